@@ -0,0 +1,637 @@
+#!/usr/bin/env python3
+import argparse
+from argparse import Namespace
+import contextlib
+import csv
+import datetime
+import itertools
+import json
+import math
+import os
+from pathlib import Path
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+import warnings
+
+import numpy as np
+
+from generate import generate
+from spice_ev import report
+from spice_ev.costs import DEFAULT_COST_CALCULATION, calculate_scenario_costs
+from spice_ev.generate import generate_schedule
+from spice_ev.scenario import Scenario
+from spice_ev.strategy import STRATEGIES
+from spice_ev.util import set_options_from_config
+
+REPO_PATH = Path(__file__).parent
+VEHICLE_TYPES = REPO_PATH / "examples/data/vehicle_types.json"
+PRICE_SHEET = REPO_PATH / "examples/data/price_sheet.json"
+TIME_WINDOWS = REPO_PATH / "examples/data/time_windows.json"
+
+START_TIME = "2023-01-02T00:00:00+01:00"  # monday
+# vehicles are at depot over night (see departure statistics in vehicle types)
+CORE_STANDING_TIME = {"times": [{"start": [22, 0], "end": [5, 0]}], "no_drive_days": [6]}
+
+# sizes per vehicle of generated grid connectors, stationary batteries and PV plants
+GC_POWER_PER_VEHICLE = 10  # kW
+BATTERY_CAPACITY_PER_VEHICLE = 10  # kWh
+BATTERY_C_RATE = 0.5
+PV_POWER_PER_VEHICLE = 5  # kW
+
+# parameters of a benchmark case, missing ones are taken from here
+DEFAULT_CASE = {
+    "mode": "statistics",  # generate mode: statistics or csv (synthetic rotations)
+    "vehicles": 10,  # statistics: number of vehicles, csv: number of rotations per day
+    "gcs": 1,  # number of grid connectors, vehicles are distributed evenly
+    "days": 1,
+    "interval": 15,  # minutes
+    "battery": False,  # stationary battery at each grid connector
+    "v2g": False,  # vehicles can discharge
+    "pv": False,  # PV plant at each grid connector
+    "schedule": False,  # grid operator schedule (single grid connector only)
+    "seed": 1,
+}
+
+# predefined sets of cases, see DEFAULT_CASE
+SUITES = {
+    "quick": [
+        {"vehicles": 10},
+        {"vehicles": 10, "battery": True, "v2g": True, "pv": True, "schedule": True},
+        {"vehicles": 10, "gcs": 2, "mode": "csv"},
+    ],
+    "default": [
+        {"vehicles": 100, "days": 7},
+        {"vehicles": 100, "days": 7, "interval": 5},
+        {"vehicles": 100, "days": 7, "battery": True, "v2g": True, "pv": True, "schedule": True},
+        {"vehicles": 100, "gcs": 10, "days": 7, "battery": True, "pv": True},
+        {"vehicles": 100, "gcs": 10, "days": 7, "mode": "csv"},
+    ],
+    "large": [
+        {"vehicles": 1000, "days": 30, "interval": 1},
+        {"vehicles": 1000, "days": 365, "battery": True, "v2g": True, "pv": True,
+         "schedule": True},
+        {"vehicles": 1000, "gcs": 50, "days": 30, "battery": True, "pv": True},
+        {"vehicles": 10000, "gcs": 500, "days": 7, "mode": "csv"},
+    ],
+}
+
+# options of strategies, added to general simulation options
+STRATEGY_OPTIONS = {
+    "peak_load_window": {"time_windows": str(TIME_WINDOWS)},
+    # do not abort if a vehicle is not at depot during core standing time
+    "schedule": {"warn_core_standing_time": True},
+}
+# strategies that support only a single grid connector
+SINGLE_GC_STRATEGIES = ["flex_window", "schedule"]
+
+
+def case_name(case):
+    """ Get short unique name of benchmark case, e.g. *statistics_v10_gc1_d1_i15+pv*.
+
+    :param case: parameters of case (see DEFAULT_CASE)
+    :type case: dict
+    :return: name
+    :rtype: str
+    """
+    case = dict(DEFAULT_CASE, **case)
+    name = "{mode}_v{vehicles}_gc{gcs}_d{days}_i{interval}".format(**case)
+    for feature in ["battery", "v2g", "pv", "schedule"]:
+        if case[feature]:
+            name += "+" + feature
+    if case["seed"] != DEFAULT_CASE["seed"]:
+        name += "_s{}".format(case["seed"])
+    return name
+
+
+def write_rotations(path, case):
+    """ Write synthetic rotation CSV (input of generate mode csv).
+
+    Each day, every rotation departs in the morning and returns in the afternoon.
+    Vehicles are assigned to rotations when generating the scenario.
+
+    :param path: path of CSV file
+    :type path: pathlib.Path
+    :param case: parameters of case (see DEFAULT_CASE)
+    :type case: dict
+    """
+    rng = random.Random(case["seed"])
+    start = datetime.datetime.fromisoformat(START_TIME).replace(tzinfo=None)
+    time_format = "%Y-%m-%d %H:%M:%S"
+    with path.open("w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["departure_time", "arrival_time", "vehicle_type", "distance"])
+        for day in range(case["days"]):
+            for idx in range(case["vehicles"]):
+                departure = start + datetime.timedelta(
+                    days=day, hours=6, minutes=rng.randrange(180))
+                arrival = departure + datetime.timedelta(minutes=rng.randrange(240, 600))
+                writer.writerow([
+                    departure.strftime(time_format), arrival.strftime(time_format),
+                    "golf" if idx % 2 else "sprinter", round(rng.uniform(20, 80), 1)])
+
+
+def write_grid_situation(path, case):
+    """ Write synthetic grid situation CSV (input of generate_schedule).
+
+    :param path: path of CSV file
+    :type path: pathlib.Path
+    :param case: parameters of case (see DEFAULT_CASE)
+    :type case: dict
+    """
+    start = datetime.datetime.fromisoformat(START_TIME).replace(tzinfo=None)
+    interval = datetime.timedelta(minutes=case["interval"])
+    power = GC_POWER_PER_VEHICLE * case["vehicles"]
+    with path.open("w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["timestamp", "curtailment", "residual load"])
+        for idx in range(case["days"] * 1440 // case["interval"]):
+            t = start + idx * interval
+            hour = t.hour + t.minute / 60
+            # curtailment around noon, residual load highest in the evening
+            curtailment = max(math.sin(math.pi * (hour - 8) / 8), 0) * power
+            residual_load = (0.5 + 0.3 * math.cos(math.pi * (hour - 18) / 12)) * power
+            writer.writerow([t.strftime("%Y-%m-%d %H:%M"), round(curtailment, 3),
+                             round(residual_load, 3)])
+
+
+def distribute_scenario(scenario, case):
+    """ Distribute generated scenario of single grid connector GC1 to several grid connectors.
+
+    Charging stations are assigned round-robin and renamed as depot stations
+    (suffix *_deps*, needed by distributed strategy). Grid connectors, grid operator signals
+    (with time windows), stationary batteries and PV plants are set up for each grid connector.
+
+    :param scenario: generated scenario
+    :type scenario: dict
+    :param case: parameters of case (see DEFAULT_CASE)
+    :type case: dict
+    """
+    components = scenario["components"]
+    events = scenario["events"]
+    gc_ids = ["GC{}".format(idx + 1) for idx in range(case["gcs"])]
+    gc = components["grid_connectors"]["GC1"]
+
+    # rename charging stations, assign to grid connectors
+    cs_names = {}
+    vehicles_per_gc = dict.fromkeys(gc_ids, 0)
+    charging_stations = {}
+    for idx, (cs_id, cs) in enumerate(sorted(components["charging_stations"].items())):
+        gc_id = gc_ids[idx % len(gc_ids)]
+        cs_names[cs_id] = cs_id + "_deps"
+        charging_stations[cs_names[cs_id]] = dict(cs, parent=gc_id)
+        vehicles_per_gc[gc_id] += 1
+    components["charging_stations"] = charging_stations
+    for vehicle in components["vehicles"].values():
+        cs_id = vehicle.get("connected_charging_station")
+        vehicle["connected_charging_station"] = cs_names.get(cs_id, cs_id)
+    for event in events["vehicle_events"]:
+        cs_id = event["update"].get("connected_charging_station")
+        if cs_id is not None:
+            event["update"]["connected_charging_station"] = cs_names[cs_id]
+
+    components["grid_connectors"] = {
+        gc_id: dict(gc, max_power=GC_POWER_PER_VEHICLE * max(vehicles_per_gc[gc_id], 1))
+        for gc_id in gc_ids}
+    # time windows (used by flex window strategy): when price is below average
+    prices = [signal["cost"]["value"] for signal in events["grid_operator_signals"]]
+    average_price = sum(prices) / max(len(prices), 1)
+    events["grid_operator_signals"] = [
+        dict(signal, grid_connector_id=gc_id, window=signal["cost"]["value"] < average_price)
+        for signal in events["grid_operator_signals"] for gc_id in gc_ids]
+
+    if case["v2g"]:
+        for vehicle_type in components["vehicle_types"].values():
+            vehicle_type["v2g"] = True
+
+    for gc_id in gc_ids:
+        num_vehicles = max(vehicles_per_gc[gc_id], 1)
+        if case["battery"]:
+            capacity = BATTERY_CAPACITY_PER_VEHICLE * num_vehicles
+            power = BATTERY_C_RATE * capacity
+            components["batteries"]["BAT_" + gc_id] = {
+                "parent": gc_id,
+                "capacity": capacity,
+                "charging_curve": [[0, power], [1, power]],
+            }
+        if case["pv"]:
+            nominal_power = PV_POWER_PER_VEHICLE * num_vehicles
+            components["photovoltaics"]["PV_" + gc_id] = {
+                "parent": gc_id,
+                "nominal_power": nominal_power,
+            }
+            # hourly generation: sunny day, every day
+            events["local_generation"]["PV_" + gc_id] = {
+                "start_time": scenario["scenario"]["start_time"],
+                "step_duration_s": 3600,
+                "grid_connector_id": gc_id,
+                "values": [
+                    round(max(math.sin(math.pi * (h % 24 - 6) / 12), 0) * nominal_power, 3)
+                    for h in range(24 * (case["days"] + 1))],
+            }
+
+
+def create_scenario(case, directory):
+    """ Generate scenario of benchmark case.
+
+    :param case: parameters of case (see DEFAULT_CASE)
+    :type case: dict
+    :param directory: directory of scenario and input files
+    :type directory: pathlib.Path
+    :return: path of scenario file
+    :rtype: pathlib.Path
+    """
+    case = dict(DEFAULT_CASE, **case)
+    assert case["mode"] in ["statistics", "csv"], f"Unknown mode {case['mode']}"
+    assert not case["schedule"] or case["gcs"] == 1, "Schedule needs single grid connector"
+    path = directory / "scenario.json"
+    args = {
+        "mode": case["mode"],
+        "output": str(path),
+        "days": case["days"],
+        "interval": case["interval"],
+        "seed": case["seed"],
+        "vehicle_types": str(VEHICLE_TYPES),
+        "start_time": START_TIME,
+        "min_soc": 0.8,
+        "min_soc_threshold": 0.05,
+        "battery": [],
+        "gc_power": GC_POWER_PER_VEHICLE * case["vehicles"],
+        "grid_operator": "default_grid_operator",
+        "voltage_level": "MV",
+        "cs_power_min": None,
+        "export_vehicle_id_csv": None,
+        "verbose": 0,
+    }
+    if case["mode"] == "statistics":
+        golf = (case["vehicles"] + 1) // 2
+        args["vehicles"] = [[n, v_type] for n, v_type in [
+            (golf, "golf"), (case["vehicles"] - golf, "sprinter")] if n > 0]
+        # draw trips in bulk, much faster for many vehicles
+        args["vectorized"] = True
+    else:
+        args["input_file"] = str(directory / "rotations.csv")
+        write_rotations(Path(args["input_file"]), case)
+
+    generate(Namespace(**args))
+
+    with path.open() as f:
+        scenario = json.load(f)
+    distribute_scenario(scenario, case)
+    with path.open("w") as f:
+        json.dump(scenario, f, separators=(",", ":"))
+
+    if case["schedule"]:
+        write_grid_situation(directory / "grid_situation.csv", case)
+        generate_schedule.generate_schedule(Namespace(
+            scenario=path,
+            input=directory / "grid_situation.csv",
+            output=None,
+            individual=False,
+            core_standing_time=CORE_STANDING_TIME,
+            visual=False,
+        ))
+    return path
+
+
+def load_scenario(path):
+    """ Read scenario file and set up scenario.
+
+    :param path: path of scenario file
+    :type path: pathlib.Path
+    :return: scenario
+    :rtype: spice_ev.Scenario
+    """
+    with path.open() as f:
+        return Scenario(json.load(f), path.parent)
+
+
+def timed(func, *args, **kwargs):
+    """ Call function and measure wall clock time.
+
+    :param func: function to call
+    :type func: callable
+    :return: return value of function and seconds needed
+    :rtype: tuple
+    """
+    begin = time.perf_counter()
+    result = func(*args, **kwargs)
+    return result, time.perf_counter() - begin
+
+
+def summarize(seconds):
+    """ Summary of repeated measurements.
+
+    :param seconds: measured times
+    :type seconds: list
+    :return: fastest run (compare this one) and all runs
+    :rtype: dict
+    """
+    return {"status": "ok", "seconds": min(seconds), "runs": seconds}
+
+
+def skip_reason(strategy, case):
+    """ Check if strategy can not be run for case.
+
+    :param strategy: name of strategy
+    :type strategy: str
+    :param case: parameters of case (see DEFAULT_CASE)
+    :type case: dict
+    :return: reason to skip or None
+    :rtype: str
+    """
+    if strategy in SINGLE_GC_STRATEGIES and case["gcs"] > 1:
+        return "only one grid connector supported"
+    if strategy == "schedule" and not case["schedule"]:
+        return "needs schedule"
+    return None
+
+
+def benchmark_strategy(path, strategy, repeat, directory):
+    """ Simulate scenario with strategy, generate reports and calculate costs.
+
+    Each step is timed separately. Each repetition uses a freshly loaded scenario.
+
+    :param path: path of scenario file
+    :type path: pathlib.Path
+    :param strategy: name of strategy
+    :type strategy: str
+    :param repeat: number of repetitions
+    :type repeat: int
+    :param directory: directory for report files
+    :type directory: pathlib.Path
+    :return: times of steps simulate, report and costs
+    :rtype: dict
+    """
+    times = {"simulate": [], "report": [], "costs": []}
+    results = {}
+    aborted = False
+    step = "simulate"
+    try:
+        for _ in range(repeat):
+            step = "simulate"
+            s = load_scenario(path)
+            options = dict(STRATEGY_OPTIONS.get(strategy, {}), margin=1, skip_flex_report=True)
+            _, seconds = timed(s.run, strategy, options)
+            times[step].append(seconds)
+            aborted = aborted or s.step_i < s.n_intervals
+
+            step = "report"
+            _, seconds = timed(report.generate_reports, s, {
+                "cost_calculation": True,
+                "save_results": directory / f"{strategy}_results.json",
+                "save_timeseries": directory / f"{strategy}_timeseries.csv",
+                "save_soc": directory / f"{strategy}_soc.csv",
+            })
+            times[step].append(seconds)
+
+            step = "costs"
+            fee_type = "SLP" if strategy in ["greedy", "balanced", "distributed"] else "RLM"
+            _, seconds = timed(
+                calculate_scenario_costs, s, [DEFAULT_COST_CALCULATION[strategy]],
+                price_sheet_path=PRICE_SHEET, fee_type=fee_type)
+            times[step].append(seconds)
+    except ImportError as e:
+        # optional dependency of strategy missing
+        return {"simulate": {"status": "skipped", "reason": str(e)}}
+    except Exception as e:
+        results[step] = {"status": "error", "reason": f"{type(e).__name__}: {e}"}
+
+    for step, seconds in times.items():
+        if seconds:
+            results.setdefault(step, summarize(seconds))
+    if aborted:
+        # simulation stopped early: times of simulation and of its report and costs
+        # are not comparable
+        for info in results.values():
+            if info["status"] == "ok":
+                info["status"] = "aborted"
+    # same order of steps as run
+    return {step: results[step] for step in times if step in results}
+
+
+def benchmark_case(case, strategies=None, repeat=1, verbose=False):
+    """ Generate scenario of case, then time scenario load and each strategy.
+
+    :param case: parameters of case (see DEFAULT_CASE)
+    :type case: dict
+    :param strategies: names of strategies to run (default: all)
+    :type strategies: list
+    :param repeat: number of repetitions of each timed step (fastest one is reported)
+    :type repeat: int
+    :param verbose: show output and warnings of generation and simulation
+    :type verbose: bool
+    :return: parameters, size and results of case
+    :rtype: dict
+    """
+    case = dict(DEFAULT_CASE, **case)
+    result = {"name": case_name(case), "parameters": case}
+    with tempfile.TemporaryDirectory() as directory, \
+            contextlib.ExitStack() as stack:
+        if not verbose:
+            # generate and simulate print progress
+            devnull = stack.enter_context(open(os.devnull, "w"))
+            stack.enter_context(contextlib.redirect_stdout(devnull))
+            stack.enter_context(warnings.catch_warnings())
+            warnings.simplefilter("ignore")
+        directory = Path(directory)
+
+        path, seconds = timed(create_scenario, case, directory)
+        result["generate"] = {"status": "ok", "seconds": seconds}
+        with path.open() as f:
+            scenario = json.load(f)
+        result["size"] = {
+            "vehicles": len(scenario["components"]["vehicles"]),
+            "charging_stations": len(scenario["components"]["charging_stations"]),
+            "grid_connectors": len(scenario["components"]["grid_connectors"]),
+            "vehicle_events": len(scenario["events"]["vehicle_events"]),
+            "file_size": path.stat().st_size,
+        }
+        del scenario
+
+        seconds = []
+        for _ in range(repeat):
+            s, t = timed(load_scenario, path)
+            seconds.append(t)
+        result["size"]["n_intervals"] = s.n_intervals
+        result["load"] = summarize(seconds)
+        del s
+
+        result["strategies"] = {}
+        for strategy in strategies or STRATEGIES:
+            reason = skip_reason(strategy, case)
+            if reason is None:
+                result["strategies"][strategy] = benchmark_strategy(
+                    path, strategy, repeat, directory)
+            else:
+                result["strategies"][strategy] = {
+                    "simulate": {"status": "skipped", "reason": reason}}
+    return result
+
+
+def get_metadata():
+    """ Get information about code and machine of benchmark run.
+
+    :return: metadata
+    :rtype: dict
+    """
+    def git(*args):
+        try:
+            return subprocess.run(
+                ["git", *args], cwd=REPO_PATH, capture_output=True, text=True, check=True
+            ).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            return None
+
+    status = git("status", "--porcelain", "--untracked-files=no")
+    return {
+        "commit": git("rev-parse", "HEAD"),
+        "dirty": None if status is None else bool(status),
+        "created": datetime.datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "platform": platform.platform(),
+        "processor": platform.processor(),
+        "cpu_count": os.cpu_count(),
+    }
+
+
+def run_benchmark(cases, strategies=None, repeat=1, output=None, verbose=False):
+    """ Benchmark all cases.
+
+    :param cases: parameters of each case (see DEFAULT_CASE)
+    :type cases: list of dicts
+    :param strategies: names of strategies to run (default: all)
+    :type strategies: list
+    :param repeat: number of repetitions of each timed step
+    :type repeat: int
+    :param output: path of JSON file to write results to, updated after each case
+    :type output: str or pathlib.Path
+    :param verbose: show output and warnings of generation and simulation
+    :type verbose: bool
+    :return: metadata and results of each case
+    :rtype: dict
+    """
+    results = {"metadata": dict(get_metadata(), repeat=repeat), "cases": []}
+    for case in cases:
+        print("Benchmark", case_name(case), file=sys.stderr)
+        results["cases"].append(benchmark_case(case, strategies, repeat, verbose))
+        if output is not None:
+            # keep finished cases if a later one fails
+            with open(output, "w") as f:
+                json.dump(results, f, indent=2)
+    return results
+
+
+def flatten_times(results):
+    """ Get comparable times of benchmark results.
+
+    :param results: benchmark results (see run_benchmark)
+    :type results: dict
+    :return: seconds by key *case/step* or *case/strategy/step* (only successful steps)
+    :rtype: dict
+    """
+    times = {}
+    for case in results["cases"]:
+        steps = {step: case.get(step) for step in ["generate", "load"]}
+        for strategy, strategy_steps in case.get("strategies", {}).items():
+            for step, info in strategy_steps.items():
+                steps[f"{strategy}/{step}"] = info
+        for key, info in steps.items():
+            if info is not None and info["status"] == "ok":
+                times[f"{case['name']}/{key}"] = info["seconds"]
+    return times
+
+
+def compare_results(old, new):
+    """ Compare times of two benchmark runs, e.g. of different commits.
+
+    :param old: benchmark results of reference run (see run_benchmark)
+    :type old: dict
+    :param new: benchmark results of new run
+    :type new: dict
+    :return: key, old and new time and ratio (new / old) of each step in both runs
+    :rtype: list of tuples
+    """
+    old_times = flatten_times(old)
+    new_times = flatten_times(new)
+    return [(key, old_times[key], seconds, seconds / old_times[key] if old_times[key] else None)
+            for key, seconds in new_times.items() if key in old_times]
+
+
+def get_cases(args):
+    """ Get cases from suite or from combinations of given parameters.
+
+    :param args: input arguments
+    :type args: argparse.Namespace
+    :return: parameters of each case
+    :rtype: list of dicts
+    """
+    grid = {key: vars(args).get(key) for key in ["mode", "vehicles", "gcs", "days", "interval"]}
+    grid = {key: values for key, values in grid.items() if values}
+    if not grid:
+        return SUITES[args.suite]
+    features = {key: True for key in ["battery", "v2g", "pv", "schedule"] if vars(args).get(key)}
+    cases = []
+    for values in itertools.product(*grid.values()):
+        case = dict(DEFAULT_CASE, **dict(zip(grid.keys(), values)), **features)
+        if case["schedule"] and case["gcs"] > 1:
+            warnings.warn(f"Schedule needs single grid connector, skip {case_name(case)}")
+            continue
+        cases.append(case)
+    return cases
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description='Benchmark SpiceEV: time scenario loading, simulation with each strategy, '
+                    'report generation and cost calculation for synthetic scenarios.')
+    parser.add_argument('--suite', default='quick', choices=SUITES.keys(),
+                        help='predefined set of cases, used if no case parameters are given')
+    parser.add_argument('--mode', nargs='+', choices=['statistics', 'csv'],
+                        help='generate scenarios from statistics or synthetic rotations (csv)')
+    parser.add_argument('--vehicles', nargs='+', type=int, metavar='N',
+                        help='number of vehicles (csv: rotations per day)')
+    parser.add_argument('--gcs', nargs='+', type=int, metavar='N',
+                        help='number of grid connectors')
+    parser.add_argument('--days', nargs='+', type=int, metavar='N', help='simulated days')
+    parser.add_argument('--interval', nargs='+', type=int, metavar='MIN',
+                        help='simulation interval in minutes')
+    parser.add_argument('--battery', action='store_true',
+                        help='add stationary battery to each grid connector')
+    parser.add_argument('--v2g', action='store_true', help='vehicles can discharge')
+    parser.add_argument('--pv', action='store_true', help='add PV plant to each grid connector')
+    parser.add_argument('--schedule', action='store_true',
+                        help='generate grid operator schedule (single grid connector only)')
+    parser.add_argument('--strategies', nargs='+', choices=STRATEGIES,
+                        help='strategies to run (default: all)')
+    parser.add_argument('--repeat', type=int, default=1,
+                        help='repeat each timed step, fastest one is reported')
+    parser.add_argument('--output', '-o', help='write results to JSON file')
+    parser.add_argument('--compare', nargs=2, metavar=('OLD', 'NEW'),
+                        help='compare two results files instead of running benchmark')
+    parser.add_argument('--verbose', '-v', action='store_true',
+                        help='show output of generation and simulation')
+    parser.add_argument('--config', help='Use config file to set arguments')
+    args = parser.parse_args()
+
+    set_options_from_config(args, check=parser, verbose=False)
+
+    if args.compare:
+        with open(args.compare[0]) as f:
+            old = json.load(f)
+        with open(args.compare[1]) as f:
+            new = json.load(f)
+        print(f"{'step':<60} {'old [s]':>10} {'new [s]':>10} {'new/old':>8}")
+        for key, old_seconds, new_seconds, ratio in compare_results(old, new):
+            ratio = "-" if ratio is None else f"{ratio:.2f}"
+            print(f"{key:<60} {old_seconds:>10.3f} {new_seconds:>10.3f} {ratio:>8}")
+    else:
+        results = run_benchmark(
+            get_cases(args), args.strategies, args.repeat, args.output, args.verbose)
+        if args.output is None:
+            json.dump(results, sys.stdout, indent=2)
+            print()
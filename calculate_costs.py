@@ -1,8 +1,16 @@
 #!/usr/bin/env python3
 import argparse
+import concurrent.futures
 import csv
 import datetime
+import functools
+import glob
 import json
+from pathlib import Path
+import sys
+import warnings
+
+import numpy as np
 
 from spice_ev import util, costs
 
@@ -10,92 +18,121 @@ from spice_ev import util, costs
 def read_simulation_csv(csv_file):
     """ Read prices, power values and charging signals for each timestamp from simulation results.
 
+    The file is read column by column: each column is converted as a whole.
+    Timestamps without timezone (as written by SpiceEV) are parsed at once into a NumPy array.
+
     :param csv_file: csv file with simulation results
     :type csv_file: str
     :return: timestamps, prices, power supplied from the grid, power fed into the grid, needed power
         of fixed load, charging signals
-    :rtype: dict of lists
+    :rtype: dict of lists (timestamps may be numpy.ndarray)
     """
 
-    timestamps_list = []
-    price_list = []  # [€/kWh]
-    power_grid_supply_list = []  # [kW]
-    power_fix_load_list = []  # [kW]
-    power_generation_feed_in_list = []  # [kW]
-    power_v2g_feed_in_list = []  # [kW]
-    power_battery_feed_in_list = []  # [kW]
-    window_signal_list = []  # [-]
-    power_schedule_list = []  # [kW]
     with open(csv_file, "r", newline="") as simulation_data:
-        reader = csv.DictReader(simulation_data, delimiter=",")
-        for row in reader:
-
-            # find values for parameter
-            timestamp = datetime.datetime.fromisoformat(row["time"])
-            price = float(row.get("price [EUR/kWh]", 0))
-            power_grid_supply = float(row.get("grid supply [kW]", 0))
-            power_fix_load = max(float(row.get("fixed load [kW]", 0)) +
-                                 min(float(row.get("local generation [kW]", 0)), 0) +
-                                 min(float(row.get("battery power [kW]", 0)), 0) +
-                                 min(float(row.get("sum CS power [kW]", 0)), 0), 0)
-            power_generation_feed_in = float(row.get("generation feed-in [kW]", 0))
-            power_v2g_feed_in = float(row.get("V2G feed-in [kW]", 0))
-            power_battery_feed_in = float(row.get("battery feed-in [kW]", 0))
-
-            # append value to the respective list
-            timestamps_list.append(timestamp)
-            price_list.append(price)
-            power_grid_supply_list.append(power_grid_supply)
-            power_fix_load_list.append(power_fix_load)
-            power_generation_feed_in_list.append(power_generation_feed_in)
-            power_v2g_feed_in_list.append(power_v2g_feed_in)
-            power_battery_feed_in_list.append(power_battery_feed_in)
-
-            try:
-                window_signal = bool(int(row["window signal [-]"]))
-            except KeyError:
-                window_signal = None
-
-            try:
-                power_schedule = float(row["schedule [kW]"])
-                power_schedule_list.append(power_schedule)
-            except KeyError:
-                power_schedule_list = None
-
-            window_signal_list.append(window_signal)
+        reader = csv.reader(simulation_data, delimiter=",")
+        header = next(reader)
+        rows = list(reader)
+    column_index = {name: idx for idx, name in enumerate(header)}
+
+    def get_strings(name):
+        # only extract columns that are needed
+        idx = column_index[name]
+        return [row[idx] for row in rows]
+
+    def get_column(name, default=None):
+        # convert all values of column at once
+        if name not in column_index:
+            return default
+        return list(map(float, get_strings(name)))
+
+    time_strings = get_strings("time")
+    if time_strings and datetime.datetime.fromisoformat(time_strings[0]).tzinfo is None:
+        timestamps_list = np.array(time_strings, dtype="datetime64[us]")
+    else:
+        # NumPy has no timezones
+        timestamps_list = list(map(datetime.datetime.fromisoformat, time_strings))
+    zeros = [0.0] * len(timestamps_list)
+
+    # fixed load: subtract support power (where negative), can not be negative
+    power_fix_load_list = list(costs.get_fixed_load_supply(
+        get_column("fixed load [kW]", zeros),
+        get_column("local generation [kW]"),
+        get_column("battery power [kW]"),
+        get_column("sum CS power [kW]")))
+
+    window_signal_list = [None] * len(zeros)
+    if "window signal [-]" in column_index:
+        # signal may be written as number or boolean
+        window_signal_list = [bool(int(w)) if w.isdigit() else w == "True"
+                              for w in get_strings("window signal [-]")]
 
     return {
         "timestamps_list": timestamps_list,
-        "price_list": price_list,
-        "power_grid_supply_list": power_grid_supply_list,
+        "price_list": get_column("price [EUR/kWh]", zeros),  # [€/kWh]
+        "power_grid_supply_list": get_column("grid supply [kW]", zeros),  # [kW]
         "power_fix_load_list": power_fix_load_list,
-        "power_generation_feed_in_list": power_generation_feed_in_list,
-        "power_v2g_feed_in_list": power_v2g_feed_in_list,
-        "power_battery_feed_in_list": power_battery_feed_in_list,
+        "power_generation_feed_in_list": get_column("generation feed-in [kW]", zeros),
+        "power_v2g_feed_in_list": get_column("V2G feed-in [kW]", zeros),
+        "power_battery_feed_in_list": get_column("battery feed-in [kW]", zeros),
         "window_signal_list": window_signal_list,
-        "power_schedule_list": power_schedule_list,
+        "power_schedule_list": get_column("schedule [kW]"),
     }
 
 
-if __name__ == "__main__":  # pragma: no cover
-    parser = argparse.ArgumentParser(
-        description='Generate scenarios as JSON files for vehicle charging modelling')
-    parser.add_argument('--voltage-level', '-vl', help='Choose voltage level for cost calculation')
-    parser.add_argument('--fee-type', choices=["SLP", "RLM"],
-                        help='Choose voltage level for cost calculation')
-    parser.add_argument('--pv-power', type=int, default=0,
-                        help='set nominal power for local photovoltaic power plant in kWp')
-    parser.add_argument('--get-timeseries', '-ts', help='get timeseries from csv file.')
-    parser.add_argument('--get-results', '-r', help='get simulation results from json file.')
-    parser.add_argument('--cost-parameters-file', '-cp', help='get cost parameters from json file.')
-    parser.add_argument('--config', help='Use config file to set arguments')
+def read_simulation_columns(columnar_file):
+    """ Read prices, power values and charging signals from simulation results in columnar format.
 
-    args = parser.parse_args()
+    Same as read_simulation_csv, but for binary columnar files (see util.COLUMNAR_FORMATS).
+    Columns are used as a whole, no text is parsed.
 
-    util.set_options_from_config(args, check=parser, verbose=False)
+    :param columnar_file: columnar file with simulation results
+    :type columnar_file: str
+    :return: timestamps, prices, power supplied from the grid, power fed into the grid, needed power
+        of fixed load, charging signals
+    :rtype: dict of lists
+    """
+
+    columns = util.read_columns(columnar_file)
+    zeros = [0.0] * len(columns["time"])
+
+    # fixed load: subtract support power (where negative), can not be negative
+    power_fix_load_list = list(costs.get_fixed_load_supply(
+        columns.get("fixed load [kW]", zeros),
+        columns.get("local generation [kW]"),
+        columns.get("battery power [kW]"),
+        columns.get("sum CS power [kW]")))
 
+    window_signal_list = [None] * len(zeros)
+    if "window signal [-]" in columns:
+        # missing values may be stored as NaN
+        window_signal_list = [None if w is None or w != w else bool(w)
+                              for w in columns["window signal [-]"]]
+
+    return {
+        "timestamps_list": columns["time"],
+        "price_list": columns.get("price [EUR/kWh]", zeros),
+        "power_grid_supply_list": columns.get("grid supply [kW]", zeros),
+        "power_fix_load_list": power_fix_load_list,
+        "power_generation_feed_in_list": columns.get("generation feed-in [kW]", zeros),
+        "power_v2g_feed_in_list": columns.get("V2G feed-in [kW]", zeros),
+        "power_battery_feed_in_list": columns.get("battery feed-in [kW]", zeros),
+        "window_signal_list": window_signal_list,
+        "power_schedule_list": columns.get("schedule [kW]"),
+    }
+
+
+def read_simulation(timeseries_file, results_file):
+    """ Read timeseries and parameters for cost calculation from simulation output files.
+
+    :param timeseries_file: csv or columnar file with simulation timeseries
+    :type timeseries_file: str
+    :param results_file: json file with simulation results
+    :type results_file: str
+    :return: cost calculation method, simulation interval, grid connector info, timeseries
+    :rtype: tuple
+    """
     # load simulation results
-    with open(args.get_results, "r", newline="") as sj:
+    with open(results_file, "r", newline="") as sj:
         simulation_json = json.load(sj)
 
     # cost calculation method through strategy
@@ -108,29 +145,257 @@ if __name__ == "__main__":  # pragma: no cover
     interval_min = simulation_json.get("temporal_parameters", {}).get("interval")
     assert interval_min is not None, "Simulation interval length not set in results file"
 
-    # core standing time for fleet
-    core_standing_time_dict = simulation_json.get("core_standing_time")
-
     # load simulation time series
-    timeseries_lists = read_simulation_csv(args.get_timeseries)
+    if Path(timeseries_file).suffix in util.COLUMNAR_FORMATS:
+        timeseries_lists = read_simulation_columns(timeseries_file)
+    else:
+        timeseries_lists = read_simulation_csv(timeseries_file)
 
-    # grid connector
     gc = simulation_json.get("grid_connector", {})
+    return cc_type, datetime.timedelta(minutes=interval_min), gc, timeseries_lists
+
+
+def calculate_simulation_costs(timeseries_file, results_file, price_sheet_path=None,
+                               voltage_level=None, fee_type=None, pv_power=0,
+                               write_results=False, price_sheets=None):
+    """ Calculate costs of one simulation from its output files.
+
+    :param timeseries_file: csv or columnar file with simulation timeseries
+    :type timeseries_file: str
+    :param results_file: json file with simulation results
+    :type results_file: str
+    :param price_sheet_path: path to price sheet
+    :type price_sheet_path: str
+    :param voltage_level: voltage level, defaults to voltage level of grid connector
+    :type voltage_level: str
+    :param fee_type: force RLM or SLP calculation (optional)
+    :type fee_type: str
+    :param pv_power: nominal power of pv power plant in kWp
+    :type pv_power: int
+    :param write_results: add costs to results file
+    :type write_results: bool
+    :param price_sheets: content of price sheet file, replaces price_sheet_path
+    :type price_sheets: dict
+    :return: costs (see costs.calculate_costs)
+    :rtype: dict
+    """
+    cc_type, interval, gc, timeseries_lists = read_simulation(timeseries_file, results_file)
     # grid operator of grid connector (default = default_grid_operator)
     grid_operator = gc.get("grid_operator", "default_grid_operator")
     # voltage level of grid connector
-    voltage_level = args.voltage_level or gc.get("voltage_level")
-    assert voltage_level is not None, f"Voltage level is of {gc['gcID']} not defined"
+    voltage_level = voltage_level or gc.get("voltage_level")
+    assert voltage_level is not None, f"Voltage level is of {gc.get('gcID')} not defined"
 
-    # cost calculation
-    costs.calculate_costs(
+    return costs.calculate_costs(
         cc_type=cc_type,
         voltage_level=voltage_level,
-        interval=datetime.timedelta(minutes=interval_min),
+        interval=interval,
         **timeseries_lists,
-        price_sheet_path=args.cost_parameters_file,
+        price_sheet_path=price_sheet_path,
         grid_operator=grid_operator,
-        fee_type=args.fee_type,
-        results_json=args.get_results,
-        power_pv_nominal=args.pv_power,
+        fee_type=fee_type,
+        results_json=results_file if write_results else None,
+        power_pv_nominal=pv_power,
+        price_sheets=price_sheets,
     )
+
+
+def read_timeseries_header(timeseries_file):
+    """ Read column names of csv or columnar file.
+
+    :param timeseries_file: csv or columnar file
+    :type timeseries_file: str
+    :return: column names
+    :rtype: list
+    """
+    if Path(timeseries_file).suffix in util.COLUMNAR_FORMATS:
+        return util.read_column_names(timeseries_file)
+    with open(timeseries_file, "r", newline="") as f:
+        return next(csv.reader(f), [])
+
+
+def find_timeseries_files(pattern):
+    """ Find simulation timeseries files (csv or columnar) in directory or by glob pattern.
+
+    Files without grid supply (e.g. vehicle SoC of simulation) are skipped with a warning.
+
+    :param pattern: directory or glob pattern, e.g. *sweep/*.csv*
+    :type pattern: str
+    :return: sorted paths of timeseries files
+    :rtype: list
+    """
+    if Path(pattern).is_dir():
+        pattern = str(Path(pattern) / "*")
+    suffixes = [".csv"] + list(util.COLUMNAR_FORMATS)
+    timeseries_files = []
+    for path in sorted(Path(p) for p in glob.glob(pattern) if Path(p).suffix in suffixes):
+        if "grid supply [kW]" not in read_timeseries_header(path):
+            warnings.warn(f"{path} is not a simulation timeseries (no grid supply), skipped")
+            continue
+        timeseries_files.append(path)
+    return timeseries_files
+
+
+def _calculate_batch_task(task, **kwargs):
+    """ Calculate costs for one pair of timeseries and results file in worker process.
+
+    :param task: timeseries file and results file
+    :type task: tuple
+    :param kwargs: keyword arguments of calculate_simulation_costs
+    :type kwargs: dict
+    :return: costs (see costs.calculate_costs)
+    :rtype: dict
+    """
+    return calculate_simulation_costs(*task, **kwargs)
+
+
+def calculate_batch_costs(timeseries_files, price_sheet_path, results_file=None,
+                          voltage_level=None, fee_type=None, pv_power=0, processes=1):
+    """ Calculate costs of many simulations, e.g. of a parameter sweep.
+
+    The results file of each timeseries file is the json file with the same name next to it.
+    Results files are not changed. The price sheet is read once.
+    With *processes* > 1, files are read and priced concurrently in a process pool.
+
+    :param timeseries_files: csv or columnar files with simulation timeseries
+    :type timeseries_files: list
+    :param price_sheet_path: path to price sheet
+    :type price_sheet_path: str
+    :param results_file: results file used if no results file is found next to a timeseries file
+    :type results_file: str
+    :param voltage_level: voltage level, defaults to voltage level of grid connector
+    :type voltage_level: str
+    :param fee_type: force RLM or SLP calculation (optional)
+    :type fee_type: str
+    :param pv_power: nominal power of pv power plant in kWp
+    :type pv_power: int
+    :param processes: number of worker processes (1: calculate sequentially)
+    :type processes: int
+    :return: timeseries file -> costs (see costs.calculate_costs)
+    :rtype: dict
+    """
+    tasks = []
+    for timeseries_file in timeseries_files:
+        own_results_file = Path(timeseries_file).with_suffix(".json")
+        if own_results_file.exists():
+            tasks.append((str(timeseries_file), str(own_results_file)))
+        else:
+            assert results_file is not None, f"No results file for {timeseries_file} found"
+            warnings.warn(f"No results file for {timeseries_file} found, using {results_file}")
+            tasks.append((str(timeseries_file), str(results_file)))
+
+    with open(price_sheet_path, "r", newline="") as ps:
+        price_sheets = json.load(ps)
+    calculate = functools.partial(
+        _calculate_batch_task, voltage_level=voltage_level, fee_type=fee_type,
+        pv_power=pv_power, price_sheets=price_sheets)
+
+    if processes <= 1 or len(tasks) <= 1:
+        results = [calculate(task) for task in tasks]
+    else:
+        with concurrent.futures.ProcessPoolExecutor(max_workers=processes) as pool:
+            chunksize = max(1, len(tasks) // (4 * processes))
+            results = list(pool.map(calculate, tasks, chunksize=chunksize))
+    return {timeseries_file: result for (timeseries_file, _), result in zip(tasks, results)}
+
+
+def write_batch_costs(batch_costs, output_file):
+    """ Write costs of many simulations to one json or csv file (by file extension).
+
+    :param batch_costs: timeseries file -> costs (see calculate_batch_costs)
+    :type batch_costs: dict
+    :param output_file: path of output file
+    :type output_file: str
+    """
+    with open(output_file, "w", newline="") as f:
+        if Path(output_file).suffix == ".json":
+            json.dump(batch_costs, f, indent=2)
+            return
+        rows = [{"timeseries": timeseries_file, **result}
+                for timeseries_file, result in batch_costs.items()]
+        header = list(rows[0].keys()) if rows else ["timeseries"]
+        writer = csv.DictWriter(f, fieldnames=header)
+        writer.writeheader()
+        writer.writerows(rows)
+
+
+if __name__ == "__main__":  # pragma: no cover
+    parser = argparse.ArgumentParser(
+        description='Generate scenarios as JSON files for vehicle charging modelling')
+    parser.add_argument('--voltage-level', '-vl', help='Choose voltage level for cost calculation')
+    parser.add_argument('--fee-type', choices=["SLP", "RLM"],
+                        help='Choose voltage level for cost calculation')
+    parser.add_argument('--pv-power', type=int, default=0,
+                        help='set nominal power for local photovoltaic power plant in kWp')
+    parser.add_argument('--get-timeseries', '-ts',
+                        help='get timeseries from csv file (or columnar file: {}).'.format(
+                            ', '.join(util.COLUMNAR_FORMATS)))
+    parser.add_argument('--get-results', '-r', help='get simulation results from json file.')
+    parser.add_argument('--cost-parameters-file', '-cp', help='get cost parameters from json file.')
+    parser.add_argument('--price-sheets', metavar='DIR',
+                        help='compare costs for all price sheets (json files) in directory, '
+                        'all of their grid operators and voltage levels')
+    parser.add_argument('--comparison-file', metavar='FILE',
+                        help='write comparison of price sheets to csv file instead of printing it')
+    parser.add_argument('--batch', metavar='PATTERN',
+                        help='calculate costs for all timeseries files in directory or matching '
+                        'glob pattern. Results of each file are read from json file with same name '
+                        '(or --get-results)')
+    parser.add_argument('--batch-output', metavar='FILE',
+                        help='write costs of all files of batch to json or csv file')
+    parser.add_argument('--processes', type=int, default=1,
+                        help='number of processes to compare price sheets or calculate batch '
+                        'in parallel')
+    parser.add_argument('--config', help='Use config file to set arguments')
+
+    args = parser.parse_args()
+
+    util.set_options_from_config(args, check=parser, verbose=False)
+
+    if args.batch is not None:
+        # price many simulations, results files are not changed
+        assert args.batch_output is not None, "Batch mode needs output file (--batch-output)"
+        batch_costs = calculate_batch_costs(
+            find_timeseries_files(args.batch),
+            price_sheet_path=args.cost_parameters_file,
+            results_file=args.get_results,
+            voltage_level=args.voltage_level,
+            fee_type=args.fee_type,
+            pv_power=args.pv_power,
+            processes=args.processes,
+        )
+        write_batch_costs(batch_costs, args.batch_output)
+    elif args.price_sheets is None:
+        # cost calculation
+        calculate_simulation_costs(
+            args.get_timeseries, args.get_results,
+            price_sheet_path=args.cost_parameters_file,
+            voltage_level=args.voltage_level,
+            fee_type=args.fee_type,
+            pv_power=args.pv_power,
+            write_results=True,
+        )
+    else:
+        # compare price sheets, results file is not changed
+        cc_type, interval, _, timeseries_lists = read_simulation(
+            args.get_timeseries, args.get_results)
+        comparison = costs.compare_price_sheets(
+            cc_type=cc_type,
+            interval=interval,
+            timeseries=timeseries_lists,
+            price_sheet_paths=sorted(Path(args.price_sheets).glob("*.json")),
+            voltage_levels=None if args.voltage_level is None else [args.voltage_level],
+            fee_types=[args.fee_type],
+            power_pv_nominal=args.pv_power,
+            processes=args.processes,
+        )
+        header = list(comparison[0].keys()) if comparison else []
+        if args.comparison_file is None:
+            f = sys.stdout
+        else:
+            f = open(args.comparison_file, "w", newline="")
+        writer = csv.DictWriter(f, fieldnames=header)
+        writer.writeheader()
+        writer.writerows(comparison)
+        if f is not sys.stdout:
+            f.close()
@@ -8,6 +8,7 @@ import warnings
 
 from spice_ev.util import set_options_from_config
 from spice_ev.generate import generate_from_csv, generate_from_simbev, generate_from_statistics
+from spice_ev.generate.scenario_writer import ScenarioWriter
 
 
 MODE_CHOICES = {
@@ -165,12 +166,15 @@ def generate(args):
 
     update_namespace(args)
 
-    # call generate function
-    scenario = MODE_CHOICES[args.mode](args)
-
-    # write JSON
-    with open(args.output, 'w') as f:
-        json.dump(scenario, f, indent=2)
+    # write JSON incrementally, compact: without indentation
+    with ScenarioWriter(args.output, None if vars(args).get("compact") else 2) as writer:
+        if args.mode == "simbev" and vars(args).get("stream"):
+            # write vehicles and their events while reading SimBEV files
+            scenario = generate_from_simbev.generate_from_simbev(args, writer)
+        else:
+            # call generate function
+            scenario = MODE_CHOICES[args.mode](args)
+        writer.write(scenario)
 
 
 if __name__ == '__main__':  # pragma: no cover
@@ -204,6 +208,11 @@ if __name__ == '__main__':  # pragma: no cover
     parser.add_argument('--days', metavar='N', type=int, default=7,
                         help='set duration of scenario as number of days')  # ignored for simbev
     parser.add_argument('--seed', default=None, type=int, help='set random seed')
+    parser.add_argument('--compact', action='store_true',
+                        help='write scenario JSON without indentation (smaller and faster)')
+    parser.add_argument('--processes', type=int, default=1,
+                        help='number of worker processes to read SimBEV files or to generate '
+                             'trips with --vectorized. Default: 1')
 
     # input files (CSV, JSON)
     parser.add_argument('--vehicle-types', default=None,
@@ -247,6 +256,9 @@ if __name__ == '__main__':  # pragma: no cover
                         help='do not use SoC columns from SimBEV files')
     parser.add_argument('--min-soc-threshold', type=float, default=0.05,
                         help='SoC below this threshold trigger a warning. Default: 0.05')
+    parser.add_argument('--stream', action='store_true',
+                        help='write vehicles and their events to output while reading SimBEV '
+                             'files, so memory stays bounded for large runs')
 
     # statistics options
     parser.add_argument('--vehicles', metavar=('N', 'TYPE'), nargs=2, action='append', type=str,
@@ -260,6 +272,9 @@ if __name__ == '__main__':  # pragma: no cover
                         help='provide list of specific days of no driving ISO format YYYY-MM-DD')
     parser.add_argument('--buffer', type=float, default=0.1,
                         help='set buffer on top of needed SoC for next trip')
+    parser.add_argument('--vectorized', action='store_true',
+                        help='draw trips of each vehicle type in bulk with NumPy. '
+                             'Result only depends on --seed, not on --processes')
 
     args = parser.parse_args()
 
@@ -9,5 +9,10 @@ setup(
     author_email='info@rl-institut.de',
     license="MIT",
     packages=find_packages(),
+    install_requires=["numpy"],
+    extras_require={
+        "optimal": ["scipy", "highspy"],
+        "columnar": ["pyarrow>=14"],
+    },
     package_data={},
 )
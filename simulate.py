@@ -5,7 +5,7 @@ import json
 from pathlib import Path
 import warnings
 
-from spice_ev.costs import DEFAULT_COST_CALCULATION, calculate_costs
+from spice_ev.costs import DEFAULT_COST_CALCULATION, calculate_scenario_costs
 from spice_ev.scenario import Scenario
 from spice_ev.strategy import STRATEGIES
 from spice_ev.util import set_options_from_config
@@ -36,9 +36,16 @@ def simulate(args):
         'save_timeseries': args.get("save_timeseries"),
         'save_soc': args.get("save_soc"),
         'save_results': args.get("save_results"),
+        'save_db': args.get("save_db"),
+        'db_resolution': args.get("db_resolution"),
+        'input': str(input_file),
         'testing': args.get("testing"),
         'timing': args.get("eta"),
+        'fast_forward': args.get("fast_forward"),
+        'adaptive_interval': args.get("adaptive_interval"),
+        'out_of_core': args.get("out_of_core"),
         'visual': args.get("visual"),
+        'plot_file': args.get("plot_file"),
     }
 
     # parse strategy options
@@ -64,48 +71,16 @@ def simulate(args):
 
     if args.get("cost_calc"):
         # cost calculation following directly after simulation
-        for gcID, gc in s.components.grid_connectors.items():
-            cc_type = DEFAULT_COST_CALCULATION[strategy_name]
-            fee_type = "SLP" if strategy_name in ["greedy", "balanced", "distributed"] else "RLM"
-            pv = sum([pv.nominal_power for pv in s.components.photovoltaics.values()
-                      if pv.parent == gcID])
-            timeseries = vars(s).get(f"{gcID}_timeseries")
-
-            # original fixed load
-            power_fix_load_list = timeseries.get("fixed load [kW]", [0] * s.n_intervals)
-            # calculate grid supply for fixed load: subtract support power (where negative)
-            for ts_name in ["local generation [kW]", "battery power [kW]", "sum CS power [kW]"]:
-                support = timeseries.get(ts_name)
-                if support is None:
-                    continue
-                assert len(support) == len(power_fix_load_list) == s.n_intervals
-                for i in range(s.n_intervals):
-                    power_fix_load_list[i] += min(support[i], 0)
-            # grid supply for fixed loads can not be negative
-            for i in range(s.n_intervals):
-                power_fix_load_list[i] = max(power_fix_load_list[i], 0)
-
-            # Calculate costs
-            costs = calculate_costs(
-                cc_type=cc_type,
-                fee_type=fee_type,
-                voltage_level=gc.voltage_level,
-                interval=s.interval,
-                timestamps_list=timeseries.get("time"),
-                power_grid_supply_list=timeseries.get("grid supply [kW]"),
-                price_list=timeseries.get("price [EUR/kWh]"),
-                power_fix_load_list=power_fix_load_list,
-                power_generation_feed_in_list=timeseries.get("generation feed-in [kW]"),
-                power_v2g_feed_in_list=timeseries.get("V2G feed-in [kW]"),
-                power_battery_feed_in_list=timeseries.get("battery feed-in [kW]"),
-                window_signal_list=timeseries.get("window signal [-]"),
-                price_sheet_path=args.get("cost_parameters_file"),
-                grid_operator=gc.grid_operator,
-                results_json=args.get("save_results"),
-                power_pv_nominal=pv,
-                power_schedule_list=timeseries.get("schedule [kW]"),
-            )
-            print(f"Costs at {gcID}: {costs['total_costs_per_year']} €/a")
+        cc_type = DEFAULT_COST_CALCULATION[strategy_name]
+        fee_type = "SLP" if strategy_name in ["greedy", "balanced", "distributed"] else "RLM"
+        scenario_costs = calculate_scenario_costs(
+            s, [cc_type],
+            price_sheet_path=args.get("cost_parameters_file"),
+            fee_type=fee_type,
+            results_json=args.get("save_results"),
+        )
+        for gcID, costs in scenario_costs.items():
+            print(f"Costs at {gcID}: {costs[cc_type]['total_costs_per_year']} €/a")
 
 
 if __name__ == "__main__":
@@ -130,13 +105,29 @@ if __name__ == "__main__":
                         help='Calculate electricity costs')
     parser.add_argument('--cost-parameters-file', '-cp', help='Get cost parameters from json file.')
     parser.add_argument('--visual', '-v', action='store_true', help='Show plots of the results')
+    parser.add_argument('--plot-file', metavar='FILE',
+                        help='Save plots of the results to file (e.g. .png, .pdf), \
+                        no window needed')
     parser.add_argument('--eta', action='store_true',
                         help='Show estimated time to finish simulation after each step, \
                         instead of progress bar. Not recommended for fast computations.')
+    parser.add_argument('--fast-forward', action='store_true',
+                        help='Skip timesteps without events, connected vehicles or used batteries. \
+                        Same results, only supported by some strategies.')
+    parser.add_argument('--adaptive-interval', metavar='MINUTES', type=float,
+                        help='Merge timesteps up to this length between events and departures. \
+                        Results stay on scenario interval, approximation.')
+    parser.add_argument('--out-of-core', metavar='DIR',
+                        help='Store simulation history in chunk files in DIR and keep only \
+                        few chunks in memory. For very long simulations.')
     parser.add_argument('--output', '-o', help='Deprecated, use save-timeseries instead')
     parser.add_argument('--save-timeseries', help='Write timesteps to file')
     parser.add_argument('--save-results', help='Write general info to file')
     parser.add_argument('--save-soc', help='Write SoCs of vehicles to file')
+    parser.add_argument('--save-db', metavar='FILE',
+                        help='Add run to SQLite database (metadata, results and timeseries)')
+    parser.add_argument('--db-resolution', metavar='MINUTES', type=float, default=60,
+                        help='Resolution of timeseries stored in database')
     parser.add_argument('--skip-flex-report', action='store_true',
                         help='Skip flex band creation when generating reports.')
     parser.add_argument('--testing', help='Stores testing results', action='store_true')
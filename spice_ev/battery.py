@@ -1,5 +1,28 @@
 import copy
-from math import exp, log
+from math import exp, isclose, log
+
+import numpy as np
+
+
+def _min_curve_power(curve_soc, curve_power, soc_a, soc_b):
+    """ Get minimum power of loading curve between two SoC (for each pair of SoC).
+
+    :param curve_soc: SoC of points of loading curve
+    :type curve_soc: numpy.ndarray
+    :param curve_power: power of points of loading curve
+    :type curve_power: numpy.ndarray
+    :param soc_a: lower SoC
+    :type soc_a: numpy.ndarray
+    :param soc_b: upper SoC
+    :type soc_b: numpy.ndarray
+    :return: minimum power between lower and upper SoC
+    :rtype: numpy.ndarray
+    """
+    min_power = np.minimum(
+        np.interp(soc_a, curve_soc, curve_power), np.interp(soc_b, curve_soc, curve_power))
+    # points of curve in between
+    inside = (soc_a[:, None] < curve_soc) & (curve_soc < soc_b[:, None])
+    return np.minimum(min_power, np.where(inside, curve_power, np.inf).min(axis=1))
 
 
 class Battery():
@@ -152,6 +175,143 @@ class Battery():
 
         return {'avg_power': avg_power, 'soc_delta':  old_soc - self.soc}
 
+    def get_soc_after_losses(self, num_steps):
+        """ Get SoC after each of the given number of timesteps in which only losses apply.
+
+        Closed form of repeated losses (see Strategy.apply_battery_losses):
+        soc[k] = max(a^k * soc - b * (1 + a + ... + a^(k-1)), 0)
+        with relative loss a and fixed losses b per timestep.
+
+        :param num_steps: number of timesteps
+        :type num_steps: int
+        :return: SoC at end of each timestep
+        :rtype: numpy.ndarray
+        """
+        loss_rate = self.loss_rate or {}
+        a = 1 - loss_rate.get("relative", 0) / 100
+        b = loss_rate.get("fixed_relative", 0) / 100 + (
+            loss_rate.get("fixed_absolute", 0) / self.capacity)
+        steps = np.arange(1, num_steps + 1)
+        decay = a ** steps
+        fixed_loss = b * steps if a == 1 else b * (1 - decay) / (1 - a)
+        # can only discharge, but not become negative (stays empty)
+        return np.maximum(decay * self.soc - fixed_loss, 0)
+
+    def load_series(self, timedelta, max_power, stop_soc=None):
+        """ Charge battery in consecutive timesteps, each with its own maximum power.
+
+        Same as calling :py:meth:`load` for each timestep. Timesteps in which the battery
+        is charged with constant power (not limited by loading curve or full battery)
+        are computed with array operations, the others with :py:meth:`load`.
+
+        :param timedelta: length of each timestep
+        :type timedelta: timedelta
+        :param max_power: maximum charging power of each timestep
+        :type max_power: list or numpy.ndarray
+        :param stop_soc: stop after the timestep in which this SoC is reached
+        :type stop_soc: numeric
+        :return: average power of each timestep (zero after stop), soc_delta and
+            number of simulated timesteps (steps)
+        :rtype: dict
+        """
+        return self._adjust_soc_series(
+            timedelta, max_power, 1, np.inf if stop_soc is None else stop_soc)
+
+    def unload_series(self, timedelta, max_power, target_soc=None, stop_soc=None):
+        """ Discharge battery in consecutive timesteps, each with its own maximum power.
+
+        Same as calling :py:meth:`unload` for each timestep. Timesteps in which the battery
+        is discharged with constant power (not limited by unloading curve or target SoC)
+        are computed with array operations, the others with :py:meth:`unload`.
+
+        :param timedelta: length of each timestep
+        :type timedelta: timedelta
+        :param max_power: maximum power connected device can receive in each timestep
+        :type max_power: list or numpy.ndarray
+        :param target_soc: desired soc
+        :type target_soc: numeric
+        :param stop_soc: stop after the timestep in which the SoC falls to this value
+        :type stop_soc: numeric
+        :return: average power of each timestep (zero after stop), soc_delta and
+            number of simulated timesteps (steps)
+        :rtype: dict
+        """
+        result = self._adjust_soc_series(
+            timedelta, max_power, -1, -np.inf if stop_soc is None else stop_soc,
+            0 if target_soc is None else target_soc)
+        result["soc_delta"] *= -1
+        return result
+
+    def _adjust_soc_series(self, timedelta, max_power, sign, stop_soc, target_soc=None):
+        """ Helper function for load_series and unload_series.
+
+        :param timedelta: length of each timestep
+        :type timedelta: timedelta
+        :param max_power: maximum power of each timestep
+        :type max_power: list or numpy.ndarray
+        :param sign: +1 to charge, -1 to discharge
+        :type sign: int
+        :param stop_soc: stop after the timestep in which this SoC is reached
+        :type stop_soc: numeric
+        :param target_soc: discharge: target SoC
+        :type target_soc: numeric
+        :return: average power of each timestep, soc_delta and number of simulated timesteps
+        :rtype: dict
+        """
+        # power of battery differs from power of connected device due to efficiency
+        if sign > 0:
+            curve = self.loading_curve
+            scale = self.efficiency
+        else:
+            curve = self.unloading_curve
+            scale = 1 / self.efficiency
+        curve_soc, curve_power = np.array(curve.points).T
+        soc_per_power = sign * scale * timedelta.total_seconds() / 3600 / self.capacity
+        max_power = np.asarray(max_power, dtype=float)
+        # power of battery too small: nothing happens (like load/unload)
+        max_power = np.where(max_power * scale < self.EPS, 0, max_power)
+        num_ts = len(max_power)
+        avg_power = np.zeros(num_ts)
+        old_soc = self.soc
+        idx = 0
+        vectorize = True
+        while idx < num_ts and (idx == 0 or sign * (stop_soc - self.soc) > 0):
+            if vectorize and num_ts - idx > 1:
+                power = max_power[idx:]
+                # SoC at start and end of each timestep with constant power
+                end_soc = self.soc + np.cumsum(power * soc_per_power)
+                start_soc = np.concatenate(([self.soc], end_soc[:-1]))
+                if sign > 0:
+                    constant = (1 - start_soc > self.EPS) & (end_soc <= 1) & (
+                        _min_curve_power(curve_soc, curve_power, start_soc, end_soc) >= power)
+                else:
+                    cur_target_soc = np.maximum(np.minimum(start_soc, 0), target_soc)
+                    constant = ((start_soc - cur_target_soc > self.EPS)
+                                & (end_soc >= cur_target_soc) & (
+                        _min_curve_power(curve_soc, curve_power, end_soc, start_soc) >= power))
+                constant |= power == 0
+                num_constant = len(constant) if constant.all() else int(np.argmin(constant))
+                reached = np.flatnonzero(sign * (end_soc[:num_constant] - stop_soc) >= 0)
+                if len(reached) > 0:
+                    num_constant = int(reached[0]) + 1
+                if num_constant > 0:
+                    avg_power[idx:idx + num_constant] = power[:num_constant]
+                    self.soc = float(end_soc[num_constant - 1])
+                    idx += num_constant
+                    if len(reached) > 0 or idx == num_ts:
+                        break
+            # single timestep, limited by (un)loading curve or SoC
+            power = float(max_power[idx])
+            if sign > 0:
+                avg_power[idx] = self.load(timedelta, max_power=power)["avg_power"]
+            else:
+                avg_power[idx] = self.unload(
+                    timedelta, max_power=power, target_soc=target_soc)["avg_power"]
+            idx += 1
+            # still limited: next timestep probably as well
+            vectorize = isclose(avg_power[idx - 1], power)
+        return {"avg_power": avg_power, "soc_delta": self.soc - old_soc, "steps": idx}
+
     def load_iterative(self, timedelta, max_charging_power):  # pragma: no cover
         """ Adjust SoC, return average charging power for given timedelta and max charging power.
 
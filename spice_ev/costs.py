@@ -1,7 +1,11 @@
+import concurrent.futures
 import json
 import datetime
+from pathlib import Path
 import warnings
 
+import numpy as np
+
 # constants for grid fee
 
 # constant utilization time of the grid, needed to find commodity and capacity charge in price sheet
@@ -27,20 +31,104 @@ DEFAULT_COST_CALCULATION = {
     "flex_window": "flex_window",
     "schedule": "schedule",
     "distributed": "fixed_wo_plw",  # should call cost calculation with specific cost type
+    "optimal": "fixed_wo_plw",
 }
 
+# load profile and price sheets of worker process, set by _init_comparison_worker
+_worker_comparison = dict()
+
+
+def to_array(values):
+    """ Convert timeseries to NumPy array once, to be used in many cost calculations.
+
+    :param values: timeseries (may be None)
+    :type values: list
+    :return: array of floats (None if values are None)
+    :rtype: numpy.ndarray
+    """
+    if values is None:
+        return None
+    return np.asarray(values, dtype=float)
+
+
+def clip_positive(values, sign=1):
+    """ Get positive part of each value of timeseries: max(sign * value, 0).
+
+    :param values: timeseries
+    :type values: list or numpy.ndarray
+    :param sign: factor for values, e.g. -1 to get grid supply from grid power
+    :type sign: int
+    :return: positive values
+    :rtype: numpy.ndarray
+    """
+    return np.maximum(sign * np.asarray(values, dtype=float), 0)
+
 
 def get_flexible_load(power_grid_supply_list, power_fix_load_list):
     """ Determine power of flexible load.
 
     :param power_grid_supply_list: power supplied from the power grid
-    :type power_grid_supply_list: list
+    :type power_grid_supply_list: list or numpy.ndarray
     :param power_fix_load_list: power of the fixed load
-    :type power_fix_load_list: list
+    :type power_fix_load_list: list or numpy.ndarray
     :return: power of flexible load in kW
-    :rtype: list
+    :rtype: numpy.ndarray
+    """
+    return np.maximum(np.asarray(power_grid_supply_list, dtype=float)
+                      - np.asarray(power_fix_load_list, dtype=float), 0)
+
+
+def get_fixed_load_supply(power_fix_load_list, *support_lists):
+    """ Determine power supplied from the grid for the fixed load.
+
+    Support power (negative values of local generation, batteries or charging stations)
+    is subtracted from the fixed load. Grid supply for the fixed load can not be negative.
+
+    :param power_fix_load_list: power of the fixed load
+    :type power_fix_load_list: list or numpy.ndarray
+    :param support_lists: power of local generation, battery and charging stations (or None)
+    :type support_lists: list or numpy.ndarray
+    :return: power supplied from the grid for fixed load in kW
+    :rtype: numpy.ndarray
+    """
+    support_lists = [support for support in support_lists if support is not None]
+    power = np.asarray(power_fix_load_list, dtype=float)
+    for support in support_lists:
+        power = power + np.minimum(np.asarray(support, dtype=float), 0)
+    return np.maximum(power, 0)
+
+
+def get_energy(power_list, interval):
+    """ Get total energy of power timeseries.
+
+    :param power_list: power per timestep in kW (may be None)
+    :type power_list: list or numpy.ndarray
+    :param interval: simulation interval
+    :type interval: timedelta
+    :return: energy in kWh
+    :rtype: float
     """
-    return [max(s - power_fix_load_list[i], 0) for i, s in enumerate(power_grid_supply_list)]
+    if power_list is None:
+        return 0
+    total_power = float(np.sum(power_list))
+    return total_power * interval.total_seconds() / 3600
+
+
+def get_peak_power(power_list, mask=None):
+    """ Get maximum power (at least zero), optionally only where mask is set.
+
+    :param power_list: power per timestep in kW
+    :type power_list: list or numpy.ndarray
+    :param mask: only consider timesteps where mask is truthy, e.g. window signal
+    :type mask: list or numpy.ndarray
+    :return: peak power in kW
+    :rtype: float
+    """
+    power = np.asarray(power_list, dtype=float)
+    if mask is not None:
+        # None is not set, mask may be longer than timeseries
+        power = power[np.asarray(mask).astype(bool)[:len(power)]]
+    return max(float(power.max(initial=0)), 0)
 
 
 def find_prices(price_sheet, fee_type, voltage_level, utilization_time_pa, energy_supply_pa):
@@ -82,10 +170,10 @@ def find_prices(price_sheet, fee_type, voltage_level, utilization_time_pa, energ
 def calculate_commodity_costs(price_list, power_supply_list, interval, fraction_year):
     """ Calculate commodity costs for all types of customers.
 
-    :param price_list: price list with commodity charge per timestamp
-    :type price_list: list
+    :param price_list: price list with commodity charge per timestamp (or same price for all)
+    :type price_list: list or numpy.ndarray or float
     :param power_supply_list: power supplied from the grid
-    :type power_supply_list: list
+    :type power_supply_list: list or numpy.ndarray
     :param interval: simulation interval
     :type interval: timedelta
     :param fraction_year: simulation time relative to one year
@@ -93,15 +181,17 @@ def calculate_commodity_costs(price_list, power_supply_list, interval, fraction_
     :return: commodity costs per year and simulation period in Euro
     :rtype: float
     """
-    # start value for commodity costs (variable gets updated with every timestep)
-    commodity_costs_eur_sim = 0
-
-    # create lists with energy supply per timestep and calculate costs
     # factor 3600: kilo Joule --> kWh
     # factor 100: ct --> €
-    for i in range(len(power_supply_list)):
-        energy_supply_per_timestep = power_supply_list[i] * interval.total_seconds() / 3600  # [kWh]
-        commodity_costs_eur_sim += energy_supply_per_timestep * price_list[i] / 100  # [€]
+    same_price = isinstance(price_list, (int, float))
+    if same_price:
+        commodity_costs_eur_sim = get_energy(power_supply_list, interval) * price_list / 100
+    else:
+        # price list may be longer than simulation
+        power_supply_list = np.asarray(power_supply_list, dtype=float)
+        price_list = np.asarray(price_list, dtype=float)[:len(power_supply_list)]
+        commodity_costs_eur_sim = float(np.dot(power_supply_list, price_list)
+                                        ) * interval.total_seconds() / 3600 / 100  # [€]
     commodity_costs_eur_per_year = commodity_costs_eur_sim / fraction_year
 
     return commodity_costs_eur_per_year, commodity_costs_eur_sim
@@ -126,8 +216,8 @@ def calculate_feed_in_remuneration(feed_in_charge, power_feed_in_list,
 
     :param feed_in_charge: feed-in charge
     :type feed_in_charge: float
-    :param power_feed_in_list: power fed into the grid
-    :type power_feed_in_list: list
+    :param power_feed_in_list: power fed into the grid (None: no feed-in)
+    :type power_feed_in_list: list or numpy.ndarray
     :param timestamps_list: timestamps of simulated points in time
     :type timestamps_list: list
     :param interval: simulation interval
@@ -137,9 +227,7 @@ def calculate_feed_in_remuneration(feed_in_charge, power_feed_in_list,
     :return: feed-in remuneration per year and simulation period in Euro
     :rtype: float
     """
-    if power_feed_in_list is None:
-        power_feed_in_list = [0] * len(timestamps_list)
-    energy_feed_in_sim = sum(power_feed_in_list) * interval.total_seconds() / 3600  # [kWh]
+    energy_feed_in_sim = get_energy(power_feed_in_list, interval)  # [kWh]
     energy_feed_in_per_year = energy_feed_in_sim / fraction_year  # [kWh]
 
     # costs for PV feed-in
@@ -154,9 +242,12 @@ def calculate_costs(cc_type, voltage_level, interval,
                     price_list, power_fix_load_list, power_generation_feed_in_list,
                     power_v2g_feed_in_list, power_battery_feed_in_list, window_signal_list,
                     price_sheet_path, grid_operator="default_grid_operator", fee_type=None,
-                    results_json=None, power_pv_nominal=0, power_schedule_list=None):
+                    results_json=None, power_pv_nominal=0, power_schedule_list=None,
+                    price_sheets=None):
     """Calculate costs using the chosen method.
 
+    Timeseries may be given as lists or NumPy arrays, they are processed as arrays.
+
     :param cc_type: cost calculation method, can be
         [variable/fixed]_[w/wo]_plw, distributed, schedule or flex_window
     :type cc_type: str
@@ -192,6 +283,9 @@ def calculate_costs(cc_type, voltage_level, interval,
     :type power_pv_nominal: int
     :param power_schedule_list: power to be supplied or fed-in according to schedule
     :type power_schedule_list: list
+    :param price_sheets: content of price sheet file (grid operator -> price sheet),
+        replaces price_sheet_path (load once for many calculations)
+    :type price_sheets: dict
     :raises NotImplementedError: if cost calculation type is not supported
     :raises ValueError: if nom. PV power exceeds max. power for feed-in remuneration in price sheet
     :raises ValueError: if price_list is a dictionary without procurement or commodity
@@ -200,34 +294,35 @@ def calculate_costs(cc_type, voltage_level, interval,
     """
     # sanity checks
     assert voltage_level is not None, "Voltage level must be set for cost calculation"
-    assert price_sheet_path is not None, "Price sheet must be given"
+    assert price_sheet_path is not None or price_sheets is not None, "Price sheet must be given"
 
     # PRICE SHEET
-    with open(price_sheet_path, "r", newline="") as ps:
-        price_sheet = json.load(ps).get(grid_operator)
-        assert bool(price_sheet)  # grid_operator section exists and is not empty
+    if price_sheets is None:
+        with open(price_sheet_path, "r", newline="") as ps:
+            price_sheets = json.load(ps)
+    price_sheet = price_sheets.get(grid_operator)
+    assert bool(price_sheet)  # grid_operator section exists and is not empty
 
     # TEMPORAL PARAMETERS
     # fraction of scenario duration in relation to one year
     fraction_year = len(timestamps_list) * interval / datetime.timedelta(days=365)
 
     # extract actual grid supply (change sign)
-    power_grid_supply_list = [max(-v, 0) for v in power_grid_supply_list]
+    power_grid_supply_list = clip_positive(power_grid_supply_list, sign=-1)
 
     # only consider positive values of fixed load for cost calculation
-    power_fix_load_list = [max(v, 0) for v in power_fix_load_list]
+    power_fix_load_list = clip_positive(power_fix_load_list)
 
     # get peak power inside time windows
     peak_power_in_windows = None
     if window_signal_list is not None:
-        window_loads = [l for (l, w) in zip(power_grid_supply_list, window_signal_list) if w]
-        peak_power_in_windows = max(window_loads + [0])
+        peak_power_in_windows = get_peak_power(power_grid_supply_list, window_signal_list)
 
-    energy_supply_sim = sum(power_grid_supply_list) * interval.total_seconds() / 3600
+    energy_supply_sim = get_energy(power_grid_supply_list, interval)
     energy_supply_pa = energy_supply_sim / fraction_year
 
     # maximum power supplied from the grid
-    max_power_grid_supply = max(power_grid_supply_list + [0])
+    max_power_grid_supply = get_peak_power(power_grid_supply_list)
 
     # prices
     if max_power_grid_supply == 0:
@@ -246,9 +341,8 @@ def calculate_costs(cc_type, voltage_level, interval,
     # COMMODITY COSTS
     if cc_type.startswith("fixed"):
         # use fixed commodity charge
-        price_list = [commodity_charge] * len(power_grid_supply_list)
         commodity_costs_eur_per_year, commodity_costs_eur_sim = calculate_commodity_costs(
-            price_list, power_grid_supply_list, interval, fraction_year)
+            commodity_charge, power_grid_supply_list, interval, fraction_year)
     elif cc_type.startswith("variable"):
         # apply procurement and commodity costs for each timestep to grid supply
         # this is just drawn power, feed-in is handled independently
@@ -261,23 +355,16 @@ def calculate_costs(cc_type, voltage_level, interval,
             raise ValueError("Variable pricing must have procurement or commodity costs")
         if procurement_price_list is None:
             # use fixed procurement costs
-            power_procurement_charge = price_sheet["power_procurement"]["charge"]  # [ct/kWh]
-            procurement_price_list = [power_procurement_charge] * len(timestamps_list)
+            procurement_price_list = price_sheet["power_procurement"]["charge"]  # [ct/kWh]
 
         if commodity_price_list is None:
             # use fixed commodity costs
-            commodity_price_list = [commodity_charge] * len(timestamps_list)
-
-        ts_per_hour = interval.total_seconds() / 3600
-        commodity_costs_eur_sim = 0
-        power_procurement_costs_sim = 0
-        for i, power in enumerate(power_grid_supply_list):
-            energy_supply_per_timestep = (power * ts_per_hour)  # [kWh]
-            commodity_costs_eur_sim += (
-                energy_supply_per_timestep * commodity_price_list[i] / 100)
-            power_procurement_costs_sim += (
-                energy_supply_per_timestep * procurement_price_list[i] / 100)
-        commodity_costs_eur_per_year = commodity_costs_eur_sim / fraction_year
+            commodity_price_list = commodity_charge
+
+        commodity_costs_eur_per_year, commodity_costs_eur_sim = calculate_commodity_costs(
+            commodity_price_list, power_grid_supply_list, interval, fraction_year)
+        _, power_procurement_costs_sim = calculate_commodity_costs(
+            procurement_price_list, power_grid_supply_list, interval, fraction_year)
 
     if cc_type.endswith("w_plw"):
         # peak load windows: adjust capacity costs by changing max_power_grid_supply
@@ -330,7 +417,7 @@ def calculate_costs(cc_type, voltage_level, interval,
         # COSTS FOR FIXED LOAD
 
         # maximum fixed power supplied from the grid [kW]
-        max_power_grid_supply_fix = max(power_fix_load_list + [0])
+        max_power_grid_supply_fix = get_peak_power(power_fix_load_list)
 
         if max_power_grid_supply_fix == 0:  # no fix load existing
             commodity_costs_eur_per_year_fix = 0
@@ -338,7 +425,7 @@ def calculate_costs(cc_type, voltage_level, interval,
             capacity_costs_eur_fix = 0
         else:  # fixed load existing
             # fixed energy supply
-            energy_supply_sim_fix = sum(power_fix_load_list) * interval.total_seconds() / 3600
+            energy_supply_sim_fix = get_energy(power_fix_load_list, interval)
             energy_supply_per_year_fix = energy_supply_sim_fix / fraction_year
 
             # prices
@@ -353,9 +440,8 @@ def calculate_costs(cc_type, voltage_level, interval,
             )
 
             # commodity costs for fixed load
-            price_list_fix_load = [commodity_charge_fix] * len(power_fix_load_list)
             commodity_costs_eur_per_year_fix, commodity_costs_eur_sim_fix = (
-                calculate_commodity_costs(price_list_fix_load, power_fix_load_list,
+                calculate_commodity_costs(commodity_charge_fix, power_fix_load_list,
                                           interval, fraction_year))
 
             # capacity costs for fixed load
@@ -373,16 +459,14 @@ def calculate_costs(cc_type, voltage_level, interval,
         if price_list is None:
             # use fixed price list
             warnings.warn("balanced_market pricing without price timeseries, used fixed prices")
-            price_list = [commodity_charge]*len(timestamps_list)
+            price_list = commodity_charge
+            # same price: always high tariff
+            max_power_high_tariff = get_peak_power(power_flex_load_list)
         else:
-            price_list = [price * 100 for price in price_list]
-
-        # find power at times of high tariff
-        max_price = max(price_list)
-        max_power_high_tariff = 0
-        for i, power in enumerate(power_flex_load_list):
-            if (price_list[i] == max_price) and (power > max_power_high_tariff):
-                max_power_high_tariff = power
+            price_list = np.asarray(price_list, dtype=float) * 100
+            high_tariff = price_list == price_list.max()
+            # find power at times of high tariff
+            max_power_high_tariff = get_peak_power(power_flex_load_list, high_tariff)
 
         # capacity costs for flexible load
         # set a suitable utilization time in order to use prices for grid friendly charging
@@ -425,7 +509,7 @@ def calculate_costs(cc_type, voltage_level, interval,
         # COSTS FOR FIXED LOAD
 
         # maximum fixed power supplied from the grid [kW]
-        max_power_grid_supply_fix = max(power_fix_load_list + [0])
+        max_power_grid_supply_fix = get_peak_power(power_fix_load_list)
 
         if max_power_grid_supply_fix == 0:
             # no fix load existing
@@ -435,7 +519,7 @@ def calculate_costs(cc_type, voltage_level, interval,
         else:
             # fixed load existing
             # fixed energy supply
-            energy_supply_sim_fix = sum(power_fix_load_list) * interval.total_seconds() / 3600
+            energy_supply_sim_fix = get_energy(power_fix_load_list, interval)
             energy_supply_per_year_fix = energy_supply_sim_fix / fraction_year
 
             # prices
@@ -450,9 +534,8 @@ def calculate_costs(cc_type, voltage_level, interval,
             )
 
             # commodity costs for fixed load
-            price_list_fix_load = [commodity_charge_fix] * len(power_fix_load_list)
             commodity_costs_eur_per_year_fix, commodity_costs_eur_sim_fix = (
-                calculate_commodity_costs(price_list_fix_load, power_fix_load_list,
+                calculate_commodity_costs(commodity_charge_fix, power_fix_load_list,
                                           interval, fraction_year))
 
             # capacity costs for fixed load
@@ -475,22 +558,15 @@ def calculate_costs(cc_type, voltage_level, interval,
         )
 
         # commodity costs for flexible load
-        price_list_flex_load = [commodity_charge_flex] * len(power_flex_load_list)
         commodity_costs_eur_per_year_flex, commodity_costs_eur_sim_flex = calculate_commodity_costs(
-            price_list_flex_load, power_flex_load_list, interval, fraction_year)
+            commodity_charge_flex, power_flex_load_list, interval, fraction_year)
 
-        # capacity costs for flexible load
-        power_flex_load_window_list = []
-        for i in range(len(power_flex_load_list)):
-            if not window_signal_list[i]:
-                power_flex_load_window_list.append(power_flex_load_list[i])
+        # capacity costs for flexible load: only outside of window (signal = 0)
         # no flexible capacity costs if charging takes place only when signal = 1
-        if power_flex_load_window_list == []:
-            capacity_costs_eur_flex = 0
-        else:
-            max_power_grid_supply_flex = max(power_flex_load_window_list)
-            capacity_costs_eur_flex = calculate_capacity_costs_rlm(
-                capacity_charge_flex, max_power_grid_supply_flex)
+        outside_window = ~np.asarray(window_signal_list).astype(bool)
+        max_power_grid_supply_flex = get_peak_power(power_flex_load_list, outside_window)
+        capacity_costs_eur_flex = calculate_capacity_costs_rlm(
+            capacity_charge_flex, max_power_grid_supply_flex)
 
         # TOTAl COSTS
         commodity_costs_eur_sim = commodity_costs_eur_sim_fix + commodity_costs_eur_sim_flex
@@ -521,7 +597,7 @@ def calculate_costs(cc_type, voltage_level, interval,
         # COSTS FOR FIXED LOAD
 
         # maximum fixed power supplied from the grid
-        max_power_grid_supply_fix = max(power_fix_load_list + [0])
+        max_power_grid_supply_fix = get_peak_power(power_fix_load_list)
 
         if max_power_grid_supply_fix == 0:
             # no fixed load existing
@@ -531,7 +607,7 @@ def calculate_costs(cc_type, voltage_level, interval,
         else:
             # fixed load existing
             # fixed energy supply
-            energy_supply_sim_fix = sum(power_fix_load_list) * interval.total_seconds() / 3600
+            energy_supply_sim_fix = get_energy(power_fix_load_list, interval)
             energy_supply_per_year_fix = energy_supply_sim_fix / fraction_year
 
             # prices
@@ -548,9 +624,8 @@ def calculate_costs(cc_type, voltage_level, interval,
             commodity_charge_fix = commodity_charge_fix - reduction_commodity_charge
 
             # commodity costs for fixed load
-            price_list_fix_load = [commodity_charge_fix, ] * len(power_fix_load_list)
             commodity_costs_eur_per_year_fix, commodity_costs_eur_sim_fix = (
-                calculate_commodity_costs(price_list_fix_load, power_fix_load_list,
+                calculate_commodity_costs(commodity_charge_fix, power_fix_load_list,
                                           interval, fraction_year))
 
             # capacity costs for fixed load
@@ -574,9 +649,8 @@ def calculate_costs(cc_type, voltage_level, interval,
         )
 
         # commodity costs for flexible load
-        price_list_flex_load = [commodity_charge_flex] * len(power_flex_load_list)
         commodity_costs_eur_per_year_flex, commodity_costs_eur_sim_flex = (
-            calculate_commodity_costs(price_list_flex_load, power_flex_load_list,
+            calculate_commodity_costs(commodity_charge_flex, power_flex_load_list,
                                       interval, fraction_year))
 
         # DEVIATION COSTS
@@ -586,10 +660,10 @@ def calculate_costs(cc_type, voltage_level, interval,
             capacity_costs_eur_flex = 0.0
         else:
             # positive deviation from schedule concerning grid supply (not feed-in)
-            power_grid_supply_schedule_list = [max(v, 0) for v in power_schedule_list]
-            pos_deviation_grid_supply_list = [
-                max(power_grid_supply_list[i] - schedule_power, 0)
-                for i, schedule_power in enumerate(power_grid_supply_schedule_list)]
+            power_grid_supply_schedule_list = clip_positive(power_schedule_list)
+            # same as flexible load: supply exceeding schedule
+            pos_deviation_grid_supply_list = get_flexible_load(
+                power_grid_supply_list, power_grid_supply_schedule_list)
 
             # charge for deviation from schedule
             schedule_deviation_charge = schedule_charges["deviation_charge"]
@@ -598,8 +672,8 @@ def calculate_costs(cc_type, voltage_level, interval,
             schedule_deviation_tolerance = schedule_charges["deviation_tolerance"]
 
             # capacity related costs for deviation from schedule
-            max_pos_deviation_grid_supply = max(pos_deviation_grid_supply_list)
-            max_grid_supply_schedule = max(power_grid_supply_schedule_list)
+            max_pos_deviation_grid_supply = get_peak_power(pos_deviation_grid_supply_list)
+            max_grid_supply_schedule = get_peak_power(power_grid_supply_schedule_list)
             lower_limit_deviation = max_grid_supply_schedule * schedule_deviation_tolerance
 
             charged_deviation_power = max(max_pos_deviation_grid_supply - lower_limit_deviation, 0)
@@ -688,7 +762,7 @@ def calculate_costs(cc_type, voltage_level, interval,
     # PV power plant not existing
     else:
         feed_in_charge_pv = 0  # [ct/kWh]
-        if power_generation_feed_in_list is not None and sum(power_generation_feed_in_list) != 0:
+        if get_energy(power_generation_feed_in_list, interval) != 0:
             warnings.warn("Nominal power of PV power plant is zero even though there is an "
                           "existing generation time series")
 
@@ -909,3 +983,239 @@ def calculate_costs(cc_type, voltage_level, interval,
         "feed_in_remuneration_per_year": feed_in_remuneration_per_year,
         "peak_power_in_windows": peak_power_in_windows,
     }
+
+
+def calculate_scenario_costs(scenario, cc_types, price_sheet_path, fee_type=None,
+                             results_json=None):
+    """ Calculate costs of all grid connectors of a simulated scenario in one call.
+
+    The price sheet is read once and the timeseries of each grid connector
+    (see report.aggregate_timeseries) are prepared once for all cost calculation methods.
+
+    :param scenario: simulated scenario with timeseries of each grid connector
+    :type scenario: spice_ev.Scenario
+    :param cc_types: cost calculation methods, see COST_CALCULATION
+    :type cc_types: list
+    :param price_sheet_path: path to price sheet
+    :type price_sheet_path: str
+    :param fee_type: force RLM or SLP calculation (optional)
+    :type fee_type: str
+    :param results_json: path to resulting json
+    :type results_json: str
+    :return: grid connector ID -> cost calculation method -> costs (see calculate_costs)
+    :rtype: dict
+    """
+    assert price_sheet_path is not None, "Price sheet must be given"
+    with open(price_sheet_path, "r", newline="") as ps:
+        price_sheets = json.load(ps)
+
+    scenario_costs = {}
+    for gcID, gc in scenario.components.grid_connectors.items():
+        timeseries = getattr(scenario, f"{gcID}_timeseries")
+        zeros = [0] * len(timeseries["time"])
+        pvs = scenario.components.photovoltaics.values()
+        power_pv_nominal = sum([pv.nominal_power for pv in pvs if pv.parent == gcID])
+        # calculate grid supply for fixed load: subtract support power (where negative)
+        power_fix_load_list = get_fixed_load_supply(
+            timeseries.get("fixed load [kW]", zeros),
+            timeseries.get("local generation [kW]"),
+            timeseries.get("battery power [kW]"),
+            timeseries.get("sum CS power [kW]"))
+        gc_timeseries = {
+            "timestamps_list": timeseries["time"],
+            "power_grid_supply_list": to_array(timeseries["grid supply [kW]"]),
+            "price_list": timeseries.get("price [EUR/kWh]"),
+            "power_fix_load_list": power_fix_load_list,
+            "power_generation_feed_in_list": to_array(timeseries.get("generation feed-in [kW]")),
+            "power_v2g_feed_in_list": to_array(timeseries.get("V2G feed-in [kW]")),
+            "power_battery_feed_in_list": to_array(timeseries.get("battery feed-in [kW]")),
+            "window_signal_list": timeseries.get("window signal [-]"),
+            "power_schedule_list": to_array(timeseries.get("schedule [kW]")),
+        }
+        scenario_costs[gcID] = {cc_type: calculate_costs(
+            cc_type=cc_type,
+            voltage_level=gc.voltage_level,
+            interval=scenario.interval,
+            price_sheet_path=price_sheet_path,
+            grid_operator=gc.grid_operator,
+            fee_type=fee_type,
+            results_json=results_json,
+            power_pv_nominal=power_pv_nominal,
+            price_sheets=price_sheets,
+            **gc_timeseries,
+        ) for cc_type in cc_types}
+    return scenario_costs
+
+
+def _strip_info(entry):
+    """ Remove descriptive unit and info entries from price sheet entry.
+
+    :param entry: price sheet entry
+    :type entry: dict or list or float
+    :return: price sheet entry with values only
+    :rtype: dict or list or float
+    """
+    if isinstance(entry, dict):
+        return {k: _strip_info(v) for k, v in entry.items() if k not in ["unit", "info"]}
+    return entry
+
+
+def index_price_sheets(price_sheets, voltage_levels=None):
+    """ Get tariff of each grid operator and voltage level in content of price sheet file.
+
+    A tariff is a price sheet reduced to the values relevant for one voltage level:
+    grid fees (SLP, RLM charges of voltage level and additional costs), power procurement, levies,
+    concession fee, taxes, feed-in remuneration tiers and strategy related charges.
+    Units and descriptions are removed, so equal tariffs of different price sheets are equal.
+
+    :param price_sheets: content of price sheet file (grid operator -> price sheet)
+    :type price_sheets: dict
+    :param voltage_levels: voltage levels to index, defaults to all voltage levels with grid fees
+    :type voltage_levels: list
+    :raises KeyError: if price sheet has no RLM grid fees for given voltage level
+    :return: grid operator -> voltage level -> tariff
+    :rtype: dict
+    """
+    index = {}
+    for grid_operator, price_sheet in price_sheets.items():
+        price_sheet = _strip_info(price_sheet)
+        rlm_fees = price_sheet["grid_fee"]["RLM"]
+        levels = voltage_levels or list(
+            rlm_fees[f">={UTILIZATION_TIME_PER_YEAR_EC}_h/a"]["capacity_charge_EUR/kW*a"])
+        index[grid_operator] = {}
+        for voltage_level in levels:
+            tariff = dict(price_sheet)
+            tariff["grid_fee"] = dict(price_sheet["grid_fee"])
+            tariff["grid_fee"]["RLM"] = {
+                key: {charge: {voltage_level: charges[voltage_level]}
+                      for charge, charges in entry.items()}
+                if key.endswith("_h/a") else entry
+                for key, entry in rlm_fees.items()}
+            index[grid_operator][voltage_level] = tariff
+    return index
+
+
+def _init_comparison_worker(context):
+    """ Initialize worker process with load profile and price sheets of comparison.
+
+    :param context: arguments of compare_price_sheets and content of price sheet files
+    :type context: dict
+    """
+    _worker_comparison.update(context)
+
+
+def _compare_combination(task, context=None):
+    """ Calculate costs of load profile for one tariff and fee type.
+
+    :param task: index of tariff, voltage level and fee type
+    :type task: tuple
+    :param context: arguments of compare_price_sheets and tariffs of price sheet files,
+        defaults to context of worker process
+    :type context: dict
+    :return: costs (see calculate_costs)
+    :rtype: dict
+    """
+    context = context or _worker_comparison
+    tariff_idx, voltage_level, fee_type = task
+    return calculate_costs(
+        cc_type=context["cc_type"],
+        voltage_level=voltage_level,
+        interval=context["interval"],
+        price_sheet_path=None,
+        grid_operator="tariff",
+        fee_type=fee_type,
+        power_pv_nominal=context["power_pv_nominal"],
+        price_sheets={"tariff": context["tariffs"][tariff_idx]},
+        **context["timeseries"],
+    )
+
+
+def compare_price_sheets(cc_type, interval, timeseries, price_sheet_paths, voltage_levels=None,
+                         grid_operators=None, fee_types=None, power_pv_nominal=0, processes=1):
+    """ Calculate costs of one load profile for many price sheets, grid operators,
+    voltage levels and fee types.
+
+    Each price sheet file is read once and indexed by tariff (see index_price_sheets), the
+    timeseries are prepared once for all combinations. Combinations with equal tariff, voltage
+    level and fee type (e.g. unchanged tariffs in several price sheet versions) are calculated
+    only once. With *processes* > 1, tariffs are calculated concurrently in a process pool.
+
+    :param cc_type: cost calculation method, see COST_CALCULATION
+    :type cc_type: str
+    :param interval: duration of one simulation timestep
+    :type interval: timedelta
+    :param timeseries: keyword arguments of timeseries for calculate_costs
+        (see calculate_costs.read_simulation_csv)
+    :type timeseries: dict
+    :param price_sheet_paths: paths to price sheet files
+    :type price_sheet_paths: list
+    :param voltage_levels: voltage levels to compare,
+        defaults to all voltage levels with grid fees in each price sheet
+    :type voltage_levels: list
+    :param grid_operators: grid operators to compare, defaults to all in each price sheet
+    :type grid_operators: list
+    :param fee_types: fee types to compare (SLP, RLM or None for automatic choice),
+        defaults to automatic choice
+    :type fee_types: list
+    :param power_pv_nominal: nominal power of pv power plant
+    :type power_pv_nominal: int
+    :param processes: number of worker processes (1: calculate sequentially)
+    :type processes: int
+    :return: comparison table: price sheet (file stem), grid operator, voltage level,
+        fee type and costs (see calculate_costs) of each combination
+    :rtype: list of dicts
+    """
+    names = set()
+    combinations = []
+    tariffs = []
+    tariff_indices = {}
+    # combinations with equal tariff, voltage level and fee type share one task
+    tasks = []
+    task_indices = {}
+    for path in price_sheet_paths:
+        name = Path(path).stem
+        assert name not in names, f"Price sheet name {name} is not unique"
+        names.add(name)
+        with open(path, "r", newline="") as ps:
+            price_sheets = json.load(ps)
+        if grid_operators is not None:
+            price_sheets = {k: v for k, v in price_sheets.items() if k in grid_operators}
+        for grid_operator, levels in index_price_sheets(price_sheets, voltage_levels).items():
+            for voltage_level, tariff in levels.items():
+                tariff_idx = tariff_indices.setdefault(
+                    json.dumps(tariff, sort_keys=True), len(tariffs))
+                if tariff_idx == len(tariffs):
+                    tariffs.append(tariff)
+                for fee_type in fee_types or [None]:
+                    task = (tariff_idx, voltage_level, fee_type)
+                    if task not in task_indices:
+                        task_indices[task] = len(tasks)
+                        tasks.append(task)
+                    combinations.append(
+                        (name, grid_operator, voltage_level, fee_type, task_indices[task]))
+
+    context = {
+        "cc_type": cc_type,
+        "interval": interval,
+        # convert power timeseries once for all combinations
+        "timeseries": {k: to_array(v) if k.startswith("power_") else v
+                       for k, v in timeseries.items()},
+        "power_pv_nominal": power_pv_nominal,
+        "tariffs": tariffs,
+    }
+    if processes <= 1 or len(tasks) <= 1:
+        results = [_compare_combination(task, context) for task in tasks]
+    else:
+        with concurrent.futures.ProcessPoolExecutor(
+                max_workers=processes, initializer=_init_comparison_worker,
+                initargs=(context,)) as pool:
+            chunksize = max(1, len(tasks) // (4 * processes))
+            results = list(pool.map(_compare_combination, tasks, chunksize=chunksize))
+
+    return [{
+        "price sheet": name,
+        "grid operator": grid_operator,
+        "voltage level": voltage_level,
+        "fee type": fee_type,
+        **results[task_idx],
+    } for name, grid_operator, voltage_level, fee_type, task_idx in combinations]
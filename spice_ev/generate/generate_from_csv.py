@@ -2,6 +2,8 @@
 
 import csv
 import datetime
+import heapq
+from itertools import count
 from pathlib import Path
 import random
 import warnings
@@ -10,6 +12,25 @@ import warnings
 DATETIME_FORMAT = '%Y-%m-%d %H:%M:%S'
 
 
+def datetime_from_csv(s):
+    """ Parse date and time of input CSV (see DATETIME_FORMAT).
+
+    Uses the fast ISO format parser, if the string matches the format.
+
+    :param s: date and time in YYYY-MM-DD HH:MM:SS
+    :type s: str
+    :return: date and time
+    :rtype: datetime.datetime
+    """
+    if len(s) == 19 and s[10] == ' ' and s[13] == ':' and s[16] == ':':
+        try:
+            return datetime.datetime.fromisoformat(s)
+        except ValueError:
+            pass
+    # other formats: raises ValueError
+    return datetime.datetime.strptime(s, DATETIME_FORMAT)
+
+
 def generate_from_csv(args):
     """ Generate a scenario JSON from CSV rotation schedule of fleets to/from one grid connector.
 
@@ -48,7 +69,7 @@ def generate_from_csv(args):
         times.append(row["departure_time"])
     times.sort()
     start = times[0]
-    start = datetime.datetime.strptime(start, DATETIME_FORMAT)
+    start = datetime_from_csv(start)
     stop = start + datetime.timedelta(days=args.days)
 
     # INITIALIZE COMPONENTS AND EVENTS
@@ -92,9 +113,14 @@ def generate_from_csv(args):
                           "charging station after every trip.")
         input = [dict(item, **{'connect_cs': 1}) for item in input]
 
+    # group trips by vehicle (in order of first appearance)
+    trips_by_vehicle = {}
+    for row in input:
+        trips_by_vehicle.setdefault(row["vehicle_id"], []).append(row)
+
     # GENERATE VEHICLE EVENTS: iterate over input file
-    for v_id in {item['vehicle_id'] for item in input}:
-        v_type = [d for d in input if d['vehicle_id'] == v_id][0]["vehicle_type"]
+    for v_id, v_id_list in trips_by_vehicle.items():
+        v_type = v_id_list[0]["vehicle_type"]
         cs_id = "CS_" + v_id
 
         # define start conditions
@@ -115,10 +141,6 @@ def generate_from_csv(args):
         # keep track of last arrival event to adjust desired SoC if needed
         last_arrival_event = None
 
-        # filter all trips for that vehicle
-        v_id_list = []
-        [v_id_list.append(row) for row in input if (row["vehicle_id"] == v_id)]
-
         # sort events for their departure time, so that the matching departure time of an
         # arrival event can be read out of the next element in v_id_list
         v_id_list = sorted(v_id_list, key=lambda x: x["departure_time"])
@@ -130,12 +152,12 @@ def generate_from_csv(args):
         for idx, row in enumerate(v_id_list):
             departure_event_in_input = True
             arrival = row["arrival_time"]
-            arrival = datetime.datetime.strptime(arrival, DATETIME_FORMAT)
+            arrival = datetime_from_csv(arrival)
             try:
                 departure = v_id_list[idx + 1]["departure_time"]
-                departure = datetime.datetime.strptime(departure, DATETIME_FORMAT)
+                departure = datetime_from_csv(departure)
                 next_arrival = v_id_list[idx + 1]["arrival_time"]
-                next_arrival = datetime.datetime.strptime(next_arrival, DATETIME_FORMAT)
+                next_arrival = datetime_from_csv(next_arrival)
             except IndexError:
                 # no departure: stand for 8h or until end of simulation (whichever comes later)
                 departure_event_in_input = False
@@ -261,11 +283,6 @@ def generate_from_csv(args):
         now = start - daily
         while now < stop + 2 * daily:
             now += daily
-            for v_id, v in vehicles.items():
-                if now >= stop:
-                    # after end of scenario: keep generating trips, but don't include in scenario
-                    continue
-
             # generate prices for the day
             if now < stop:
                 morning = now + datetime.timedelta(hours=6)
@@ -322,29 +339,19 @@ def csv_to_dict(csv_path):
     :rtype: dict
     """
 
-    dict = []
     with open(csv_path, 'r') as file:
         reader = csv.reader(file)
         # set column names using first row
-        columns = next(reader)
-
+        columns = [column.lower() for column in next(reader)]
         # convert csv to json
-        for row in reader:
-            row_data = {}
-            for i in range(len(row)):
-                # set key names
-                row_key = columns[i].lower()
-                # set key/value
-                row_data[row_key] = row[i]
-            # add data to json store
-            dict.append(row_data)
-    return dict
+        return [dict(zip(columns, row)) for row in reader]
 
 
 def assign_vehicle_id(input, vehicle_types, export=None):
     """ Assign all rotations to specific vehicles with distinct vehicle_id.
 
-    The assignment follows the principle "first in, first out".
+    The assignment follows the principle "first in, first out": each rotation gets the
+    vehicle of its type that is ready the longest (heap of vehicles per type).
     The assignment of a minimum standing time in hours is optional.
 
     :param input: schedule of rotations
@@ -357,10 +364,11 @@ def assign_vehicle_id(input, vehicle_types, export=None):
     :rtype: dict
     """
 
-    # rotations in progress: ordered by next possible departure time
-    rotations_in_progress = []
-    # list of currently idle vehicles
-    idle_vehicles = []
+    # vehicles of each type, ordered by next possible departure time
+    # (on same time: vehicle of latest rotation first)
+    vehicle_queues = {v_type: [] for v_type in vehicle_types.keys()}
+    # count rotations to order vehicles with same possible departure time
+    counter = count()
     # keep track of number of needed vehicles per type
     v_type_counts = {v_type: 0 for v_type in vehicle_types.keys()}
 
@@ -378,50 +386,24 @@ def assign_vehicle_id(input, vehicle_types, export=None):
 
     # find vehicle for each rotation
     for rot in rotations:
-        arrival_time = datetime.datetime.strptime(rot["arrival_time"], DATETIME_FORMAT)
-        departure_time = datetime.datetime.strptime(rot["departure_time"], DATETIME_FORMAT)
-        while rotations_in_progress:
-            # find vehicles that have completed rotation and stood for a minimum standing time
-            # mark those vehicle as idle
-
-            # get first rotation in progress
-            r = rotations_in_progress.pop(0)
-
-            # min_departure_time computed when inserting rotation (see below)
-            if departure_time > r["min_departure_time"]:
-                # standing time sufficient: vehicle idle, no longer in progress
-                idle_vehicles.append(r["vehicle_id"])
-            else:
-                # not arrived or standing time not sufficient:
-                # prepend to rotation again
-                rotations_in_progress.insert(0, r)
-                # ordered by possible departure time: other rotations not possible as well
-                break
-
-        # find idle vehicle for rotation if exists, else generate new vehicle id
+        arrival_time = datetime_from_csv(rot["arrival_time"])
+        departure_time = datetime_from_csv(rot["departure_time"])
         v_type = rot["vehicle_type"]
-        try:
-            # find idle vehicle for rotation
-            v_id = next(v_id for v_id in idle_vehicles if v_type in v_id)
-            idle_vehicles.remove(v_id)
-        except StopIteration:
+        queue = vehicle_queues[v_type]
+        # min_departure_time computed when vehicle was queued (see below)
+        if queue and departure_time > queue[0][0]:
+            # vehicle has completed rotation and stood for a minimum standing time
+            v_id = heapq.heappop(queue)[2]
+        else:
             # no vehicle idle: generate new vehicle id
             v_type_counts[v_type] += 1
             v_id = f"{v_type}_{v_type_counts[v_type]}"
 
         rot["vehicle_id"] = v_id
-        # insert new rotation into list of ongoing rotations
         # calculate the earliest possible new departure time
         min_departure_time = arrival_time + min_standing_times[v_type]
-        # find place to insert
-        i = 0
-        for i, r in enumerate(rotations_in_progress):
-            # go through rotations in order, stop at same or higher departure
-            if r["min_departure_time"] >= min_departure_time:
-                break
         rot["min_departure_time"] = min_departure_time
-        # insert at calculated index
-        rotations_in_progress.insert(i, rot)
+        heapq.heappush(queue, (min_departure_time, -next(counter), v_id))
 
     if export:
         all_rotations = []
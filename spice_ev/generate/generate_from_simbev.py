@@ -1,5 +1,8 @@
 #!/usr/bin/env python3
 
+import bisect
+from collections import deque
+import concurrent.futures
 import csv
 import datetime
 import json
@@ -10,6 +13,9 @@ import warnings
 from spice_ev.battery import Battery
 from spice_ev.loading_curve import LoadingCurve
 
+# maximum number of SimBEV files read by one worker call
+MAX_FILES_PER_CHUNK = 64
+
 
 def parse_vehicle_types(tech_data):
     """ Get vehicle data from SimBEV metadata.
@@ -33,11 +39,312 @@ def parse_vehicle_types(tech_data):
     return predefined_vehicle_types
 
 
-def generate_from_simbev(args):
+def read_simbev_vehicle(csv_path, v_id, v_type, vehicle_type, start, args):
+    """ Read vehicle events of a single SimBEV vehicle file.
+
+    Vehicles are independent of each other, so files can be read in parallel.
+
+    :param csv_path: path of SimBEV vehicle file (*_events.csv)
+    :type csv_path: pathlib.Path
+    :param v_id: unique vehicle ID
+    :type v_id: str
+    :param v_type: name of vehicle type
+    :type v_type: str
+    :param vehicle_type: vehicle type info
+    :type vehicle_type: dict
+    :param start: start time of SimBEV run
+    :type start: datetime.datetime
+    :param args: input arguments
+    :type args: argparse.Namespace
+    :return: vehicle (None if file is empty), its charging stations and vehicle events,
+        number of intervals, capacity taken from file name and number of trips
+        (total and above minimum SoC)
+    :rtype: dict
+    """
+
+    interval = datetime.timedelta(minutes=args.interval)
+
+    def datetime_from_timestep(timestep):
+        assert type(timestep) is int
+        return start + (interval * timestep)
+
+    vehicle = None
+    charging_stations = {}
+    vehicle_events = []
+    n_intervals = 0
+    trips_above_min_soc = 0
+    trips_total = 0
+
+    vehicle_capacity = vehicle_type["capacity"]
+    # take capacity from vehicle file name
+    file_capacity = int(csv_path.stem[:-7].split("_")[-1][:-3])
+    if args.verbose > 0:
+        # capacity of vehicle type is updated in order of files (see generate_from_simbev)
+        vehicle_capacity = file_capacity
+
+    with open(csv_path, newline='') as csvfile:
+        reader = csv.DictReader(csvfile)
+
+        # set initial charge
+        last_arrival_idx = None
+        soc_needed = 0.0
+        arrival = None
+        departure = datetime_from_timestep(0)
+
+        # iterate next timesteps
+        for idx, row in enumerate(reader):
+            if idx == 0:
+                # save initial vehicle data
+                vehicle_soc = float(row["soc_start"])
+                vehicle = {
+                    "connected_charging_station": None,
+                    "soc": vehicle_soc,
+                    "vehicle_type": v_type
+                }
+                battery = Battery(
+                    capacity=vehicle_capacity,
+                    loading_curve=LoadingCurve(vehicle_type["charging_curve"]),
+                    soc=vehicle_soc,
+                    efficiency=vehicle_type.get("efficiency", 0.95)
+                )
+            is_charge_event = False
+            # read info from row
+            location = row["location"]
+            cs_power = float(row["station_charging_capacity"])
+            consumption = abs(min(float(row["energy"]), 0))
+
+            # general sanity checks
+            simbev_soc_start = float(row["soc_start"])
+            simbev_soc_end = float(row["soc_end"])
+            # SoC must not be negative
+            assert simbev_soc_start >= 0 and simbev_soc_end >= 0, \
+                f"SimBEV created negative SoC for {v_id} in row {idx + 1}."
+            # might want to avoid very low battery levels (configurable in config)
+            soc_threshold = args.min_soc_threshold
+            if args.verbose > 0 and (
+                    simbev_soc_start < soc_threshold
+                    or simbev_soc_end < soc_threshold):
+                warnings.warn(f"SimBEV created very low SoC for {v_id} "
+                              f"in row {idx + 1}.")
+
+            simbev_demand = max(float(row["energy"]), 0)
+            assert cs_power > 0 or simbev_demand == 0, \
+                f"Charging event without charging station: {v_id} in row {idx + 1}."
+
+            cs_present = cs_power > 0
+            assert (not cs_present) or consumption == 0, \
+                f"Consumption while charging for {v_id} in row {idx + 1}."
+
+            # get maximum length of timesteps
+            departure_idx = int(row["event_start"]) + int(row["event_time"])
+            n_intervals = max(n_intervals, departure_idx + 1)
+
+            # actual driving and charging behavior
+            if not args.ignore_simbev_soc:
+                if cs_present and float(row["energy"]) > 0:
+                    # arrival at new CS: use info from SimBEV directly
+                    is_charge_event = True
+                    desired_soc = float(row["soc_end"])
+                    delta_soc = (vehicle_soc - float(row["soc_start"]))
+
+                    # check if feasible: simulate with battery
+                    # set battery SoC to level when arriving
+                    battery.soc = float(row["soc_start"])
+                    charge_duration = int(row["event_time"]) * interval
+                    battery.load(charge_duration, max_power=cs_power)
+                    if battery.soc < float(row["soc_end"]) and args.verbose > 0:
+                        warnings.warn(f"Can't fulfill charging request for {v_id} in "
+                                      f"ts {row['timestamp']}. Desired SoC is set to "
+                                      f"{desired_soc:.3f}, possible: {battery.soc:.3f}.")
+                    vehicle_soc = desired_soc
+            else:
+                # tolerance for sanity checks, required due to possible rounding
+                # differences between SimBEV and SpiceEV
+                tolerance = 1e-5
+                # compute needed power and desired SoC independent of SimBEV
+                if not cs_present:
+                    # no charging station or don't need to charge
+                    # just increase charging demand based on consumption
+                    soc_needed += consumption / vehicle_capacity
+                    assert soc_needed <= 1 + vehicle_soc + tolerance, (
+                        f"Consumption too high for {v_id} in row {idx + 1}: "
+                        f"vehicle charged to {vehicle_soc}, needs SoC of {soc_needed} "
+                        f"({soc_needed * vehicle_capacity} kWh). This might be caused by "
+                        f"rounding differences between SimBEV and SpiceEV.")
+                else:
+                    # charging station present
+                    is_charge_event = True
+
+                    if last_arrival_idx is None:
+                        # first charge: initial must be enough
+                        assert vehicle_soc >= soc_needed - tolerance, (
+                            f"Initial charge for {v_id} is not sufficient. This might "
+                            f"be caused by rounding differences between SimBEV and SpiceEV.")
+                    else:
+                        # update desired SoC from last charging event
+                        # this much charge must be in battery when leaving CS
+                        # to reach next CS (the one from current row)
+                        desired_soc = max(args.min_soc, soc_needed)
+
+                        trips_above_min_soc += desired_soc > args.min_soc
+                        trips_total += 1
+
+                        # this much must be charged
+                        delta_soc = max(desired_soc - vehicle_soc, 0)
+
+                        # check if charging is possible in ideal case
+                        last_arrival_event = vehicle_events[last_arrival_idx]
+                        cs_id = last_arrival_event["update"]["connected_charging_station"]
+                        charge_duration = departure - arrival
+                        possible_energy = (charging_stations[cs_id]["max_power"] *
+                                           charge_duration.total_seconds() / 3600)
+                        possible_soc = possible_energy / vehicle_capacity
+
+                        if delta_soc > possible_soc:
+                            warnings.warn(
+                                f"Can't fulfill charging request for '{v_id}' in ts "
+                                f"{((arrival - start) / interval):.0f}. Need "
+                                f"{(desired_soc * vehicle_capacity):.2f} kWh in "
+                                f"{(charge_duration.total_seconds() / 3600):.2f} h "
+                                f"({(charge_duration / interval):.0f} ts). "
+                                f"Possible within standing time: {possible_energy} kWh.")
+
+                        # update last charge event info: set desired SOC
+                        if last_arrival_idx is not None:
+                            vehicle_events[last_arrival_idx]["update"]["desired_soc"]\
+                                = desired_soc
+
+                        # simulate charging
+                        vehicle_soc = max(vehicle_soc, desired_soc)
+
+                    # reset desired SoC for next trip
+                    desired_soc = 0
+
+                    # update vehicle SOC: with how much SOC does vehicle arrive at new CS?
+                    vehicle_soc -= soc_needed
+
+            if is_charge_event:
+                # initialize new charge event
+
+                # setup charging point at location
+                cs_id = f"{v_id}_{location}"
+                if (cs_id in charging_stations
+                        and charging_stations[cs_id]["max_power"] != cs_power):
+                    # same location type, different cs_power: build new CS
+                    cs_id = "{}_{}".format(cs_id, idx)
+                if cs_id not in charging_stations:
+                    charging_stations[cs_id] = {
+                        "max_power": cs_power,
+                        "min_power": (args.cs_power_min if args.cs_power_min is not None
+                                      else 0.1 * cs_power),
+                        "parent": "GC1"
+                    }
+
+                # generate vehicle events
+                # arrival at new CS
+                arrival_idx = int(row["event_start"])
+                arrival = datetime_from_timestep(arrival_idx)
+                assert arrival >= departure, (
+                    f"Order of vehicle {v_id} wrong in timestep {arrival_idx}, "
+                    f"has been standing already.")
+                departure = datetime_from_timestep(departure_idx)
+                delta_soc = soc_needed if args.ignore_simbev_soc else delta_soc
+                vehicle_events.append({
+                    "signal_time": arrival.isoformat(),
+                    "start_time": arrival.isoformat(),
+                    "vehicle_id": v_id,
+                    "event_type": "arrival",
+                    "update": {
+                        "connected_charging_station": cs_id,
+                        "estimated_time_of_departure": departure.isoformat(),
+                        "desired_soc": desired_soc,  # may be None, updated later
+                        "soc_delta": -delta_soc
+                    }
+                })
+                # update last departure
+                if last_arrival_idx is not None:
+                    vehicle_events[last_arrival_idx+1]["update"][
+                        "estimated_time_of_arrival"] = arrival.isoformat()
+                last_arrival_idx = len(vehicle_events) - 1
+
+                # departure from CS
+                vehicle_events.append({
+                    "signal_time": departure.isoformat(),
+                    "start_time": departure.isoformat(),
+                    "vehicle_id": v_id,
+                    "event_type": "departure",
+                    "update": {
+                        "estimated_time_of_arrival": None  # updated at next arrival
+                    }
+                })
+
+                # reset distance (needed charge) to next CS
+                soc_needed = 0.0
+
+    return {
+        "vehicle": vehicle,
+        "charging_stations": charging_stations,
+        "vehicle_events": vehicle_events,
+        "n_intervals": n_intervals,
+        "file_capacity": file_capacity,
+        "trips_above_min_soc": trips_above_min_soc,
+        "trips_total": trips_total,
+    }
+
+
+def _read_simbev_chunk(chunk, vehicle_types, start, args):
+    return [read_simbev_vehicle(csv_path, v_id, v_type, vehicle_types[v_type], start, args)
+            for csv_path, v_id, v_type in chunk]
+
+
+def read_simbev_vehicles(tasks, vehicle_types, start, args, processes=1):
+    """ Read SimBEV vehicle files, in parallel if more than one process is given.
+
+    Results are yielded in order of the tasks. Only a few files are read ahead,
+    so memory stays bounded for any number of vehicle files.
+
+    :param tasks: path, unique vehicle ID and vehicle type name of each vehicle file
+    :type tasks: list of tuples
+    :param vehicle_types: vehicle types by name
+    :type vehicle_types: dict
+    :param start: start time of SimBEV run
+    :type start: datetime.datetime
+    :param args: input arguments
+    :type args: argparse.Namespace
+    :param processes: number of worker processes
+    :type processes: int
+    :yield: result of read_simbev_vehicle for each task
+    :ytype: dict
+    """
+    if processes <= 1:
+        for csv_path, v_id, v_type in tasks:
+            yield read_simbev_vehicle(csv_path, v_id, v_type, vehicle_types[v_type], start, args)
+        return
+
+    # several files per worker call, but limited to keep memory bounded
+    chunksize = min(max(1, len(tasks) // (4 * processes)), MAX_FILES_PER_CHUNK)
+    with concurrent.futures.ProcessPoolExecutor(processes) as executor:
+        pending = deque()
+        for i in range(0, len(tasks), chunksize):
+            chunk = tasks[i:i+chunksize]
+            chunk_types = {v_type: vehicle_types[v_type] for _, _, v_type in chunk}
+            pending.append(executor.submit(_read_simbev_chunk, chunk, chunk_types, start, args))
+            if len(pending) >= 4 * processes:
+                yield from pending.popleft().result()
+        while pending:
+            yield from pending.popleft().result()
+
+
+def generate_from_simbev(args, writer=None):
     """ Generate a scenario JSON from SimBEV results.
 
+    Vehicle files are read in parallel if *args.processes* is greater than one.
+
     :param args: input arguments
     :type args: argparse.Namespace
+    :param writer: write vehicles, charging stations and vehicle events right away instead
+        of returning them in scenario (keeps memory bounded)
+    :type writer: spice_ev.generate.scenario_writer.ScenarioWriter
     :return: scenario
     :rtype: dict
     """
@@ -139,235 +446,55 @@ def generate_from_simbev(args):
             price_interval = datetime.timedelta(hours=price_stable_hours) / interval
 
     # GENERATE VEHICLE EVENTS: iterate over input files
+    tasks = []
+    vehicle_ids = []  # sorted, to find similar names
     for csv_path in pathlist:
         # get vehicle id from file name
         v_id = str(csv_path.stem)[:-7]
-
-        with open(csv_path, newline='') as csvfile:
-            reader = csv.DictReader(csvfile)
-
-            # set vehicle info from first data row
-            # update in vehicles, regardless if known before or not
-            v_info = v_id.split("_")
-            # get vehicle type from the first two parts of the csv name
-            v_type = '_'.join(v_info[:2])
-
-            # vehicle type must be known
-            assert v_type in vehicle_types, f"Unknown type for {v_id}: {v_type}."
-            if v_id in vehicles:
-                num_similar_name = sum([1 for v in vehicles.keys() if v.startswith(v_id)])
-                v_id_new = "{}_{}".format(v_id, num_similar_name + 1)
-                if args.verbose > 0:
-                    warnings.warn(f"Vehicle name '{v_id}' is not unique! "
-                                  f"Renamed to '{v_id_new}'.")
-                v_id = v_id_new
-
-            # check that capacities match
-            vehicle_capacity = vehicle_types[v_type]["capacity"]
-            # take capacity from vehicle file name
-            file_capacity = int(v_info[-1][:-3])
-            if vehicle_capacity != file_capacity and args.verbose > 0:
-                warnings.warn(f"Capacities of vehicle type '{v_type}' don't match!"
-                              f"In file name: '{file_capacity}', in script: '{vehicle_capacity}'. "
-                              "Using value from file.")
-                vehicle_capacity = file_capacity
-                vehicle_types[v_type]["capacity"] = file_capacity
-
-            # set initial charge
-            last_arrival_idx = None
-            soc_needed = 0.0
-            arrival = None
-            departure = datetime_from_timestep(0)
-
-            # iterate next timesteps
-            for idx, row in enumerate(reader):
-                if idx == 0:
-                    # save initial vehicle data
-                    vehicle_soc = float(row["soc_start"])
-                    vehicles[v_id] = {
-                        "connected_charging_station": None,
-                        "soc": vehicle_soc,
-                        "vehicle_type": v_type
-                    }
-                    battery = Battery(
-                        capacity=vehicle_capacity,
-                        loading_curve=LoadingCurve(vehicle_types[v_type]["charging_curve"]),
-                        soc=vehicle_soc,
-                        efficiency=vehicle_types[v_type].get("efficiency", 0.95)
-                    )
-                is_charge_event = False
-                # read info from row
-                location = row["location"]
-                cs_power = float(row["station_charging_capacity"])
-                consumption = abs(min(float(row["energy"]), 0))
-
-                # general sanity checks
-                simbev_soc_start = float(row["soc_start"])
-                simbev_soc_end = float(row["soc_end"])
-                # SoC must not be negative
-                assert simbev_soc_start >= 0 and simbev_soc_end >= 0, \
-                    f"SimBEV created negative SoC for {v_id} in row {idx + 1}."
-                # might want to avoid very low battery levels (configurable in config)
-                soc_threshold = args.min_soc_threshold
-                if args.verbose > 0 and (
-                        simbev_soc_start < soc_threshold
-                        or simbev_soc_end < soc_threshold):
-                    warnings.warn(f"SimBEV created very low SoC for {v_id} "
-                                  f"in row {idx + 1}.")
-
-                simbev_demand = max(float(row["energy"]), 0)
-                assert cs_power > 0 or simbev_demand == 0, \
-                    f"Charging event without charging station: {v_id} in row {idx + 1}."
-
-                cs_present = cs_power > 0
-                assert (not cs_present) or consumption == 0, \
-                    f"Consumption while charging for {v_id} in row {idx + 1}."
-
-                # get maximum length of timesteps
-                departure_idx = int(row["event_start"]) + int(row["event_time"])
-                n_intervals = max(n_intervals, departure_idx + 1)
-
-                # actual driving and charging behavior
-                if not args.ignore_simbev_soc:
-                    if cs_present and float(row["energy"]) > 0:
-                        # arrival at new CS: use info from SimBEV directly
-                        is_charge_event = True
-                        desired_soc = float(row["soc_end"])
-                        delta_soc = (vehicle_soc - float(row["soc_start"]))
-
-                        # check if feasible: simulate with battery
-                        # set battery SoC to level when arriving
-                        battery.soc = float(row["soc_start"])
-                        charge_duration = int(row["event_time"]) * interval
-                        battery.load(charge_duration, max_power=cs_power)
-                        if battery.soc < float(row["soc_end"]) and args.verbose > 0:
-                            warnings.warn(f"Can't fulfill charging request for {v_id} in "
-                                          f"ts {row['timestamp']}. Desired SoC is set to "
-                                          f"{desired_soc:.3f}, possible: {battery.soc:.3f}.")
-                        vehicle_soc = desired_soc
-                else:
-                    # tolerance for sanity checks, required due to possible rounding
-                    # differences between SimBEV and SpiceEV
-                    tolerance = 1e-5
-                    # compute needed power and desired SoC independent of SimBEV
-                    if not cs_present:
-                        # no charging station or don't need to charge
-                        # just increase charging demand based on consumption
-                        soc_needed += consumption / vehicle_capacity
-                        assert soc_needed <= 1 + vehicle_soc + tolerance, (
-                            f"Consumption too high for {v_id} in row {idx + 1}: "
-                            f"vehicle charged to {vehicle_soc}, needs SoC of {soc_needed} "
-                            f"({soc_needed * vehicle_capacity} kWh). This might be caused by "
-                            f"rounding differences between SimBEV and SpiceEV.")
-                    else:
-                        # charging station present
-                        is_charge_event = True
-
-                        if last_arrival_idx is None:
-                            # first charge: initial must be enough
-                            assert vehicle_soc >= soc_needed - tolerance, (
-                                f"Initial charge for {v_id} is not sufficient. This might "
-                                f"be caused by rounding differences between SimBEV and SpiceEV.")
-                        else:
-                            # update desired SoC from last charging event
-                            # this much charge must be in battery when leaving CS
-                            # to reach next CS (the one from current row)
-                            desired_soc = max(args.min_soc, soc_needed)
-
-                            trips_above_min_soc += desired_soc > args.min_soc
-                            trips_total += 1
-
-                            # this much must be charged
-                            delta_soc = max(desired_soc - vehicle_soc, 0)
-
-                            # check if charging is possible in ideal case
-                            last_arrival_event = events["vehicle_events"][last_arrival_idx]
-                            cs_id = last_arrival_event["update"]["connected_charging_station"]
-                            charge_duration = departure - arrival
-                            possible_energy = (charging_stations[cs_id]["max_power"] *
-                                               charge_duration.total_seconds() / 3600)
-                            possible_soc = possible_energy / vehicle_capacity
-
-                            if delta_soc > possible_soc:
-                                warnings.warn(
-                                    f"Can't fulfill charging request for '{v_id}' in ts "
-                                    f"{((arrival - start) / interval):.0f}. Need "
-                                    f"{(desired_soc * vehicle_capacity):.2f} kWh in "
-                                    f"{(charge_duration.total_seconds() / 3600):.2f} h "
-                                    f"({(charge_duration / interval):.0f} ts). "
-                                    f"Possible within standing time: {possible_energy} kWh.")
-
-                            # update last charge event info: set desired SOC
-                            if last_arrival_idx is not None:
-                                events["vehicle_events"][last_arrival_idx]["update"]["desired_soc"]\
-                                    = desired_soc
-
-                            # simulate charging
-                            vehicle_soc = max(vehicle_soc, desired_soc)
-
-                        # reset desired SoC for next trip
-                        desired_soc = 0
-
-                        # update vehicle SOC: with how much SOC does vehicle arrive at new CS?
-                        vehicle_soc -= soc_needed
-
-                if is_charge_event:
-                    # initialize new charge event
-
-                    # setup charging point at location
-                    cs_id = f"{v_id}_{location}"
-                    if (cs_id in charging_stations
-                            and charging_stations[cs_id]["max_power"] != cs_power):
-                        # same location type, different cs_power: build new CS
-                        cs_id = "{}_{}".format(cs_id, idx)
-                    if cs_id not in charging_stations:
-                        charging_stations[cs_id] = {
-                            "max_power": cs_power,
-                            "min_power": (args.cs_power_min if args.cs_power_min is not None
-                                          else 0.1 * cs_power),
-                            "parent": "GC1"
-                        }
-
-                    # generate vehicle events
-                    # arrival at new CS
-                    arrival_idx = int(row["event_start"])
-                    arrival = datetime_from_timestep(arrival_idx)
-                    assert arrival >= departure, (
-                        f"Order of vehicle {v_id} wrong in timestep {arrival_idx}, "
-                        f"has been standing already.")
-                    departure = datetime_from_timestep(departure_idx)
-                    delta_soc = soc_needed if args.ignore_simbev_soc else delta_soc
-                    events["vehicle_events"].append({
-                        "signal_time": arrival.isoformat(),
-                        "start_time": arrival.isoformat(),
-                        "vehicle_id": v_id,
-                        "event_type": "arrival",
-                        "update": {
-                            "connected_charging_station": cs_id,
-                            "estimated_time_of_departure": departure.isoformat(),
-                            "desired_soc": desired_soc,  # may be None, updated later
-                            "soc_delta": -delta_soc
-                        }
-                    })
-                    # update last departure
-                    if last_arrival_idx is not None:
-                        events["vehicle_events"][last_arrival_idx+1]["update"][
-                            "estimated_time_of_arrival"] = arrival.isoformat()
-                    last_arrival_idx = len(events["vehicle_events"]) - 1
-
-                    # departure from CS
-                    events["vehicle_events"].append({
-                        "signal_time": departure.isoformat(),
-                        "start_time": departure.isoformat(),
-                        "vehicle_id": v_id,
-                        "event_type": "departure",
-                        "update": {
-                            "estimated_time_of_arrival": None  # updated at next arrival
-                        }
-                    })
-
-                    # reset distance (needed charge) to next CS
-                    soc_needed = 0.0
+        # get vehicle type from the first two parts of the csv name
+        v_type = '_'.join(v_id.split("_")[:2])
+        # vehicle type must be known
+        assert v_type in vehicle_types, f"Unknown type for {v_id}: {v_type}."
+        idx = bisect.bisect_left(vehicle_ids, v_id)
+        if idx < len(vehicle_ids) and vehicle_ids[idx] == v_id:
+            num_similar_name = bisect.bisect_left(vehicle_ids, v_id + chr(0x10FFFF)) - idx
+            v_id_new = "{}_{}".format(v_id, num_similar_name + 1)
+            if args.verbose > 0:
+                warnings.warn(f"Vehicle name '{v_id}' is not unique! "
+                              f"Renamed to '{v_id_new}'.")
+            v_id = v_id_new
+        bisect.insort(vehicle_ids, v_id)
+        tasks.append((csv_path, v_id, v_type))
+
+    num_vehicles = 0
+    processes = int(vars(args).get("processes") or 1)
+    for (_, v_id, v_type), result in zip(
+            tasks, read_simbev_vehicles(tasks, vehicle_types, start, args, processes)):
+        # check that capacities match (in order of files, independent of processes)
+        type_capacity = vehicle_types[v_type]["capacity"]
+        if type_capacity != result["file_capacity"] and args.verbose > 0:
+            warnings.warn(f"Capacities of vehicle type '{v_type}' don't match!"
+                          f"In file name: '{result['file_capacity']}', in script: "
+                          f"'{type_capacity}'. Using value from file.")
+            vehicle_types[v_type]["capacity"] = result["file_capacity"]
+        n_intervals = max(n_intervals, result["n_intervals"])
+        trips_above_min_soc += result["trips_above_min_soc"]
+        trips_total += result["trips_total"]
+        if result["vehicle"] is None:
+            # empty vehicle file
+            continue
+        num_vehicles += 1
+        if writer is None:
+            vehicles[v_id] = result["vehicle"]
+            charging_stations.update(result["charging_stations"])
+            events["vehicle_events"] += result["vehicle_events"]
+        else:
+            # write vehicle right away
+            writer.add(("components", "vehicles"), result["vehicle"], key=v_id)
+            for cs_id, cs in result["charging_stations"].items():
+                writer.add(("components", "charging_stations"), cs, key=cs_id)
+            for event in result["vehicle_events"]:
+                writer.add(("events", "vehicle_events"), event)
 
     # random price: each price interval, generate new price
     while (
@@ -404,7 +531,7 @@ def generate_from_simbev(args):
                 }
             })
 
-    assert len(vehicles) > 0, f"No vehicles found in {args.simbev}."
+    assert num_vehicles > 0, f"No vehicles found in {args.simbev}."
 
     # number of trips for which desired_soc is above min_soc
     if trips_above_min_soc and args.verbose > 0:
@@ -1,13 +1,18 @@
 #!/usr/bin/env python3
 
+import concurrent.futures
 import datetime
 import random
 import warnings
 
+import numpy as np
+
 from spice_ev.util import datetime_from_isoformat
 
 
 DEFAULT_START_TIME = "2023-01-01T01:00:00+02:00"
+# number of vehicles of one type that share a random stream, when drawing trips in bulk
+VEHICLES_PER_BLOCK = 1000
 
 
 def datetime_from_string(s):
@@ -15,13 +20,14 @@ def datetime_from_string(s):
     return datetime.datetime(1972, 1, 1, h, m)
 
 
-def generate_trip(v_type_info):
-    """ Create randomly generated trips from average input arguments.
+def get_trip_statistics(v_type_info):
+    """ Get and check statistical values of trips of a vehicle type.
 
     :param v_type_info: info of used vehicle_type
     :type v_type_info: dict
     :raises Exception: if the time format is not hh:mm
-    :return: start (datetime), duration (timedelta), distance (float)
+    :return: statistical values, times of day as datetime
+    :rtype: dict
     """
 
     stat_values = v_type_info["statistical_values"]
@@ -56,6 +62,18 @@ def generate_trip(v_type_info):
         else:
             # make sure non-time arguments are numbers
             assert type(v) in [int, float], f"'{k}' must be given as integer or float."
+    return trip
+
+
+def generate_trip(v_type_info):
+    """ Create randomly generated trips from average input arguments.
+
+    :param v_type_info: info of used vehicle_type
+    :type v_type_info: dict
+    :return: start (datetime), duration (timedelta), distance (float)
+    """
+
+    trip = get_trip_statistics(v_type_info)
 
     # start time
     start = trip["avg_start"]
@@ -85,9 +103,228 @@ def generate_trip(v_type_info):
     return start.time(), duration, distance
 
 
+def generate_trips(v_type_info, shape, rng):
+    """ Create randomly generated trips in bulk, same distributions as in generate_trip.
+
+    :param v_type_info: info of used vehicle_type
+    :type v_type_info: dict
+    :param shape: shape of returned arrays, e.g. (number of days, number of vehicles)
+    :type shape: tuple
+    :param rng: NumPy random generator
+    :type rng: numpy.random.Generator
+    :return: start (minutes after midnight), duration (minutes), distance (km)
+    :rtype: tuple of numpy.ndarray
+    """
+    trip = get_trip_statistics(v_type_info)
+
+    def minutes(t):
+        return t.hour * 60 + t.minute
+
+    # start time: normal distribution (hours -> minutes), ignore sub-minute resolution
+    start = np.floor(rng.normal(minutes(trip["avg_start"]), trip["std_start"] * 60, shape))
+    start = np.clip(start, minutes(trip["min_start"]), minutes(trip["max_start"]))
+    # trip duration: clip to min/max, ignore sub-minute resolution
+    duration = rng.normal(trip["avg_driving"], trip["std_driving"], shape)
+    duration = np.clip(duration, trip["min_driving"], trip["max_driving"])
+    duration = np.floor(duration * 60)
+    # trip distance
+    distance = rng.normal(trip["avg_distance"], trip["std_distance"], shape)
+    distance = np.clip(distance, trip["min_distance"], trip["max_distance"])
+
+    return start.astype(np.int64), duration.astype(np.int64), distance
+
+
+def generate_vehicle_events(v_type, v_type_info, vehicle_ids, days, seed, options):
+    """ Generate trips of some vehicles of one type, drawn in bulk.
+
+    Trips only depend on the given seed, not on other vehicles,
+    so blocks of vehicles can be generated in any order or in parallel.
+
+    :param v_type: name of vehicle type
+    :type v_type: str
+    :param v_type_info: info of vehicle type
+    :type v_type_info: dict
+    :param vehicle_ids: IDs of vehicles
+    :type vehicle_ids: list
+    :param days: start of each day with trips (after end of scenario: only update last arrival)
+    :type days: list of datetime.datetime
+    :param seed: seed of random generator of this block of vehicles
+    :type seed: numpy.random.SeedSequence
+    :param options: stop time of scenario (*stop*), minimum SoC (*min_soc*)
+        and buffer on top of needed SoC (*buffer*)
+    :type options: dict
+    :return: first departure and desired SoC by vehicle ID (*vehicles*), vehicle events of
+        each day (*events*), number of trips (*trips_total*, *trips_above_min_soc*)
+    :rtype: dict
+    """
+    rng = np.random.default_rng(seed)
+    shape = (len(days), len(vehicle_ids))
+    dep_time, duration, distance = generate_trips(v_type_info, shape, rng)
+
+    # minutes since epoch (local time) of each departure and arrival
+    epoch = datetime.date(1970, 1, 1).toordinal()
+    midnight = np.array([(day.toordinal() - epoch) * 24 * 60 for day in days], dtype=np.int64)
+    departure = midnight[:, None] + dep_time
+    arrival = departure + duration
+    # convert mileage per 100 km in 1 km
+    soc_delta = distance * (v_type_info["mileage"] / 100) / v_type_info["capacity"]
+    # add buffer on top of soc_delta
+    desired_soc = np.maximum(soc_delta * (1 + options["buffer"]), options["min_soc"])
+
+    # time zone is the same for all events (suffix of ISO format)
+    tz = days[0].replace(hour=0, minute=0, second=0, microsecond=0).isoformat()[19:] if days else ""
+
+    def isoformat(minutes):
+        return [t + tz for t in np.datetime_as_string(
+            minutes.astype("datetime64[m]"), unit="s").tolist()]
+
+    vehicles = {}
+    events = [[] for _ in days]
+    last_arrival = {}
+    trips_total = 0
+    trips_above_min_soc = 0
+    min_soc = options["min_soc"]
+    for d, day in enumerate(days):
+        after_stop = day >= options["stop"]
+        departure_str = isoformat(departure[d])
+        arrival_str = isoformat(arrival[d])
+        day_departure = departure[d].tolist()
+        day_arrival = arrival[d].tolist()
+        day_soc_delta = soc_delta[d].tolist()
+        day_desired_soc = desired_soc[d].tolist()
+        for v, v_id in enumerate(vehicle_ids):
+            update = {
+                "estimated_time_of_departure": departure_str[v],
+                "desired_soc": day_desired_soc[v],
+            }
+            if v_id in last_arrival:
+                event, arrival_time = last_arrival[v_id]
+                if arrival_time >= day_departure[v]:
+                    # still on last trip, discard new trip
+                    continue
+                # update last arrival event
+                event["update"].update(update)
+            else:
+                # first event for this vehicle: update directly
+                vehicles[v_id] = update
+
+            if after_stop:
+                # after end of scenario: keep generating trips, but don't include in scenario
+                continue
+
+            trips_above_min_soc += day_desired_soc[v] > min_soc
+            trips_total += 1
+
+            events[d].append({
+                "signal_time": departure_str[v],
+                "start_time": departure_str[v],
+                "vehicle_id": v_id,
+                "event_type": "departure",
+                "update": {
+                    "estimated_time_of_arrival": arrival_str[v]
+                }
+            })
+            event = {
+                "signal_time": arrival_str[v],
+                "start_time": arrival_str[v],
+                "vehicle_id": v_id,
+                "event_type": "arrival",
+                "update": {
+                    "connected_charging_station": "CS_" + v_id,
+                    "estimated_time_of_departure": None,
+                    "desired_soc": 0,
+                    "soc_delta": -day_soc_delta[v]
+                }
+            }
+            events[d].append(event)
+            last_arrival[v_id] = (event, day_arrival[v])
+
+    return {
+        "vehicles": vehicles,
+        "events": events,
+        "trips_total": trips_total,
+        "trips_above_min_soc": trips_above_min_soc,
+    }
+
+
+def generate_vehicle_events_bulk(args, vehicle_types, vehicles, start, stop):
+    """ Generate vehicle events with trips drawn in bulk.
+
+    Each vehicle type gets its own random stream derived from *args.seed* (negative seeds are
+    used like their absolute value), split into blocks of VEHICLES_PER_BLOCK vehicles.
+    Blocks are generated in parallel if *args.processes* is greater than one,
+    the result does not depend on it.
+
+    :param args: input arguments
+    :type args: argparse.Namespace
+    :param vehicle_types: vehicle types with number of vehicles (*count*)
+    :type vehicle_types: dict
+    :param vehicles: vehicles by ID, first departure and desired SoC are updated
+    :type vehicles: dict
+    :param start: start time of scenario
+    :type start: datetime.datetime
+    :param stop: stop time of scenario
+    :type stop: datetime.datetime
+    :return: vehicle events, number of trips and number of trips above minimum SoC
+    :rtype: tuple
+    """
+    daily = datetime.timedelta(days=1)
+    holidays = vars(args).get("holidays", [])
+    all_days = []
+    now = start - daily
+    while now < stop + 2 * daily:
+        now += daily
+        if now.date().isoformat() not in holidays:
+            all_days.append(now)
+
+    options = {
+        "stop": stop,
+        "min_soc": args.min_soc,
+        "buffer": vars(args).get("buffer", 0.1),
+    }
+    tasks = []
+    # SeedSequence needs non-negative seed: use absolute value (like random.seed)
+    seed = None if args.seed is None else abs(args.seed)
+    type_seeds = np.random.SeedSequence(seed).spawn(len(vehicle_types))
+    for (v_type, v_type_info), type_seed in zip(vehicle_types.items(), type_seeds):
+        count = v_type_info.get("count", 0)
+        no_drive_days = v_type_info.get("no_drive_days", [])
+        days = [day for day in all_days if day.weekday() not in no_drive_days]
+        block_starts = range(0, count, VEHICLES_PER_BLOCK)
+        for first, seed in zip(block_starts, type_seed.spawn(len(block_starts))):
+            vehicle_ids = [
+                "{}_{}".format(v_type, i)
+                for i in range(first, min(first + VEHICLES_PER_BLOCK, count))]
+            tasks.append((v_type, v_type_info, vehicle_ids, days, seed, options))
+
+    processes = int(vars(args).get("processes") or 1)
+    if processes <= 1 or len(tasks) <= 1:
+        results = [generate_vehicle_events(*task) for task in tasks]
+    else:
+        with concurrent.futures.ProcessPoolExecutor(processes) as executor:
+            results = list(executor.map(generate_vehicle_events, *zip(*tasks)))
+
+    # merge blocks day by day, like sequential generation
+    events_by_day = {day: [] for day in all_days}
+    trips_total = 0
+    trips_above_min_soc = 0
+    for task, result in zip(tasks, results):
+        for v_id, update in result["vehicles"].items():
+            vehicles[v_id].update(update)
+        for day, day_events in zip(task[3], result["events"]):
+            events_by_day[day] += day_events
+        trips_total += result["trips_total"]
+        trips_above_min_soc += result["trips_above_min_soc"]
+    vehicle_events = [event for day_events in events_by_day.values() for event in day_events]
+    return vehicle_events, trips_total, trips_above_min_soc
+
+
 def generate_from_statistics(args):
     """ Generate a scenario JSON with trips from statistical input parameters.
 
+    With *args.vectorized*, trips are drawn in bulk with NumPy (see
+    generate_vehicle_events_bulk) instead of one by one.
+
     :param args: input arguments
     :type args: argparse.Namespace
     :return: scenario
@@ -157,87 +394,92 @@ def generate_from_statistics(args):
                 "parent": "GC1"
             }
 
-    # GENERATE VEHICLE EVENTS: daily
     daily = datetime.timedelta(days=1)
-    now = start - daily
-    while now < stop + 2 * daily:
-        now += daily
-
-        # create vehicle events for this day
-        for v_id, v_info in vehicles.items():
-            # check if day is defined as a no driving day for this vehicle_type
-            if now.weekday() in vehicle_types[v_info["vehicle_type"]].get("no_drive_days", []):
-                continue
-            if now.date().isoformat() in vars(args).get("holidays", []):
-                break
-
-            # get vehicle infos
-            capacity = vehicle_types[v_info["vehicle_type"]]["capacity"]
-            # convert mileage per 100 km in 1 km
-            mileage = vehicle_types[v_info["vehicle_type"]]["mileage"] / 100
-
-            # generate trip event
-            dep_time, duration, distance = generate_trip(vehicle_types[v_info["vehicle_type"]])
-            departure = datetime.datetime.combine(now.date(), dep_time, now.tzinfo)
-            arrival = departure + duration
-            soc_delta = distance * mileage / capacity
-
-            # add buffer on top of soc_delta
-            desired_soc = soc_delta * (1 + vars(args).get("buffer", 0.1))
-            desired_soc = max(args.min_soc, desired_soc)
-            # update initial desired SoC
-            v_info["desired_soc"] = v_info["desired_soc"] or desired_soc
-            update = {
-                "estimated_time_of_departure": departure.isoformat(),
-                "desired_soc": desired_soc
-            }
+    if vars(args).get("vectorized"):
+        # GENERATE VEHICLE EVENTS: drawn in bulk for each vehicle type
+        events["vehicle_events"], trips_total, trips_above_min_soc = \
+            generate_vehicle_events_bulk(args, vehicle_types, vehicles, start, stop)
+    else:
+        # GENERATE VEHICLE EVENTS: daily
+        now = start - daily
+        while now < stop + 2 * daily:
+            now += daily
 
-            if "last_arrival_idx" in v_info:
-                if v_info["arrival"] >= departure:
-                    # still on last trip, discard new trip
+            # create vehicle events for this day
+            for v_id, v_info in vehicles.items():
+                # check if day is defined as a no driving day for this vehicle_type
+                if now.weekday() in vehicle_types[v_info["vehicle_type"]].get("no_drive_days", []):
                     continue
-                # update last arrival event
-                events["vehicle_events"][v_info["last_arrival_idx"]]["update"].update(update)
-            else:
-                # first event for this vehicle: update directly
-                v_info.update(update)
-
-            if now >= stop:
-                # after end of scenario: keep generating trips, but don't include in scenario
-                continue
-
-            trips_above_min_soc += desired_soc > args.min_soc
-            trips_total += 1
-
-            events["vehicle_events"].append({
-                "signal_time": departure.isoformat(),
-                "start_time": departure.isoformat(),
-                "vehicle_id": v_id,
-                "event_type": "departure",
-                "update": {
-                    "estimated_time_of_arrival": arrival.isoformat()
+                if now.date().isoformat() in vars(args).get("holidays", []):
+                    break
+
+                # get vehicle infos
+                capacity = vehicle_types[v_info["vehicle_type"]]["capacity"]
+                # convert mileage per 100 km in 1 km
+                mileage = vehicle_types[v_info["vehicle_type"]]["mileage"] / 100
+
+                # generate trip event
+                dep_time, duration, distance = generate_trip(vehicle_types[v_info["vehicle_type"]])
+                departure = datetime.datetime.combine(now.date(), dep_time, now.tzinfo)
+                arrival = departure + duration
+                soc_delta = distance * mileage / capacity
+
+                # add buffer on top of soc_delta
+                desired_soc = soc_delta * (1 + vars(args).get("buffer", 0.1))
+                desired_soc = max(args.min_soc, desired_soc)
+                # update initial desired SoC
+                v_info["desired_soc"] = v_info["desired_soc"] or desired_soc
+                update = {
+                    "estimated_time_of_departure": departure.isoformat(),
+                    "desired_soc": desired_soc
                 }
-            })
 
-            v_info["last_arrival_idx"] = len(events["vehicle_events"])
-            v_info["arrival"] = arrival
+                if "last_arrival_idx" in v_info:
+                    if v_info["arrival"] >= departure:
+                        # still on last trip, discard new trip
+                        continue
+                    # update last arrival event
+                    events["vehicle_events"][v_info["last_arrival_idx"]]["update"].update(update)
+                else:
+                    # first event for this vehicle: update directly
+                    v_info.update(update)
+
+                if now >= stop:
+                    # after end of scenario: keep generating trips, but don't include in scenario
+                    continue
 
-            events["vehicle_events"].append({
-                "signal_time": arrival.isoformat(),
-                "start_time": arrival.isoformat(),
-                "vehicle_id": v_id,
-                "event_type": "arrival",
-                "update": {
-                    "connected_charging_station": "CS_" + v_id,
-                    "estimated_time_of_departure": None,
-                    "desired_soc": 0,
-                    "soc_delta": -soc_delta
-                }
-            })
-    # remove temporary information
-    for v_info in vehicles.values():
-        del v_info["last_arrival_idx"]
-        del v_info["arrival"]
+                trips_above_min_soc += desired_soc > args.min_soc
+                trips_total += 1
+
+                events["vehicle_events"].append({
+                    "signal_time": departure.isoformat(),
+                    "start_time": departure.isoformat(),
+                    "vehicle_id": v_id,
+                    "event_type": "departure",
+                    "update": {
+                        "estimated_time_of_arrival": arrival.isoformat()
+                    }
+                })
+
+                v_info["last_arrival_idx"] = len(events["vehicle_events"])
+                v_info["arrival"] = arrival
+
+                events["vehicle_events"].append({
+                    "signal_time": arrival.isoformat(),
+                    "start_time": arrival.isoformat(),
+                    "vehicle_id": v_id,
+                    "event_type": "arrival",
+                    "update": {
+                        "connected_charging_station": "CS_" + v_id,
+                        "estimated_time_of_departure": None,
+                        "desired_soc": 0,
+                        "soc_delta": -soc_delta
+                    }
+                })
+        # remove temporary information
+        for v_info in vehicles.values():
+            del v_info["last_arrival_idx"]
+            del v_info["arrival"]
     for v_info in vehicle_types.values():
         del v_info["count"]
         del v_info["statistical_values"]
@@ -1,11 +1,16 @@
+import concurrent.futures
 from copy import deepcopy
 import datetime
+from itertools import accumulate
 import json
 from os.path import relpath
 from pathlib import Path
 import warnings
 
-from spice_ev import events, scenario, strategy, util
+import numpy as np
+
+from spice_ev import events, scenario, util
+from spice_ev.generate.scenario_writer import patch_json
 
 EPS = 1e-5
 
@@ -23,20 +28,90 @@ def generate_flex_band(scenario, gcID, core_standing_time=None):
     :return: flex band
     :rtype: dict
     """
+    return generate_flex_bands(scenario, [gcID], core_standing_time)[gcID]
 
-    s = strategy.Strategy(
-        scenario.components, scenario.start_time, **{
-            "interval": scenario.interval,
-            "margin": 1,
-            "ALLOW_NEGATIVE_SOC": True
-        })
-    gc = s.world_state.grid_connectors[gcID]
-    event_steps = scenario.events.get_event_steps(
-        scenario.start_time, scenario.n_intervals, scenario.interval)
 
-    ts_per_hour = datetime.timedelta(hours=1) / s.interval
+def generate_flex_bands(scenario, gc_ids=None, core_standing_time=None, processes=1):
+    """ Generate flexibility potential for total vehicle fleet of many grid connectors.
+
+    Events are replayed once for all grid connectors (see generate_flex_band).
+    Events bucketed by a previous simulation run (*scenario.event_steps*) are reused.
+    With *processes* > 1, grid connectors are distributed to worker processes,
+    each worker replays the events for its grid connectors.
 
-    def clamp_to_gc(power):
+    :param scenario: input scenario
+    :type scenario: Scenario
+    :param gc_ids: grid connector IDs for which to create flex bands, defaults to all
+    :type gc_ids: list
+    :param core_standing_time: core standing time during which flexibility is guaranteed
+        (see generate_flex_band)
+    :type core_standing_time: dict
+    :param processes: number of worker processes (1: generate in this process)
+    :type processes: int
+    :return: grid connector ID -> flex band
+    :rtype: dict
+    """
+    if gc_ids is None:
+        gc_ids = sorted(scenario.components.grid_connectors.keys())
+    event_steps = getattr(scenario, "event_steps", None)
+    if event_steps is None:
+        event_steps = scenario.events.get_event_steps(
+            scenario.start_time, scenario.n_intervals, scenario.interval)
+    args = (scenario.components, event_steps, scenario.start_time, scenario.interval,
+            scenario.n_intervals)
+
+    num_workers = min(int(processes), len(gc_ids))
+    if num_workers <= 1:
+        return replay_flex_bands(*args, gc_ids, core_standing_time)
+
+    with concurrent.futures.ProcessPoolExecutor(max_workers=num_workers) as pool:
+        futures = [pool.submit(replay_flex_bands, *args, gc_ids[i::num_workers],
+                               core_standing_time) for i in range(num_workers)]
+        flex_bands = {}
+        for future in futures:
+            flex_bands.update(future.result())
+    # same order as grid connector IDs
+    return {gcID: flex_bands[gcID] for gcID in gc_ids}
+
+
+def replay_flex_bands(components, event_steps, start_time, interval, n_intervals, gc_ids,
+                      core_standing_time=None):
+    """ Replay events once and generate flex bands of grid connectors (see generate_flex_bands).
+
+    Event processing follows Strategy.step without charging.
+    Vehicle SoCs are raised to desired SoC on arrival at a grid connector, so SoCs may differ
+    between grid connectors. These SoCs are only stored for grid connectors that change them.
+
+    :param components: scenario components (not changed)
+    :type components: Components
+    :param event_steps: new events for each timestep (see Events.get_event_steps)
+    :type event_steps: list
+    :param start_time: start time of scenario
+    :type start_time: datetime.datetime
+    :param interval: length of timestep
+    :type interval: datetime.timedelta
+    :param n_intervals: number of timesteps
+    :type n_intervals: int
+    :param gc_ids: grid connector IDs for which to create flex bands
+    :type gc_ids: list
+    :param core_standing_time: core standing time during which flexibility is guaranteed
+    :type core_standing_time: dict
+    :raises Exception: if an unknown event type is encountered or
+        a GC has neither associated costs nor schedule at any time
+    :return: grid connector ID -> flex band
+    :rtype: dict
+    """
+    grid_connectors = deepcopy(components.grid_connectors)
+    charging_stations = components.charging_stations
+    battery_ids = components.batteries.keys()
+    vehicles = deepcopy(components.vehicles)
+    # vehicle ID -> grid connector ID -> SoC, if different from vehicle SoC
+    gc_socs = {vid: {} for vid in vehicles}
+
+    ts_per_hour = datetime.timedelta(hours=1) / interval
+    core_standing_calendar = util.CoreStandingTime(core_standing_time)
+
+    def clamp_to_gc(power, gc):
         # helper function: make sure to stay within GC power limits
         return min(max(power, -gc.max_power), gc.max_power)
 
@@ -48,7 +123,7 @@ def generate_flex_band(scenario, gcID, core_standing_time=None):
     average_efficiency = 0
     # True if any vehicle has v2g enabled
     v2g_enabled = False
-    for v in s.world_state.vehicles.values():
+    for v in vehicles.values():
         total_vehicle_capacity += v.battery.capacity
         total_desired_energy += v.desired_soc * v.battery.capacity
         average_efficiency += v.battery.efficiency * v.battery.capacity
@@ -56,154 +131,256 @@ def generate_flex_band(scenario, gcID, core_standing_time=None):
             v2g_enabled = True
     average_efficiency /= total_vehicle_capacity
 
-    flex = {
-        "min": [],
-        "base": [],
-        "max": [],
-        "vehicles": {
-            "capacity": total_vehicle_capacity,
-            "desired_energy": total_desired_energy,
-            "v2g": v2g_enabled,
-            "efficiency": average_efficiency,
+    # vehicles that may connect to charging stations of each GC (others never have flex there)
+    gc_vehicle_ids = {gcID: set() for gcID in gc_ids}
+    connections = [(vid, v.connected_charging_station) for vid, v in vehicles.items()]
+    for cur_events in event_steps:
+        connections += [(ev.vehicle_id, ev.update.get("connected_charging_station"))
+                        for ev in cur_events if type(ev) is events.VehicleEvent]
+    for vid, cs_id in connections:
+        cs = charging_stations.get(cs_id)
+        if cs is not None and cs.parent in gc_vehicle_ids:
+            gc_vehicle_ids[cs.parent].add(vid)
+
+    # state of each GC
+    states = {}
+    for gcID in gc_ids:
+        flex = {
             "min": [],
+            "base": [],
             "max": [],
-        },
-        "batteries": {
-            "stored": 0,
-            "power": 0,
-            "free": 0,  # how much energy can still be stored?
-            "efficiency": 0  # average efficiency across all batteries
-        },
-        "intervals": [],
-    }
-
-    # get battery info: how much can be discharged in beginning, how much if fully charged?
-    batteries = [b for b in s.world_state.batteries.values() if b.parent == gcID]
-    bat_init_discharge_power = sum([b.get_available_power(s.interval) for b in batteries])
-    for b in batteries:
-        if b.capacity > 2**50:
-            warnings.warn("battery without capacity detected")
-        flex["batteries"]["stored"] += b.soc * b.capacity
-        flex["batteries"]["power"] += b.loading_curve.max_power
-        flex["batteries"]["free"] += (1 - b.soc) * b.capacity
-        flex["batteries"]["efficiency"] += b.efficiency
-        b.soc = 1
-    bat_full_discharge_power = sum([b.get_available_power(s.interval) for b in batteries])
-    flex["batteries"]["efficiency"] = \
-        flex["batteries"]["efficiency"] / len(batteries) if len(batteries) else 1
-
-    vehicles = {vid: [0, 0, 0] for vid in s.world_state.vehicles}
-    vehicles_present = False
-    prev_vehicles_present = False
-
-    for step_i in range(scenario.n_intervals):
-        with warnings.catch_warnings():
-            warnings.simplefilter('ignore', UserWarning)
-            s.step(event_steps[step_i])
-
-        current_datetime = scenario.start_time + scenario.interval * step_i
-        currently_in_core_standing_time = \
-            util.dt_within_core_standing_time(current_datetime, core_standing_time)
+            "vehicles": {
+                "capacity": total_vehicle_capacity,
+                "desired_energy": total_desired_energy,
+                "v2g": v2g_enabled,
+                "efficiency": average_efficiency,
+                "min": [],
+                "max": [],
+            },
+            "batteries": {
+                "stored": 0,
+                "power": 0,
+                "free": 0,  # how much energy can still be stored?
+                "efficiency": 0  # average efficiency across all batteries
+            },
+            "intervals": [],
+        }
 
-        # basic value: fixed load, local generation power
-        base_flex = gc.get_current_load()
+        # get battery info: how much can be discharged in beginning, how much if fully charged?
+        batteries = [deepcopy(b) for b in components.batteries.values() if b.parent == gcID]
+        bat_init_discharge_power = sum([b.get_available_power(interval) for b in batteries])
+        for b in batteries:
+            if b.capacity > 2**50:
+                warnings.warn("battery without capacity detected")
+            flex["batteries"]["stored"] += b.soc * b.capacity
+            flex["batteries"]["power"] += b.loading_curve.max_power
+            flex["batteries"]["free"] += (1 - b.soc) * b.capacity
+            flex["batteries"]["efficiency"] += b.efficiency
+            b.soc = 1
+        bat_full_discharge_power = sum([b.get_available_power(interval) for b in batteries])
+        flex["batteries"]["efficiency"] = \
+            flex["batteries"]["efficiency"] / len(batteries) if len(batteries) else 1
+
+        states[gcID] = {
+            "flex": flex,
+            "bat_init_discharge_power": bat_init_discharge_power,
+            "bat_full_discharge_power": bat_full_discharge_power,
+            # charging power, energy needed and V2G power of vehicles (in order of vehicles)
+            "vehicles": {vid: [0, 0, 0] for vid in vehicles if vid in gc_vehicle_ids[gcID]},
+            "prev_vehicles_present": False,
+        }
 
-        # update vehicles
-        for vid, v in s.world_state.vehicles.items():
-            cs_id = v.connected_charging_station
-            if cs_id is None:
-                # vehicle not present: reset vehicle flex
-                if (
-                        vehicles[vid][0] != 0 and
-                        core_standing_time is not None and
-                        currently_in_core_standing_time):
-                    warnings.warn(f"TS {step_i}: {vid} leaves during CST")
-                # keep vehicle energy until charging interval is complete
-                vehicles[vid] = [0, vehicles[vid][1], 0]
+    future_events = []
+    current_time = start_time - interval
+    for step_i in range(n_intervals):
+        # process events (like Strategy.step)
+        current_time += interval
+        future_events += event_steps[step_i]
+        future_events.sort(key=lambda ev: ev.start_time)
+        num_events = 0
+        for ev in future_events:
+            if ev.start_time > current_time:
+                # ignore future events
+                break
+            num_events += 1
+            if type(ev) is events.FixedLoad:
+                connector = grid_connectors.get(ev.grid_connector_id)
+                if connector is None:
+                    continue
+                assert ev.name not in charging_stations, (
+                    "Fixed load must not be from charging station")
+                connector.current_loads[ev.name] = ev.value
+            elif type(ev) is events.LocalEnergyGeneration:
+                assert ev.name not in charging_stations, (
+                    "Local energy generation must not be from charging station")
+                connector = grid_connectors.get(ev.grid_connector_id)
+                if connector is None:
+                    continue
+                connector.current_loads[ev.name] = -ev.value
+            elif type(ev) is events.GridOperatorSignal:
+                connector = grid_connectors.get(ev.grid_connector_id)
+                if connector is None:
+                    continue
+                if ev.cost is not None:
+                    connector.cost = ev.cost
+                if ev.target is not None:
+                    connector.target = ev.target
+                if ev.window is not None:
+                    connector.window = ev.window
+                if connector.max_power:
+                    if ev.max_power is not None:
+                        connector.cur_max_power = min(connector.max_power, ev.max_power)
+                else:
+                    connector.cur_max_power = ev.max_power
+            elif type(ev) is events.VehicleEvent:
+                vehicle = vehicles.get(ev.vehicle_id)
+                if vehicle is None:
+                    continue
+                for k, v in ev.update.items():
+                    setattr(vehicle, k, v)
+                if ev.event_type == "departure":
+                    vehicle.estimated_time_of_departure = None
+                    if ev.start_time < current_time - interval:
+                        # event from the past: optimal charging, same SoC for all GCs
+                        vehicle.battery.soc = vehicle.desired_soc
+                        gc_socs[ev.vehicle_id] = {}
+                    vehicle.connected_charging_station = None
+                elif ev.event_type == "arrival":
+                    assert hasattr(vehicle, 'soc_delta')
+                    vehicle.battery.soc += vehicle.soc_delta
+                    socs = gc_socs[ev.vehicle_id]
+                    for gcID in socs:
+                        socs[gcID] += vehicle.soc_delta
+                    delattr(vehicle, 'soc_delta')
             else:
-                cs = s.world_state.charging_stations[cs_id]
-                if cs.parent == gcID:
-                    if vehicles[vid][0] == 0:
-                        # just arrived
+                raise Exception("Unknown event type: {}".format(ev))
+        del future_events[:num_events]
+
+        for name, connector in grid_connectors.items():
+            # reset charging stations and battery loads at grid connector
+            for load_name in list(connector.current_loads.keys()):
+                if load_name in charging_stations or load_name in battery_ids:
+                    del connector.current_loads[load_name]
+            # check GC: must have costs (dict, may be empty) or schedule (float/None)
+            if not connector.cost and connector.target is None:
+                raise Exception(
+                    "Connector {} has neither associated costs nor schedule at {}"
+                    .format(name, current_time))
+
+        current_datetime = start_time + interval * step_i
+        currently_in_core_standing_time = core_standing_calendar.within(current_datetime)
+
+        for gcID, state in states.items():
+            gc = grid_connectors[gcID]
+            flex = state["flex"]
+            gc_vehicles = state["vehicles"]
+
+            # basic value: fixed load, local generation power
+            base_flex = gc.get_current_load()
+
+            # update vehicles
+            for vid, vehicle_flex in gc_vehicles.items():
+                v = vehicles[vid]
+                cs_id = v.connected_charging_station
+                if cs_id is None:
+                    # vehicle not present: reset vehicle flex
+                    if (
+                            vehicle_flex[0] != 0 and
+                            core_standing_time is not None and
+                            currently_in_core_standing_time):
+                        warnings.warn(f"TS {step_i}: {vid} leaves during CST")
+                    # keep vehicle energy until charging interval is complete
+                    gc_vehicles[vid] = [0, vehicle_flex[1], 0]
+                else:
+                    cs = charging_stations[cs_id]
+                    if cs.parent == gcID and vehicle_flex[0] == 0:
+                        # just arrived: use SoC of vehicle at this GC
+                        vehicle_soc = v.battery.soc
+                        v.battery.soc = gc_socs[vid].get(gcID, vehicle_soc)
                         charging_power = min(v.battery.loading_curve.max_power, cs.max_power)
                         delta_soc = max(v.get_delta_soc(), 0)
                         # scale with remaining steps
                         if v.estimated_time_of_departure is not None:
                             dep = v.estimated_time_of_departure
                             # try to understand this one
-                            dep = -((scenario.start_time - dep) // s.interval)
-                            factor = min((scenario.n_intervals - step_i) / (dep - step_i), 1)
+                            dep = -((start_time - dep) // interval)
+                            factor = min((n_intervals - step_i) / (dep - step_i), 1)
                             delta_soc *= factor
                         vehicle_energy_needed = (
-                            vehicles[vid][1] +
+                            vehicle_flex[1] +
                             (delta_soc * v.battery.capacity) / v.battery.efficiency)
                         v.battery.soc = max(v.battery.soc, v.desired_soc)
-                        v2g = (v.battery.get_available_power(s.interval)
+                        v2g = (v.battery.get_available_power(interval)
                                * v.vehicle_type.v2g_power_factor) if v.vehicle_type.v2g else 0
-                        vehicles[vid] = [charging_power, vehicle_energy_needed, v2g]
+                        gc_vehicles[vid] = [charging_power, vehicle_energy_needed, v2g]
+                        gc_socs[vid][gcID] = v.battery.soc
+                        v.battery.soc = vehicle_soc
                         if (
                                 step_i != 0 and
                                 core_standing_time is not None and currently_in_core_standing_time):
                             warnings.warn(f"TS {step_i}: {vid} arrives during CST")
-        num_vehicles_present = sum(bool(v[0]) for v in vehicles.values())
-
-        local_generation_support = max(-base_flex, 0)
-        vehicles_present = currently_in_core_standing_time and num_vehicles_present > 0
-        if vehicles_present:
-            # local generation surplus can support vehicle charging
-            for v in vehicles.values():
-                if local_generation_support <= EPS:
-                    break
-                power = min(v[0], v[1] * ts_per_hour, local_generation_support)
-                v[1] -= power / ts_per_hour
-                local_generation_support -= power
-                base_flex += power
-
-            # get sums from vehicles dict
-            vehicle_flex, needed, v2g_flex = map(sum, zip(*vehicles.values()))
-            if not prev_vehicles_present:
-                # new standing period
-                flex["intervals"].append({
-                    "needed": 0,  # updated until all vehicles have left
-                    "time": [],
-                    "num_vehicles_present": 0,
-                })
-            info = flex["intervals"][-1]
-            info["needed"] = needed
-            info["num_vehicles_present"] = num_vehicles_present
-            # only timesteps in core standing time are taken added to interval
-            # if no core standing time is specified step_i is always appended
-            # e.g. currently_in_core_standing_time = TRUE for all step_i
-            if currently_in_core_standing_time:
-                info["time"].append(step_i)
-        else:
-            # no vehicles present or not within core standing time: no vehicle flex
-            vehicle_flex = 0
-            v2g_flex = 0
-            if prev_vehicles_present:
-                # first TS with all vehicles left or end of CST
-                # reset vehicle flex and energy needed
-                vehicles = {vid: [0, 0, 0] for vid in vehicles}
-
-        # take note if vehicles are present for comparison at next timestep
-        prev_vehicles_present = vehicles_present
-
-        bat_flex_discharge = bat_init_discharge_power if step_i == 0 else bat_full_discharge_power
-        bat_flex_charge = flex["batteries"]["power"]
-        # local generation surplus can also feed batteries
-        local_gen_to_battery = min(bat_flex_charge, local_generation_support)
-        bat_flex_charge -= local_gen_to_battery
-        local_generation_support -= local_gen_to_battery
-
-        flex["base"].append(clamp_to_gc(base_flex))
-        # min: no vehicle charging, discharge from batteries and V2G
-        flex["min"].append(clamp_to_gc(base_flex - bat_flex_discharge - v2g_flex))
-        # max: all vehicle and batteries charging
-        flex["max"].append(clamp_to_gc(base_flex + vehicle_flex + bat_flex_charge))
-        flex["vehicles"]["min"].append(-v2g_flex)
-        flex["vehicles"]["max"].append(vehicle_flex)
+            num_vehicles_present = sum(bool(v[0]) for v in gc_vehicles.values())
+
+            local_generation_support = max(-base_flex, 0)
+            vehicles_present = currently_in_core_standing_time and num_vehicles_present > 0
+            if vehicles_present:
+                # local generation surplus can support vehicle charging
+                for v in gc_vehicles.values():
+                    if local_generation_support <= EPS:
+                        break
+                    power = min(v[0], v[1] * ts_per_hour, local_generation_support)
+                    v[1] -= power / ts_per_hour
+                    local_generation_support -= power
+                    base_flex += power
+
+                # get sums from vehicles dict
+                vehicle_flex, needed, v2g_flex = map(sum, zip(*gc_vehicles.values()))
+                if not state["prev_vehicles_present"]:
+                    # new standing period
+                    flex["intervals"].append({
+                        "needed": 0,  # updated until all vehicles have left
+                        "time": [],
+                        "num_vehicles_present": 0,
+                    })
+                info = flex["intervals"][-1]
+                info["needed"] = needed
+                info["num_vehicles_present"] = num_vehicles_present
+                # only timesteps in core standing time are taken added to interval
+                # if no core standing time is specified step_i is always appended
+                # e.g. currently_in_core_standing_time = TRUE for all step_i
+                if currently_in_core_standing_time:
+                    info["time"].append(step_i)
+            else:
+                # no vehicles present or not within core standing time: no vehicle flex
+                vehicle_flex = 0
+                v2g_flex = 0
+                if state["prev_vehicles_present"]:
+                    # first TS with all vehicles left or end of CST
+                    # reset vehicle flex and energy needed
+                    state["vehicles"] = {vid: [0, 0, 0] for vid in gc_vehicles}
+
+            # take note if vehicles are present for comparison at next timestep
+            state["prev_vehicles_present"] = vehicles_present
+
+            if step_i == 0:
+                bat_flex_discharge = state["bat_init_discharge_power"]
+            else:
+                bat_flex_discharge = state["bat_full_discharge_power"]
+            bat_flex_charge = flex["batteries"]["power"]
+            # local generation surplus can also feed batteries
+            local_gen_to_battery = min(bat_flex_charge, local_generation_support)
+            bat_flex_charge -= local_gen_to_battery
+            local_generation_support -= local_gen_to_battery
 
-    return flex
+            flex["base"].append(clamp_to_gc(base_flex, gc))
+            # min: no vehicle charging, discharge from batteries and V2G
+            flex["min"].append(clamp_to_gc(base_flex - bat_flex_discharge - v2g_flex, gc))
+            # max: all vehicle and batteries charging
+            flex["max"].append(clamp_to_gc(base_flex + vehicle_flex + bat_flex_charge, gc))
+            flex["vehicles"]["min"].append(-v2g_flex)
+            flex["vehicles"]["max"].append(vehicle_flex)
+
+    return {gcID: state["flex"] for gcID, state in states.items()}
 
 
 def generate_individual_flex_band(scenario, gcID):
@@ -223,16 +400,23 @@ def generate_individual_flex_band(scenario, gcID):
     event_signal_steps = scenario.events.get_event_steps(
         scenario.start_time, scenario.n_intervals, interval)
     # change ordering and corresponding interval from signal_time to start_time
+    # vehicle events are handled separately
     event_steps = [[] for _ in range(scenario.n_intervals)]
+    vehicle_events = []
     for cur_events in event_signal_steps:
         for event in cur_events:
             # get start interval (ceil), must be within scenario time
             start_interval = -((scenario.start_time - event.start_time) // interval)
             if 0 <= start_interval < scenario.n_intervals:
-                event_steps[start_interval].append(event)
+                if type(event) is events.VehicleEvent:
+                    vehicle_events.append((start_interval, event))
+                else:
+                    event_steps[start_interval].append(event)
+    # order by start interval, same start interval keeps order of signal time (stable sort)
+    vehicle_events.sort(key=lambda e: e[0])
 
     flex = {
-        "vehicles": [[]],
+        "vehicles": [[] for _ in range(scenario.n_intervals)],
         "batteries": {
             "stored": 0,
             "power": 0,
@@ -262,6 +446,8 @@ def generate_individual_flex_band(scenario, gcID):
         flex["batteries"]["efficiency"] / len(batteries) if len(batteries) else 1
 
     vehicles = deepcopy(scenario.components.vehicles)
+    # latest arrival info of vehicles connected at this GC
+    last_arrival = {}
 
     def get_v2g_energy(vehicle):
         if vehicle.vehicle_type.v2g:
@@ -278,10 +464,9 @@ def generate_individual_flex_band(scenario, gcID):
         if cs is None or cs.parent != gcID:
             continue
         # connected
-        v.last_arrival_idx = (0, len(flex["vehicles"][0]))
         delta_soc = max(v.desired_soc - v.battery.soc, 0)
         energy = delta_soc * v.battery.capacity / v.battery.efficiency
-        flex["vehicles"][0].append({
+        last_arrival[vid] = {
             "vid": vid,
             "v2g": get_v2g_energy(v),
             "t_start": scenario.start_time,
@@ -294,12 +479,11 @@ def generate_individual_flex_band(scenario, gcID):
             "efficiency": v.battery.efficiency,
             "p_min": max(cs.min_power, v.vehicle_type.min_charging_power),
             "p_max": min(cs.max_power, v.battery.loading_curve.max_power),
-        })
+        }
+        flex["vehicles"][0].append(last_arrival[vid])
 
-    # update flex based on events
-    for idx, timestep in enumerate(event_steps):
-        if idx != 0:
-            flex["vehicles"].append([])
+    # update GC based on events
+    for timestep in event_steps:
         for event in timestep:
             if type(event) is events.FixedLoad and event.grid_connector_id == gcID:
                 # fixed load event at this GC
@@ -318,71 +502,110 @@ def generate_individual_flex_band(scenario, gcID):
                 else:
                     # connector max power not set
                     gc.cur_max_power = event.max_power
-            elif type(event) is events.VehicleEvent:
-                # vehicle event: check if this GC
-                vid = event.vehicle_id
-                vehicle = vehicles[vid]
-                if event.event_type == 'arrival':
-                    if vehicle.connected_charging_station is not None:
-                        warnings.warn("Multiple arrivals")
-                    cs_id = event.update["connected_charging_station"]
-                    vehicle.connected_charging_station = cs_id
-                    vehicle.battery.soc += event.update["soc_delta"]
-                    if cs_id is None:
-                        continue
-                    cs = scenario.components.charging_stations.get(cs_id)
-                    if cs is None:
-                        # CS not found? Can't charge
-                        continue
-                    if cs.parent != gcID:
-                        # fake perfect charging
-                        vehicle.battery.soc = max(vehicle.battery.soc, event.update["desired_soc"])
-                        continue
-                    # arrived at this GC: add to list
-                    vehicle.last_arrival_idx = (len(flex["vehicles"])-1, len(flex["vehicles"][-1]))
-                    delta_soc = event.update["desired_soc"] - vehicle.battery.soc
-                    delta_soc = max(delta_soc, 0)
-                    energy = delta_soc * vehicle.battery.capacity / vehicle.battery.efficiency
-                    est_tod = event.update["estimated_time_of_departure"]
-                    tod_idx = (est_tod - scenario.start_time) // scenario.interval
-                    flex["vehicles"][-1].append({
-                        "vid": vid,
-                        "v2g": get_v2g_energy(vehicle),
-                        "t_start": event.start_time,
-                        "t_end": min(est_tod, scenario.stop_time),
-                        "idx_start": idx,
-                        "idx_end": min(tod_idx, scenario.n_intervals - 1),
-                        "init_soc": vehicle.battery.soc,
-                        "energy": energy,
-                        "desired_soc": event.update["desired_soc"],
-                        "efficiency": vehicle.battery.efficiency,
-                        "p_min": max(cs.min_power, vehicle.vehicle_type.min_charging_power),
-                        "p_max": min(cs.max_power, vehicle.battery.loading_curve.max_power),
-                    })
-                    vehicle.battery.soc = max(vehicle.battery.soc, event.update["desired_soc"])
-                else:
-                    # departure
-                    cs_id = vehicle.connected_charging_station
-                    if cs_id is None:
-                        continue
-                    vehicle.connected_charging_station = None
-                    cs = scenario.components.charging_stations.get(cs_id)
-                    if cs is None or cs.parent != gcID:
-                        # leave without being connected or different GC: skip
-                        continue
-                    # departed from this GC: update departure time
-                    v_idx = vehicle.last_arrival_idx
-                    flex["vehicles"][v_idx[0]][v_idx[1]]["t_end"] = event.start_time
-                    flex["vehicles"][v_idx[0]][v_idx[1]]["idx_end"] = idx
             # other event types ignored
         # end of current events: get current GC loads
         flex["base"].append(gc.get_current_load())
         flex["min"].append(-gc.cur_max_power)
         flex["max"].append(gc.cur_max_power)
-    # end of timesteps
+
+    # get standing times of vehicles at this GC directly from vehicle events
+    for idx, event in vehicle_events:
+        vid = event.vehicle_id
+        vehicle = vehicles[vid]
+        if event.event_type == 'arrival':
+            if vehicle.connected_charging_station is not None:
+                warnings.warn("Multiple arrivals")
+            cs_id = event.update["connected_charging_station"]
+            vehicle.connected_charging_station = cs_id
+            vehicle.battery.soc += event.update["soc_delta"]
+            if cs_id is None:
+                continue
+            cs = scenario.components.charging_stations.get(cs_id)
+            if cs is None:
+                # CS not found? Can't charge
+                continue
+            if cs.parent != gcID:
+                # fake perfect charging
+                vehicle.battery.soc = max(vehicle.battery.soc, event.update["desired_soc"])
+                continue
+            # arrived at this GC: add to list
+            delta_soc = event.update["desired_soc"] - vehicle.battery.soc
+            delta_soc = max(delta_soc, 0)
+            energy = delta_soc * vehicle.battery.capacity / vehicle.battery.efficiency
+            est_tod = event.update["estimated_time_of_departure"]
+            tod_idx = (est_tod - scenario.start_time) // scenario.interval
+            last_arrival[vid] = {
+                "vid": vid,
+                "v2g": get_v2g_energy(vehicle),
+                "t_start": event.start_time,
+                "t_end": min(est_tod, scenario.stop_time),
+                "idx_start": idx,
+                "idx_end": min(tod_idx, scenario.n_intervals - 1),
+                "init_soc": vehicle.battery.soc,
+                "energy": energy,
+                "desired_soc": event.update["desired_soc"],
+                "efficiency": vehicle.battery.efficiency,
+                "p_min": max(cs.min_power, vehicle.vehicle_type.min_charging_power),
+                "p_max": min(cs.max_power, vehicle.battery.loading_curve.max_power),
+            }
+            flex["vehicles"][idx].append(last_arrival[vid])
+            vehicle.battery.soc = max(vehicle.battery.soc, event.update["desired_soc"])
+        else:
+            # departure
+            cs_id = vehicle.connected_charging_station
+            if cs_id is None:
+                continue
+            vehicle.connected_charging_station = None
+            cs = scenario.components.charging_stations.get(cs_id)
+            if cs is None or cs.parent != gcID:
+                # leave without being connected or different GC: skip
+                continue
+            # departed from this GC: update departure time
+            last_arrival[vid]["t_end"] = event.start_time
+            last_arrival[vid]["idx_end"] = idx
     return flex
 
 
+def get_balanced_power(loads, lower, upper, power_needed):
+    """ Distribute power across timesteps, such that the resulting loads are balanced.
+
+    Power of each timestep is the difference of a common cutoff level to its load, clipped to
+    its bounds (water-filling). The power of a timestep rises linearly between two breakpoints
+    (load + lower bound and load + upper bound). The cutoff is found exactly by sorting the
+    breakpoints and summing up the power in between (prefix sums).
+    If the power needed can not be reached, every timestep is set to its respective bound.
+
+    :param loads: load of each timestep
+    :type loads: list or numpy.ndarray
+    :param lower: lower bound of power of each timestep (must not be positive)
+    :type lower: list or numpy.ndarray
+    :param upper: upper bound of power of each timestep (must not be negative)
+    :type upper: list or numpy.ndarray
+    :param power_needed: sum of power over all timesteps
+    :type power_needed: float
+    :return: power of each timestep
+    :rtype: numpy.ndarray
+    """
+    loads = np.asarray(loads, dtype=float)
+    lower = np.asarray(lower, dtype=float)
+    upper = np.asarray(upper, dtype=float)
+    # stable sort: rising breakpoints come before falling ones of same value
+    points = np.concatenate((loads + lower, loads + upper))
+    order = np.argsort(points, kind="stable")
+    points = points[order]
+    slopes = np.cumsum(np.concatenate((np.ones(len(loads)), -np.ones(len(loads))))[order])
+    # total power at each breakpoint
+    totals = np.concatenate(([0], np.cumsum(slopes[:-1] * np.diff(points)))) + lower.sum()
+    k = np.searchsorted(totals, power_needed)
+    if k == 0:
+        level = points[0]
+    elif k == len(points):
+        level = points[-1]
+    else:
+        level = points[k-1] + (power_needed - totals[k-1]) / slopes[k-1]
+    return np.clip(level - loads, lower, upper)
+
+
 def aggressive_round(f, places=0):
     """ Numbers close to zero are truncated to zero.
 
@@ -462,7 +685,15 @@ def generate_schedule(args):
         flex["base"][i] = 0
 
     vehicle_ids = sorted(s.components.vehicles.keys())
-    vehicle_schedule = {vid: [0] * s.n_intervals for vid in vehicle_ids}
+
+    def to_timeseries(values):
+        # energy is distributed on slices of arrays
+        return np.array(values, dtype=float)
+
+    schedule = to_timeseries(schedule)
+    residual_load = to_timeseries(residual_load)
+    curtailment = to_timeseries(curtailment)
+    vehicle_schedule = {vid: to_timeseries([0] * s.n_intervals) for vid in vehicle_ids}
 
     def distribute_energy_balanced(period, energy_needed, v2g, ind_flex, vid=None):
         """ Distribute energy across a time period.
@@ -476,104 +707,92 @@ def generate_schedule(args):
         :type energy_needed: float
         :param v2g: general discharge capability (also true for batteries)
         :type v2g: bool
-        :param ind_flex: individual flex. Power must stay within given bounds
-        :type ind_flex: list of tuples
+        :param ind_flex: individual flex (min, max). Power must stay within given bounds.
+            Each bound is either a number or a list with one value per timestep of period.
+        :type ind_flex: tuple
         :param vid: vehicle ID. Used for individual schedule. Optional.
         :type vid: string
         :return: total change in stored energy after distribution completes
         """
 
         power_needed = energy_needed * ts_per_hour
-        energy_distributed = 0
-        # lower and upper bounds of individual flex and available power
-        p_low = min([max(ind_flex[i][0], -avail["min"][j]) for i, j in enumerate(period)])
-        p_high = max([min(ind_flex[i][1], avail["max"][j]) for i, j in enumerate(period)])
-        # average residual load during period
-        p_avg = 0
-        for idx, i in enumerate(period):
-            # use curtailment power first (greedy charging)
-            if curtailment[i] > EPS:
-                power = min(curtailment[i], avail["max"][i], power_needed, ind_flex[idx][1])
-                power_needed -= power
-                schedule[i] += power
-                avail["min"][i] += power
-                avail["max"][i] -= power
-                if vid:
-                    vehicle_schedule[vid][i] += power
-                curtailment[i] -= power
-                energy_distributed += power / ts_per_hour
-                ind_flex[idx] = (ind_flex[idx][0] - power, ind_flex[idx][1] - power)
-            p_avg += residual_load[i] - curtailment[i]
-        p_avg /= len(period)
+        n = len(period)
+        ind_min, ind_max = ind_flex
+
+        # contiguous period as slice (views of arrays), otherwise as index array
+        steps = slice(period.start, period.stop) if type(period) is range else list(period)
+        ind_min = np.broadcast_to(np.asarray(ind_min, dtype=float), (n,))
+        ind_max = np.broadcast_to(np.asarray(ind_max, dtype=float), (n,))
+        # use curtailment power first (greedy charging)
+        greedy = np.zeros(n)
+        curtailed = curtailment[steps]
+        avail_max = avail["max"][steps]
+        for idx in np.flatnonzero(curtailed > EPS):
+            greedy[idx] = min(curtailed[idx], avail_max[idx], power_needed, ind_max[idx])
+            power_needed -= greedy[idx]
+        schedule[steps] += greedy
+        avail["min"][steps] += greedy
+        avail["max"][steps] -= greedy
+        if vid:
+            vehicle_schedule[vid][steps] += greedy
+        curtailment[steps] -= greedy
+        energy_distributed = greedy.sum() / ts_per_hour
 
         if power_needed < EPS and not v2g:
             # no power needed and no discharging capabilities: finished
             return energy_distributed
 
-        # find cutoff for peak shaving such that in times of low res. load vehicles are charging
-        old_power_needed = power_needed
-        power = [0]*len(period)
-        # good first approx: average out residual load and add needed average power
-        p = p_avg + power_needed / len(period)
-        while (p_high - p_low) > EPS:
-            power_needed = old_power_needed
-            new_avg = p_avg + p
-            for idx, i in enumerate(period):
-                # difference of new average to residual load
-                delta_p = new_avg - (residual_load[i] - curtailment[i])
-                if delta_p > 0:
-                    # res. load lower than new average: charge to increase load
-                    # clip to available power
-                    delta_p = min(delta_p, avail["max"][i])
-                    # clip to flex (individual and global)
-                    delta_p = min(delta_p, ind_flex[idx][1], flex["max"][i] - schedule[i])
-                elif v2g and residual_load[i] > EPS and curtailment[i] < EPS:
-                    # V2G only if res. load positive and no curtailment
-                    # clip to available power (which is positive)
-                    delta_p = max(delta_p, -avail["min"][i])
-                    # clip to flex (individual and global)
-                    delta_p = max(delta_p, ind_flex[idx][0], flex["min"][i] - schedule[i])
-                else:
-                    # res. load higher than average (delta_p negative), but not V2G: skip
-                    power[idx] = 0
-                    continue
-                power[idx] = delta_p
-                power_needed -= delta_p
-
-            if power_needed > EPS:
-                # power not sufficient
-                p_low = p
-            elif power_needed < -EPS:
-                # too much power drawn
-                p_high = p
-            else:
-                # power need exactly fulfilled
-                break
-            # approach optimum through binary search tree
-            p = (p_low + p_high) / 2
+        # power bounds: available power, individual and global flex
+        upper = np.minimum(np.minimum(avail["max"][steps], ind_max - greedy),
+                           flex["max"][steps] - schedule[steps])
+        lower = np.zeros(n)
+        if v2g:
+            # V2G only if res. load positive and no curtailment
+            lower = np.maximum(np.maximum(-avail["min"][steps], ind_min - greedy),
+                               flex["min"][steps] - schedule[steps])
+            lower[(residual_load[steps] <= EPS) | (curtailment[steps] >= EPS)] = 0
+        # peak shaving: in times of low res. load vehicles are charging
+        power = get_balanced_power(
+            residual_load[steps] - curtailment[steps],
+            np.minimum(lower, 0), np.maximum(upper, 0), power_needed)
 
         # apply power
-        for idx, i in enumerate(period):
-            schedule[i] += power[idx]
-            if vid:
-                vehicle_schedule[vid][i] += power[idx]
-            curtail_power = max(min(curtailment[i], power[idx]), 0)
-            curtailment[i] -= curtail_power
-            residual_load[i] += power[idx] - curtail_power
-            energy_distributed += power[idx] / ts_per_hour
-            avail["min"][i] += power[idx]
-            avail["max"][i] -= power[idx]
-
-        return energy_distributed
+        schedule[steps] += power
+        if vid:
+            vehicle_schedule[vid][steps] += power
+        curtail_power = np.maximum(np.minimum(curtailment[steps], power), 0)
+        curtailment[steps] -= curtail_power
+        residual_load[steps] += power - curtail_power
+        avail["min"][steps] += power
+        avail["max"][steps] -= power
+        return energy_distributed + power.sum() / ts_per_hour
 
     if args.individual:
         # available GC power: max power minus base load
         avail = {
-            "min": [max(schedule[i] - flex["min"][i], 0) for i in range(s.n_intervals)],
-            "max": [max(flex["max"][i] - schedule[i], 0) for i in range(s.n_intervals)],
+            "min": to_timeseries(
+                [max(schedule[i] - flex["min"][i], 0) for i in range(s.n_intervals)]),
+            "max": to_timeseries(
+                [max(flex["max"][i] - schedule[i], 0) for i in range(s.n_intervals)]),
         }
-        flex["min"] = schedule.copy()
-        flex["max"] = schedule.copy()
+        # flex: add power of every vehicle during its standing time and battery power
+        # changes of flex are collected in difference arrays and summed up afterwards
+        flex_min = [0] * (s.n_intervals + 1)
+        flex_max = [0] * (s.n_intervals + 1)
+        for vinfo in (vinfo for arrivals in flex["vehicles"] for vinfo in arrivals):
+            if vinfo["idx_start"] >= vinfo["idx_end"]:
+                # arrival/departure same interval: ignore
+                continue
+            flex_min[vinfo["idx_start"]] -= vinfo["v2g"]
+            flex_min[vinfo["idx_end"]] += vinfo["v2g"]
+            flex_max[vinfo["idx_start"]] += vinfo["p_max"]
+            flex_max[vinfo["idx_end"]] -= vinfo["p_max"]
+        # battery flex
+        flex_min[0] -= flex["batteries"]["init_discharge"]
+        flex_min[1] -= flex["batteries"]["full_discharge"] - flex["batteries"]["init_discharge"]
+        flex_max[0] += flex["batteries"]["power"] * flex["batteries"]["efficiency"] / ts_per_hour
+        flex["min"] = to_timeseries([v + d for v, d in zip(schedule, accumulate(flex_min))])
+        flex["max"] = to_timeseries([v + d for v, d in zip(schedule, accumulate(flex_max))])
 
         for i in range(s.n_intervals):
             # sort arrivals by energy needed and standing time
@@ -585,34 +804,23 @@ def generate_schedule(args):
                 if vinfo["idx_start"] >= vinfo["idx_end"]:
                     # arrival/departure same interval: ignore
                     continue
-
-                standing_range = range(vinfo["idx_start"], vinfo["idx_end"])
-                # add to flex
-                for j in standing_range:
-                    flex["min"][j] -= vinfo["v2g"]
-                    flex["max"][j] += vinfo["p_max"]
-
                 distribute_energy_balanced(
-                    standing_range,
+                    range(vinfo["idx_start"], vinfo["idx_end"]),
                     energy_needed=vinfo["energy"],
                     v2g=bool(vinfo["v2g"]),
                     vid=vinfo["vid"],
-                    ind_flex=[[-vinfo["v2g"], vinfo["p_max"]] for _ in standing_range])
-
-            # add battery flex
-            if i == 0:
-                flex["min"][i] -= flex["batteries"]["init_discharge"]
-            else:
-                flex["min"][i] -= flex["batteries"]["full_discharge"]
-            bat_flex = flex["batteries"]["power"] * flex["batteries"]["efficiency"] / ts_per_hour
-            flex["max"][i] += bat_flex
+                    ind_flex=(-vinfo["v2g"], vinfo["p_max"]))
             # end generate schedule for individual vehicles
     else:
         # generate schedule for whole vehicle park
         avail = {
-            "min": [max(schedule[i] + gc.max_power, 0) for i in range(s.n_intervals)],
-            "max": [max(gc.max_power - schedule[i], 0) for i in range(s.n_intervals)],
+            "min": to_timeseries(
+                [max(schedule[i] + gc.max_power, 0) for i in range(s.n_intervals)]),
+            "max": to_timeseries(
+                [max(gc.max_power - schedule[i], 0) for i in range(s.n_intervals)]),
         }
+        flex["min"] = to_timeseries(flex["min"])
+        flex["max"] = to_timeseries(flex["max"])
         for interval in flex["intervals"]:
             if not interval["time"]:
                 # empty interval
@@ -621,9 +829,9 @@ def generate_schedule(args):
                 interval["time"],
                 energy_needed=interval["needed"],
                 v2g=flex["vehicles"]["v2g"],
-                ind_flex=[
-                    [flex["vehicles"]["min"][i], flex["vehicles"]["max"][i]]
-                    for i in interval["time"]])
+                ind_flex=(
+                    [flex["vehicles"]["min"][i] for i in interval["time"]],
+                    [flex["vehicles"]["max"][i] for i in interval["time"]]))
 
     # create schedule for batteries
     batteries = flex["batteries"]  # members: stored, power, free
@@ -632,7 +840,13 @@ def generate_schedule(args):
             range(s.n_intervals),
             energy_needed=-batteries["stored"] * batteries["efficiency"] / ts_per_hour,
             v2g=True,
-            ind_flex=[[-batteries["power"], batteries["power"]] for _ in range(s.n_intervals)])
+            ind_flex=(-batteries["power"], batteries["power"]))
+
+    # write lists of floats
+    schedule = schedule.tolist()
+    residual_load = residual_load.tolist()
+    curtailment = curtailment.tolist()
+    vehicle_schedule = {vid: v.tolist() for vid, v in vehicle_schedule.items()}
 
     # check that schedule is within flex
     for i, v in enumerate(schedule):
@@ -674,18 +888,19 @@ def generate_schedule(args):
                 values += [aggressive_round(vehicle_schedule[vid][t], 3) for vid in vehicle_ids]
             f.write(', '.join([str(v) for v in values]) + '\n')
 
-    # add schedule file info to scenario JSON
-    scenario_json['events']['schedule_from_csv'] = {
+    # add schedule file info to scenario JSON (only changed parts of file are rewritten)
+    updates = {("events", "schedule_from_csv"): {
         'column': 'schedule [kW]',
         'start_time': s.start_time.isoformat(),
         'step_duration_s': s.interval.seconds,
         'csv_file': relative_output_path,
         'grid_connector_id': list(s.components.grid_connectors.keys())[0],
         'individual': args.individual,
-    }
-    scenario_json['scenario']['core_standing_time'] = core_standing_time
-    with args.scenario.open('w') as f:
-        json.dump(scenario_json, f, indent=2)
+    }}
+    if core_standing_time is not None or "core_standing_time" in scenario_json["scenario"]:
+        # missing core standing time is the same as None
+        updates[("scenario", "core_standing_time")] = core_standing_time
+    patch_json(args.scenario, updates)
 
     if args.visual:
         # plot flex with schedule, input and priorities
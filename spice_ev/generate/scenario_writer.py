@@ -0,0 +1,258 @@
+import json
+from pathlib import Path
+import re
+import shutil
+import tempfile
+
+# large sections of generated scenarios, written entry by entry
+STREAMED_SECTIONS = [
+    ("components", "vehicles"),
+    ("components", "charging_stations"),
+    ("events", "vehicle_events"),
+]
+# number of entries of a streamed section serialized at once
+BATCH_SIZE = 1000
+
+
+class ScenarioWriter:
+    """ Write scenario JSON incrementally, so memory stays bounded for large scenarios.
+
+    Entries of large sections (e.g. vehicles or vehicle events) are serialized as soon as they
+    are added and kept in temporary files next to the output file. The rest of the scenario is
+    given on write, the added entries are appended to their sections. Components are written
+    before events and sections in STREAMED_SECTIONS are written entry by entry.
+    The file is the same as written by *json.dump(scenario, f, indent=2)* of the whole scenario
+    or by *json.dump(scenario, f, separators=(",", ":"))* if compact.
+
+    :param path: path of output file
+    :type path: str or pathlib.Path
+    :param indent: number of spaces per indentation level (None: compact, without whitespace)
+    :type indent: int
+    """
+
+    def __init__(self, path, indent=2):
+        self.path = Path(path)
+        self.indent = indent
+        self.key_separator = ":" if indent is None else ": "
+        self.sections = {}  # section -> temporary file with serialized entries
+        self.counts = {}  # section -> number of added entries
+        self.keyed = {}  # section -> entries have keys (section is a dictionary)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        """ Remove temporary files. """
+        for spool in self.sections.values():
+            spool.close()
+        self.sections = {}
+        self.counts = {}
+        self.keyed = {}
+
+    def dumps(self, obj, level):
+        """ Serialize object, nested in given indentation level.
+
+        :param obj: JSON serializable object
+        :type obj: object
+        :param level: indentation level of object
+        :type level: int
+        :return: JSON text
+        :rtype: str
+        """
+        if self.indent is None:
+            return json.dumps(obj, separators=(",", ":"))
+        return json.dumps(obj, indent=self.indent).replace("\n", self.newline(level))
+
+    def newline(self, level):
+        """ Get line break with indentation of given level.
+
+        :param level: indentation level of next line
+        :type level: int
+        :return: whitespace (empty if compact)
+        :rtype: str
+        """
+        if self.indent is None:
+            return ""
+        return "\n" + " " * self.indent * level
+
+    def add(self, section, value, key=None):
+        """ Add entry to end of section.
+
+        :param section: keys of section in scenario, e.g. *("events", "vehicle_events")*
+        :type section: tuple
+        :param value: new entry
+        :type value: object
+        :param key: key of entry, if section is a dictionary (None for lists)
+        :type key: str
+        """
+        spool = self.sections.get(section)
+        if spool is None:
+            spool = tempfile.TemporaryFile("w+", dir=self.path.parent)
+            self.sections[section] = spool
+            self.counts[section] = 0
+            self.keyed[section] = key is not None
+        level = len(section) + 1
+        text = self.dumps(value, level)
+        if key is not None:
+            text = json.dumps(key) + self.key_separator + text
+        # every entry starts with separator, skipped for first entry of section
+        spool.write("," + self.newline(level) + text)
+        self.counts[section] += 1
+
+    def write(self, scenario):
+        """ Write scenario with all added entries to output file.
+
+        :param scenario: scenario without added entries. Missing sections are created.
+        :type scenario: dict
+        """
+        for section in self.sections:
+            obj = scenario
+            for key in section[:-1]:
+                obj = obj.setdefault(key, {})
+            obj.setdefault(section[-1], {} if self.keyed[section] else [])
+        with self.path.open('w') as f:
+            self._write(f, scenario, ())
+
+    def _write(self, f, obj, path):
+        level = len(path)
+        sections = list(self.sections) + STREAMED_SECTIONS
+        if not isinstance(obj, (dict, list)) or not any(
+                section[:level] == path for section in sections):
+            # no added entries or large sections in this part of scenario
+            f.write(self.dumps(obj, level))
+            return
+        is_dict = isinstance(obj, dict)
+        brackets = "{}" if is_dict else "[]"
+        empty = True
+        f.write(brackets[0])
+        if path in sections:
+            # serialize entries in batches
+            entries = list(obj.items()) if is_dict else obj
+            for i in range(0, len(entries), BATCH_SIZE):
+                batch = entries[i:i+BATCH_SIZE]
+                text = self.dumps(dict(batch) if is_dict else batch, level)
+                # strip brackets and line break before closing bracket
+                text = text[1:len(text) - 1 - len(self.newline(level))]
+                f.write(text if empty else "," + text)
+                empty = False
+        else:
+            separator = self.newline(level + 1)
+            for key, value in (obj.items() if is_dict else enumerate(obj)):
+                f.write(separator if empty else "," + separator)
+                if is_dict:
+                    f.write(json.dumps(key) + self.key_separator)
+                self._write(f, value, path + (key,))
+                empty = False
+        if self.counts.get(path):
+            spool = self.sections[path]
+            spool.seek(0)
+            if empty:
+                spool.read(1)
+            shutil.copyfileobj(spool, f)
+            empty = False
+        if not empty:
+            f.write(self.newline(level))
+        f.write(brackets[1])
+
+
+WHITESPACE = re.compile(r"[ \t\n\r]*")
+DECODER = json.JSONDecoder()
+
+
+def _find_member(text, pos, key):
+    """ Find member of JSON object. Only members before it are parsed.
+
+    :param text: JSON text
+    :type text: str
+    :param pos: position of opening brace of object
+    :type pos: int
+    :param key: key of member
+    :type key: str
+    :return: start of value of member or None if not found,
+        end of last member (None if object is empty) and position of closing brace if not found
+    :rtype: tuple
+    """
+    last = None
+    pos = WHITESPACE.match(text, pos + 1).end()
+    if text[pos] == "}":
+        return None, last, pos
+    while True:
+        member_key, pos = DECODER.raw_decode(text, pos)
+        pos = WHITESPACE.match(text, pos).end()
+        assert text[pos] == ":", f"Invalid JSON at position {pos}"
+        start = WHITESPACE.match(text, pos + 1).end()
+        if member_key == key:
+            return start, last, None
+        _, last = DECODER.raw_decode(text, start)
+        pos = WHITESPACE.match(text, last).end()
+        if text[pos] == "}":
+            return None, last, pos
+        assert text[pos] == ",", f"Invalid JSON at position {pos}"
+        pos = WHITESPACE.match(text, pos + 1).end()
+
+
+def patch_json(path, updates):
+    """ Set some values of a JSON object file in place.
+
+    Only the part of the file after the first change is rewritten and the rest of the file is
+    not serialized again. Changes at the end of the file (like new events) are cheap even for
+    large scenarios. Formatting of the file (indentation or compact) is kept.
+
+    :param path: path of JSON file
+    :type path: str or pathlib.Path
+    :param updates: new value by keys, e.g. *{("events", "schedule_from_csv"): {...}}*.
+        Missing objects are created, existing values are replaced.
+    :type updates: dict
+    """
+    path = Path(path)
+    with path.open("r", encoding="utf-8", newline="") as f:
+        text = f.read()
+
+    # detect formatting from top level object
+    pos = WHITESPACE.match(text).end()
+    assert text[pos] == "{", f"{path} does not contain a JSON object"
+    line = re.compile(r"\n( *)").match(text, pos + 1)
+    writer = ScenarioWriter(path, indent=len(line.group(1)) if line else None)
+
+    top = pos
+    # position of first change
+    first = None
+    for keys, value in updates.items():
+        pos = top
+        level = 0
+        while True:
+            found, last, end = _find_member(text, pos, keys[level])
+            if found is None or level == len(keys) - 1:
+                break
+            pos = found
+            assert text[pos] == "{", f"{keys[:level+1]} is not an object in {path}"
+            level += 1
+        for key in reversed(keys[level+1:]):
+            value = {key: value}
+        value_text = writer.dumps(value, level + 1)
+        if found is not None:
+            # replace existing value
+            start = found
+            _, end = DECODER.raw_decode(text, found)
+        else:
+            value_text = json.dumps(keys[level]) + writer.key_separator + value_text
+            if last is not None:
+                # append after last member
+                start = end = last
+                value_text = "," + writer.newline(level + 1) + value_text
+            else:
+                start = pos + 1
+                value_text = writer.newline(level + 1) + value_text + writer.newline(level)
+        text = text[:start] + value_text + text[end:]
+        first = start if first is None else min(first, start)
+
+    if first is None:
+        # nothing changed
+        return
+    with path.open("r+", encoding="utf-8", newline="") as f:
+        f.seek(len(text[:first].encode("utf-8")))
+        f.write(text[first:])
+        f.truncate()
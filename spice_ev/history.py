@@ -0,0 +1,153 @@
+from collections import OrderedDict
+from pathlib import Path
+import pickle
+
+# default number of items per chunk file
+CHUNK_SIZE = 4096
+
+
+class ChunkedList:
+    """ List-like sequence stored in chunk files, only few chunks are kept in memory.
+
+    Used to keep the history of long simulations out of memory. Supports appending,
+    indexing (also negative indices and slices), item assignment and iteration.
+    Modified chunks are written (with pickle) when they are evicted from memory.
+    Changes of mutable items are not tracked, modified items have to be reassigned.
+    Reports go through the history chunk by chunk (e.g. slices of chunk size).
+
+    :param directory: directory to store chunk files in
+    :type directory: str or pathlib.Path
+    :param name: prefix of chunk file names
+    :type name: str
+    :param chunk_size: number of items per chunk, defaults to CHUNK_SIZE
+    :type chunk_size: int
+    :param max_chunks: maximum number of chunks kept in memory
+    :type max_chunks: int
+    """
+
+    def __init__(self, directory, name, chunk_size=None, max_chunks=2):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.name = name
+        self.chunk_size = chunk_size or CHUNK_SIZE
+        self.max_chunks = max(max_chunks, 1)
+        self.length = 0
+        self.cache = OrderedDict()  # chunk index -> list of items (least recently used first)
+        self.modified = set()  # indices of cached chunks that differ from file
+        self.stored = set()  # indices of chunks written by this instance
+
+    def get_chunk_path(self, chunk_idx):
+        """ Get path of chunk file.
+
+        :param chunk_idx: index of chunk
+        :type chunk_idx: int
+        :return: path to chunk file
+        :rtype: pathlib.Path
+        """
+        return self.directory / f"{self.name}_{chunk_idx:06d}.pickle"
+
+    def get_chunk(self, chunk_idx):
+        """ Get chunk from memory or load it from file. May evict other chunks.
+
+        :param chunk_idx: index of chunk
+        :type chunk_idx: int
+        :return: items of chunk
+        :rtype: list
+        """
+        chunk = self.cache.get(chunk_idx)
+        if chunk is not None:
+            self.cache.move_to_end(chunk_idx)
+            return chunk
+        if chunk_idx in self.stored:
+            with self.get_chunk_path(chunk_idx).open("rb") as f:
+                chunk = pickle.load(f)
+        else:
+            # new chunk (ignore files of previous runs)
+            chunk = []
+        self.cache[chunk_idx] = chunk
+        while len(self.cache) > self.max_chunks:
+            old_idx, old_chunk = self.cache.popitem(last=False)
+            self.write_chunk(old_idx, old_chunk)
+        return chunk
+
+    def write_chunk(self, chunk_idx, chunk):
+        """ Write chunk to file, if modified.
+
+        :param chunk_idx: index of chunk
+        :type chunk_idx: int
+        :param chunk: items of chunk
+        :type chunk: list
+        """
+        if chunk_idx not in self.modified:
+            return
+        with self.get_chunk_path(chunk_idx).open("wb") as f:
+            pickle.dump(chunk, f, protocol=pickle.HIGHEST_PROTOCOL)
+        self.modified.discard(chunk_idx)
+        self.stored.add(chunk_idx)
+
+    def flush(self):
+        """ Write all modified chunks in memory to their files. """
+        for chunk_idx, chunk in self.cache.items():
+            self.write_chunk(chunk_idx, chunk)
+
+    def append(self, item):
+        """ Add item to end of sequence.
+
+        :param item: new item
+        :type item: object
+        """
+        chunk_idx = self.length // self.chunk_size
+        self.get_chunk(chunk_idx).append(item)
+        self.modified.add(chunk_idx)
+        self.length += 1
+
+    def extend(self, items):
+        """ Add items to end of sequence, filling one chunk after the other.
+
+        :param items: new items
+        :type items: list
+        """
+        items = list(items)
+        start = 0
+        while start < len(items):
+            chunk_idx = self.length // self.chunk_size
+            num = min(self.chunk_size - self.length % self.chunk_size, len(items) - start)
+            self.get_chunk(chunk_idx).extend(items[start:start + num])
+            self.modified.add(chunk_idx)
+            self.length += num
+            start += num
+
+    def get_index(self, idx):
+        """ Get absolute index of item.
+
+        :param idx: index, may be negative
+        :type idx: int
+        :raises IndexError: if index is out of range
+        :return: absolute index
+        :rtype: int
+        """
+        if idx < 0:
+            idx += self.length
+        if not 0 <= idx < self.length:
+            raise IndexError(f"{self.name} index out of range")
+        return idx
+
+    def __len__(self):
+        return self.length
+
+    def __getitem__(self, idx):
+        if isinstance(idx, slice):
+            return [self[i] for i in range(*idx.indices(self.length))]
+        idx = self.get_index(idx)
+        return self.get_chunk(idx // self.chunk_size)[idx % self.chunk_size]
+
+    def __setitem__(self, idx, item):
+        idx = self.get_index(idx)
+        chunk_idx = idx // self.chunk_size
+        self.get_chunk(chunk_idx)[idx % self.chunk_size] = item
+        self.modified.add(chunk_idx)
+
+    def __iter__(self):
+        num_chunks = (self.length + self.chunk_size - 1) // self.chunk_size
+        for chunk_idx in range(num_chunks):
+            yield from self.get_chunk(chunk_idx)
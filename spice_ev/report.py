@@ -1,9 +1,171 @@
 import datetime
+from itertools import chain, islice, repeat
 import json
+import math
 from pathlib import Path
 import warnings
 
+import numpy as np
+
 from spice_ev import util
+from spice_ev.result_store import ResultStore
+
+
+def get_window_index(time):
+    """ Get index of time window of day used to aggregate results.
+
+    Four equally large time windows: 04-10, 10-16, 16-22, 22-04.
+
+    :param time: point in time
+    :type time: datetime.datetime
+    :return: index of time window (0-3)
+    :rtype: int
+    """
+    time_since_midnight = time - time.replace(hour=0, minute=0)
+    # shift time by four hours
+    shifted_time = time_since_midnight - datetime.timedelta(hours=4)
+    return (shifted_time // datetime.timedelta(hours=6)) % 4
+
+
+class RunStatistics:
+    """ Accumulate statistics of a simulation run, one timestep after the other.
+
+    Updated by the scenario during the simulation, so local results can be aggregated
+    without replaying the whole simulation afterwards.
+
+    :param scenario: scenario to be simulated
+    :type scenario: spice_ev.Scenario
+    """
+
+    def __init__(self, scenario):
+        components = scenario.components
+        gc_ids = components.grid_connectors.keys()
+        self.interval = scenario.interval
+        self.steps_per_hour = datetime.timedelta(hours=1) / scenario.interval
+        self.fixed_load_keys = (set(scenario.events.fixed_load_lists.keys())
+                                | set(scenario.events.local_generation_lists.keys()))
+        self.battery_parent = {batID: bat.parent for batID, bat in components.batteries.items()}
+
+        self.num_steps = 0
+        # standing of vehicles: number of standing periods, vehicle standing at last timestep?
+        self.num_standing_periods = len(components.vehicles)
+        self.standing = [False] * len(components.vehicles)
+        # number of timesteps (with standing vehicles) per time window
+        self.window_steps = [0] * 4
+        self.standing_per_window = [0] * 4
+        # power (per GC)
+        self.sum_load = {gcID: 0 for gcID in gc_ids}
+        self.max_load = {gcID: None for gcID in gc_ids}
+        self.has_load = {gcID: False for gcID in gc_ids}
+        self.sum_load_per_window = {gcID: [0] * 4 for gcID in gc_ids}
+        self.max_fixed_load = {gcID: 0 for gcID in gc_ids}
+        self.max_variable_load = {gcID: 0 for gcID in gc_ids}
+        self.sum_local_generation = {gcID: 0 for gcID in gc_ids}
+        # stationary batteries
+        self.max_battery_level = {batID: None for batID in components.batteries}
+        self.has_battery_level = {batID: False for batID in components.batteries}
+        self.battery_energy = {gcID: 0 for gcID in gc_ids}
+        # energy charged by all vehicles
+        self.vehicle_energy = 0
+
+    def update(self, current_time, socs, commands, total_load, fixed_loads, local_generation,
+               battery_levels):
+        """ Add a single simulated timestep.
+
+        :param current_time: start of timestep
+        :type current_time: datetime.datetime
+        :param socs: SoC of each vehicle (None if not connected)
+        :type socs: list
+        :param commands: charging power per charging station
+        :type commands: dict
+        :param total_load: power drawn per grid connector
+        :type total_load: dict
+        :param fixed_loads: loads without charging stations per grid connector
+        :type fixed_loads: dict
+        :param local_generation: local generation power per grid connector
+        :type local_generation: dict
+        :param battery_levels: stored energy per stationary battery
+        :type battery_levels: dict
+        """
+        self.update_steps(
+            current_time, 1, socs, commands, total_load, fixed_loads, local_generation,
+            {batID: [level] for batID, level in battery_levels.items()})
+
+    def update_steps(self, current_time, num_steps, socs, commands, total_load, fixed_loads,
+                     local_generation, battery_levels):
+        """ Add consecutive timesteps with the same results (e.g. fast-forward).
+
+        Only the stored energy of stationary batteries may differ between these timesteps.
+
+        :param current_time: start of first timestep
+        :type current_time: datetime.datetime
+        :param num_steps: number of timesteps
+        :type num_steps: int
+        :param socs: SoC of each vehicle (None if not connected)
+        :type socs: list
+        :param commands: charging power per charging station
+        :type commands: dict
+        :param total_load: power drawn per grid connector
+        :type total_load: dict
+        :param fixed_loads: loads without charging stations per grid connector
+        :type fixed_loads: dict
+        :param local_generation: local generation power per grid connector
+        :type local_generation: dict
+        :param battery_levels: stored energy per stationary battery in each timestep
+        :type battery_levels: dict
+        """
+        self.num_steps += num_steps
+        if num_steps == 1:
+            window_steps = [0] * 4
+            window_steps[get_window_index(current_time)] = 1
+        else:
+            # time windows of all timesteps at once (see get_window_index)
+            midnight = current_time.replace(hour=0, minute=0)
+            start = (current_time - midnight - datetime.timedelta(hours=4)).total_seconds()
+            seconds = start + np.arange(num_steps) * self.interval.total_seconds()
+            window_idx = (seconds // datetime.timedelta(hours=6).total_seconds()) % 4
+            window_steps = np.bincount(window_idx.astype(int), minlength=4).tolist()
+        for widx in range(4):
+            self.window_steps[widx] += window_steps[widx]
+
+        for i, soc in enumerate(socs):
+            if soc is None:
+                if self.standing[i]:
+                    # end of standing period
+                    self.num_standing_periods += 1
+                    self.standing[i] = False
+            else:
+                self.standing[i] = True
+                for widx in range(4):
+                    self.standing_per_window[widx] += window_steps[widx]
+
+        for gcID, load in total_load.items():
+            self.sum_load[gcID] += load * num_steps
+            max_load = self.max_load[gcID]
+            self.max_load[gcID] = load if max_load is None else max(max_load, load)
+            self.has_load[gcID] = self.has_load[gcID] or bool(load)
+            for widx in range(4):
+                if window_steps[widx]:
+                    self.sum_load_per_window[gcID][widx] += load * window_steps[widx]
+            self.sum_local_generation[gcID] += local_generation[gcID] * num_steps
+
+            fixed_load = sum([v for k, v in fixed_loads[gcID].items()
+                              if k in self.fixed_load_keys])
+            self.max_fixed_load[gcID] = max(self.max_fixed_load[gcID], fixed_load)
+            self.max_variable_load[gcID] = max(self.max_variable_load[gcID], load - fixed_load)
+
+        for batID, levels in battery_levels.items():
+            max_level = self.max_battery_level[batID]
+            if max_level is not None:
+                levels = [max_level, *levels]
+            self.max_battery_level[batID] = max(levels)
+            self.has_battery_level[batID] = self.has_battery_level[batID] or any(levels)
+            gcID = self.battery_parent[batID]
+            if gcID in fixed_loads:
+                power = fixed_loads[gcID].get(batID, 0)
+                self.battery_energy[gcID] += max(power, 0) * num_steps / self.steps_per_hour
+
+        self.vehicle_energy += sum([max(v, 0) for v in commands.values()]) * num_steps
 
 
 def aggregate_global_results(scenario):
@@ -78,6 +240,8 @@ def aggregate_local_results(scenario, gcID):
     json_results = {}
     steps = scenario.step_i
     stepsPerHour = scenario.stepsPerHour
+    # statistics accumulated during simulation
+    stats = scenario.run_statistics
 
     json_results["temporal_parameters"] = {
         "interval": scenario.interval.total_seconds() // 60,
@@ -113,54 +277,21 @@ def aggregate_local_results(scenario, gcID):
         "info": "charging strategy for electric vehicles"
     }
 
-    # gather info about standing and power in specific time windows
-    load_count = [[0] for _ in scenario.components.vehicles]
-    load_window = [[] for _ in range(4)]
-    count_window = [[0] * len(scenario.components.vehicles) for _ in range(4)]
-
-    cur_time = scenario.start_time - scenario.interval
-    # maximum power (fixed and variable loads)
-    max_fixed_load = 0
-    max_variable_load = 0
-    for idx in range(scenario.step_i):
-        cur_time += scenario.interval
-        time_since_midnight = cur_time - cur_time.replace(hour=0, minute=0)
-        # four equally large time_windows: 04-10, 10-16, 16-22, 22-04
-        # shift time by four hours
-        shifted_time = time_since_midnight - datetime.timedelta(hours=4)
-        # compute window index
-        widx = (shifted_time // datetime.timedelta(hours=6)) % 4
-
+    # avg flex per window
+    if scenario.flex_bands is not None:
+        sum_flex_per_window = [0] * 4
         try:
             flex = scenario.flex_bands[gcID]
-            cur_load_window = (flex["max"][idx] - flex["min"][idx], scenario.totalLoad[gcID][idx])
+            cur_time = scenario.start_time
+            for flex_max, flex_min in zip(flex["max"][:steps], flex["min"][:steps]):
+                sum_flex_per_window[get_window_index(cur_time)] += flex_max - flex_min
+                cur_time += scenario.interval
         except TypeError:
-            # flex band generation might have been skipped (scenario.flex_bands=None)
-            # or failed for this key (scenario.flex_bands[gcID] = None)
-            cur_load_window = (0, scenario.totalLoad[gcID][idx])
-        load_window[widx].append(cur_load_window)
-
-        count_window[widx] = list(map(
-            lambda c, t: c + (t is not None),
-            count_window[widx], scenario.socs[idx]))
-
-        for i, soc in enumerate(scenario.socs[idx]):
-            if soc is None and load_count[i][-1] > 0:
-                load_count[i].append(0)
-            else:
-                load_count[i][-1] += (soc is not None)
-
-        fixed_load = sum([v for k, v in scenario.fixedLoads[gcID][idx].items() if
-                          k in scenario.events.fixed_load_lists or
-                          k in scenario.events.local_generation_lists])
-        max_fixed_load = max(max_fixed_load, fixed_load)
-        var_load = scenario.totalLoad[gcID][idx] - fixed_load
-        max_variable_load = max(max_variable_load, var_load)
-
-    # avg flex per window
-    if scenario.flex_bands is not None:
-        scenario.avg_flex_per_window[gcID] = [sum([t[0] for t in w]) / len(w) if w else 0
-                                              for w in load_window]
+            # flex band generation failed for this key (scenario.flex_bands[gcID] = None)
+            pass
+        scenario.avg_flex_per_window[gcID] = [
+            flex / num_steps if num_steps else 0
+            for flex, num_steps in zip(sum_flex_per_window, stats.window_steps)]
         json_results["avg flex per window"] = {
             "04-10": scenario.avg_flex_per_window[gcID][0],
             "10-16": scenario.avg_flex_per_window[gcID][1],
@@ -172,14 +303,14 @@ def aggregate_local_results(scenario, gcID):
 
     # sum of used energy during simulation
     json_results["sum of energy"] = {
-        "value": sum(scenario.totalLoad[gcID]) / stepsPerHour,
+        "value": stats.sum_load[gcID] / stepsPerHour,
         "unit": "kWh",
         "info": "Total drawn energy from grid connection point during simulation"
     }
 
     # sum of used energy per window
-    scenario.sum_energy_per_window[gcID] = [sum([t[1] for t in w]) / stepsPerHour
-                                            for w in load_window]
+    scenario.sum_energy_per_window[gcID] = [
+        load / stepsPerHour for load in stats.sum_load_per_window[gcID]]
     json_results["sum of energy per window"] = {
         "04-10": scenario.sum_energy_per_window[gcID][0],
         "10-16": scenario.sum_energy_per_window[gcID][1],
@@ -191,19 +322,13 @@ def aggregate_local_results(scenario, gcID):
 
     # avg standing time
     # don't use info from flex band, as standing times might be interleaved
-    # remove last empty standing count
-    for counts in load_count:
-        if counts[-1] == 0:
-            counts = counts[:-1]
-    num_loads = sum(map(len, load_count))
+    total_standing = sum(stats.standing_per_window)
     avg_stand_time = scenario.avg_stand_time
-    if num_loads > 0:
-        avg_stand_time[gcID] = sum(map(sum, load_count)) / stepsPerHour / num_loads
+    if stats.num_standing_periods > 0:
+        avg_stand_time[gcID] = total_standing / stepsPerHour / stats.num_standing_periods
     else:
         avg_stand_time[gcID] = 0
     # avg total standing time
-    # count per vehicle: list(zip(*count_window))
-    total_standing = sum(map(sum, count_window))
     # avoid div0 if there are no vehicles
     num_vehicles = max(len(scenario.components.vehicles), 1)
     scenario.avg_total_standing_time[gcID] = total_standing / num_vehicles / stepsPerHour
@@ -216,9 +341,9 @@ def aggregate_local_results(scenario, gcID):
     }
 
     # percent of standing time in time window
-    scenario.perc_stand_window[gcID] = list(map(
-        lambda x: x * 100 / total_standing if total_standing > 0 else 0,
-        map(sum, count_window)))
+    scenario.perc_stand_window[gcID] = [
+        standing * 100 / total_standing if total_standing > 0 else 0
+        for standing in stats.standing_per_window]
     json_results["standing per window"] = {
         "04-10": scenario.perc_stand_window[gcID][0],
         "10-16": scenario.perc_stand_window[gcID][1],
@@ -246,8 +371,8 @@ def aggregate_local_results(scenario, gcID):
 
     # data about power in time windows
     if scenario.strategy_name == "peak_load_window":  # ToDo: Change to scenario.strat.uses_window
-        significance_threshold = ((max(scenario.totalLoad[gcID]) - scenario.strat.peak_power[gcID])
-                                  / max(scenario.totalLoad[gcID])) * 100
+        significance_threshold = ((stats.max_load[gcID] - scenario.strat.peak_power[gcID])
+                                  / stats.max_load[gcID]) * 100
         json_results["peak load time windows"] = {
             "peak power in time windows": scenario.strat.peak_power[gcID],
             "unit": "kW",
@@ -258,11 +383,11 @@ def aggregate_local_results(scenario, gcID):
         }
 
     # power peaks (fixed loads and variable loads)
-    if any(scenario.totalLoad[gcID]):
+    if stats.has_load[gcID]:
         json_results["power peaks"] = {
-            "fixed": max_fixed_load,
-            "variable": max_variable_load,
-            "total": max(scenario.totalLoad[gcID]),
+            "fixed": stats.max_fixed_load[gcID],
+            "variable": stats.max_variable_load[gcID],
+            "total": stats.max_load[gcID],
             "unit": "kW",
             "info": "Maximum drawn power, by fixed loads (building),"
                     " variable loads (charging stations, stationary batteries) "
@@ -270,7 +395,7 @@ def aggregate_local_results(scenario, gcID):
         }
 
     # average drawn power
-    scenario.avg_drawn[gcID] = sum(scenario.totalLoad[gcID]) / steps if steps > 0 else 0
+    scenario.avg_drawn[gcID] = stats.sum_load[gcID] / steps if steps > 0 else 0
     json_results["avg drawn power"] = {
         "value": scenario.avg_drawn[gcID],
         "unit": "kW",
@@ -279,7 +404,7 @@ def aggregate_local_results(scenario, gcID):
 
     # total energy from local generation
     json_results["local energy generation"] = {
-        "value": sum(scenario.localGenerationPower[gcID]) / stepsPerHour,
+        "value": stats.sum_local_generation[gcID] / stepsPerHour,
         "unit": "kWh",
         "info": "Total energy from renewable energy sources"
     }
@@ -299,15 +424,13 @@ def aggregate_local_results(scenario, gcID):
         pass
 
     # battery sizes
-    for b in scenario.batteryLevels.values():
-        if any(b):
-            bat_dict = {batName: max(values) for batName, values in
-                        scenario.batteryLevels.items()}
-            bat_dict.update({
-                "unit": "kWh",
-                "info": "Maximum stored energy in each battery by name"
-            })
-            json_results["max. stored energy in batteries"] = bat_dict
+    if any(stats.has_battery_level.values()):
+        bat_dict = dict(stats.max_battery_level)
+        bat_dict.update({
+            "unit": "kWh",
+            "info": "Maximum stored energy in each battery by name"
+        })
+        json_results["max. stored energy in batteries"] = bat_dict
 
     # charging cycles
     # stationary batteries
@@ -316,27 +439,21 @@ def aggregate_local_results(scenario, gcID):
         if scenario.components.batteries[batID].parent == gcID:
             if battery.capacity > 2 ** 63:
                 # unlimited capacity
-                max_cap = max(scenario.batteryLevels[batID])
+                max_cap = stats.max_battery_level[batID]
                 print("Battery {} is unlimited, set capacity to {} kWh".format(
                     batID, max_cap))
                 total_bat_cap += max_cap
             else:
                 total_bat_cap += battery.capacity
     if total_bat_cap:
-        total_bat_energy = 0
-        for loads in scenario.fixedLoads[gcID]:
-            for batID in scenario.components.batteries.keys():
-                if scenario.components.batteries[batID].parent == gcID:
-                    total_bat_energy += max(loads.get(batID, 0), 0) / stepsPerHour
         json_results["stationary battery cycles"] = {
-            "value": total_bat_energy / total_bat_cap,
+            "value": stats.battery_energy[gcID] / total_bat_cap,
             "unit": None,
             "info": "Number of load cycles of stationary batteries (averaged)"
         }
     # vehicles
     vehicle_cap = sum([v.battery.capacity for v in scenario.components.vehicles.values()])
-    vehicle_energy = sum([sum(map(lambda v: max(v, 0), r["commands"].values()))
-                          for r in scenario.results])
+    vehicle_energy = stats.vehicle_energy
     scenario.total_vehicle_cap[gcID] = vehicle_cap
     scenario.total_vehicle_energy[gcID] = vehicle_energy
     battery_cycles = vehicle_energy / vehicle_cap if vehicle_cap > 0 else 0
@@ -357,8 +474,45 @@ def aggregate_local_results(scenario, gcID):
     return json_results
 
 
+def round_values(values, places):
+    """ Round (array of) numbers like built-in round.
+
+    NumPy rounds scaled values, so a scaled value that ends up exactly halfway is rounded to even,
+    even if its binary value is slightly above or below. These rare cases use built-in round.
+    Negative zero becomes zero.
+
+    :param values: number or array of numbers
+    :type values: float or numpy.ndarray
+    :param places: decimal places
+    :type places: int
+    :return: rounded values
+    :rtype: float or numpy.ndarray
+    """
+    values = np.asarray(values, dtype=float)
+    scaled = values * 10 ** places
+    rounded = np.rint(scaled) / 10 ** places
+    for idx in np.flatnonzero(scaled % 1 == 0.5):
+        rounded.flat[idx] = round(float(values.flat[idx]), places)
+    return (rounded + 0)[()]
+
+
+def _integers_as_int(values):
+    """ Convert array of rounded values to list, integral values as int (e.g. 0 instead of 0.0).
+
+    Keeps the text form of timeseries files, negative zero becomes 0.
+
+    :param values: rounded values
+    :type values: numpy.ndarray
+    :return: values as int or float
+    :rtype: list
+    """
+    return [int(v) if v.is_integer() else v for v in values.tolist()]
+
+
 def split_feedin(grid, generation, cs_sum, round_to_places=3):
-    """ Split feed-in to grid into local power generation, V2G and battery for one time step.
+    """ Split feed-in to grid into local power generation, V2G and battery.
+
+    Works on single time steps as well as on whole timeseries (arrays).
 
     Order:
 
@@ -367,11 +521,11 @@ def split_feedin(grid, generation, cs_sum, round_to_places=3):
     #. rest of feed-in must come from stationary battery
 
     :param grid: current total feed-in at grid connector at time step
-    :type grid: float
+    :type grid: float or numpy.ndarray
     :param generation: current generation (e.g. PV) power at time step (as negative value)
-    :type generation: float
+    :type generation: float or numpy.ndarray
     :param cs_sum: aggregated power of discharging vehicles at grid connector at time step
-    :type cs_sum: float
+    :type cs_sum: float or numpy.ndarray
     :param round_to_places: decimal places, that each value in the result list should be rounded to
     :type round_to_places: int
     :return: list of feed-in to grid split into generation-, V2G- and battery-feed-in; in that order
@@ -380,18 +534,18 @@ def split_feedin(grid, generation, cs_sum, round_to_places=3):
 
     accumulated = grid
     # feed-in is provided by local generation first
-    generation_feedin = max(min(-generation, accumulated), 0)
-    accumulated -= generation_feedin
+    generation_feedin = np.maximum(np.minimum(-generation, accumulated), 0)
+    accumulated = accumulated - generation_feedin
     # feed-in not locally generated comes from discharging vehicles first
-    v2g_feedin = max(min(-cs_sum, accumulated), 0)
-    accumulated -= v2g_feedin
+    v2g_feedin = np.maximum(np.minimum(-cs_sum, accumulated), 0)
+    accumulated = accumulated - v2g_feedin
     # rest of feed-in must come from stationary battery
-    battery_feedin = max(accumulated, 0)
+    battery_feedin = np.maximum(accumulated, 0)
 
     return [
-        round(generation_feedin, round_to_places),
-        round(v2g_feedin, round_to_places),
-        round(battery_feedin, round_to_places)
+        round_values(generation_feedin, round_to_places),
+        round_values(v2g_feedin, round_to_places),
+        round_values(battery_feedin, round_to_places)
     ]
 
 
@@ -509,118 +663,150 @@ def aggregate_timeseries(scenario, gcID):
     # charging power per CS
     header += [str(cs_id) + " [kW]" for cs_id in cs_ids]
 
-    # accumulate timesteps
-    timeseries = []
-    for idx, r in enumerate(scenario.results):
-        # general info: timestep index and timestamp
-        # TZ removed for spreadsheet software
-        row = [idx, r['current_time'].replace(tzinfo=None)]
-        # price
-        if any(scenario.prices[gcID]):
-            row.append(scenario.prices[gcID][idx])
-        # grid power (negative since grid power is fed into system)
-        row.append(-1 * round(scenario.totalLoad[gcID][idx], round_to_places))
-        # fixed loads
-        if hasFixedLoads:
-            sumFixedLoads = sum([
-                v for k, v in scenario.fixedLoads[gcID][idx].items()
-                if k in scenario.events.fixed_load_lists])
-            row.append(round(sumFixedLoads, round_to_places))
-        # local generation (negative since power is fed into system)
-        if hasGeneration:
-            row.append(-1 * round(scenario.localGenerationPower[gcID][idx], round_to_places))
-
-        # batteries
-        if hasBatteries:
-            current_battery = {}
-            for batID in scenario.batteryLevels:
-                if scenario.components.batteries[batID].parent == gcID:
-                    current_battery.update({batID: scenario.batteryLevels[batID]})
-            row += [
-                # battery power
-                round(sum([
-                    v for k, v in scenario.fixedLoads[gcID][idx].items()
-                    if k in scenario.components.batteries]),
-                    round_to_places),
-                # battery levels
-                # get connected battery
-                round(
-                    sum([levels[idx] for levels in current_battery.values()]),
-                    round_to_places
-                )
-            ]
-
-        # flex, might not exist
-        if scenario.flex_bands is not None:
-            # max flex energy: (1-soc) * capacity for all connected vehicles
-            max_flex_energy = 0
+    # accumulate timeseries column by column (in order of header)
+    n = len(scenario.results)
+    # out-of-core: go through history chunk by chunk, otherwise all at once
+    block_size = scenario.results.chunk_size if scenario.history_dir else max(n, 1)
+    columns = []
+    # general info: timestep index and timestamp
+    columns.append(range(n))
+    # TZ removed for spreadsheet software
+    columns.append([r['current_time'].replace(tzinfo=None) for r in scenario.results])
+    # price
+    if any(scenario.prices[gcID]):
+        columns.append(scenario.prices[gcID][:n])
+    # grid power (negative since grid power is fed into system)
+    total_load = np.array(scenario.totalLoad[gcID][:n], dtype=float)
+    columns.append(round_values(-total_load, round_to_places))
+    fixed_loads = scenario.fixedLoads[gcID]
+    # fixed loads
+    if hasFixedLoads:
+        fixed_load_ids = scenario.events.fixed_load_lists
+        columns.append(round_values(np.fromiter((
+            sum([v for k, v in loads.items() if k in fixed_load_ids]) for loads in fixed_loads),
+            dtype=float), round_to_places))
+    # local generation (negative since power is fed into system)
+    generation = np.array(scenario.localGenerationPower[gcID][:n], dtype=float)
+    if hasGeneration:
+        columns.append(round_values(-generation, round_to_places))
+
+    # batteries
+    if hasBatteries:
+        battery_ids = scenario.components.batteries
+        # battery power
+        columns.append(round_values(np.fromiter((
+            sum([v for k, v in loads.items() if k in battery_ids]) for loads in fixed_loads),
+            dtype=float), round_to_places))
+        # battery levels of batteries connected to GC
+        current_battery = np.array([
+            levels[:n] for batID, levels in scenario.batteryLevels.items()
+            if scenario.components.batteries[batID].parent == gcID], dtype=float)
+        columns.append(round_values(current_battery.sum(axis=0), round_to_places))
+
+    # flex, might not exist
+    if scenario.flex_bands is not None:
+        flex_band = scenario.flex_bands[gcID]
+        if flex_band is None:
+            # no flex band for this GC
+            columns += [np.zeros(n) for _ in range(4)]
+        else:
+            columns += [
+                round_values(flex_band[key][:n], round_to_places)
+                for key in ["min", "base", "max"]]
+            # max flex energy: (1-soc) * capacity for all connected vehicles at this GC
             vids = sorted(scenario.components.vehicles.keys())
-            connected = scenario.connected[idx]
-            for vidx, vid in enumerate(vids):
-                if vid not in connected:
-                    # vehicle not connected
-                    continue
-                cs = scenario.components.charging_stations.get(connected[vid])
-                if cs is None or cs.parent != gcID:
-                    # CS not found or CS not at this GC
-                    continue
-                vehicle = scenario.components.vehicles[vid]
-                soc = scenario.socs[idx][vidx]
-                max_flex_energy += max(1-soc, 0) * vehicle.battery.capacity
-            try:
-                row += [
-                    round(scenario.flex_bands[gcID]["min"][idx], round_to_places),
-                    round(scenario.flex_bands[gcID]["base"][idx], round_to_places),
-                    round(scenario.flex_bands[gcID]["max"][idx], round_to_places),
-                    round(max_flex_energy, round_to_places),
-                ]
-            except TypeError:
-                row += [0, 0, 0, 0]
-
-        # schedule + window schedule
-        if hasSchedule:
-            row.append(round(scenario.gcPowerSchedule[gcID][idx], round_to_places))  # float
-        if hasWindows:
-            row.append(scenario.gcWindowSchedule[gcID][idx])
-
-        # charging power
+            vehicle_index = {vid: vidx for vidx, vid in enumerate(vids)}
+            capacity = np.array(
+                [scenario.components.vehicles[vid].battery.capacity for vid in vids], dtype=float)
+            gc_cs_ids = {
+                cs_id for cs_id, cs in scenario.components.charging_stations.items()
+                if cs.parent == gcID}
+            max_flex_energy = np.zeros(n)
+            num_flex_vehicles = np.zeros(n, dtype=int)
+            for start in range(0, n, block_size):
+                stop = min(start + block_size, n)
+                flex_steps, flex_vidx, flex_socs = [], [], []
+                for idx, (connected, socs) in enumerate(zip(
+                        scenario.connected[start:stop], scenario.socs[start:stop])):
+                    vidx = [vehicle_index[vid] for vid, cs_id in connected.items()
+                            if cs_id in gc_cs_ids and vid in vehicle_index]
+                    flex_steps += [idx] * len(vidx)
+                    flex_vidx += vidx
+                    flex_socs += [socs[i] for i in vidx]
+                flex_energy = (
+                    np.maximum(1 - np.array(flex_socs, dtype=float), 0) * capacity[flex_vidx])
+                max_flex_energy[start:stop] = np.bincount(
+                    flex_steps, weights=flex_energy, minlength=stop - start)
+                num_flex_vehicles[start:stop] = np.bincount(flex_steps, minlength=stop - start)
+            # sum of energy (float), 0 without connected vehicles
+            columns.append([
+                energy if num else 0 for energy, num in zip(
+                    round_values(max_flex_energy, round_to_places).tolist(),
+                    num_flex_vehicles.tolist())])
+
+    # schedule + window schedule
+    if hasSchedule:
+        columns.append(round_values(scenario.gcPowerSchedule[gcID][:n], round_to_places))
+    if hasWindows:
+        columns.append(scenario.gcWindowSchedule[gcID][:n])
+
+    # charging power: commands of CS that are connected to GC
+    cs_index = {cs_id: i for i, cs_id in enumerate(cs_ids)}
+    cs_sum = np.zeros(n)
+    uc_sums = {uc_key: np.zeros(n) for uc_key in uc_keys_present}
+    if not scenario.history_dir:
+        # individual charging power of CS that are connected to gc (one column per CS)
+        cs_columns = np.zeros((len(cs_ids), n))
+    for start in range(0, n, block_size):
+        stop = min(start + block_size, n)
+        command_steps, command_cs, command_power = _get_gc_commands(
+            scenario.results[start:stop], cs_index)
         # get sum of all current CS power that are connected to gc
-        gc_commands = {}
-        if r['commands']:
-            for k, v in r["commands"].items():
-                if k in cs_ids:
-                    gc_commands.update({k: v})
-        cs_sum = sum(gc_commands.values())
-        # feed-in per asset, i.e. PV, V2G and battery in this priority order
-        splitFeedin = split_feedin(
-            - scenario.totalLoad[gcID][idx],
-            - scenario.localGenerationPower[gcID][idx] if hasGeneration else 0,
-            min(cs_sum, 0),
-            round_to_places
-        )
-        row += [feedin for has, feedin in zip(hasFeedinComponents, splitFeedin) if has]
-        # sum of all current CS power that are connected to gc
-        row.append(round(cs_sum, round_to_places))
+        cs_sum[start:stop] = np.bincount(
+            command_steps, weights=command_power, minlength=stop - start)
         # sum up all charging power at gc for each use case
-        row += [round(sum([cs_value for cs_id, cs_value in gc_commands.items()
-                           if cs_id in cs_by_uc[uc_key]]),
-                round_to_places) for uc_key in uc_keys_present]
-        # get total number of occupied CS that are connected to gc
-        row.append(len(scenario.connChargeByTS[gcID][idx]))
-        # get number of CS that actually deliver power
-        row.append(sum(map(bool, scenario.connChargeByTS[gcID][idx].values())))
-        # get number of occupied CS at gc for each use case
-        row += [
-            sum([1 if uc_key in cs_id else 0
-                for cs_id in scenario.connChargeByTS[gcID][idx]]) for uc_key in
-            uc_keys_present]
-        # get individual charging power of cs_id that is connected to gc
-        row += [round(gc_commands.get(cs_id, 0), round_to_places) for cs_id in
-                cs_ids]
-        timeseries.append(row)
-
-    # update scenario with timeseries data
-    setattr(scenario, f"{gcID}_timeseries", dict(zip(header, map(list, zip(*timeseries)))))
+        for uc_key in uc_keys_present:
+            in_uc = np.isin(command_cs, [cs_index[cs_id] for cs_id in cs_by_uc[uc_key]])
+            uc_sums[uc_key][start:stop] = np.bincount(
+                command_steps[in_uc], weights=command_power[in_uc], minlength=stop - start)
+        if not scenario.history_dir:
+            cs_columns[command_cs, command_steps + start] = round_values(
+                command_power, round_to_places)
+    # feed-in per asset, i.e. PV, V2G and battery in this priority order
+    if any(hasFeedinComponents):
+        split_columns = split_feedin(
+            -total_load, -generation if hasGeneration else 0, np.minimum(cs_sum, 0),
+            round_to_places)
+        columns += [c for has, c in zip(hasFeedinComponents, split_columns) if has]
+    # sum of all current CS power that are connected to gc
+    columns.append(round_values(cs_sum, round_to_places))
+    # sum up all charging power at gc for each use case
+    for uc_key in uc_keys_present:
+        columns.append(round_values(uc_sums[uc_key], round_to_places))
+    occupied = scenario.connChargeByTS[gcID]
+    # get total number of occupied CS that are connected to gc
+    columns.append([len(cs_power) for cs_power in occupied])
+    # get number of CS that actually deliver power
+    columns.append([sum(map(bool, cs_power.values())) for cs_power in occupied])
+    # get number of occupied CS at gc for each use case
+    for uc_key in uc_keys_present:
+        columns.append([
+            sum([1 if uc_key in cs_id else 0 for cs_id in cs_power]) for cs_power in occupied])
+    # write lists of numbers
+    columns = [_integers_as_int(c) if isinstance(c, np.ndarray) else c for c in columns]
+
+    if scenario.history_dir:
+        # out-of-core: rows are generated chunk by chunk when needed,
+        # keep only columns without single CS
+        timeseries = _get_timeseries_rows(
+            columns, scenario.results, cs_index, block_size, round_to_places)
+        setattr(scenario, f"{gcID}_timeseries", {
+            name: list(column) for name, column in zip(header, columns)})
+    else:
+        columns += [_integers_as_int(c) for c in cs_columns]
+        timeseries = [list(row) for row in zip(*columns)]
+        setattr(scenario, f"{gcID}_timeseries", {
+            name: list(column)[:len(timeseries)] for name, column in zip(header, columns)})
 
     return {
         "header": header,
@@ -628,6 +814,143 @@ def aggregate_timeseries(scenario, gcID):
     }
 
 
+def _get_gc_commands(results, cs_index):
+    """ Get charging commands of CS that are connected to GC, flattened over given timesteps.
+
+    :param results: results of consecutive timesteps
+    :type results: list
+    :param cs_index: ID -> index of charging stations connected to GC
+    :type cs_index: dict
+    :return: timestep (relative to first result), index of charging station and power
+        of each charging command
+    :rtype: tuple of numpy.ndarray
+    """
+    step_commands = [r['commands'] or {} for r in results]
+    command_steps = np.repeat(
+        np.arange(len(step_commands)), [len(commands) for commands in step_commands])
+    command_cs = np.array(list(map(
+        cs_index.get, chain.from_iterable(step_commands), repeat(-1))), dtype=int)
+    command_power = np.fromiter(
+        chain.from_iterable(commands.values() for commands in step_commands), dtype=float,
+        count=len(command_cs))
+    at_gc = command_cs >= 0
+    return command_steps[at_gc], command_cs[at_gc], command_power[at_gc]
+
+
+def _get_timeseries_rows(columns, results, cs_index, block_size, round_to_places):
+    """ Generate rows of timeseries block by block, appending power per charging station.
+
+    :param columns: timeseries columns without single charging stations
+    :type columns: list
+    :param results: results of all timesteps (e.g. stored out-of-core)
+    :type results: list
+    :param cs_index: ID -> index of charging stations connected to GC (one column each)
+    :type cs_index: dict
+    :param block_size: number of timesteps per block
+    :type block_size: int
+    :param round_to_places: decimal places of power
+    :type round_to_places: int
+    :return: rows of timeseries
+    :rtype: generator
+    """
+    n = len(columns[0])
+    for start in range(0, n, block_size):
+        stop = min(start + block_size, n)
+        command_steps, command_cs, command_power = _get_gc_commands(
+            results[start:stop], cs_index)
+        cs_power = np.zeros((stop - start, len(cs_index)))
+        cs_power[command_steps, command_cs] = round_values(command_power, round_to_places)
+        for row, power in zip(zip(*(c[start:stop] for c in columns)), cs_power):
+            yield list(row) + _integers_as_int(power)
+
+
+def iter_column_blocks(header, rows, block_size):
+    """ Group rows of timeseries into blocks of columns (see util.write_column_blocks).
+
+    :param header: column names
+    :type header: list
+    :param rows: rows of timeseries
+    :type rows: iterable
+    :param block_size: number of rows per block
+    :type block_size: int
+    :return: column name -> list of values for each block
+    :rtype: generator
+    """
+    rows = iter(rows)
+    while True:
+        block = list(islice(rows, block_size))
+        if not block:
+            return
+        yield dict(zip(header, map(list, zip(*block))))
+
+
+def iter_disconnected_socs(scenario, block_size=None):
+    """ Get SoC of disconnected vehicles, block of timesteps by block of timesteps.
+
+    During trips (see scenario.trips), the SoC is interpolated linearly between departure
+    and arrival. The interpolated values of all trips are computed at once and assigned to
+    each block by index.
+
+    :param scenario: The scenario for which to get the SoC.
+    :type scenario: spice_ev.Scenario
+    :param block_size: number of timesteps per block (default: all timesteps in one block)
+    :type block_size: int
+    :return: for each block: SoC of every vehicle per timestep (NaN if connected or not known)
+    :rtype: iterator of numpy.ndarray
+    """
+
+    num_vehicles = len(scenario.components.vehicles)
+    trips = np.array(scenario.trips, dtype=float).reshape(-1, 5)
+    vidx, start_idx, start_soc, end_idx, end_soc = trips.T
+    # SoC during trip: interpolated from departure up to timestep before arrival
+    duration = (end_idx - start_idx).astype(int)
+    offset = np.arange(duration.sum()) - np.repeat(np.cumsum(duration) - duration, duration)
+    slope = (end_soc - start_soc) / np.where(duration > 0, duration, 1)
+    trip_idx = np.repeat(start_idx.astype(int), duration) + offset
+    trip_vidx = np.repeat(vidx.astype(int), duration)
+    trip_socs = np.repeat(slope, duration) * offset + np.repeat(start_soc, duration)
+    # sort by timestep, so each block only needs a slice
+    order = np.argsort(trip_idx, kind="stable")
+    trip_idx, trip_vidx, trip_socs = trip_idx[order], trip_vidx[order], trip_socs[order]
+
+    rows = iter(scenario.disconnect)
+    block_size = block_size or max(len(scenario.disconnect), 1)
+    block_start = 0
+    while True:
+        # missing values (None) become NaN
+        block = np.array(list(islice(rows, block_size)), dtype=float).reshape(-1, num_vehicles)
+        if not len(block):
+            return
+        lo, hi = np.searchsorted(trip_idx, [block_start, block_start + len(block)])
+        block[trip_idx[lo:hi] - block_start, trip_vidx[lo:hi]] = trip_socs[lo:hi]
+        block_start += len(block)
+        yield block
+
+
+def iter_soc_rows(scenario):
+    """ Generate SoC of all vehicles for each timestep, one timestep at a time.
+
+    Same values as generate_soc_timeseries, but the history is not kept in memory
+    (e.g. out-of-core mode).
+
+    :param scenario: The scenario for which to generate SOC timeseries.
+    :type scenario: spice_ev.Scenario
+    :return: rows of timestep index, time (without timezone) and SoC of each vehicle
+    :rtype: generator
+    """
+
+    block_size = scenario.results.chunk_size if scenario.history_dir else None
+    rows = enumerate(zip(scenario.results, scenario.socs))
+    for disconnect in iter_disconnected_socs(scenario, block_size):
+        for cur_dis in disconnect.tolist():
+            idx, (r, socs) = next(rows)
+            # TZ removed for spreadsheet software
+            row = [idx, r['current_time'].replace(tzinfo=None)]
+            # combine SOCs from connected and disconnected timesteps (NaN: not known)
+            row += [soc or (None if dis != dis else dis) for soc, dis in zip(socs, cur_dis)]
+            yield row
+
+
 def generate_soc_timeseries(scenario):
     """ Generate SoC timeseries for each vehicle.
 
@@ -636,18 +959,57 @@ def generate_soc_timeseries(scenario):
     """
 
     vids = sorted(scenario.components.vehicles.keys())
-    scenario.vehicle_socs = {vid: [] for vid in vids}
-    for ts_idx, socs in enumerate(scenario.socs):
-        for vidx, vid in enumerate(vids):
-            # combine SOCs from connected and disconnected timesteps
-            # for every time step and vehicle, exactly one of the two has
-            # a numeric value while the other contains a NoneType
-            # (except if not known, like absent at beginning or end)
-            soc = socs[vidx] or scenario.disconnect[ts_idx][vidx]
-            scenario.vehicle_socs[vid].append(soc)
-
-
-def plot(scenario):
+    shape = (len(scenario.socs), len(vids))
+    # missing values (None) become NaN
+    socs = np.array(list(scenario.socs), dtype=float).reshape(shape)
+    disconnect = next(iter_disconnected_socs(scenario), np.full(shape, np.nan))
+    # combine SOCs from connected and disconnected timesteps (same as soc or disconnect)
+    combined = np.where(np.isnan(socs) | (socs == 0), disconnect, socs)
+    scenario.vehicle_socs = {
+        vid: [None if soc != soc else soc for soc in column]
+        for vid, column in zip(vids, combined.T.tolist())}
+
+
+def downsample_envelope(values, num_buckets):
+    """ Reduce timeseries to minimum and maximum of each bucket (envelope) for plotting.
+
+    Buckets are consecutive timesteps of equal length. Gaps (None) are kept,
+    so lines stay interrupted.
+
+    :param values: timeseries, may contain None
+    :type values: list
+    :param num_buckets: number of buckets, e.g. plot width in pixels
+    :type num_buckets: int
+    :return: indices and values of points to keep (NaN for gaps)
+    :rtype: tuple of lists
+    """
+
+    y = np.array(list(values), dtype=float)
+    bucket_size = math.ceil(len(y) / max(num_buckets, 1))
+    if bucket_size <= 2:
+        # nothing to gain
+        return list(range(len(y))), y.tolist()
+    num_buckets = math.ceil(len(y) / bucket_size)
+    buckets = np.full(num_buckets * bucket_size, np.nan)
+    buckets[:len(y)] = y
+    buckets = buckets.reshape(num_buckets, bucket_size)
+    gaps = np.zeros(buckets.shape, dtype=bool)
+    gaps.flat[:len(y)] = np.isnan(y)
+    missing = np.isnan(buckets)
+    has_value = ~missing.all(axis=1)
+    offsets = np.arange(num_buckets) * bucket_size
+    # index of minimum, maximum and first gap per bucket
+    indices = np.concatenate([
+        (np.where(missing, np.inf, buckets).argmin(axis=1) + offsets)[has_value],
+        (np.where(missing, -np.inf, buckets).argmax(axis=1) + offsets)[has_value],
+        (gaps.argmax(axis=1) + offsets)[gaps.any(axis=1)],
+    ])
+    # sorted, without duplicates
+    indices = np.unique(indices)
+    return indices.tolist(), y[indices].tolist()
+
+
+def plot(scenario, plot_file=None, show=True):
     """ Plot various timeseries collected over the duration of the simulation.
 
     Generated plots:
@@ -659,63 +1021,117 @@ def plot(scenario):
         grid connectors, charging stations, local power generation and batteries
     #. Price over time per grid connector
 
+    Long timeseries are reduced to their envelope (minimum and maximum)
+    per pixel of the plot width. When shown in a window, the envelope of the visible
+    part is recomputed after zooming or panning.
+
     :param scenario: The scenario for which to generate the plots.
     :type scenario: spice_ev.Scenario
+    :param plot_file: save figure to this file (file type by extension, e.g. .png, .pdf)
+    :type plot_file: str or pathlib.Path
+    :param show: show figure in window
+    :type show: bool
     """
 
-    import matplotlib.pyplot as plt
+    import matplotlib.dates
+    if show:
+        import matplotlib.pyplot as plt
+        fig = plt.figure()
+    else:
+        # headless: figure without pyplot, backend of process is not changed
+        import matplotlib.figure
+        fig = matplotlib.figure.Figure()
 
     print('Done. Create plots...')
 
+    if plot_file:
+        # set size first: number of plotted points depends on width
+        fig.set_size_inches(16, 9)
+
     xlabels = []
     for r in scenario.results:
         xlabels.append(r['current_time'])
+    # full timeseries of plotted lines of each axes (to update envelope)
+    full_lines = {}
+
+    def update_envelope(ax):
+        # envelope of visible timesteps, depending on width of axes in pixels
+        x_num = matplotlib.dates.date2num(xlabels)
+        x_min, x_max = ax.get_xlim()
+        start = max(int(np.searchsorted(x_num, x_min)) - 1, 0)
+        end = int(np.searchsorted(x_num, x_max, side="right")) + 1
+        num_buckets = int(ax.get_window_extent().width)
+        for line, values in full_lines[ax]:
+            indices, y = downsample_envelope(values[start:end], num_buckets)
+            line.set_data([xlabels[start + idx] for idx in indices], y)
+
+    def plot_lines(ax, columns, *args, step=False, **kwargs):
+        # plot each timeseries reduced to envelope, depending on width of axes in pixels
+        num_buckets = int(ax.get_window_extent().width)
+        lines = []
+        for values in columns:
+            values = list(values)
+            indices, y = downsample_envelope(values, num_buckets)
+            x = [xlabels[idx] for idx in indices]
+            if step:
+                new_lines = ax.step(x, y, *args, where='post', **kwargs)
+            else:
+                new_lines = ax.plot(x, y, *args, **kwargs)
+            if show:
+                if ax not in full_lines:
+                    full_lines[ax] = []
+                    ax.callbacks.connect("xlim_changed", update_envelope)
+                full_lines[ax] += [(line, values) for line in new_lines]
+            lines += new_lines
+        return lines
 
     # plot stationary batteries
     if scenario.batteryLevels:
         plots_top_row = 3
-        ax = plt.subplot(2, plots_top_row, 3)
+        ax = fig.add_subplot(2, plots_top_row, 3)
         ax.set_title('Stationary Batteries')
         ax.set(ylabel='Stored power in kWh')
         for name, values in scenario.batteryLevels.items():
-            ax.plot(xlabels, values, label=name)
+            plot_lines(ax, [values], label=name)
         ax.legend()
     else:
         plots_top_row = 2
 
     # plot vehicles
-    ax = plt.subplot(2, plots_top_row, 1)
+    ax = fig.add_subplot(2, plots_top_row, 1)
     ax.set_title('Vehicles')
     ax.set(ylabel='SoC')
     if any(scenario.socs):
-        lines = ax.plot(xlabels, scenario.socs)
+        lines = plot_lines(ax, zip(*scenario.socs))
         # reset color cycle, so lines have same color
         ax.set_prop_cycle(None)
 
-        ax.plot(xlabels, scenario.disconnect, '--')
+        disconnect = next(iter_disconnected_socs(scenario))
+        plot_lines(ax, [[None if soc != soc else soc for soc in column]
+                        for column in disconnect.T.tolist()], '--')
         if len(scenario.components.vehicles) <= 10:
             ax.legend(lines, sorted(scenario.components.vehicles.keys()))
 
     # plot charging stations
-    ax = plt.subplot(2, plots_top_row, 2)
+    ax = fig.add_subplot(2, plots_top_row, 2)
     ax.set_title('Charging Stations')
     ax.set(ylabel='Power in kW')
     if any(scenario.sum_cs):
-        lines = ax.step(xlabels, scenario.sum_cs, where='post')
+        lines = plot_lines(ax, zip(*scenario.sum_cs), step=True)
         if len(scenario.components.charging_stations) <= 10:
             ax.legend(lines, sorted(scenario.components.charging_stations.keys()))
 
     # plot all power sources
-    ax = plt.subplot(2, 2, 3)
+    ax = fig.add_subplot(2, 2, 3)
     # charging stations
     if any(scenario.sum_cs):
-        ax.step(xlabels, list([sum(cs) for cs in scenario.sum_cs]),
-                label="Charging Stations", where='post')
+        plot_lines(ax, [[sum(cs) for cs in scenario.sum_cs]],
+                   label="Charging Stations", step=True)
     # other loads
     gc_ids = scenario.components.grid_connectors.keys()
     for gcID in gc_ids:
         for name, values in scenario.loads[gcID].items():
-            ax.step(xlabels, values, label=name, where='post')
+            plot_lines(ax, [values], label=name, step=True)
     # draw time windows
     if scenario.strat.uses_window:
         # get list with boolean values for timesteps inside/outside window for each grid connector
@@ -725,8 +1141,8 @@ def plot(scenario):
             try:
                 # plot dashed line at peak power
                 # show label only once in legend
-                plt.axhline(y=max(window_loads), color='k', linestyle='--',
-                            label=f"{gc_idx * '_'}peak power")
+                ax.axhline(y=max(window_loads), color='k', linestyle='--',
+                           label=f"{gc_idx * '_'}peak power")
             except ValueError:
                 # window_loads may be empty, can't use max then -> no line
                 pass
@@ -755,35 +1171,37 @@ def plot(scenario):
     if scenario.strat.uses_schedule:
         for gcID, schedule in scenario.gcPowerSchedule.items():
             if any(s is not None for s in schedule):
-                ax.step(xlabels, schedule, label="Schedule {}".format(gcID), where='post')
+                plot_lines(ax, [schedule], label="Schedule {}".format(gcID), step=True)
     # total power
-    ax.step(xlabels, scenario.all_totalLoad, label="Total", where='post')
+    plot_lines(ax, [scenario.all_totalLoad], label="Total", step=True)
     ax.set_title('Total Power')
     ax.set(ylabel='Power in kW')
     ax.legend()
     ax.xaxis_date()  # xaxis are datetime objects
 
     # plot prices
-    ax = plt.subplot(2, 2, 4)
-    prices = list(zip(*scenario.prices.values()))
-    lines = ax.step(xlabels, prices, where='post')
+    ax = fig.add_subplot(2, 2, 4)
+    lines = plot_lines(ax, scenario.prices.values(), step=True)
     ax.set_title('Price')
     ax.set(ylabel='Price in ct/kWh')
     if len(gc_ids) <= 10:
         ax.legend(lines, sorted(gc_ids))
 
     # figure title
-    fig = plt.gcf()
     fig.suptitle('Strategy: {}'.format(scenario.strat.description), fontweight='bold')
 
     # fig.autofmt_xdate()  # rotate xaxis labels (dates) to fit
     # autofmt removes some axis labels, so rotate by hand:
     for ax in fig.get_axes():
         ax.set_xlim(scenario.start_time, scenario.stop_time)
-        plt.setp(ax.get_xticklabels(), rotation=30, ha='right')
+        for label in ax.get_xticklabels():
+            label.set(rotation=30, ha='right')
 
-    plt.subplots_adjust(hspace=0.5)
-    plt.show()
+    fig.subplots_adjust(hspace=0.5)
+    if plot_file:
+        fig.savefig(plot_file, bbox_inches="tight")
+    if show:
+        plt.show()
 
 
 def generate_reports(scenario, options):
@@ -799,12 +1217,14 @@ def generate_reports(scenario, options):
     cost_calculation = options.get("cost_calculation")
     save_timeseries = options.get("save_timeseries")
     save_results = options.get("save_results")
+    save_db = options.get("save_db")
     flex_report = not options.get("skip_flex_report")
     save_soc = options.get("save_soc")
     testing = options.get("testing")
     visual = options.get("visual")
+    plot_file = options.get("plot_file")
 
-    if save_results or testing:
+    if save_results or save_db or testing:
         # initialize aggregation variables with empty dicts
         for var in ["avg_drawn", "total_vehicle_cap", "avg_stand_time",
                     "total_vehicle_energy", "avg_needed_energy", "perc_stand_window",
@@ -812,10 +1232,21 @@ def generate_reports(scenario, options):
             setattr(scenario, var, {})
 
     if flex_report:
-        scenario.flex_bands = {}
-        if 'generate_flex_band' not in locals().keys():
-            # cyclic dependency: import when needed
-            from spice_ev.generate.generate_schedule import generate_flex_band
+        # cyclic dependency: import when needed
+        from spice_ev.generate.generate_schedule import generate_flex_band, generate_flex_bands
+        gc_ids = sorted(scenario.components.grid_connectors.keys())
+        try:
+            # all GCs in one replay of events, optionally in worker processes
+            scenario.flex_bands = generate_flex_bands(
+                scenario, gc_ids, processes=int(options.get("PROCESSES", 1)))
+        except Exception:
+            # generate flex band of each GC on its own, skip GCs that fail
+            scenario.flex_bands = {}
+            for gcID in gc_ids:
+                try:
+                    scenario.flex_bands[gcID] = generate_flex_band(scenario, gcID)
+                except Exception:
+                    scenario.flex_bands[gcID] = None
     else:
         scenario.flex_bands = None
 
@@ -823,26 +1254,35 @@ def generate_reports(scenario, options):
     if save_results and Path(save_results).suffix != ".json":
         # general results should be JSON
         print("File extension mismatch: results file should be of type .json")
-    if save_soc and Path(save_soc).suffix != ".csv":
-        # vehicle SoC should be CSV
-        print("File extension mismatch: SoC timeseries file should be of type .csv")
-    if save_timeseries and Path(save_timeseries).suffix != ".csv":
-        # timeseries data should be CSV
-        print("File extension mismatch: timeseries file should be of type .csv")
+    # timeseries data and vehicle SoC: CSV or binary columnar format
+    timeseries_formats = [".csv"] + util.COLUMNAR_FORMATS
+    if save_soc and Path(save_soc).suffix not in timeseries_formats:
+        print("File extension mismatch: SoC timeseries file should be of type "
+              f"{', '.join(timeseries_formats)}")
+    if save_timeseries and Path(save_timeseries).suffix not in timeseries_formats:
+        print("File extension mismatch: timeseries file should be of type "
+              f"{', '.join(timeseries_formats)}")
+
+    # results and timeseries to store in database
+    db_results = {}
+    db_timeseries = {}
 
     gc_ids = sorted(scenario.components.grid_connectors.keys())
     for gcID in gc_ids:
-        if flex_report:
-            try:
-                scenario.flex_bands[gcID] = generate_flex_band(scenario, gcID)
-            except Exception:
-                scenario.flex_bands[gcID] = None
-        if cost_calculation or save_timeseries:
+        if cost_calculation or save_timeseries or save_db:
             # aggregate timeseries info
             agg_ts = aggregate_timeseries(scenario, gcID)
-        if save_results or testing:
+        if save_results or save_db or testing:
             # aggregate GC dependent info
             results_file_content = aggregate_local_results(scenario=scenario, gcID=gcID)
+        if save_db:
+            # skip columns of single CS
+            cs_columns = {f"{cs_id} [kW]" for cs_id, cs in
+                          scenario.components.charging_stations.items() if cs.parent == gcID}
+            db_results[gcID] = results_file_content
+            db_timeseries[gcID] = {
+                name: values for name, values in getattr(scenario, f"{gcID}_timeseries").items()
+                if name not in cs_columns}
         if save_results:
             # write general results to file
             fpath = Path(save_results)
@@ -860,42 +1300,68 @@ def generate_reports(scenario, options):
                 fpath = fpath.parent / f"{fpath.stem}_{util.sanitize(gcID)}{fpath.suffix}"
             if len(str(fpath.resolve())) > 260:
                 warnings.warn(f"Path length of {gcID} timeseries exceeds 260 characters.")
-            with fpath.open('w') as timeseries_file:
-                # write header
-                timeseries_file.write(','.join(agg_ts["header"]))
-                # write timestep data
-                for row in agg_ts["timeseries"]:
-                    timeseries_file.write('\n' + ','.join(map(lambda x: str(x), row)))
+            if fpath.suffix in util.COLUMNAR_FORMATS and scenario.history_dir:
+                # out-of-core: write columns chunk by chunk
+                util.write_column_blocks(fpath, agg_ts["header"], iter_column_blocks(
+                    agg_ts["header"], agg_ts["timeseries"], scenario.results.chunk_size))
+            elif fpath.suffix in util.COLUMNAR_FORMATS:
+                # write all columns at once
+                columns = getattr(scenario, f"{gcID}_timeseries")
+                util.write_columns(fpath, {name: columns.get(name, [])
+                                           for name in agg_ts["header"]})
+            else:
+                with fpath.open('w') as timeseries_file:
+                    # write header
+                    timeseries_file.write(','.join(agg_ts["header"]))
+                    # write timestep data
+                    for row in agg_ts["timeseries"]:
+                        timeseries_file.write('\n' + ','.join(map(lambda x: str(x), row)))
+
+    if save_db:
+        # store results of all GCs as one run
+        with ResultStore(save_db) as store:
+            store.add_run(scenario, db_results, db_timeseries, options=options,
+                          name=options.get("input"), resolution=options.get("db_resolution"))
 
     # GC-independent stuff
 
-    if attach_vehicle_soc or save_soc:
+    if attach_vehicle_soc and scenario.history_dir:
+        warnings.warn("Vehicle SoC is not attached in out-of-core mode, use save_soc instead.")
+    elif attach_vehicle_soc or (save_soc and not scenario.history_dir):
         # generate (continuous) SoC of vehicles
         scenario.vehicle_socs = {}
         generate_soc_timeseries(scenario=scenario)
     if save_soc:
-        # write vehicle SoC per timestep to file
         vids = sorted(scenario.components.vehicles.keys())
+        header = ["timestep", "time"] + vids
         if len(str(Path(save_soc).resolve())) > 260:
             warnings.warn("Path length of SoC timeseries exceeds 260 characters.")
+    if save_soc and Path(save_soc).suffix in util.COLUMNAR_FORMATS:
+        if scenario.history_dir:
+            # out-of-core: write columns of vehicle SoC chunk by chunk
+            util.write_column_blocks(save_soc, header, iter_column_blocks(
+                header, iter_soc_rows(scenario), scenario.results.chunk_size))
+        else:
+            # write all columns of vehicle SoC at once
+            util.write_columns(save_soc, {
+                "timestep": range(len(scenario.results)),
+                "time": [r['current_time'].replace(tzinfo=None) for r in scenario.results],
+                **scenario.vehicle_socs
+            })
+    elif save_soc:
+        # write vehicle SoC per timestep to file
         with open(save_soc, "w") as soc_file:
             # write header
-            header = ["timestep", "time"] + vids
             soc_file.write(','.join(header))
-            for idx, r in enumerate(scenario.results):
-                # general info: timestep index and timestamp
-                # TZ removed for spreadsheet software
-                row = [idx, str(r['current_time'].replace(tzinfo=None))]
-
-                row += [scenario.vehicle_socs[vid][idx] for vid in vids]
+            for row in iter_soc_rows(scenario):
                 # write row to file
                 soc_file.write('\n' + ','.join(map(lambda x: str(x), row)))
 
-    if visual or testing:
+    if visual or plot_file or testing:
         aggregate_global_results(scenario)
-    if visual:
+    if visual or plot_file:
         # plot!
-        plot(scenario)
+        plot(scenario, plot_file=plot_file, show=bool(visual))
     if testing:
         # metadata, used in tests
         scenario.testing = {
@@ -913,8 +1379,9 @@ def generate_reports(scenario, options):
             "avg_total_standing_time": scenario.avg_total_standing_time,
             "avg_needed_energy": scenario.avg_needed_energy,
             "avg_drawn_power": scenario.avg_drawn,
-            "sum_local_generation_per_h": {gcID: (sum(scenario.localGenerationPower[gcID])
-                                                  / scenario.stepsPerHour) for gcID in gc_ids},
+            "sum_local_generation_per_h": {
+                gcID: scenario.run_statistics.sum_local_generation[gcID] / scenario.stepsPerHour
+                for gcID in gc_ids},
             "vehicle_battery_cycles": {
                 # battery cycle: full charge of battery
                 # => total cycles: how often can batteries be fully charged with loaded energy
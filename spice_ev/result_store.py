@@ -0,0 +1,270 @@
+import datetime
+import json
+from pathlib import Path
+import sqlite3
+
+# default resolution of stored timeseries in minutes
+DEFAULT_RESOLUTION = 60
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    run_id INTEGER PRIMARY KEY,
+    name TEXT,
+    created TEXT,
+    strategy TEXT,
+    start_time TEXT,
+    interval REAL,
+    n_intervals INTEGER,
+    options TEXT
+);
+CREATE TABLE IF NOT EXISTS grid_connectors (
+    run_id INTEGER NOT NULL REFERENCES runs(run_id),
+    gc_id TEXT NOT NULL,
+    max_power REAL,
+    voltage_level TEXT,
+    grid_operator TEXT,
+    results TEXT,
+    PRIMARY KEY (run_id, gc_id)
+);
+CREATE TABLE IF NOT EXISTS result_values (
+    run_id INTEGER NOT NULL REFERENCES runs(run_id),
+    gc_id TEXT NOT NULL,
+    key TEXT NOT NULL,
+    value REAL,
+    unit TEXT
+);
+CREATE TABLE IF NOT EXISTS timeseries (
+    run_id INTEGER NOT NULL REFERENCES runs(run_id),
+    gc_id TEXT NOT NULL,
+    name TEXT NOT NULL,
+    step INTEGER NOT NULL,
+    time TEXT,
+    value REAL,
+    PRIMARY KEY (run_id, gc_id, name, step)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS runs_strategy ON runs(strategy);
+CREATE INDEX IF NOT EXISTS grid_connectors_max_power ON grid_connectors(max_power);
+CREATE INDEX IF NOT EXISTS result_values_key ON result_values(key, value);
+CREATE INDEX IF NOT EXISTS result_values_run ON result_values(run_id, gc_id);
+"""
+
+
+def flatten_results(results, prefix=""):
+    """ Get numeric values of aggregated results (see report.aggregate_local_results).
+
+    Nested keys are joined by slashes, e.g. *power peaks/total*.
+    Strings, lists and *None* are skipped.
+
+    :param results: aggregated results of one grid connector
+    :type results: dict
+    :param prefix: prefix of keys
+    :type prefix: str
+    :return: key, value and unit of each numeric value
+    :rtype: list of tuples
+    """
+    values = []
+    unit = results.get("unit")
+    for key, value in results.items():
+        if key in ["unit", "info"]:
+            continue
+        key = prefix + str(key)
+        if isinstance(value, dict):
+            values += [
+                (k, v, u if u is not None else unit)
+                for k, v, u in flatten_results(value, key + '/')]
+        elif isinstance(value, (int, float)):
+            values.append((key, float(value), unit))
+    return values
+
+
+def downsample(values, factor):
+    """ Average consecutive blocks of values. *None* values are ignored.
+
+    :param values: values to downsample
+    :type values: list
+    :param factor: number of values per block
+    :type factor: int
+    :return: average of each block (None if block has no values)
+    :rtype: list
+    """
+    averages = []
+    for start in range(0, len(values), factor):
+        block = [float(v) for v in values[start:start+factor] if v is not None]
+        averages.append(sum(block) / len(block) if block else None)
+    return averages
+
+
+class ResultStore:
+    """ SQLite database of simulation results, to archive and query many runs.
+
+    Each run stores its metadata, the aggregated results of each grid connector
+    (complete and as indexed numeric values) and downsampled timeseries.
+    All inserts of a run are done in a single transaction.
+
+    :param path: path to database file, created if missing
+    :type path: str or pathlib.Path
+    :param timeout: seconds to wait for other connections to release the database
+    :type timeout: float
+    """
+
+    def __init__(self, path, timeout=60):
+        self.path = Path(path)
+        self.connection = sqlite3.connect(self.path, timeout=timeout)
+        with self.connection:
+            self.connection.executescript(SCHEMA)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        """ Close connection to database. """
+        self.connection.close()
+
+    def add_run(self, scenario, results, timeseries=None, options=None, name=None,
+                resolution=None):
+        """ Store results of one simulation run.
+
+        :param scenario: simulated scenario
+        :type scenario: spice_ev.Scenario
+        :param results: aggregated results by grid connector ID
+            (see report.aggregate_local_results)
+        :type results: dict
+        :param timeseries: columns by grid connector ID (e.g. scenario.<gcID>_timeseries).
+            Columns without numeric values are skipped.
+        :type timeseries: dict
+        :param options: simulation options, stored as JSON (events are skipped)
+        :type options: dict
+        :param name: name of run, e.g. scenario file
+        :type name: str
+        :param resolution: resolution of stored timeseries in minutes,
+            defaults to DEFAULT_RESOLUTION (never finer than scenario interval)
+        :type resolution: float
+        :return: ID of new run
+        :rtype: int
+        """
+        options = {k: v for k, v in (options or {}).items() if k != "events"}
+        interval = scenario.interval.total_seconds() / 60
+        factor = max(round((resolution or DEFAULT_RESOLUTION) / interval), 1)
+
+        with self.connection:
+            cursor = self.connection.execute(
+                "INSERT INTO runs (name, created, strategy, start_time, interval, n_intervals, "
+                "options) VALUES (?, ?, ?, ?, ?, ?, ?)", (
+                    None if name is None else str(name),
+                    datetime.datetime.now().isoformat(timespec="seconds"),
+                    getattr(scenario, "strategy_name", None),
+                    scenario.start_time.isoformat(),
+                    interval,
+                    scenario.n_intervals,
+                    json.dumps(options, default=str)))
+            run_id = cursor.lastrowid
+
+            for gcID, gc_results in results.items():
+                gc = scenario.components.grid_connectors[gcID]
+                self.connection.execute(
+                    "INSERT INTO grid_connectors VALUES (?, ?, ?, ?, ?, ?)", (
+                        run_id, gcID, gc.max_power, gc.voltage_level, gc.grid_operator,
+                        json.dumps(gc_results, default=str)))
+                self.connection.executemany(
+                    "INSERT INTO result_values VALUES (?, ?, ?, ?, ?)",
+                    ((run_id, gcID, k, v, u) for k, v, u in flatten_results(gc_results)))
+
+            for gcID, columns in (timeseries or {}).items():
+                times = columns.get("time") or []
+                times = [t.isoformat() for t in times[::factor]]
+                for col_name, values in columns.items():
+                    if col_name in ["timestep", "time"]:
+                        continue
+                    try:
+                        values = downsample(values, factor)
+                    except (TypeError, ValueError):
+                        # not numeric
+                        continue
+                    self.connection.executemany(
+                        "INSERT INTO timeseries VALUES (?, ?, ?, ?, ?, ?)",
+                        ((run_id, gcID, col_name, step, times[step] if step < len(times) else None,
+                          value) for step, value in enumerate(values)))
+        return run_id
+
+    def get_runs(self, strategy=None):
+        """ Get metadata of stored runs.
+
+        :param strategy: only get runs of this strategy
+        :type strategy: str
+        :return: metadata of each run (options as dict)
+        :rtype: list of dicts
+        """
+        query = "SELECT * FROM runs"
+        params = []
+        if strategy is not None:
+            query += " WHERE strategy = ?"
+            params.append(strategy)
+        cursor = self.connection.execute(query + " ORDER BY run_id", params)
+        keys = [d[0] for d in cursor.description]
+        runs = [dict(zip(keys, row)) for row in cursor]
+        for run in runs:
+            run["options"] = json.loads(run["options"])
+        return runs
+
+    def query(self, key, max_power=None, strategy=None):
+        """ Get a single value of aggregated results of all matching grid connectors.
+
+        Example: peak power of every run with GC limit 400 kW:
+        *query("power peaks/total", max_power=400)*
+
+        :param key: flattened key of value, see flatten_results
+        :type key: str
+        :param max_power: only include grid connectors with this maximum power
+        :type max_power: float
+        :param strategy: only include runs of this strategy
+        :type strategy: str
+        :return: run ID, grid connector ID and value
+        :rtype: list of tuples
+        """
+        query = ("SELECT v.run_id, v.gc_id, v.value FROM result_values v "
+                 "JOIN grid_connectors g ON v.run_id = g.run_id AND v.gc_id = g.gc_id "
+                 "JOIN runs r ON v.run_id = r.run_id WHERE v.key = ?")
+        params = [key]
+        if max_power is not None:
+            query += " AND g.max_power = ?"
+            params.append(max_power)
+        if strategy is not None:
+            query += " AND r.strategy = ?"
+            params.append(strategy)
+        return self.connection.execute(query + " ORDER BY v.run_id, v.gc_id", params).fetchall()
+
+    def get_results(self, run_id, gc_id):
+        """ Get complete aggregated results of one grid connector.
+
+        :param run_id: ID of run
+        :type run_id: int
+        :param gc_id: ID of grid connector
+        :type gc_id: str
+        :return: aggregated results or None if not found
+        :rtype: dict
+        """
+        row = self.connection.execute(
+            "SELECT results FROM grid_connectors WHERE run_id = ? AND gc_id = ?",
+            (run_id, gc_id)).fetchone()
+        return None if row is None else json.loads(row[0])
+
+    def get_timeseries(self, run_id, gc_id, name):
+        """ Get downsampled timeseries of one grid connector.
+
+        :param run_id: ID of run
+        :type run_id: int
+        :param gc_id: ID of grid connector
+        :type gc_id: str
+        :param name: name of timeseries column, e.g. *grid supply [kW]*
+        :type name: str
+        :return: timestamps and values
+        :rtype: tuple of lists
+        """
+        rows = self.connection.execute(
+            "SELECT time, value FROM timeseries WHERE run_id = ? AND gc_id = ? AND name = ? "
+            "ORDER BY step", (run_id, gc_id, name)).fetchall()
+        times = [None if t is None else datetime.datetime.fromisoformat(t) for t, _ in rows]
+        return times, [v for _, v in rows]
@@ -1,10 +1,12 @@
 #!/usr/bin/env python3
 
 import datetime
+import math
 import traceback
 from warnings import warn
 
 from spice_ev import components, events, strategy, util, report
+from spice_ev.history import ChunkedList
 
 
 class Scenario:
@@ -54,6 +56,64 @@ class Scenario:
             gc = self.components.grid_connectors[gc_id]
             gc.add_avg_fixed_load_week(fixed_load_list, self.interval)
 
+    def get_quiescent_steps(self, strat, event_steps, step_i, departed_vehicles):
+        """ Get number of timesteps from step_i on in which nothing happens.
+
+        A timestep is quiescent if no events are due, no vehicle is connected (all vehicles have
+        departed) and stationary batteries stay unused, so only losses change their SoC (strategy
+        must support this, see Strategy.battery_stays_idle). The strategy must allow fast-forward,
+        i.e. do nothing in this case. Results of quiescent timesteps equal those of the previous
+        timestep, except for battery losses.
+
+        :param strat: strategy of current simulation
+        :type strat: spice_ev.strategy.Strategy
+        :param event_steps: new events for each timestep
+        :type event_steps: list
+        :param step_i: index of current timestep (not yet simulated)
+        :type step_i: int
+        :param departed_vehicles: vehicle ID -> (index when left, soc when left)
+        :type departed_vehicles: dict
+        :return: number of quiescent timesteps starting with step_i
+        :rtype: int
+        """
+        if step_i == 0 or not strat.allow_fast_forward:
+            # strategy must have run at least once with current state
+            return 0
+        for b_id in strat.world_state.batteries:
+            if not (strat.fast_forward_batteries and strat.battery_stays_idle(b_id)):
+                return 0
+        for vid, vehicle in strat.world_state.vehicles.items():
+            if vehicle.connected_charging_station is not None or vid not in departed_vehicles:
+                return 0
+            if (vehicle.estimated_time_of_departure is not None
+                    and vehicle.estimated_time_of_departure > strat.current_time):
+                # vehicle not departed yet
+                return 0
+
+        return max(self.get_next_event_step(strat, event_steps, step_i) - step_i, 0)
+
+    def get_next_event_step(self, strat, event_steps, step_i):
+        """ Get index of first timestep from step_i on with new or due events.
+
+        :param strat: strategy of current simulation
+        :type strat: spice_ev.strategy.Strategy
+        :param event_steps: new events for each timestep
+        :type event_steps: list
+        :param step_i: index of first timestep to check
+        :type step_i: int
+        :return: index of timestep with events or number of timesteps if there are none
+        :rtype: int
+        """
+        stop_i = step_i
+        while stop_i < self.n_intervals and not event_steps[stop_i]:
+            stop_i += 1
+        # known future events (start time in timestep with index x: x - 1 < start_step <= x)
+        if strat.world_state.future_events:
+            start_step = ((strat.world_state.future_events[0].start_time - self.start_time)
+                          / self.interval)
+            stop_i = min(stop_i, math.ceil(start_step))
+        return stop_i
+
     def run(self, strategy_name, options):
         """ Run the scenario.
 
@@ -82,21 +142,48 @@ class Scenario:
         results = []  # for each ts: time and commands for each GC
         totalLoad = {gcID: [] for gcID in gc_ids}  # for each GC: list of loads
         connected = []  # for each ts: charging station for each vehicle at start of ts
-        disconnect = []  # for each ts: interpolated soc for all unconnected vehicles
+        disconnect = []  # for each ts: soc of unconnected vehicles (not during trips)
         fixedLoads = {gcID: [] for gcID in gc_ids}  # for each GC: list of fixed loads
         batteryLevels = {k: [] for k in self.components.batteries.keys()}  # stat. bats: list of soc
         connChargeByTS = {gcID: [] for gcID in gc_ids}  # for each GC: list of summed CS power
         gcPowerSchedule = {gcID: [] for gcID in gc_ids}  # for each GC: schedule
         gcWindowSchedule = {gcID: [] for gcID in gc_ids}  # for each GC: time windows (bool/None)
         departed_vehicles = {}  # vehicle id -> (index when left, soc when left)
+        trips = []  # (vehicle index, index when left, soc when left, index back, soc back)
         gcWithinPowerLimit = True  # flag: all GC are within their limit
         localGenerationPower = {gcID: [] for gcID in gc_ids}  # for each GC: list of generated power
+        run_statistics = report.RunStatistics(self)  # statistics, updated after each timestep
+
+        history_dir = options.get("out_of_core")
+        if history_dir:
+            # out-of-core: keep large per-step records in chunk files, only few chunks in memory
+            socs, connected, disconnect, results = [
+                ChunkedList(history_dir, name)
+                for name in ["socs", "connected", "disconnect", "results"]]
+            fixedLoads = {gcID: ChunkedList(history_dir, f"fixedLoads_{i}")
+                          for i, gcID in enumerate(gc_ids)}
+            connChargeByTS = {gcID: ChunkedList(history_dir, f"connChargeByTS_{i}")
+                              for i, gcID in enumerate(gc_ids)}
+
+        # adaptive time resolution: maximum number of timesteps combined into one strategy step
+        max_steps_per_ts = 1
+        if options.get("adaptive_interval"):
+            if strat.allow_adaptive_interval:
+                max_steps_per_ts = max(int(
+                    datetime.timedelta(minutes=options["adaptive_interval"]) // self.interval), 1)
+            else:
+                warn(f"Strategy {strategy_name} does not support adaptive interval, ignored")
 
         begin = datetime.datetime.now()
         error = None
         step_i = -1
+        skip_until = 0  # index of next timestep (previous ones might have been combined)
         for step_i in range(self.n_intervals):
 
+            if step_i < skip_until:
+                # timestep already simulated (fast-forward or adaptive interval)
+                continue
+
             if options.get("timing", False):
                 # show estimated time until finished after each simulation step
                 # get time since start
@@ -123,12 +210,71 @@ class Scenario:
                         '.' * (width - progress)
                     ), end="", flush=True)
 
+            if options.get("fast_forward", False) and error is None:
+                num_steps = self.get_quiescent_steps(
+                    strat, event_steps, step_i, departed_vehicles)
+                if num_steps > 0:
+                    # repeat results of previous timestep for all quiescent timesteps at once
+                    num_vehicles = len(strat.world_state.vehicles)
+                    if strat.interval != self.interval:
+                        # previous timestep may have been longer (adaptive interval)
+                        strat.set_interval(self.interval)
+                    times = [strat.current_time + (i + 1) * self.interval
+                             for i in range(num_steps)]
+                    strat.current_time = times[-1]
+                    socs.extend([[None] * num_vehicles] * num_steps)
+                    connected.extend([{}] * num_steps)
+                    disconnect.extend([[None] * num_vehicles] * num_steps)
+                    results.extend({'current_time': t, 'commands': {}} for t in times)
+                    # stored energy at start of each timestep: decays by losses only
+                    levels = {}
+                    for batName, bat in strat.world_state.batteries.items():
+                        levels[batName] = [bat.soc * bat.capacity] * num_steps
+                        if bat.loss_rate:
+                            levels[batName][1:] = (
+                                bat.get_soc_after_losses(num_steps - 1) * bat.capacity).tolist()
+                        batteryLevels[batName].extend(levels[batName])
+                    strat.apply_battery_losses(num_steps)
+                    for gcID in gc_ids:
+                        fixedLoads[gcID].extend([fixedLoads[gcID][-1]] * num_steps)
+                        gcPowerSchedule[gcID].extend([gcPowerSchedule[gcID][-1]] * num_steps)
+                        gcWindowSchedule[gcID].extend(strat.get_window(gcID, t) for t in times)
+                        prices[gcID].extend([prices[gcID][-1]] * num_steps)
+                        totalLoad[gcID].extend([totalLoad[gcID][-1]] * num_steps)
+                        localGenerationPower[gcID].extend(
+                            [localGenerationPower[gcID][-1]] * num_steps)
+                        connChargeByTS[gcID].extend([{}] * num_steps)
+                    run_statistics.update_steps(
+                        times[0], num_steps, socs[-1], {},
+                        {gcID: totalLoad[gcID][-1] for gcID in gc_ids},
+                        {gcID: fixedLoads[gcID][-1] for gcID in gc_ids},
+                        {gcID: localGenerationPower[gcID][-1] for gcID in gc_ids}, levels)
+                if num_steps > 0:
+                    skip_until = step_i + num_steps
+                    continue
+
             # process events
             try:
                 super(type(strat), strat).step(event_steps[step_i])
             except Exception:
                 error = traceback.format_exc()
 
+            # adaptive time resolution: combine timesteps until next event or departure
+            num_steps = 1
+            if max_steps_per_ts > 1 and error is None:
+                stop_i = self.get_next_event_step(strat, event_steps, step_i + 1)
+                for vehicle in strat.world_state.vehicles.values():
+                    departure = vehicle.estimated_time_of_departure
+                    if vehicle.connected_charging_station is not None and departure is not None:
+                        departure_step = math.ceil((departure - self.start_time) / self.interval)
+                        if departure_step > step_i:
+                            stop_i = min(stop_i, departure_step)
+                # split evenly (avoid short last timestep)
+                num_parts = math.ceil((stop_i - step_i) / max_steps_per_ts)
+                num_steps = math.ceil((stop_i - step_i) / num_parts)
+            if strat.interval != num_steps * self.interval:
+                strat.set_interval(num_steps * self.interval)
+
             # get vehicle SoC at start of timestep
             cur_dis = []
             cur_conn = {}
@@ -158,14 +304,10 @@ class Scenario:
                         cur_dis[-1] = vehicle.battery.soc
 
                 if (is_connected or not departed) and vid in departed_vehicles:
-                    # newly arrived: update disconnect with linear interpolation
+                    # newly arrived: note trip, SoC in between is interpolated in reports
                     start_idx, start_soc = departed_vehicles[vid]
-                    # compute linear equation
-                    m = (vehicle.battery.soc - start_soc) / (step_i - start_idx)
-                    # update timesteps between start and now
-                    for idx in range(start_idx, step_i):
-                        disconnect[idx][vidx] = m * (idx - start_idx) + start_soc
-                        cur_dis[-1] = vehicle.battery.soc
+                    trips.append((vidx, start_idx, start_soc, step_i, vehicle.battery.soc))
+                    cur_dis[-1] = vehicle.battery.soc
                     # remove vehicle from departed list
                     del departed_vehicles[vid]
 
@@ -188,8 +330,9 @@ class Scenario:
                 error = traceback.format_exc() if error is None else error
             results.append(res)
 
-            # apply battery losses at end of timestep
-            strat.apply_battery_losses()
+            # apply battery losses at end of each timestep
+            for _ in range(num_steps):
+                strat.apply_battery_losses()
 
             # get loads during timestep
             for gcID, gc in strat.world_state.grid_connectors.items():
@@ -275,6 +418,46 @@ class Scenario:
                 localGenerationPower[gcID].append(curLocalGeneration)
                 connChargeByTS[gcID].append(cur_cs)
 
+            run_statistics.update(
+                res['current_time'], cur_socs, res['commands'],
+                {gcID: totalLoad[gcID][-1] for gcID in gc_ids},
+                {gcID: fixedLoads[gcID][-1] for gcID in gc_ids},
+                {gcID: localGenerationPower[gcID][-1] for gcID in gc_ids},
+                {batName: levels[-1] for batName, levels in batteryLevels.items()})
+
+            # combined timesteps (adaptive interval): same power, interpolate SoC
+            vehicle_ids = sorted(strat.world_state.vehicles.keys())
+            vehicles = [strat.world_state.vehicles[vid] for vid in vehicle_ids]
+            for ts_idx in range(1, num_steps):
+                f = ts_idx / num_steps
+                socs.append([None if soc is None else soc + (v.battery.soc - soc) * f
+                             for soc, v in zip(cur_socs, vehicles)])
+                connected.append(dict(cur_conn))
+                disconnect.append([
+                    v.battery.soc
+                    if v.connected_charging_station is None and vid not in departed_vehicles
+                    else None for vid, v in zip(vehicle_ids, vehicles)])
+                for batName, bat in strat.world_state.batteries.items():
+                    start_level = batteryLevels[batName][-ts_idx]
+                    batteryLevels[batName].append(
+                        start_level + (bat.soc * bat.capacity - start_level) * f)
+                results.append(dict(res, current_time=res['current_time'] + ts_idx * self.interval))
+                for gcID in gc_ids:
+                    fixedLoads[gcID].append(dict(fixedLoads[gcID][-1]))
+                    gcPowerSchedule[gcID].append(gcPowerSchedule[gcID][-1])
+                    gcWindowSchedule[gcID].append(gcWindowSchedule[gcID][-1])
+                    prices[gcID].append(prices[gcID][-1])
+                    totalLoad[gcID].append(totalLoad[gcID][-1])
+                    localGenerationPower[gcID].append(localGenerationPower[gcID][-1])
+                    connChargeByTS[gcID].append(dict(connChargeByTS[gcID][-1]))
+                run_statistics.update(
+                    results[-1]['current_time'], socs[-1], res['commands'],
+                    {gcID: totalLoad[gcID][-1] for gcID in gc_ids},
+                    {gcID: fixedLoads[gcID][-1] for gcID in gc_ids},
+                    {gcID: localGenerationPower[gcID][-1] for gcID in gc_ids},
+                    {batName: levels[-1] for batName, levels in batteryLevels.items()})
+            skip_until = step_i + num_steps
+
             if error is not None:
                 print('\n', '*'*42)
                 print("Aborting simulation in timestep {} ({})".format(
@@ -286,13 +469,18 @@ class Scenario:
 
         # end of simulation: increase step_i one last time (no error: step_i == n_intervals)
         step_i += 1
-        self.stepsPerHour = strat.ts_per_hour
+        if history_dir:
+            # complete chunk files
+            for history in [socs, connected, disconnect, results,
+                            *fixedLoads.values(), *connChargeByTS.values()]:
+                history.flush()
+        self.stepsPerHour = datetime.timedelta(hours=1) / self.interval
 
         # make variable members of Scenario class to access them in report
-        for var in ["batteryLevels", "connChargeByTS", "connected", "disconnect",
-                    "fixedLoads", "localGenerationPower", "gcPowerSchedule", "gcWindowSchedule",
-                    "prices", "results", "socs", "step_i", "strat",
-                    "strategy_name", "totalLoad"]:
+        for var in ["batteryLevels", "connChargeByTS", "connected", "disconnect", "event_steps",
+                    "fixedLoads", "history_dir", "localGenerationPower", "gcPowerSchedule",
+                    "gcWindowSchedule", "prices", "results", "run_statistics", "socs", "step_i",
+                    "strat", "strategy_name", "totalLoad", "trips"]:
             setattr(self, var, locals()[var])
 
         # save reference to negative soc tracker for ease of use in other modules
@@ -305,6 +493,6 @@ class Scenario:
 
         for gcID in gc_ids:
             print(f"Energy drawn from {gcID}: "
-                  f"{round((sum(totalLoad[gcID])/strat.ts_per_hour), 3)} kWh")
+                  f"{round((sum(totalLoad[gcID])/self.stepsPerHour), 3)} kWh")
 
         report.generate_reports(self, options)
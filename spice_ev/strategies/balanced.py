@@ -8,6 +8,8 @@ class Balanced(Strategy):
         # defaults
         super().__init__(components, start_time, **kwargs)
         self.description = "balanced"
+        self.allow_fast_forward = True
+        self.fast_forward_batteries = True
 
     def step(self):
         """ Calculates charging power in each timestep.
@@ -12,6 +12,7 @@ class BalancedMarket(Strategy):
 
         super().__init__(components, start_time, **kwargs)
         self.description = "balanced (market-oriented)"
+        self.allow_fast_forward = True
 
         # adjust foresight for price events
         horizon_timedelta = datetime.timedelta(hours=self.HORIZON)
@@ -36,8 +37,7 @@ class BalancedMarket(Strategy):
         # reset charging station power (nothing charged yet in this timestep)
         for cs in self.world_state.charging_stations.values():
             cs.current_power = 0
-        for gc_id, gc in self.world_state.grid_connectors.items():
-            commands.update(self.step_gc(gc_id, gc))
+        commands.update(self.step_gcs())
         return {'current_time': self.current_time, 'commands': commands}
 
     def step_gc(self, gc_id, gc):
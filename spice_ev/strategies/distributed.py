@@ -1,8 +1,48 @@
+import concurrent.futures
 from copy import deepcopy
 import datetime
+import weakref
 
 from spice_ev import components, events, strategy
 
+# sub-strategies of worker process, set by _init_worker
+_worker_strategies = dict()
+
+
+def _init_worker(strategies):
+    """ Initialize worker process with its own copy of the sub-strategies.
+
+    :param strategies: sub-strategy for each station type
+    :type strategies: dict
+    """
+    _worker_strategies.update(strategies)
+
+
+def _step_gcs(current_time, interval, tasks):
+    """ Run sub-strategies for grid connectors of worker process.
+
+    :param current_time: current time
+    :type current_time: datetime.datetime
+    :param interval: length of timestep
+    :type interval: datetime.timedelta
+    :param tasks: station type and world state of each grid connector
+    :type tasks: list
+    :return: commands and world state after step of each grid connector
+    :rtype: list
+    """
+    results = []
+    for station_type, world_state in tasks:
+        strat = _worker_strategies[station_type]
+        strat.current_time = current_time
+        if interval != strat.interval:
+            strat.set_interval(interval)
+        strat.world_state = world_state
+        commands = strat.step()["commands"]
+        # future events are not changed by sub-strategy, no need to send them back
+        world_state.future_events = []
+        results.append((commands, world_state))
+    return results
+
 
 class Distributed(strategy.Strategy):
     """ Strategy that allows for greedy charging at opp stops and balanced charging at depots. """
@@ -17,12 +57,19 @@ class Distributed(strategy.Strategy):
         strat_options_opps = dict(deepcopy(kwargs), **strat_options_opps)
         strat_deps = kwargs.get("strategy_deps", "balanced")
         strat_options_deps = dict(deepcopy(kwargs), **strat_options_deps)
+        # GCs are already distributed among processes here: run sub-strategies sequentially
+        strat_options_opps["PROCESSES"] = strat_options_deps["PROCESSES"] = 1
         self.description = f"distributed (deps: {strat_deps} / opps: {strat_opps})"
         self.strat_opps = strategy.class_from_str(strat_opps)(
             comps, start_time, **strat_options_opps)
         self.strat_deps = strategy.class_from_str(strat_deps)(
             comps, start_time, **strat_options_deps)
 
+        # number of worker processes to step independent GCs concurrently (1: sequential)
+        self.PROCESSES = int(self.PROCESSES)
+        # worker processes, created on first use
+        self.gc_workers = None
+
         # adjust foresight for vehicle events (known one hour in advance)
         self.ARRIVAL_HORIZON = datetime.timedelta(hours=1)
         # minimum charging time at depot; time to look into the future for prioritization
@@ -81,6 +128,16 @@ class Distributed(strategy.Strategy):
                 "min_power": bat.min_charging_power,
             })
 
+    def set_interval(self, interval):
+        """ Change length of timestep, also for sub-strategies.
+
+        :param interval: length of timestep
+        :type interval: timedelta
+        """
+        super().set_interval(interval)
+        self.strat_opps.set_interval(interval)
+        self.strat_deps.set_interval(interval)
+
     def step(self):
         """ Calculates charging power in each timestep.
 
@@ -113,9 +170,18 @@ class Distributed(strategy.Strategy):
                 })
                 next_arrival[cs.parent] = self.current_time
 
+        # sort future events by GC and vehicle
+        gc_events = dict()
+        vehicle_events = dict()
         for event in self.world_state.future_events:
             if type(event) is not events.VehicleEvent:
+                if type(event) in [
+                        events.FixedLoad,
+                        events.LocalEnergyGeneration,
+                        events.GridOperatorSignal]:
+                    gc_events.setdefault(event.grid_connector_id, []).append(event)
                 continue
+            vehicle_events.setdefault(event.vehicle_id, []).append(event)
             if event.event_type != "arrival":
                 # only interested in arrival events
                 continue
@@ -169,6 +235,8 @@ class Distributed(strategy.Strategy):
             self.connected[gc_id] = conn
 
         # all vehicles are ranked. Charge vehicles that are connected
+        # GCs do not share vehicles within one timestep, so they can be simulated independently
+        gc_tasks = []
         for gc_id, gc in self.world_state.grid_connectors.items():
             # find all vehicles that are actually connected
             vehicles = self.world_state.vehicles if skip_prio[gc_id] else self.connected[gc_id]
@@ -180,7 +248,7 @@ class Distributed(strategy.Strategy):
 
             if connected_vehicles or self.gc_battery.get(gc_id):
                 # GC needs to be simulated
-                station_type, strat = self.strategies[gc_id]
+                station_type = self.strategies[gc_id][0]
                 # prepare new empty world state
                 new_world_state = components.Components(dict())
                 # link to vehicle_types and photovoltaics (should not change during simulation)
@@ -190,25 +258,15 @@ class Distributed(strategy.Strategy):
                 # changes during simulation reflect back to original!
                 new_world_state.grid_connectors = {gc_id: gc}
 
-                # filter future events for this GC
-                new_world_state.future_events = []
-                for event in self.world_state.future_events:
-                    if (
-                            type(event) in [
-                                events.FixedLoad,
-                                events.LocalEnergyGeneration,
-                                events.GridOperatorSignal]
-                            and event.grid_connector_id == gc_id):
-                        new_world_state.future_events.append(deepcopy(event))
+                # future events for this GC
+                new_world_state.future_events = deepcopy(gc_events.get(gc_id, []))
 
                 for v_id, vehicle in connected_vehicles.items():
                     cs_id = vehicle.connected_charging_station
                     cs = self.world_state.charging_stations[cs_id]
                     new_world_state.charging_stations[cs_id] = cs
                     new_world_state.vehicles[v_id] = vehicle
-                    for event in self.world_state.future_events:
-                        if type(event) is events.VehicleEvent and event.vehicle_id == v_id:
-                            new_world_state.future_events.append(deepcopy(event))
+                    new_world_state.future_events += deepcopy(vehicle_events.get(v_id, []))
 
                 # stationary batteries
                 avail_bat_power = dict()
@@ -249,35 +307,98 @@ class Distributed(strategy.Strategy):
                             new_world_state.charging_stations[name] = self.virtual_cs[name]
                             new_world_state.vehicles[b_id] = bat_vehicle
 
-                # update world state of strategy
-                strat.current_time = self.current_time
-                strat.world_state = new_world_state
-                # run sub-strategy
-                commands = strat.step()["commands"]
-                # update stationary batteries
-                if station_type == "opps":
-                    for b_id, battery in self.gc_battery.get(gc_id, {}).items():
-                        power = avail_bat_power.get(b_id)
-                        if power is not None:
-                            # battery used to support GC -> revert max_power, discharge
-                            gc.cur_max_power = power[1]
-                            power_needed = gc.get_current_load() - gc.cur_max_power
-                            power = battery.unload(self.interval, target_power=max(power_needed, 0))
-                            gc.add_load(b_id, -power['avg_power'])
-                            continue
-                        name = f"stationary_{b_id}"
-                        if name in commands:
-                            # battery is simulated as vehicle -> apply changes
-                            # remove from commands
-                            del commands[name]
-                            # and add as battery
-                            # this will crash if virtual CS power has not been added correctly to GC
-                            gc.add_load(b_id, gc.current_loads.pop(name))
-                            # update battery SoC
-                            battery.soc = strat.world_state.vehicles[b_id].battery.soc
-                charging_stations.update(commands)
+                gc_tasks.append((gc_id, station_type, new_world_state, avail_bat_power))
+
+        # run sub-strategy for each GC
+        results = self.run_gc_tasks(gc_tasks)
+
+        for (gc_id, station_type, world_state, avail_bat_power), commands in zip(
+                gc_tasks, results):
+            gc = self.world_state.grid_connectors[gc_id]
+            # update stationary batteries
+            if station_type == "opps":
+                for b_id, battery in self.gc_battery.get(gc_id, {}).items():
+                    power = avail_bat_power.get(b_id)
+                    if power is not None:
+                        # battery used to support GC -> revert max_power, discharge
+                        gc.cur_max_power = power[1]
+                        power_needed = gc.get_current_load() - gc.cur_max_power
+                        power = battery.unload(self.interval, target_power=max(power_needed, 0))
+                        gc.add_load(b_id, -power['avg_power'])
+                        continue
+                    name = f"stationary_{b_id}"
+                    if name in commands:
+                        # battery is simulated as vehicle -> apply changes
+                        # remove from commands
+                        del commands[name]
+                        # and add as battery
+                        # this will crash if virtual CS power has not been added correctly to GC
+                        gc.add_load(b_id, gc.current_loads.pop(name))
+                        # update battery SoC
+                        battery.soc = world_state.vehicles[b_id].battery.soc
+            charging_stations.update(commands)
 
         # all vehicles charged
         charging_stations.update(self.distribute_surplus_power())
 
         return {'current_time': self.current_time, 'commands': charging_stations}
+
+    def run_gc_tasks(self, gc_tasks):
+        """ Run sub-strategies for independent grid connectors.
+
+        With *PROCESSES* > 1, grid connectors are simulated concurrently in worker processes.
+        Each worker keeps its own copy of the sub-strategies and always simulates the same
+        grid connectors, so sub-strategy state of a grid connector stays with its worker.
+        Changes to the world states of the workers are merged back in order of the tasks.
+
+        :param gc_tasks: tuples of GC ID, station type, world state and battery info for each GC
+        :type gc_tasks: list
+        :return: commands for each task
+        :rtype: list
+        """
+
+        if self.PROCESSES <= 1 or len(gc_tasks) <= 1 and self.gc_workers is None:
+            results = []
+            for gc_id, station_type, world_state, _ in gc_tasks:
+                # update world state of strategy
+                strat = self.strategies[gc_id][1]
+                strat.current_time = self.current_time
+                strat.world_state = world_state
+                # run sub-strategy
+                results.append(strat.step()["commands"])
+            return results
+
+        if self.gc_workers is None:
+            # fixed assignment of grid connectors to workers
+            gc_ids = list(self.world_state.grid_connectors.keys())
+            num_workers = min(self.PROCESSES, len(gc_ids))
+            self.gc_worker_ids = {gc_id: i % num_workers for i, gc_id in enumerate(gc_ids)}
+            self.gc_workers = []
+            for _ in range(num_workers):
+                worker = concurrent.futures.ProcessPoolExecutor(
+                    max_workers=1, initializer=_init_worker,
+                    initargs=({"deps": self.strat_deps, "opps": self.strat_opps},))
+                # shut down worker when strategy is no longer used
+                weakref.finalize(self, worker.shutdown)
+                self.gc_workers.append(worker)
+
+        worker_tasks = [[] for _ in self.gc_workers]
+        for task_idx, (gc_id, station_type, world_state, _) in enumerate(gc_tasks):
+            worker_tasks[self.gc_worker_ids[gc_id]].append((task_idx, station_type, world_state))
+        futures = [
+            worker.submit(_step_gcs, self.current_time, self.interval,
+                          [(station_type, world_state) for _, station_type, world_state in tasks])
+            for worker, tasks in zip(self.gc_workers, worker_tasks) if tasks]
+        results = [None] * len(gc_tasks)
+        for tasks, future in zip([tasks for tasks in worker_tasks if tasks], futures):
+            for (task_idx, _, world_state), (commands, new_world_state) in zip(
+                    tasks, future.result()):
+                # merge changes into world state (attributes of vehicle type are not changed)
+                for attr in ["grid_connectors", "charging_stations", "vehicles", "batteries"]:
+                    comps = getattr(world_state, attr)
+                    for key, new_component in getattr(new_world_state, attr).items():
+                        if attr == "vehicles":
+                            new_component.vehicle_type = comps[key].vehicle_type
+                        comps[key].__dict__.update(new_component.__dict__)
+                results[task_idx] = commands
+        return results
@@ -1,10 +1,116 @@
 from copy import deepcopy
 import datetime
 
+import numpy as np
+
 from spice_ev import events, util
 from spice_ev.strategy import Strategy
 
 
+class Horizon:
+    """ Look-ahead of the FlexWindow strategy.
+
+    Information about each timestep within the horizon is stored in arrays.
+    The predicted fixed load only depends on the time, so it is kept between timesteps
+    and only computed for timesteps entering the horizon.
+
+    :param length: number of timesteps within horizon
+    :type length: int
+    :param interval: length of one timestep
+    :type interval: timedelta
+    """
+
+    def __init__(self, length, interval):
+        self.length = length
+        self.interval = interval
+        # time of first timestep within horizon
+        self.start_time = None
+        # average fixed load (without local generation) for each timestep
+        self.avg_fixed_load = np.zeros(0)
+
+    def update(self, gc, current_time, future_events):
+        """ Move horizon to current time and predict GC info for each timestep.
+
+        :param gc: grid connector
+        :type gc: spice_ev.components.GridConnector
+        :param current_time: time of first timestep within horizon
+        :type current_time: datetime
+        :param future_events: sorted list of future events
+        :type future_events: list
+        """
+
+        # drop timesteps that have passed, add new timesteps at end of horizon
+        if self.start_time is not None:
+            self.avg_fixed_load = self.avg_fixed_load[
+                (current_time - self.start_time) // self.interval:]
+        self.start_time = current_time
+        num_known = len(self.avg_fixed_load)
+        self.avg_fixed_load = np.concatenate((self.avg_fixed_load, [
+            gc.get_avg_fixed_load(current_time + idx * self.interval, self.interval)
+            for idx in range(num_known, self.length)]))
+
+        # predicted GC info: current value until changed by event
+        self.max_power = np.full(self.length, gc.cur_max_power, dtype=float)
+        self.window = np.full(self.length, gc.window, dtype=object)
+        cur_local_generation = {k: -v for k, v in gc.current_loads.items() if v < 0}
+        local_generation = np.full(self.length, sum(cur_local_generation.values()), dtype=float)
+
+        # look ahead: events change GC info from their first timestep to end of horizon
+        for event in future_events:
+            # first timestep starting at or after event
+            idx = max(-((current_time - event.start_time) // self.interval), 0)
+            if idx >= self.length:
+                break
+            if type(event) is events.GridOperatorSignal:
+                # update GC info
+                if event.max_power:
+                    self.max_power[idx:] = event.max_power
+                if event.window is not None:
+                    self.window[idx:] = event.window
+            elif type(event) is events.LocalEnergyGeneration:
+                cur_local_generation[event.name] = event.value
+                local_generation[idx:] = sum(cur_local_generation.values())
+            # vehicle events ignored (use vehicle info such as estimated_time_of_departure)
+
+        self.fixed_load = self.avg_fixed_load - local_generation
+        # available power, updated when power is allocated
+        self.power = self.max_power - self.fixed_load
+        # planned loads, updated in first timestep only
+        self.v_load = np.zeros(self.length)
+        self.total_load = self.fixed_load.copy()
+
+        # timestep indices by window value
+        self.window_idx = {w: np.flatnonzero(np.equal(self.window, w))
+                           for w in [True, False, None]}
+
+    def num_timesteps_until(self, dt, inclusive=False):
+        """ Get number of timesteps within horizon that start before given time.
+
+        :param dt: time, e.g. departure of vehicle
+        :type dt: datetime
+        :param inclusive: also count timestep starting at given time
+        :type inclusive: bool
+        :return: number of timesteps
+        :rtype: int
+        """
+        if inclusive:
+            num_ts = (dt - self.start_time) // self.interval + 1
+        else:
+            num_ts = -((self.start_time - dt) // self.interval)
+        return min(max(num_ts, 0), self.length)
+
+    def leading(self, indices):
+        """ Get number of timesteps at beginning of horizon that are part of given indices.
+
+        :param indices: sorted timestep indices, e.g. timesteps within window
+        :type indices: numpy.ndarray
+        :return: number of consecutive timesteps from start of horizon
+        :rtype: int
+        """
+        leading = np.asarray(indices) == np.arange(len(indices))
+        return len(leading) if leading.all() else int(np.argmin(leading))
+
+
 class FlexWindow(Strategy):
     """ Charging during given time windows. """
     def __init__(self, components, start_time, **kwargs):
@@ -16,6 +122,9 @@ class FlexWindow(Strategy):
         self.description = "Flex Window ({}, {} hour horizon)".format(
             self.LOAD_STRAT, self.HORIZON)
         self.uses_window = True
+        # look-ahead, kept between timesteps
+        self.horizon = Horizon(int(datetime.timedelta(hours=self.HORIZON) / self.interval),
+                               self.interval)
 
         if self.LOAD_STRAT == "greedy":
             # charge vehicles in need first, then by order of departure
@@ -33,6 +142,16 @@ class FlexWindow(Strategy):
         else:
             "Unknown charging strategy: {}".format(self.LOAD_STRAT)
 
+    def set_interval(self, interval):
+        """ Change length of timestep, start new look-ahead with this resolution.
+
+        :param interval: length of timestep
+        :type interval: timedelta
+        """
+        super().set_interval(interval)
+        self.horizon = Horizon(int(datetime.timedelta(hours=self.HORIZON) / self.interval),
+                               self.interval)
+
     def step(self):
         """ Calculate charging power in each timestep.
 
@@ -46,71 +165,25 @@ class FlexWindow(Strategy):
         for cs in self.world_state.charging_stations.values():
             cs.current_power = 0
 
-        cur_local_generation = {k: -v for k, v in gc.current_loads.items() if v < 0}
-        cur_max_power = gc.cur_max_power
-
         # ---------- GET NEXT EVENTS ---------- #
-        timesteps = []
-
         # look ahead (limited by horizon)
         # get future events and predict fixed load and cost for each timestep
-        event_idx = 0
-        timesteps_ahead = int(datetime.timedelta(hours=self.HORIZON) / self.interval)
+        horizon = self.horizon
+        horizon.update(gc, self.current_time, self.world_state.future_events)
 
-        cur_time = self.current_time - self.interval
-        cur_window = gc.window
-
-        for timestep_idx in range(timesteps_ahead):
-
-            cur_time += self.interval
-            # peek into future events
-            while True:
-                try:
-                    event = self.world_state.future_events[event_idx]
-                except IndexError:
-                    # no more events
-                    break
-                if event.start_time > cur_time:
-                    # not this timestep
-                    break
-                event_idx += 1
-                if type(event) is events.GridOperatorSignal:
-                    # update GC info
-                    cur_max_power = event.max_power or cur_max_power
-                    if event.window is not None:
-                        cur_window = event.window
-                elif type(event) is events.LocalEnergyGeneration:
-                    cur_local_generation[event.name] = event.value
-                # vehicle events ignored (use vehicle info such as estimated_time_of_departure)
-
-            fixed_load = gc.get_avg_fixed_load(cur_time, self.interval) \
-                - sum(cur_local_generation.values())
-
-            # save information for each timestep
-            timesteps.append(
-                {
-                    "timestep_idx": timestep_idx,
-                    "power": cur_max_power - fixed_load,
-                    "fixed_load": fixed_load,
-                    "window": cur_window,
-                    "v_load": 0,
-                    "total_load": fixed_load
-                }
-            )
-
-        # read current window from timesteps
-        gc.window = timesteps[0]["window"]
+        # read current window from horizon
+        gc.window = horizon.window[0]
         loaded_v2g = False
         if self.LOAD_STRAT == "balanced":
             # load vehicle with balanced strategy
-            commands = self.distribute_balanced_vehicles(timesteps)
+            commands = self.distribute_balanced_vehicles(horizon)
             # check if there is surplus power available
             if -gc.get_current_load() > self.EPS:
                 # add surplus power to vehicle
                 commands.update(self.distribute_surplus_to_vehicles())
             else:
                 # get commands from V2G
-                commands_v2g = self.distribute_balanced_v2g(timesteps)
+                commands_v2g = self.distribute_balanced_v2g(horizon)
                 # update old commands with V2G commands
                 commands.update(commands_v2g)
                 # loaded_v2g is True if there was V2G discharge
@@ -119,17 +192,17 @@ class FlexWindow(Strategy):
             if gc.get_current_load() < 0 and not loaded_v2g:
                 self.load_surplus_to_batteries()
             else:
-                self.distribute_balanced_batteries(timesteps)
+                self.distribute_balanced_batteries(horizon)
         else:
             # charge vehicles with peak shaving strategy
-            commands = self.distribute_peak_shaving_vehicles(timesteps)
+            commands = self.distribute_peak_shaving_vehicles(horizon)
             # check if there is surplus power available
             if -gc.get_current_load() > self.EPS:
                 # add surplus power to vehicle
                 commands.update(self.distribute_surplus_power())
             else:
                 # get commands from V2G
-                commands_v2g = self.distribute_peak_shaving_v2g(timesteps)
+                commands_v2g = self.distribute_peak_shaving_v2g(horizon)
                 # update old commands with V2G commands
                 commands.update(commands_v2g)
                 # loaded_v2g is True if there was V2G discharge
@@ -138,15 +211,15 @@ class FlexWindow(Strategy):
             if gc.get_current_load() < 0 and not loaded_v2g:
                 self.load_surplus_to_batteries()
             else:
-                self.distribute_peak_shaving_batteries(timesteps)
+                self.distribute_peak_shaving_batteries(horizon)
 
         return {"current_time": self.current_time, "commands": commands}
 
-    def distribute_balanced_vehicles(self, timesteps):
+    def distribute_balanced_vehicles(self, horizon):
         """ Charge vehicles with balanced method according to time windows.
 
-        :param timesteps: list of dictionaries for each timestep in horizon
-        :type timesteps: list
+        :param horizon: GC info for each timestep in horizon
+        :type horizon: Horizon
         :return: commands for charging stations
         :rtype: dict
         """
@@ -160,26 +233,23 @@ class FlexWindow(Strategy):
         for vehicle in vehicles:
             cs_id = vehicle.connected_charging_station
             cs = self.world_state.charging_stations[cs_id]
-            sim_vehicle = deepcopy(vehicle)
+            old_soc = vehicle.battery.soc
+            # number of timesteps before departure
+            num_ts = horizon.num_timesteps_until(vehicle.estimated_time_of_departure)
+            window = horizon.window[:num_ts]
+            in_window = np.equal(window, True)
+            # power available at charging station in each timestep
+            avail_power = util.clamp_power_array(horizon.power[:num_ts], vehicle, cs)
             # simple case: charge balanced during windows
             # try to charge with full power
-            cur_time = self.current_time - self.interval
-            for ts_info in timesteps:
-                cur_time += self.interval
-                if cur_time >= sim_vehicle.estimated_time_of_departure:
-                    break
-                if ts_info["window"]:
-                    p = ts_info["power"]
-                    p = util.clamp_power(p, sim_vehicle, cs)
-                    sim_vehicle.battery.load(self.interval, max_power=p)
+            vehicle.battery.load_series(self.interval, avail_power[in_window])
 
-            charged_in_window = sim_vehicle.get_delta_soc() <= self.EPS
+            charged_in_window = vehicle.get_delta_soc() <= self.EPS
+            vehicle.battery.soc = old_soc
 
             min_power = 0
-            max_power = util.clamp_power(cs.max_power, sim_vehicle, cs)
-            old_soc = vehicle.battery.soc
-            safe = vehicle.get_delta_soc() <= self.EPS
-            power_vec = [0] * len(timesteps)
+            max_power = util.clamp_power(cs.max_power, vehicle, cs)
+            power_vec = np.zeros(horizon.length)
             # Compute the optimal maximum power to charge a vehicle to desired SOC
             # For vehicles that cannot be fully charged in charge window, this power is applied to
             # all TS of non-charging windows (if GC bound is not tighter) while during charging TS
@@ -187,37 +257,32 @@ class FlexWindow(Strategy):
             # For vehicles that can be fully charged during charge windows, at every TS of a
             # charging window the minimum of this power and the remaining power on the
             # GC is applied.
+            # timesteps charged with optimal power
+            limited = np.equal(window, charged_in_window)
+            # charging windows not sufficient: charge max during window
+            full_power = np.where(in_window & ~limited, avail_power, 0)
+            # already charged: every power is sufficient
+            charged = vehicle.get_delta_soc() <= self.EPS
             while max_power - min_power > self.EPS:
                 power = (min_power + max_power) / 2
-                sim_vehicle.battery.soc = old_soc
+                if charged and power - min_power > self.EPS:
+                    # not last power: no need to simulate
+                    max_power = power
+                    continue
+                vehicle.battery.soc = old_soc
 
-                cur_time = self.current_time - self.interval
-                for ts_idx, ts_info in enumerate(timesteps):
-                    cur_time += self.interval
-                    avg_power = 0
-                    if cur_time >= sim_vehicle.estimated_time_of_departure:
-                        break
-
-                    if ts_info["window"] == charged_in_window:
-                        p = util.clamp_power(min(power, ts_info["power"]), sim_vehicle, cs)
-                        avg_power = sim_vehicle.battery.load(
-                            self.interval, max_power=p)["avg_power"]
-                    elif not charged_in_window and ts_info["window"]:
-                        # charging windows not sufficient, charge max during window
-                        p = util.clamp_power(ts_info["power"], sim_vehicle, cs)
-                        avg_power = sim_vehicle.battery.load(
-                            self.interval, max_power=p)["avg_power"]
-
-                    power_vec[ts_idx] = avg_power
-                    safe = sim_vehicle.get_delta_soc() <= self.EPS
-                    if safe:
-                        power_vec[ts_idx + 1:] = [0] * (len(timesteps) - ts_idx - 1)
-                        break
+                # evaluate all timesteps at once, stop when vehicle is charged
+                p = np.where(limited, util.clamp_power_array(
+                    np.minimum(power, horizon.power[:num_ts]), vehicle, cs), full_power)
+                power_vec[:num_ts] = vehicle.battery.load_series(
+                    self.interval, p, stop_soc=vehicle.desired_soc - self.EPS)["avg_power"]
+                safe = vehicle.get_delta_soc() <= self.EPS
 
                 if safe:
                     max_power = power
                 else:
                     min_power = power
+            vehicle.battery.soc = old_soc
 
             # The GC may not allow to charge with optimal power during current TS
             power = min(gc.max_power - gc.get_current_load(), power)
@@ -232,72 +297,79 @@ class FlexWindow(Strategy):
             commands[cs_id] = gc.add_load(cs_id, avg_power)
             cs.current_power += avg_power
 
-            for ts_idx, ts_info in enumerate(timesteps):
-                ts_info["power"] -= power_vec[ts_idx]
+            horizon.power -= power_vec
 
         return commands
 
-    def distribute_balanced_batteries(self, timesteps):
+    def distribute_balanced_batteries(self, horizon):
         """ Charge/discharge stationary batteries with balanced method according to time windows.
 
-        :param timesteps: list of dictionaries for each timestep in horizon
-        :type timesteps: list
+        :param horizon: GC info for each timestep in horizon
+        :type horizon: Horizon
         """
 
         gc = list(self.world_state.grid_connectors.values())[0]
 
         batteries = [b for b in self.world_state.batteries.values()]
         cur_window = gc.window
-        sim_batteries = deepcopy(batteries)
 
         # charge/discharge batteries
         min_power = - gc.max_power
         max_power = gc.max_power - gc.get_current_load()
 
-        window_timesteps = [item for item in timesteps if item["window"] is cur_window]
-        new_timesteps = []
-        for i, row in enumerate(window_timesteps):
-            if window_timesteps[i]["timestep_idx"] != i:
-                break
-            new_timesteps.append(row)
-        old_soc = [b.soc for b in sim_batteries]
+        # number of timesteps until window changes
+        num_ts = horizon.leading(horizon.window_idx.get(cur_window, []))
+        old_soc = [b.soc for b in batteries]
 
         total_power = 0
         while max_power - min_power > self.EPS:
             total_power = (min_power + max_power) / 2
             # reset soc
-            for i, b in enumerate(sim_batteries):
+            for i, b in enumerate(batteries):
                 b.soc = old_soc[i]
 
             # calculate needed power to load battery
-            for ts_info in new_timesteps:
-                for b in sim_batteries:
-                    if cur_window:
-                        if b.soc > 1 - self.EPS:
-                            # already charged
-                            break
-                    else:
-                        if b.soc < 0 + self.EPS:
-                            # already discharged
-                            break
+            if len(batteries) == 1 and num_ts > 0:
+                # single battery with constant power: simulate whole window at once
+                b = batteries[0]
+                if (b.soc <= 1 - self.EPS) if cur_window else (b.soc >= self.EPS):
                     total_power = (0 if total_power < b.min_charging_power else total_power)
                     if total_power > 0:
-                        p = total_power / len(sim_batteries)
                         if cur_window:
-                            b.load(self.interval, max_power=p)["avg_power"]
+                            b.load(num_ts * self.interval, max_power=total_power)
                         else:
-                            b.unload(self.interval, max_power=p)["avg_power"]
+                            b.unload(num_ts * self.interval, max_power=total_power)
+            elif num_ts > 0:
+                # first battery with higher minimum power stops (dis)charging afterwards
+                num_charged, num_steps = len(batteries), num_ts
+                for idx, b in enumerate(batteries):
+                    if (b.soc > 1 - self.EPS) if cur_window else (b.soc < self.EPS):
+                        # already (dis)charged
+                        break
+                    if total_power < b.min_charging_power:
+                        # batteries before only (dis)charged in first timestep
+                        num_charged, num_steps = idx, 1
+                        break
+                p = np.full(num_steps, total_power / len(batteries) if total_power > 0 else 0)
+                self.simulate_batteries(
+                    batteries[:num_charged], [p] * num_charged, charge=bool(cur_window))
+                if num_charged < len(batteries):
+                    total_power = 0
             if cur_window:
                 at_limit = all(
-                    [b.soc >= (1 - self.EPS) for b in sim_batteries])
+                    [b.soc >= (1 - self.EPS) for b in batteries])
             else:
                 at_limit = all(
-                    [b.soc <= (0 + self.EPS) for b in sim_batteries])
+                    [b.soc <= (0 + self.EPS) for b in batteries])
 
             if at_limit:
                 max_power = total_power
             else:
                 min_power = total_power
+        # reset soc after simulation
+        for i, b in enumerate(batteries):
+            b.soc = old_soc[i]
+
         # actual charge/ discharge
         for b_id, battery in self.world_state.batteries.items():
             if cur_window:
@@ -306,7 +378,7 @@ class FlexWindow(Strategy):
                 if avail_power > 0:
                     charge = battery.load(self.interval, max_power=p)["avg_power"]
                     gc.add_load(b_id, charge)
-                    timesteps[0]["total_load"] += charge
+                    horizon.total_load[0] += charge
             else:
                 if total_power < 0:
                     discharge = 0
@@ -314,13 +386,13 @@ class FlexWindow(Strategy):
                     p = total_power / len(batteries)
                     discharge = battery.unload(self.interval, max_power=p)["avg_power"]
                 gc.add_load(b_id, -discharge)
-                timesteps[0]["total_load"] -= discharge
+                horizon.total_load[0] -= discharge
 
-    def distribute_balanced_v2g(self, timesteps):
+    def distribute_balanced_v2g(self, horizon):
         """ Charge/discharge vehicles with v2g with balanced method according to time windows.
 
-        :param timesteps: list of dictionaries for each timestep in horizon
-        :type timesteps: list
+        :param horizon: GC info for each timestep in horizon
+        :type horizon: Horizon
         :return: commands for charging stations
         :rtype: dict
         """
@@ -332,63 +404,53 @@ class FlexWindow(Strategy):
                            if (v.connected_charging_station is not None)
                            and (v.vehicle_type.v2g)], key=self.sort_key)
 
-        cur_window = timesteps[0]["window"]
+        cur_window = horizon.window[0]
         window = cur_window
+        # number of timesteps until window changes
+        num_window_ts = horizon.leading(horizon.window_idx.get(cur_window, []))
 
         for vehicle in vehicles:
             cs_id = vehicle.connected_charging_station
             cs = self.world_state.charging_stations[cs_id]
-            sim_vehicle = deepcopy(vehicle)
-            cur_time = self.current_time - self.interval
-            max_discharge_power = sim_vehicle.battery.unloading_curve.max_power
+            max_discharge_power = vehicle.battery.unloading_curve.max_power
 
             # check if vehicles can be loaded until desired_soc in connected timesteps
             old_soc = vehicle.battery.soc
-            connected_timesteps = []
+            # number of timesteps with vehicle connected (including departure)
+            num_ts = horizon.num_timesteps_until(
+                vehicle.estimated_time_of_departure, inclusive=True)
             window_change = 0
-            # get connected timesteps and count number of window changes
-            for ts_info in timesteps:
-                cur_time += self.interval
-                if sim_vehicle.estimated_time_of_departure < cur_time:
-                    break
-                if ts_info["window"] != window:
+            # count number of window changes
+            for ts_window in horizon.window[:num_ts]:
+                if ts_window != window:
                     window_change += 1
-                    window = ts_info["window"]
-                connected_timesteps.append(ts_info)
+                    window = ts_window
 
             # check if vehicle ends up with desired soc, adjust min_soc accordingly
             if not cur_window and window_change >= 1:
                 min_soc = vehicle.vehicle_type.discharge_limit
                 max_soc = 1
+                charge_power = util.clamp_power_array(
+                    horizon.power[:num_ts] + horizon.fixed_load[:num_ts]
+                    - horizon.total_load[:num_ts], vehicle, cs)
+                discharge_power = np.full(num_ts, min(cs.max_power, max_discharge_power))
                 while max_soc - min_soc > self.EPS:
                     discharge_limit = (max_soc + min_soc) / 2
-                    for ts_info in connected_timesteps:
-                        if ts_info["window"]:
-                            p = ts_info["power"] + ts_info["fixed_load"] - ts_info["total_load"]
-                            p = util.clamp_power(p, sim_vehicle, cs)
-                            sim_vehicle.battery.load(self.interval, max_power=p)["avg_power"]
-                        else:
-                            p = min(cs.max_power, max_discharge_power)
-                            sim_vehicle.battery.unload(
-                                self.interval, max_power=p, target_soc=discharge_limit)["avg_power"]
-                    if sim_vehicle.battery.soc <= sim_vehicle.desired_soc - self.EPS:
+                    self.simulate_window_runs(
+                        vehicle.battery, horizon.window[:num_ts], charge_power,
+                        discharge_power, discharge_limit)
+                    if vehicle.battery.soc <= vehicle.desired_soc - self.EPS:
                         min_soc = discharge_limit
                     else:
                         max_soc = discharge_limit
-                    sim_vehicle.battery.soc = old_soc
+                    vehicle.battery.soc = old_soc
             elif not cur_window and not window_change:
-                discharge_limit = sim_vehicle.desired_soc
+                discharge_limit = vehicle.desired_soc
 
-            if not cur_window and sim_vehicle.battery.soc <= discharge_limit:
+            if not cur_window and vehicle.battery.soc <= discharge_limit:
                 break
-            # filter current window
-            window_timesteps = [item for item in connected_timesteps if item["window"]
-                                is cur_window]
-            new_timesteps = []
-            for i, row in enumerate(window_timesteps):
-                if window_timesteps[i]["timestep_idx"] != i:
-                    break
-                new_timesteps.append(row)
+            # connected timesteps within current window
+            duration = min(num_ts, num_window_ts) * self.interval
 
             # calculate power to charge / discharge
             min_power = 0
@@ -400,35 +462,25 @@ class FlexWindow(Strategy):
             while max_power - min_power > self.EPS:
                 total_power = (min_power + max_power) / 2
                 # reset soc
-                sim_vehicle.battery.soc = old_soc
-                peak = []
-                for ts_info in new_timesteps:
+                vehicle.battery.soc = old_soc
+                # constant power during current window: simulate whole window at once
+                if duration and total_power > 0:
                     if cur_window:
-                        if sim_vehicle.battery.soc >= 1 - self.EPS:
-                            # already charged
-                            break
-                    else:
-                        if sim_vehicle.battery.soc < discharge_limit + self.EPS:
-                            # already discharged
-                            break
-                    if total_power > 0:
-                        if cur_window:
-                            power = util.clamp_power(total_power, sim_vehicle, cs)
-                            load = sim_vehicle.battery.load(
-                                self.interval, max_power=power)["avg_power"]
-                            peak.append(load)
-                        else:
-                            power = util.clamp_power(total_power, sim_vehicle, cs)
-                            power = min(power, max_discharge_power)
-                            sim_vehicle.battery.unload(
-                                self.interval, max_power=power, target_soc=discharge_limit
-                            )["avg_power"]
-
-                at_limit = sim_vehicle.battery.soc >= (1 - self.EPS)
+                        if vehicle.battery.soc < 1 - self.EPS:
+                            power = util.clamp_power(total_power, vehicle, cs)
+                            vehicle.battery.load(duration, max_power=power)
+                    elif vehicle.battery.soc >= discharge_limit + self.EPS:
+                        power = util.clamp_power(total_power, vehicle, cs)
+                        power = min(power, max_discharge_power)
+                        vehicle.battery.unload(
+                            duration, max_power=power, target_soc=discharge_limit)
+
+                at_limit = vehicle.battery.soc >= (1 - self.EPS)
                 if at_limit:
                     max_power = total_power
                 else:
                     min_power = total_power
+            vehicle.battery.soc = old_soc
             # apply power
             if cur_window:
                 if total_power <= 0:
@@ -438,7 +490,7 @@ class FlexWindow(Strategy):
                     charge = vehicle.battery.load(self.interval, max_power=power)["avg_power"]
                 commands[cs_id] = gc.add_load(cs_id, charge)
                 cs.current_power += charge
-                timesteps[0]["total_load"] += charge
+                horizon.total_load[0] += charge
             if not cur_window:
                 if total_power <= 0:
                     discharge = 0
@@ -450,15 +502,15 @@ class FlexWindow(Strategy):
                     )["avg_power"]
                 commands[cs_id] = gc.add_load(cs_id, -discharge)
                 cs.current_power -= discharge
-                timesteps[0]["total_load"] -= discharge
+                horizon.total_load[0] -= discharge
 
         return commands
 
-    def distribute_peak_shaving_vehicles(self, timesteps):
+    def distribute_peak_shaving_vehicles(self, horizon):
         """ Charge vehicles with peak shaving method according to time windows.
 
-        :param timesteps: list of dictionaries for each timestep in horizon
-        :type timesteps: list
+        :param horizon: GC info for each timestep in horizon
+        :type horizon: Horizon
         :return: commands for charging stations
         :rtype: dict
         """
@@ -476,7 +528,7 @@ class FlexWindow(Strategy):
 
         # check if battery can be fully charged within time windows in horizon with max power
         cur_time = self.current_time - self.interval
-        for ts_info in timesteps:
+        for ts_idx in range(horizon.length):
             cur_time += self.interval
             # get all vehicle events that depart later than current time
             cur_vehicles = [v for v in cur_vehicles if (v.estimated_time_of_departure > cur_time)
@@ -488,15 +540,15 @@ class FlexWindow(Strategy):
                 # no vehicles or no energy need: skip check
                 break
 
-            if ts_info["window"]:
-                self.distribute_power(cur_vehicles, ts_info["power"], cur_needed)
+            if horizon.window[ts_idx]:
+                self.distribute_power(cur_vehicles, float(horizon.power[ts_idx]), cur_needed)
 
         charged_in_window = all([v.get_delta_soc() < self.EPS for v in sim_vehicles])
 
         # can be charged within windows: reset SoC
         for i, v in enumerate(sim_vehicles):
             v.battery.soc = vehicles[i].battery.soc
-        new_timesteps = [ts for ts in timesteps if ts["window"] == charged_in_window]
+        new_timesteps = [idx for idx, w in enumerate(horizon.window) if w == charged_in_window]
 
         old_soc = [v.battery.soc for v in sim_vehicles]
         min_total_power = -gc.max_power
@@ -512,9 +564,7 @@ class FlexWindow(Strategy):
                 v.battery.soc = old_soc[i]
 
             cur_time = self.current_time - self.interval
-            index = -1
-            for ts_info in new_timesteps:
-                index += 1
+            for ts_idx in new_timesteps:
                 cur_time += self.interval
                 new_cur_vehicles = []
                 for v in cur_vehicles:
@@ -531,7 +581,8 @@ class FlexWindow(Strategy):
                 if not cur_vehicles or cur_needed < self.EPS:
                     # no vehicles or no energy need: skip simulation
                     break
-                self.distribute_power(cur_vehicles, total_power - ts_info["fixed_load"], cur_needed)
+                self.distribute_power(
+                    cur_vehicles, total_power - float(horizon.fixed_load[ts_idx]), cur_needed)
 
             safe = all([v.get_delta_soc() < self.EPS for v in sim_vehicles])
             if safe:
@@ -552,19 +603,18 @@ class FlexWindow(Strategy):
             cs = self.world_state.charging_stations[cs_id]
             old_power = power
             commands[cs_id] = gc.add_load(cs_id, power)
-            timesteps[0]["v_load"] += power
-            timesteps[0][cs_id] = power
-            timesteps[0]["total_load"] += power
+            horizon.v_load[0] += power
+            horizon.total_load[0] += power
             assert commands[cs_id] == old_power
             cs.current_power += commands[cs_id]
 
         return commands
 
-    def distribute_peak_shaving_batteries(self, timesteps):
+    def distribute_peak_shaving_batteries(self, horizon):
         """ Charge/discharge batteries with peak shaving method according to time windows.
 
-        :param timesteps: list of dictionaries for each timestep in horizon
-        :type timesteps: list
+        :param horizon: GC info for each timestep in horizon
+        :type horizon: Horizon
         """
 
         discharging_stations = []
@@ -586,13 +636,12 @@ class FlexWindow(Strategy):
             min_total_power = -gc.max_power
             max_total_power = gc.max_power
 
-            window_timesteps = [item for item in timesteps if item["window"]]
-            new_timesteps = []
-            for i, row in enumerate(window_timesteps):
-                if window_timesteps[i]["timestep_idx"] != i:
-                    break
-                new_timesteps.append(row)
+            # number of timesteps until window ends
+            num_ts = 0
+            while num_ts < horizon.length and horizon.window[num_ts]:
+                num_ts += 1
             old_soc = [b.soc for b in sim_batteries]
+            min_charging_power = np.maximum.accumulate([b.min_charging_power for b in batteries])
 
             while max_total_power - min_total_power > self.EPS:
                 total_power = (min_total_power + max_total_power) / 2
@@ -601,17 +650,11 @@ class FlexWindow(Strategy):
                     b.soc = old_soc[i]
 
                 # calculate needed power to load battery
-                for ts_info in new_timesteps:
-                    cur_avail_power = total_power - ts_info["total_load"]
-                    for b in sim_batteries:
-                        if b.soc > 1 - self.EPS:
-                            # already charged
-                            break
-                        cur_avail_power = (0 if cur_avail_power < b.min_charging_power
-                                           else cur_avail_power)
-                        if cur_avail_power > 0:
-                            power = cur_avail_power / len(sim_batteries)
-                            b.load(self.interval, max_power=power)["avg_power"]
+                # no power for battery (and following) if below minimum power of any before
+                cur_avail_power = total_power - horizon.total_load[:num_ts]
+                self.simulate_batteries(sim_batteries, [
+                    np.where(cur_avail_power < min_power, 0, cur_avail_power) / len(sim_batteries)
+                    for min_power in min_charging_power], charge=True)
 
                 at_limit = all([b.soc >= (1 - self.EPS) for b in sim_batteries])
 
@@ -620,7 +663,7 @@ class FlexWindow(Strategy):
                 else:
                     min_total_power = total_power
             # actual charge
-            avail_power = total_power - timesteps[0]["total_load"]
+            avail_power = total_power - float(horizon.total_load[0])
             for b_id, battery in self.world_state.batteries.items():
                 avail_power = (0 if avail_power < battery.min_charging_power
                                else avail_power)
@@ -628,15 +671,13 @@ class FlexWindow(Strategy):
                     power = avail_power/len(sim_batteries)
                     charge = battery.load(self.interval, max_power=power)["avg_power"]
                     gc.add_load(b_id, charge)
-                    timesteps[0]["total_load"] += charge
+                    horizon.total_load[0] += charge
         else:
             # discharge battery
-            no_window_timesteps = [item for item in timesteps if not item["window"]]
-            new_timesteps = []
-            for i, row in enumerate(no_window_timesteps):
-                if no_window_timesteps[i]["timestep_idx"] != i:
-                    break
-                new_timesteps.append(row)
+            # number of timesteps until window starts
+            num_ts = 0
+            while num_ts < horizon.length and not horizon.window[num_ts]:
+                num_ts += 1
 
             min_total_power = -gc.max_power
             max_total_power = gc.max_power
@@ -649,18 +690,11 @@ class FlexWindow(Strategy):
                 for i, b in enumerate(sim_batteries):
                     b.soc = old_soc[i]
 
-                cur_time = self.current_time - self.interval
                 # calculate needed power to load battery
-                for ts_info in new_timesteps:
-                    cur_time += self.interval
-                    cur_needed_power = ts_info["total_load"] - total_power
-
-                    for b in sim_batteries:
-                        if b.soc <= self.EPS:
-                            break
-                        if cur_needed_power > 0:
-                            power = cur_needed_power / len(sim_batteries)
-                            b.unload(self.interval, max_power=power)["avg_power"]
+                cur_needed_power = horizon.total_load[:num_ts] - total_power
+                self.simulate_batteries(
+                    sim_batteries, [cur_needed_power / len(sim_batteries)] * len(sim_batteries),
+                    charge=False)
                 at_limit = all([b.soc > (self.EPS) for b in sim_batteries])
 
                 if at_limit:
@@ -669,7 +703,7 @@ class FlexWindow(Strategy):
                     min_total_power = total_power
 
             # actual discharge
-            needed_power = timesteps[0]["total_load"] - total_power
+            needed_power = float(horizon.total_load[0]) - total_power
 
             for b_id, battery in self.world_state.batteries.items():
                 if needed_power < 0:
@@ -679,13 +713,13 @@ class FlexWindow(Strategy):
                     discharge = battery.unload(self.interval, max_power=power)["avg_power"]
                 discharging_stations.append(b_id)
                 gc.add_load(b_id, -discharge)
-                timesteps[0]["total_load"] -= discharge
+                horizon.total_load[0] -= discharge
 
-    def distribute_peak_shaving_v2g(self, timesteps):
+    def distribute_peak_shaving_v2g(self, horizon):
         """ Charge/discharge vehicles with v2g with peak shaving method according to time windows.
 
-        :param timesteps: list of dictionaries for each timestep in horizon
-        :type timesteps: list
+        :param horizon: GC info for each timestep in horizon
+        :type horizon: Horizon
         :return: commands for charging stations
         :rtype: dict
         """
@@ -697,7 +731,7 @@ class FlexWindow(Strategy):
                            if (v.connected_charging_station is not None) and (
                                v.vehicle_type.v2g)], key=self.sort_key)
 
-        cur_window = timesteps[0]["window"]
+        cur_window = horizon.window[0]
         cur_time = self.current_time - self.interval
 
         for vehicle in vehicles:
@@ -712,30 +746,27 @@ class FlexWindow(Strategy):
             window = cur_window
             window_change = 0
             # get connected timesteps and count number of window changes
-            for ts_info in timesteps:
+            for ts_idx in range(horizon.length):
                 cur_time += self.interval
                 if sim_vehicle.estimated_time_of_departure < cur_time:
                     break
-                if ts_info["window"] != window:
+                if horizon.window[ts_idx] != window:
                     window_change += 1
-                    window = ts_info["window"]
-                connected_timesteps.append(ts_info)
+                    window = horizon.window[ts_idx]
+                connected_timesteps.append(ts_idx)
 
             # check if vehicle ends up with desired soc, adjust min_soc accordingly
             if not cur_window and window_change >= 1:
                 min_soc = sim_vehicle.vehicle_type.discharge_limit
                 max_soc = 1
+                num_ts = len(connected_timesteps)
+                charge_power = np.full(num_ts, cs.max_power)
+                discharge_power = np.full(num_ts, min(cs.max_power, max_discharge_power))
                 while max_soc - min_soc > self.EPS:
                     discharge_limit = (max_soc + min_soc) / 2
-                    for ts_info in connected_timesteps:
-                        if ts_info["window"]:
-                            sim_vehicle.battery.load(
-                                self.interval, max_power=cs.max_power)["avg_power"]
-                        else:
-                            power = min(cs.max_power, max_discharge_power)
-                            sim_vehicle.battery.unload(
-                                self.interval, max_power=power, target_soc=discharge_limit
-                            )["avg_power"]
+                    self.simulate_window_runs(
+                        sim_vehicle.battery, horizon.window[:num_ts], charge_power,
+                        discharge_power, discharge_limit)
                     if sim_vehicle.battery.soc <= sim_vehicle.desired_soc - self.EPS:
                         min_soc = discharge_limit
                     else:
@@ -752,47 +783,41 @@ class FlexWindow(Strategy):
                 min_total_power = -gc.max_power
                 max_total_power = gc.max_power
 
-                window_timesteps = [item for item in timesteps if item["window"] is True]
+                window_timesteps = horizon.window_idx.get(True, [])
                 old_soc = vehicle.battery.soc
+                min_charging_power = sim_vehicle.vehicle_type.min_charging_power
 
                 while max_total_power - min_total_power > self.EPS:
                     total_power = (min_total_power + max_total_power) / 2
                     # reset soc
                     sim_vehicle.battery.soc = old_soc
 
-                    cur_time = self.current_time - self.interval
                     # calculate needed power to load battery
-                    for ts_info in window_timesteps:
-                        cur_time += self.interval
-
-                        cur_avail_power = total_power - ts_info["total_load"]
-                        if sim_vehicle.battery.soc >= 1:
-                            # already charged
-                            break
-                        if cur_avail_power > 0:
-                            cur_avail_power = (
-                                0 if cur_avail_power <
-                                sim_vehicle.vehicle_type.min_charging_power
-                                else cur_avail_power)
-                            power = util.clamp_power(cur_avail_power, sim_vehicle, cs)
-                            sim_vehicle.battery.load(self.interval, max_power=power)["avg_power"]
+                    cur_avail_power = total_power - horizon.total_load[window_timesteps]
+                    power = util.clamp_power_array(np.where(
+                        cur_avail_power < min_charging_power, 0, cur_avail_power), sim_vehicle, cs)
+                    steps = sim_vehicle.battery.load_series(
+                        self.interval, power, stop_soc=1)["steps"]
 
                     at_limit = sim_vehicle.battery.soc >= (1 - self.EPS)
                     if at_limit:
                         max_total_power = total_power
                     else:
                         min_total_power = total_power
-                avail_power = total_power - window_timesteps[0]["total_load"]
+                # look-ahead of next vehicle continues after last simulated timestep
+                num_simulated = 1 if old_soc >= 1 else min(steps + 1, len(window_timesteps))
+                cur_time = self.current_time + (num_simulated - 1) * self.interval
+                avail_power = total_power - float(horizon.total_load[window_timesteps[0]])
                 avail_power = (0 if avail_power < vehicle.vehicle_type.min_charging_power
                                else avail_power)
                 charge = vehicle.battery.load(self.interval, max_power=avail_power)["avg_power"]
                 commands[cs_id] = gc.add_load(cs_id, charge)
                 cs.current_power += charge
-                timesteps[0]["total_load"] += charge
+                horizon.total_load[0] += charge
 
             else:
                 # discharge battery
-                no_window_timesteps = [item for item in timesteps if item["window"] is False]
+                no_window_timesteps = horizon.window_idx.get(False, [])
 
                 min_total_power = -gc.max_power
                 max_total_power = gc.max_power
@@ -804,19 +829,12 @@ class FlexWindow(Strategy):
                     # reset soc
                     sim_vehicle.battery.soc = old_soc
 
-                    cur_time = self.current_time - self.interval
                     # calculate needed power to load battery
-                    for ts_info in no_window_timesteps:
-                        cur_time += self.interval
-                        cur_needed_power = (ts_info["fixed_load"] + ts_info["v_load"]) - total_power
-                        if sim_vehicle.battery.soc <= discharge_limit:
-                            # already discharged
-                            break
-                        if cur_needed_power > 0:
-                            power = min(cur_needed_power, max_discharge_power)
-                            sim_vehicle.battery.unload(
-                                self.interval, max_power=power, target_soc=discharge_limit
-                            )["avg_power"]
+                    cur_needed_power = (horizon.fixed_load[no_window_timesteps]
+                                        + horizon.v_load[no_window_timesteps] - total_power)
+                    steps = sim_vehicle.battery.unload_series(
+                        self.interval, np.minimum(cur_needed_power, max_discharge_power),
+                        target_soc=discharge_limit, stop_soc=discharge_limit)["steps"]
 
                     at_limit = sim_vehicle.battery.soc > (discharge_limit)
                     if at_limit:
@@ -824,7 +842,10 @@ class FlexWindow(Strategy):
                     else:
                         min_total_power = total_power
 
-                needed_power = no_window_timesteps[0]["total_load"] - total_power
+                # look-ahead of next vehicle continues after last simulated timestep
+                num_simulated = min(steps + 1, len(no_window_timesteps))
+                cur_time = self.current_time + (num_simulated - 1) * self.interval
+                needed_power = float(horizon.total_load[no_window_timesteps[0]]) - total_power
                 if needed_power < 0:
                     discharge = 0
                 else:
@@ -833,10 +854,68 @@ class FlexWindow(Strategy):
                         self.interval, max_power=power, target_soc=discharge_limit)["avg_power"]
                 commands[cs_id] = gc.add_load(cs_id, -discharge)
                 cs.current_power -= discharge
-                timesteps[0]["total_load"] -= discharge
+                horizon.total_load[0] -= discharge
 
         return commands
 
+    def simulate_batteries(self, batteries, power, charge):
+        """ Charge or discharge batteries in consecutive timesteps (look-ahead only).
+
+        In each timestep, batteries are (dis)charged one after the other until a battery
+        is full (or empty). The timesteps of each battery are evaluated with array operations.
+
+        :param batteries: batteries to simulate, SoC is changed
+        :type batteries: list of :py:class:`~spice_ev.battery.Battery`
+        :param power: (dis)charging power of each battery in each timestep
+        :type power: list of numpy.ndarray
+        :param charge: charge (True) or discharge (False) batteries
+        :type charge: bool
+        """
+
+        num_ts = len(power[0]) if power else 0
+        for battery, battery_power in zip(batteries, power):
+            if charge:
+                if battery.soc > 1 - self.EPS:
+                    # already charged
+                    break
+                num_ts = battery.load_series(
+                    self.interval, battery_power[:num_ts], stop_soc=1 - self.EPS)["steps"]
+            else:
+                if battery.soc <= self.EPS:
+                    # already discharged
+                    break
+                num_ts = battery.unload_series(
+                    self.interval, battery_power[:num_ts], stop_soc=self.EPS)["steps"]
+
+    def simulate_window_runs(self, battery, window, charge_power, discharge_power, target_soc):
+        """ Charge battery during time windows, discharge outside (look-ahead only).
+
+        Consecutive timesteps with the same window are evaluated with array operations.
+
+        :param battery: battery to simulate, SoC is changed
+        :type battery: spice_ev.battery.Battery
+        :param window: time window of each timestep
+        :type window: numpy.ndarray
+        :param charge_power: maximum charging power of each timestep
+        :type charge_power: numpy.ndarray
+        :param discharge_power: maximum discharging power of each timestep
+        :type discharge_power: numpy.ndarray
+        :param target_soc: discharge limit
+        :type target_soc: numeric
+        """
+
+        in_window = np.equal(window, True)
+        # start of each run of timesteps with same window
+        starts = np.concatenate(([0], np.flatnonzero(np.diff(in_window)) + 1))
+        for start, end in zip(starts, list(starts[1:]) + [len(window)]):
+            if start >= end:
+                continue
+            if in_window[start]:
+                battery.load_series(self.interval, charge_power[start:end])
+            else:
+                battery.unload_series(
+                    self.interval, discharge_power[start:end], target_soc=target_soc)
+
     def distribute_power(self, vehicles, total_power, total_needed):
         """ Charge vehicle batteries with available power according to *LOAD_STRAT*.
 
@@ -13,6 +13,8 @@ class Greedy(Strategy):
     def __init__(self, components, start_time, **kwargs):
         super().__init__(components, start_time, **kwargs)
         self.description = "greedy"
+        self.allow_fast_forward = True
+        self.fast_forward_batteries = True
 
     def step(self):
         """ Calculate charging power in each timestep.
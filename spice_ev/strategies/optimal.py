@@ -0,0 +1,491 @@
+import datetime
+
+import numpy as np
+
+from spice_ev import events, util
+from spice_ev.strategy import Strategy
+
+
+def _solve_highs(objective, lower, upper, A_ub, b_ub, A_eq, b_eq, integrality, time_limit, x0):
+    """ Solve (mixed integer) linear program with HiGHS, starting from given solution.
+
+    Same as scipy.optimize.linprog with method "highs", which can not be given a starting point.
+    Bounds of variables are given as arrays (no upper bound: infinity).
+
+    :param x0: starting point, e.g. solution of similar program
+    :type x0: numpy.ndarray
+    :return: optimal value of each variable or None if no solution was found
+    :rtype: numpy.ndarray
+    """
+    import highspy
+    from scipy import sparse
+
+    A = sparse.vstack([A_ub, A_eq]).tocsc()
+    lp = highspy.HighsLp()
+    lp.num_col_ = len(objective)
+    lp.num_row_ = A.shape[0]
+    lp.col_cost_ = objective
+    lp.col_lower_ = lower
+    lp.col_upper_ = np.minimum(upper, highspy.kHighsInf)
+    lp.row_lower_ = np.concatenate((np.full(len(b_ub), -highspy.kHighsInf), b_eq))
+    lp.row_upper_ = np.concatenate((b_ub, b_eq))
+    lp.a_matrix_.format_ = highspy.MatrixFormat.kColwise
+    lp.a_matrix_.start_ = A.indptr
+    lp.a_matrix_.index_ = A.indices
+    lp.a_matrix_.value_ = A.data
+    if any(integrality):
+        lp.integrality_ = [
+            highspy.HighsVarType.kSemiContinuous if i else highspy.HighsVarType.kContinuous
+            for i in integrality]
+
+    h = highspy.Highs()
+    h.setOptionValue("output_flag", False)
+    if time_limit is not None:
+        h.setOptionValue("time_limit", float(time_limit))
+    h.passModel(lp)
+    start = highspy.HighsSolution()
+    start.col_value = x0.tolist()
+    start.value_valid = True
+    h.setSolution(start)
+    h.run()
+    if h.getModelStatus() != highspy.HighsModelStatus.kOptimal:
+        return None
+    return np.array(h.getSolution().col_value)
+
+
+class Optimal(Strategy):
+    """ Plan charging of all vehicles and batteries at a GC with one linear program per step.
+
+    Each timestep, the charging/discharging power of all connected vehicles and stationary
+    batteries within the horizon is optimized at once (rolling horizon).
+    Only the decisions of the first timestep are applied.
+    The objective is a weighted sum of energy cost, peak power and deviation from schedule.
+    Minimum charging power is applied to the planned power of the first timestep
+    (or modeled exactly with *MIN_POWER_MILP*, which is much slower).
+    Requires SciPy (HiGHS solver). If highspy is installed, the solver starts from the
+    plan of the previous timestep.
+    """
+    def __init__(self, components, start_time, **kwargs):
+        self.HORIZON = 24  # hours ahead
+        self.COST_WEIGHT = 1  # weight of energy cost (per EUR)
+        self.PEAK_WEIGHT = 0.1  # weight of peak power within horizon (per kW)
+        self.SCHEDULE_WEIGHT = 0  # weight of deviation from schedule (per kWh), 0: ignore
+        self.SOC_PENALTY = 1000  # penalty for energy missing at departure (per kWh)
+        self.TIME_LIMIT = None  # maximum time for solver in seconds
+        self.MIN_POWER_MILP = False  # model minimum charging power (mixed integer program)
+
+        super().__init__(components, start_time, **kwargs)
+        self.description = "optimal ({} hour horizon)".format(self.HORIZON)
+        self.allow_fast_forward = True
+        self.set_interval(self.interval)
+        # last plan of each GC: device ID -> planned power for each timestep
+        # starting point of solver, used if solver does not find a solution
+        self.plans = {gc_id: {} for gc_id in self.world_state.grid_connectors}
+
+    def set_interval(self, interval):
+        """ Change length of timestep, horizon keeps its duration.
+
+        :param interval: length of timestep
+        :type interval: timedelta
+        """
+        super().set_interval(interval)
+        self.timesteps_ahead = int(datetime.timedelta(hours=self.HORIZON) / self.interval)
+
+    def step(self):
+        """ Calculate charging power in each timestep.
+
+        :return: current time and commands of the charging stations
+        :rtype: dict
+        """
+        # reset charging station power (nothing charged yet in this timestep)
+        for cs in self.world_state.charging_stations.values():
+            cs.current_power = 0
+        commands = self.step_gcs()
+        return {'current_time': self.current_time, 'commands': commands}
+
+    def get_horizon(self, gc_id, gc):
+        """ Predict fixed load, maximum power, price and schedule of GC for each timestep.
+
+        :param gc_id: grid connector ID
+        :type gc_id: str
+        :param gc: grid connector
+        :type gc: spice_ev.components.GridConnector
+        :return: list of dictionaries with GC info for each timestep in horizon
+        :rtype: list
+        """
+        timesteps = []
+        cur_cost = gc.cost
+        cur_target = gc.target
+        cur_max_power = gc.cur_max_power
+        cur_local_generation = {k: -v for k, v in gc.current_loads.items() if v < 0}
+
+        event_idx = 0
+        cur_time = self.current_time - self.interval
+        for timestep_idx in range(self.timesteps_ahead):
+            cur_time += self.interval
+            # peek into future events
+            while event_idx < len(self.world_state.future_events):
+                event = self.world_state.future_events[event_idx]
+                if event.start_time > cur_time:
+                    # not this timestep
+                    break
+                event_idx += 1
+                if type(event) is events.GridOperatorSignal:
+                    if event.grid_connector_id != gc_id:
+                        continue
+                    # update GC info
+                    if event.max_power is not None:
+                        cur_max_power = event.max_power
+                    if event.cost is not None:
+                        cur_cost = event.cost
+                    if event.target is not None:
+                        cur_target = event.target
+                elif type(event) is events.LocalEnergyGeneration:
+                    if event.grid_connector_id != gc_id:
+                        continue
+                    cur_local_generation[event.name] = event.value
+                # vehicle events ignored (use vehicle info such as estimated_time_of_departure)
+
+            # get (predicted) fixed load
+            if timestep_idx == 0:
+                # use actual fixed load
+                fixed_load = gc.get_current_load()
+            else:
+                fixed_load = gc.get_avg_fixed_load(cur_time, self.interval) \
+                           - sum(cur_local_generation.values())
+            timesteps.append({
+                "fixed_load": fixed_load,
+                "max_power": cur_max_power,
+                "price": util.get_cost(1, cur_cost) if cur_cost else 0,
+                "target": cur_target,
+            })
+        return timesteps
+
+    def get_devices(self, gc_id):
+        """ Collect vehicles and batteries at GC with their limits within horizon.
+
+        :param gc_id: grid connector ID
+        :type gc_id: str
+        :return: dictionary of device ID -> info dict
+        :rtype: dict
+        """
+        horizon_duration = self.timesteps_ahead * self.interval
+        devices = {}
+        for v_id in sorted(self.world_state.vehicles):
+            vehicle = self.world_state.vehicles[v_id]
+            cs_id = vehicle.connected_charging_station
+            if cs_id is None:
+                continue
+            cs = self.world_state.charging_stations[cs_id]
+            if cs.parent != gc_id:
+                continue
+            battery = vehicle.battery
+            energy = battery.soc * battery.capacity
+            departure = vehicle.estimated_time_of_departure
+            target_energy = max(vehicle.desired_soc * battery.capacity, energy)
+            if departure is None:
+                # unknown departure: charge within horizon
+                num_ts = self.timesteps_ahead
+            else:
+                # number of timesteps until departure (round up), at least current timestep
+                num_ts = -((departure - self.current_time) // -self.interval)
+                num_ts = min(max(num_ts, 1), self.timesteps_ahead)
+                if departure - self.current_time > horizon_duration:
+                    # departure after horizon: charge proportionally within horizon
+                    target_energy = energy + (target_energy - energy) * (
+                        horizon_duration / (departure - self.current_time))
+            v2g = vehicle.vehicle_type.v2g
+            devices[v_id] = {
+                "cs_id": cs_id,
+                "battery": battery,
+                "num_ts": num_ts,
+                "energy": energy,
+                "min_charge": max(cs.min_power, vehicle.vehicle_type.min_charging_power),
+                "max_charge": min(cs.max_power, battery.loading_curve.max_power),
+                "max_discharge": (
+                    min(cs.max_power, battery.unloading_curve.max_power) if v2g else 0),
+                "min_energy": min(
+                    energy, vehicle.vehicle_type.discharge_limit * battery.capacity if v2g else 0),
+                "target_energy": target_energy,
+            }
+        for b_id in sorted(self.world_state.batteries):
+            battery = self.world_state.batteries[b_id]
+            if battery.parent != gc_id:
+                continue
+            energy = battery.soc * battery.capacity
+            devices[b_id] = {
+                "cs_id": None,
+                "battery": battery,
+                "num_ts": self.timesteps_ahead,
+                "energy": energy,
+                "min_charge": battery.min_charging_power,
+                "max_charge": battery.loading_curve.max_power,
+                "max_discharge": battery.unloading_curve.max_power,
+                "min_energy": min(energy, 0),
+                "target_energy": None,
+            }
+        return devices
+
+    def solve(self, timesteps, devices, start=None):
+        """ Find optimal power of each device for each timestep in horizon.
+
+        Variables per device and timestep: charging power, discharging power (if possible)
+        and stored energy at end of timestep. Per timestep: GC power.
+        Additionally: peak power, schedule deviation and missing energy per vehicle.
+        With *MIN_POWER_MILP*, charging power with minimum is semi-continuous:
+        either zero or between minimum and maximum.
+
+        :param timesteps: GC info for each timestep in horizon (see get_horizon)
+        :type timesteps: list
+        :param devices: vehicles and batteries at GC (see get_devices)
+        :type devices: dict
+        :param start: device ID -> power for each timestep, e.g. previous plan.
+            Starting point of solver (needs highspy), missing values are zero.
+        :type start: dict
+        :return: device ID -> planned power for each timestep or None if no solution was found
+        :rtype: dict
+        """
+        from scipy import optimize, sparse
+
+        num_ts = len(timesteps)
+        ts_per_hour = self.ts_per_hour
+        dt = 1 / ts_per_hour
+        # variables: blocks of cost, bounds and type (0: continuous,
+        # 2: semi-continuous, zero or within bounds), concatenated at the end
+        objective, lower, upper, integrality = [], [], [], []
+        # sparse matrices: blocks of (row, column, value) and right-hand side
+        eq_entries, b_eq = [], []
+        ub_entries, b_ub = [], []
+        num_vars = 0
+        num_rows = {"eq": 0, "ub": 0}
+
+        def add_variables(num, low, high, cost, semi_continuous=False):
+            # return indices of new variables, no upper bound: None
+            nonlocal num_vars
+            idx = np.arange(num_vars, num_vars + num)
+            num_vars += num
+            objective.append(np.broadcast_to(np.asarray(cost, dtype=float), num))
+            lower.append(np.broadcast_to(np.asarray(low, dtype=float), num))
+            upper.append(np.broadcast_to(np.inf if high is None else np.asarray(
+                high, dtype=float), num))
+            integrality.append(np.full(num, 2 if semi_continuous else 0))
+            return idx
+
+        def add_rows(kind, rhs):
+            # return indices of new (in)equality rows with given right-hand side
+            rhs = np.atleast_1d(np.asarray(rhs, dtype=float))
+            (b_eq if kind == "eq" else b_ub).append(rhs)
+            first = num_rows[kind]
+            num_rows[kind] += len(rhs)
+            return np.arange(first, first + len(rhs))
+
+        def add_entries(kind, rows, cols, vals):
+            rows, cols = np.broadcast_arrays(rows, cols)
+            (eq_entries if kind == "eq" else ub_entries).append(
+                (rows, cols, np.broadcast_to(np.asarray(vals, dtype=float), rows.shape)))
+
+        # GC power per timestep: power drawn from grid and feed-in of local surplus
+        # feed-in has no revenue, small penalty: rather store local generation
+        fixed_load = np.array([ts["fixed_load"] for ts in timesteps], dtype=float)
+        max_power = np.array([ts["max_power"] for ts in timesteps], dtype=float)
+        price = np.array([ts["price"] for ts in timesteps], dtype=float)
+        grid_idx = add_variables(
+            num_ts, 0, np.maximum(max_power, np.maximum(fixed_load, 0)),
+            self.COST_WEIGHT * price * dt)
+        feed_in_idx = add_variables(num_ts, 0, np.maximum(-fixed_load, 0), 1e-3 * dt)
+        # GC balance: sum of device power - grid power + feed-in = -fixed load
+        balance_rows = add_rows("eq", -fixed_load)
+        add_entries("eq", balance_rows, grid_idx, -1)
+        add_entries("eq", balance_rows, feed_in_idx, 1)
+
+        # peak power within horizon: grid power - peak <= 0
+        peak_idx = add_variables(1, 0, None, self.PEAK_WEIGHT)[0]
+        peak_rows = add_rows("ub", np.zeros(num_ts))
+        add_entries("ub", peak_rows, grid_idx, 1)
+        add_entries("ub", peak_rows, peak_idx, -1)
+
+        # schedule: grid power - feed-in - positive deviation + negative deviation = target
+        deviation_idx = []
+        for ts_idx, ts_info in enumerate(timesteps):
+            if ts_info["target"] is None or not self.SCHEDULE_WEIGHT:
+                continue
+            dev_idx = add_variables(2, 0, None, self.SCHEDULE_WEIGHT * dt)
+            deviation_idx.append((ts_idx, dev_idx))
+            row = add_rows("eq", ts_info["target"])
+            add_entries(
+                "eq", row, [grid_idx[ts_idx], feed_in_idx[ts_idx], dev_idx[0], dev_idx[1]],
+                [1, -1, -1, 1])
+
+        plan_idx = {}
+        # starting point: given power of devices, other variables follow
+        x0 = []
+        net_power = fixed_load.copy()
+        for device_id, info in devices.items():
+            n = info["num_ts"]
+            battery = info["battery"]
+            ts_range = np.arange(n)
+            # prefer early charging and avoid needless discharging with equal costs
+            if info["min_charge"] > info["max_charge"]:
+                # minimum power can not be reached
+                charge_bounds = (0, 0)
+                charge_idx = add_variables(n, *charge_bounds, 0)
+            elif info["min_charge"] > self.EPS and self.MIN_POWER_MILP:
+                # charge with at least minimum power or not at all
+                charge_bounds = (info["min_charge"], info["max_charge"])
+                charge_idx = add_variables(
+                    n, *charge_bounds, (ts_range + 1) * 1e-6, semi_continuous=True)
+            else:
+                charge_bounds = (0, info["max_charge"])
+                charge_idx = add_variables(n, *charge_bounds, (ts_range + 1) * 1e-6)
+            discharge_idx = None
+            if info["max_discharge"] > 0:
+                discharge_idx = add_variables(n, 0, info["max_discharge"], 1e-5)
+            energy_idx = add_variables(
+                n, info["min_energy"], max(battery.capacity, info["energy"]), 0)
+            plan_idx[device_id] = (charge_idx, discharge_idx)
+
+            power = np.zeros(n)
+            start_power = (start or {}).get(device_id, [])[:n]
+            power[:len(start_power)] = start_power
+            charge = np.clip(power, *charge_bounds)
+            discharge = np.zeros(n)
+            if discharge_idx is not None:
+                discharge = np.clip(-power, 0, info["max_discharge"])
+            energy = info["energy"] + np.cumsum(
+                battery.efficiency * dt * charge - dt / battery.efficiency * discharge)
+            net_power[:n] += charge - discharge
+            x0.append((charge_idx, charge))
+            if discharge_idx is not None:
+                x0.append((discharge_idx, discharge))
+            x0.append((energy_idx, energy))
+
+            # stored energy: e[t] - e[t-1] - eff * dt * charge + dt / eff * discharge = 0
+            rhs = np.zeros(n)
+            rhs[0] = info["energy"]
+            energy_rows = add_rows("eq", rhs)
+            add_entries("eq", energy_rows, energy_idx, 1)
+            add_entries("eq", energy_rows, charge_idx, -battery.efficiency * dt)
+            add_entries("eq", energy_rows[1:], energy_idx[:-1], -1)
+            if discharge_idx is not None:
+                add_entries("eq", energy_rows, discharge_idx, dt / battery.efficiency)
+
+            # power at GC
+            add_entries("eq", balance_rows[:n], charge_idx, 1)
+            if discharge_idx is not None:
+                add_entries("eq", balance_rows[:n], discharge_idx, -1)
+
+            if info["target_energy"] is not None:
+                # energy at departure: -e[n-1] - missing energy <= -target energy
+                missing_idx = add_variables(1, 0, None, self.SOC_PENALTY)[0]
+                x0.append((missing_idx, max(info["target_energy"] - energy[-1], 0)))
+                row = add_rows("ub", -info["target_energy"])
+                add_entries("ub", row, [energy_idx[-1], missing_idx], -1)
+
+        objective, lower, upper, integrality = [
+            np.concatenate(blocks) for blocks in [objective, lower, upper, integrality]]
+        A_eq, A_ub = [
+            sparse.csr_array(
+                (np.concatenate(vals), (np.concatenate(rows), np.concatenate(cols))),
+                shape=(num_rows[kind], num_vars))
+            for kind, (rows, cols, vals) in [("eq", zip(*eq_entries)), ("ub", zip(*ub_entries))]]
+        b_eq, b_ub = np.concatenate(b_eq), np.concatenate(b_ub)
+        try:
+            import highspy  # noqa: F401
+        except ImportError:
+            # solve without starting point
+            options = {}
+            if self.TIME_LIMIT is not None:
+                options["time_limit"] = self.TIME_LIMIT
+            result = optimize.linprog(
+                objective, A_ub=A_ub, b_ub=b_ub, A_eq=A_eq, b_eq=b_eq,
+                bounds=np.column_stack((lower, upper)), method="highs", options=options,
+                integrality=integrality if integrality.any() else None)
+            x = result.x if result.status == 0 else None
+        else:
+            start_values = np.zeros(num_vars)
+            for idx, values in x0:
+                start_values[idx] = values
+            start_values[grid_idx] = np.maximum(net_power, 0)
+            start_values[feed_in_idx] = np.maximum(-net_power, 0)
+            start_values[peak_idx] = max(np.max(net_power), 0)
+            for ts_idx, dev_idx in deviation_idx:
+                deviation = net_power[ts_idx] - timesteps[ts_idx]["target"]
+                start_values[dev_idx] = [max(deviation, 0), max(-deviation, 0)]
+            x = _solve_highs(
+                objective, lower, upper, A_ub, b_ub, A_eq, b_eq, integrality, self.TIME_LIMIT,
+                start_values)
+        if x is None:
+            return None
+
+        plan = {}
+        for device_id, (charge_idx, discharge_idx) in plan_idx.items():
+            power = x[charge_idx]
+            if discharge_idx is not None:
+                power = power - x[discharge_idx]
+            plan[device_id] = power.tolist()
+        return plan
+
+    def step_gc(self, gc_id, gc):
+        """ Plan and apply charging power of vehicles and batteries at one GC.
+
+        :param gc_id: grid connector ID
+        :type gc_id: str
+        :param gc: grid connector
+        :type gc: spice_ev.components.GridConnector
+        :return: commands for charging stations
+        :rtype: dict
+        """
+        commands = {}
+        devices = self.get_devices(gc_id)
+        if not devices:
+            self.plans[gc_id] = {}
+            return commands
+
+        plan = self.solve(self.get_horizon(gc_id, gc), devices, self.plans[gc_id])
+        if plan is None:
+            # no solution found: continue previous plan (charge greedily if unknown),
+            # power is limited by GC when applied
+            plan = {
+                device_id: self.plans[gc_id].get(device_id) or [info["max_charge"]]
+                for device_id, info in devices.items()}
+        self.plans[gc_id] = {device_id: power[1:] for device_id, power in plan.items()}
+
+        # apply first timestep of plan
+        for device_id, info in devices.items():
+            power = plan[device_id][0] if plan[device_id] else 0
+            if power > self.EPS:
+                # don't exceed maximum power of GC
+                power = min(power, max(gc.cur_max_power - gc.get_current_load(), 0))
+            cs_id = info["cs_id"]
+            battery = info["battery"]
+            if cs_id is None:
+                # stationary battery
+                if power > self.EPS:
+                    power = 0 if power < battery.min_charging_power else power
+                    avg_power = battery.load(self.interval, max_power=power)["avg_power"]
+                elif power < -self.EPS:
+                    avg_power = -battery.unload(self.interval, max_power=-power)["avg_power"]
+                else:
+                    avg_power = 0
+                gc.add_load(device_id, avg_power)
+                continue
+
+            vehicle = self.world_state.vehicles[device_id]
+            cs = self.world_state.charging_stations[cs_id]
+            if power > self.EPS:
+                # planned power may be below minimum power (not part of linear program):
+                # charge with minimum power if GC can provide it, otherwise not at all
+                if power < info["min_charge"] and (
+                        info["min_charge"] <= gc.cur_max_power - gc.get_current_load()):
+                    power = info["min_charge"]
+                power = util.clamp_power(power, vehicle, cs)
+                avg_power = battery.load(self.interval, max_power=power)["avg_power"]
+            elif power < -self.EPS:
+                avg_power = -battery.unload(
+                    self.interval, max_power=-power,
+                    target_soc=vehicle.vehicle_type.discharge_limit)["avg_power"]
+            else:
+                avg_power = 0
+            commands[cs_id] = gc.add_load(cs_id, avg_power)
+            cs.current_power += avg_power
+        return commands
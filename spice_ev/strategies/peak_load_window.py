@@ -18,8 +18,11 @@ class PeakLoadWindow(Strategy):
         super().__init__(components, start_time, **kwargs)
 
         self.description = "peak load window"
+        self.allow_fast_forward = True
         self.uses_window = True
         self.start_time = start_time
+        # peak power is updated when simulating GC
+        self.gc_attributes = ["peak_power"]
 
         if self.time_windows is None:
             raise Exception("Need time windows for Peak Load Window strategy")
@@ -139,22 +142,35 @@ class PeakLoadWindow(Strategy):
                     peak_power[gc_id] = gc_sum_loads
                     peak_time[gc_id] = cur_time
             self.events.append(cur_events)
+        # length of timestep of self.events (may differ from current interval)
+        self.events_interval = self.interval
         self.peak_power = peak_power
         for gc_id, t in peak_time.items():
             if t > self.stop_time:
                 warnings.warn(f"Peak power of {peak_power[gc_id]} kW at {gc_id} "
                               f"is not within simulation time, but at {t}")
 
+    def get_window(self, gc_id, dt):
+        """ Get time window of grid connector at given time from time windows.
+
+        :param gc_id: grid connector ID
+        :type gc_id: str
+        :param dt: time
+        :type dt: datetime.datetime
+        :return: whether time is within load window of grid connector
+        :rtype: bool
+        """
+        gc = self.world_state.grid_connectors[gc_id]
+        return util.datetime_within_time_window(
+            dt, self.time_windows[gc.grid_operator], gc.voltage_level)
+
     def step(self):
         """ Calculate charging power in each timestep.
 
         :return: current time and commands of the charging stations
         :rtype: dict
         """
-        commands = dict()
-        for gc_id, gc in self.world_state.grid_connectors.items():
-            assert gc.voltage_level is not None
-            commands.update(self.step_gc(gc_id, gc))
+        commands = self.step_gcs()
         return {'current_time': self.current_time, 'commands': commands}
 
     def step_gc(self, gc_id, gc):
@@ -192,8 +208,7 @@ class PeakLoadWindow(Strategy):
             bid: b for bid, b in self.world_state.batteries.items() if b.parent == gc_id}
 
         def within_window(dt):
-            return util.datetime_within_time_window(
-                dt, self.time_windows[gc.grid_operator], gc.voltage_level)
+            return self.get_window(gc_id, dt)
 
         gc.window = within_window(self.current_time)
         if stationary_batteries:
@@ -212,8 +227,16 @@ class PeakLoadWindow(Strategy):
         # step() may get called multiple times or not at all in distributed strategy,
         # so self.events should not be changed after initialization
         # instead, calculate next timestep index to find event list offset
-        event_idx = ((self.current_time - self.start_time) // self.interval) + 1
-        future_event_lists = self.events[event_idx:event_idx+timesteps_ahead]
+        event_idx = ((self.current_time - self.start_time) // self.events_interval) + 1
+        events_per_ts = max(self.interval // self.events_interval, 1)
+        if events_per_ts == 1:
+            future_event_lists = self.events[event_idx:event_idx+timesteps_ahead]
+        else:
+            # current timestep is longer: combine event lists
+            stop_idx = min(event_idx + timesteps_ahead * events_per_ts, len(self.events))
+            future_event_lists = [
+                sum(self.events[idx:idx+events_per_ts], [])
+                for idx in range(event_idx, stop_idx, events_per_ts)]
         # prepend empty list for current timestep (all current events done, used for init)
         future_event_lists = [[]] + future_event_lists
         for event_list in future_event_lists:
@@ -16,6 +16,7 @@ class PeakShaving(Strategy):
         super().__init__(components, start_time, **kwargs)
         self.HORIZON = dt.timedelta(hours=self.HORIZON)
         self.description = "Peak Shaving"
+        self.allow_fast_forward = True
 
         if self.perfect_foresight:
             all_events = self.events.vehicle_events + self.events.grid_operator_signals
@@ -49,9 +50,7 @@ class PeakShaving(Strategy):
         :return: current time and commands of the charging stations
         :rtype: dict
         """
-        charging_stations = {}
-        for gc_id, gc in self.world_state.grid_connectors.items():
-            charging_stations.update(self.step_gc(gc_id, gc))
+        charging_stations = self.step_gcs()
         return {'current_time': self.current_time, 'commands': charging_stations}
 
     def step_gc(self, gc_id, gc):
@@ -4,7 +4,7 @@ import warnings
 
 import spice_ev.events as events
 from spice_ev.strategy import Strategy
-from spice_ev.util import clamp_power, dt_within_core_standing_time
+from spice_ev.util import clamp_power, CoreStandingTime
 
 
 class Schedule(Strategy):
@@ -24,6 +24,8 @@ class Schedule(Strategy):
 
         self.description = "schedule ({})".format(self.LOAD_STRAT)
         self.uses_schedule = True
+        # charging plan of core standing time has fixed timesteps
+        self.allow_adaptive_interval = False
 
         assert self.LOAD_STRAT in allowed_substrats, (
             f"Unknown charging strategy: {self.LOAD_STRAT}. "
@@ -35,6 +37,8 @@ class Schedule(Strategy):
                     "Only one grid connector allowed for collective sub-strategy")
             assert self.core_standing_time is not None, (
                 "Provide core standing times in the generate_schedule.cfg")
+            # compile core standing time once for fast lookups
+            self.core_standing_calendar = CoreStandingTime(self.core_standing_time)
 
     def dt_to_end_of_time_window(self):
         """Return timedelta between now and end of core standing time (resolution: one minute).
@@ -43,13 +47,8 @@ class Schedule(Strategy):
         :rtype: timedelta
         """
 
-        duration = timedelta()
-        interval = timedelta(minutes=1)
-
-        while dt_within_core_standing_time(self.current_time + duration, self.core_standing_time):
-            duration += interval
-
-        return duration
+        return self.core_standing_calendar.time_until_end(
+            self.current_time, resolution=timedelta(minutes=1))
 
     def sim_balanced_charging(self, vehicle, dt, max_power, delta_soc=None):
         """ Simulate a balanced charging process for a single vehicle.
@@ -771,7 +770,7 @@ class Schedule(Strategy):
         charging_stations = {}
 
         if self.LOAD_STRAT == "collective":
-            if dt_within_core_standing_time(self.current_time, self.core_standing_time):
+            if self.core_standing_calendar.within(self.current_time):
                 # only run in first TS of core standing time
                 if not self.currently_in_core_standing_time:
                     self.evaluate_core_standing_time_ahead()
@@ -1,15 +1,18 @@
+import concurrent.futures
 from copy import deepcopy
 
 from datetime import timedelta
 from importlib import import_module
+import warnings
 from warnings import warn
+import weakref
 
 from spice_ev import events
 from spice_ev.util import get_cost, clamp_power
 
 STRATEGIES = [
     'greedy', 'balanced', 'balanced_market', 'distributed',
-    'peak_load_window', 'peak_shaving', 'flex_window', 'schedule'
+    'peak_load_window', 'peak_shaving', 'flex_window', 'schedule', 'optimal'
 ]
 
 
@@ -20,6 +23,56 @@ def class_from_str(strategy_name):
     return getattr(module, class_name)
 
 
+# strategy of worker process, set by _init_gc_worker
+_gc_worker = dict()
+
+
+def _init_gc_worker(strategy, gc_ids):
+    """ Initialize worker process that always simulates the same grid connectors.
+
+    :param strategy: copy of strategy, kept by worker between timesteps
+    :type strategy: Strategy
+    :param gc_ids: IDs of grid connectors simulated by this worker
+    :type gc_ids: list
+    """
+    strategy.gc_ids = gc_ids
+    strategy.PROCESSES = 1
+    strategy.gc_workers = None
+    _gc_worker["strategy"] = strategy
+
+
+def _step_gc_worker(data):
+    """ Simulate grid connectors of worker process for one timestep.
+
+    The worker keeps its own world state. It is updated with the SoC of vehicles
+    charged by other workers and the new events, like in the main process.
+
+    :param data: current time, timestep length, new events, vehicle SoC
+        and SoC of stationary batteries with losses
+    :type data: tuple
+    :return: commands and changed state of each grid connector of worker
+    :rtype: list
+    """
+    strat = _gc_worker["strategy"]
+    current_time, interval, event_list, socs, battery_socs = data
+    for v_id, soc in socs.items():
+        strat.world_state.vehicles[v_id].battery.soc = soc
+    for b_id, soc in battery_socs.items():
+        strat.world_state.batteries[b_id].soc = soc
+    if interval != strat.interval:
+        strat.set_interval(interval)
+    strat.current_time = current_time - interval
+    with warnings.catch_warnings():
+        # events have already been checked by main process
+        warnings.simplefilter("ignore")
+        Strategy.step(strat, event_list)
+    gc_commands = {gc_id: dict() for gc_id in strat.gc_ids}
+    for cs_id, power in strat.step()["commands"].items():
+        gc_id = strat.world_state.charging_stations[cs_id].parent
+        gc_commands.setdefault(gc_id, dict())[cs_id] = power
+    return [(gc_id, gc_commands[gc_id], strat.get_gc_state(gc_id)) for gc_id in strat.gc_ids]
+
+
 class Strategy():
     """ Parent class for the individual strategies.
 
@@ -55,10 +108,34 @@ class Strategy():
             cs.max_power = kwargs.get('CONCURRENCY', 1.0) * cs.max_power
         # dummy description (should be set in actual strategies)
         self.description = None
+        # number of worker processes to simulate grid connectors (1: sequential)
+        self.PROCESSES = 1
         # update optional
         for k, v in kwargs.items():
             setattr(self, k, v)
         # everything below can not be set by user
+        # strategy attributes with an entry for each GC, changed in step_gc
+        self.gc_attributes = []
+        # worker processes for grid connectors, created on first use
+        self.gc_workers = None
+        # grid connectors simulated by step_gcs (None: all, otherwise those of worker process)
+        self.gc_ids = None
+        # index of worker process of each grid connector
+        self.gc_worker_ids = dict()
+        # events to send to worker processes in next timestep
+        self.gc_worker_events = []
+        # SoC of vehicles charged by other workers, to send to each worker in next timestep
+        self.gc_worker_socs = []
+        # SoC of stationary batteries with losses, to send to workers in next timestep
+        self.gc_worker_battery_socs = dict()
+        # strategy supports timesteps of different length (see set_interval)
+        self.allow_adaptive_interval = True
+        # strategy does nothing without connected vehicles and stationary batteries
+        # (quiescent timesteps may be skipped by scenario, see Scenario.get_quiescent_steps)
+        self.allow_fast_forward = False
+        # stationary batteries are only used by update_batteries: idle batteries do not prevent
+        # fast-forward (see battery_stays_idle)
+        self.fast_forward_batteries = False
         # for each vehicle, save timestamps when SoC becomes negative
         self.negative_soc_tracker = {}
         # count number of times SoC is below desired SoC on departure (used in report)
@@ -66,6 +143,17 @@ class Strategy():
         # count number of times SoC is below desired SoC (with margin) on departure
         self.margin_counter = 0
 
+    def set_interval(self, interval):
+        """ Change length of timestep (adaptive time resolution).
+
+        Applies to current timestep, current time is advanced by this interval in next step.
+
+        :param interval: length of timestep
+        :type interval: timedelta
+        """
+        self.interval = interval
+        self.ts_per_hour = timedelta(hours=1) / self.interval
+
     def step(self, event_list=[]):
         """ Prepare next timestep for specific charging strategy.
 
@@ -82,6 +170,16 @@ class Strategy():
         self.current_time += self.interval
 
         self.world_state.future_events += event_list
+        if self.gc_workers is not None:
+            # worker processes keep their own world state
+            self.gc_worker_events += event_list
+            # battery losses are only applied in main process: send SoC of lossy batteries
+            lossy_socs = {v_id: v.battery.soc for v_id, v in self.world_state.vehicles.items()
+                          if v.battery.loss_rate}
+            for socs in self.gc_worker_socs:
+                socs.update(lossy_socs)
+            self.gc_worker_battery_socs = {
+                b_id: b.soc for b_id, b in self.world_state.batteries.items() if b.loss_rate}
         self.world_state.future_events.sort(key=lambda ev: ev.start_time)
 
         while True:
@@ -197,6 +295,126 @@ class Strategy():
                     "Connector {} has neither associated costs nor schedule at {}"
                     .format(name, self.current_time))
 
+    def step_gcs(self):
+        """ Run strategy for each grid connector (step_gc).
+
+        Grid connectors are independent within one timestep.
+        With *PROCESSES* > 1, grid connectors are simulated in worker processes instead.
+        Each worker keeps its own copy of the strategy and world state and always simulates
+        the same grid connectors. In each timestep, workers get the new events of their grid
+        connectors, all vehicle events (vehicles move between grid connectors) and the SoC of
+        vehicles charged by other workers or changed by battery losses (applied only in the
+        main process). They send back commands, loads and SoC of their grid connectors.
+
+        :return: commands for charging stations
+        :rtype: dict
+        """
+
+        if self.gc_ids is None:
+            gc_ids = list(self.world_state.grid_connectors.keys())
+        else:
+            gc_ids = self.gc_ids
+        num_workers = min(int(self.PROCESSES), len(gc_ids))
+        commands = dict()
+        if num_workers <= 1:
+            for gc_id in gc_ids:
+                commands.update(self.step_gc(gc_id, self.world_state.grid_connectors[gc_id]))
+            return commands
+
+        if self.gc_workers is None:
+            # fixed assignment of grid connectors to workers
+            self.gc_worker_ids = {gc_id: i % num_workers for i, gc_id in enumerate(gc_ids)}
+            self.gc_worker_socs = [dict() for _ in range(num_workers)]
+            # current state is sent once, workers update their copy themselves afterwards
+            workers = []
+            for i in range(num_workers):
+                worker = concurrent.futures.ProcessPoolExecutor(
+                    max_workers=1, initializer=_init_gc_worker,
+                    initargs=(self, gc_ids[i::num_workers]))
+                # shut down worker when strategy is no longer used
+                weakref.finalize(self, worker.shutdown)
+                workers.append(worker)
+            self.gc_workers = workers
+            self.gc_worker_events = []
+
+        # route new events to workers
+        worker_events = [[] for _ in self.gc_workers]
+        for event in self.gc_worker_events:
+            if type(event) is events.VehicleEvent:
+                for event_list in worker_events:
+                    event_list.append(event)
+            elif event.grid_connector_id in self.gc_worker_ids:
+                worker_events[self.gc_worker_ids[event.grid_connector_id]].append(event)
+        self.gc_worker_events = []
+        futures = [
+            worker.submit(_step_gc_worker, (
+                self.current_time, self.interval, worker_events[i], self.gc_worker_socs[i],
+                self.gc_worker_battery_socs))
+            for i, worker in enumerate(self.gc_workers)]
+        self.gc_worker_socs = [dict() for _ in self.gc_workers]
+        self.gc_worker_battery_socs = dict()
+        gc_results = dict()
+        for worker_idx, future in enumerate(futures):
+            for gc_id, gc_commands, gc_state in future.result():
+                gc_results[gc_id] = (gc_commands, gc_state)
+                # other workers need SoC of vehicles charged by this worker
+                for i, socs in enumerate(self.gc_worker_socs):
+                    if i != worker_idx:
+                        socs.update(gc_state["vehicles"])
+        # merge in order of grid connectors
+        for gc_id in gc_ids:
+            gc_commands, gc_state = gc_results[gc_id]
+            self.set_gc_state(gc_id, gc_state)
+            commands.update(gc_commands)
+        return commands
+
+    def get_gc_state(self, gc_id):
+        """ Get state of grid connector and its components that may change in step_gc.
+
+        :param gc_id: grid connector ID
+        :type gc_id: str
+        :return: loads and window of grid connector, power of charging stations,
+            SoC of vehicles and batteries and strategy attributes of this grid connector
+        :rtype: dict
+        """
+        gc = self.world_state.grid_connectors[gc_id]
+        cs_ids = {cs_id for cs_id, cs in self.world_state.charging_stations.items()
+                  if cs.parent == gc_id}
+        return {
+            "loads": gc.current_loads,
+            "window": gc.window,
+            "charging_stations": {
+                cs_id: self.world_state.charging_stations[cs_id].current_power
+                for cs_id in cs_ids},
+            "vehicles": {
+                v_id: v.battery.soc for v_id, v in self.world_state.vehicles.items()
+                if v.connected_charging_station in cs_ids},
+            "batteries": {
+                b_id: b.soc for b_id, b in self.world_state.batteries.items()
+                if b.parent == gc_id},
+            "attributes": {attr: getattr(self, attr)[gc_id] for attr in self.gc_attributes},
+        }
+
+    def set_gc_state(self, gc_id, gc_state):
+        """ Update grid connector and its components with state from get_gc_state.
+
+        :param gc_id: grid connector ID
+        :type gc_id: str
+        :param gc_state: state of grid connector
+        :type gc_state: dict
+        """
+        gc = self.world_state.grid_connectors[gc_id]
+        gc.current_loads = gc_state["loads"]
+        gc.window = gc_state["window"]
+        for cs_id, power in gc_state["charging_stations"].items():
+            self.world_state.charging_stations[cs_id].current_power = power
+        for v_id, soc in gc_state["vehicles"].items():
+            self.world_state.vehicles[v_id].battery.soc = soc
+        for b_id, soc in gc_state["batteries"].items():
+            self.world_state.batteries[b_id].soc = soc
+        for attr, value in gc_state["attributes"].items():
+            getattr(self, attr)[gc_id] = value
+
     def distribute_surplus_power(self):
         """ Distribute surplus power to vehicles.
 
@@ -263,12 +481,56 @@ class Strategy():
                 bat_power = battery.unload(self.interval, target_power=gc_current_load)['avg_power']
                 gc.add_load(b_id, -bat_power)
 
-    def apply_battery_losses(self):
-        """ Regardless of specific strategy, reduce SoC of lossy batteries. """
+    def get_window(self, gc_id, dt):
+        """ Get time window of grid connector at given time without events (fast-forward).
+
+        :param gc_id: grid connector ID
+        :type gc_id: str
+        :param dt: time
+        :type dt: datetime.datetime
+        :return: time window of grid connector
+        :rtype: bool or None
+        """
+        return self.world_state.grid_connectors[gc_id].window
+
+    def battery_stays_idle(self, b_id):
+        """ Check if update_batteries leaves stationary battery unused, regardless of its SoC.
+
+        This is the case if the GC has no load to support, no surplus to store and the price
+        is not low (or the power of the GC is below the minimum power of the battery).
+        Without events, only losses change the battery (see Scenario.get_quiescent_steps).
+
+        :param b_id: ID of stationary battery
+        :type b_id: str
+        :return: battery is not charged or discharged in following timesteps without events
+        :rtype: bool
+        """
+        battery = self.world_state.batteries[b_id]
+        gc = self.world_state.grid_connectors.get(battery.parent)
+        if gc is None:
+            return True
+        if gc.current_loads.get(b_id, 0) != 0:
+            # battery was used in last timestep: repeated results would include its power
+            return False
+        gc_current_load = gc.get_current_load(exclude=[b_id])
+        if get_cost(1, gc.cost) <= self.PRICE_THRESHOLD:
+            return gc.cur_max_power - gc_current_load < battery.min_charging_power
+        if gc_current_load < 0:
+            return -gc_current_load < battery.min_charging_power
+        return gc_current_load == 0
+
+    def apply_battery_losses(self, num_steps=1):
+        """ Regardless of specific strategy, reduce SoC of lossy batteries.
+
+        :param num_steps: number of timesteps with losses (closed form if more than one)
+        :type num_steps: int
+        """
         for battery in (
                         list(self.world_state.batteries.values()) +
                         [v.battery for v in self.world_state.vehicles.values()]):
-            if battery.loss_rate:
+            if battery.loss_rate and num_steps > 1:
+                battery.soc = float(battery.get_soc_after_losses(num_steps)[-1])
+            elif battery.loss_rate:
                 relative_loss = battery.loss_rate.get("relative", 0)
                 battery.soc *= 1 - relative_loss/100
                 fixed_relative_loss = battery.loss_rate.get("fixed_relative", 0)
@@ -1,8 +1,17 @@
+import bisect
 import csv
 import datetime
 import json
 from math import sqrt
+from pathlib import Path
+import tempfile
 import warnings
+import zipfile
+
+import numpy as np
+
+# binary file formats for timeseries (see write_columns)
+COLUMNAR_FORMATS = [".npz", ".parquet", ".feather"]
 
 
 def datetime_from_isoformat(s):
@@ -91,6 +100,163 @@ def dt_within_core_standing_time(dt, core_standing_time):
     return False
 
 
+class CoreStandingTime:
+    """ Compiled calendar of core standing times.
+
+    Same semantics as :func:`dt_within_core_standing_time`, but the time windows of
+    *core_standing_time* are converted once into a sorted list of daily intervals. This allows
+    fast lookups whether a given datetime is inside core standing time and how long it takes
+    until the current core standing time ends (or the next one starts).
+
+    :param core_standing_time: core standing time definition, e.g.
+        {"times": [{"start": [22, 0], "end": [5, 0]}], "no_drive_days": [6],
+        "holidays": ["2022-01-01"]}. None means always inside core standing time.
+    :type core_standing_time: dict
+    """
+
+    DAY = datetime.timedelta(days=1)
+
+    def __init__(self, core_standing_time):
+        self.always = core_standing_time is None
+        core_standing_time = core_standing_time or {}
+        self.no_drive_days = frozenset(core_standing_time.get('no_drive_days', []))
+        self.holidays = frozenset(
+            datetime.date.fromisoformat(d) for d in core_standing_time.get('holidays', []))
+
+        # daily intervals as offset since midnight: [start, end] (closed) or [start, end)
+        intervals = []
+        for time_window in core_standing_time.get('times', []):
+            start, end = [
+                datetime.timedelta(**dict(zip(
+                    ["hours", "minutes", "seconds", "microseconds"], time_window[key])))
+                for key in ['start', 'end']
+            ]
+            if end < start:
+                # over midnight: split into two intervals (end is excluded)
+                intervals.append((datetime.timedelta(), end, False))
+                intervals.append((start, self.DAY, False))
+            else:
+                intervals.append((start, end, True))
+        intervals.sort(key=lambda i: i[0])
+
+        # merge overlapping or touching intervals
+        self.starts = []
+        self.ends = []
+        self.closed = []
+        for start, end, closed in intervals:
+            if self.starts and start <= self.ends[-1]:
+                if end > self.ends[-1]:
+                    self.ends[-1] = end
+                    self.closed[-1] = closed
+                elif end == self.ends[-1]:
+                    self.closed[-1] |= closed
+            else:
+                self.starts.append(start)
+                self.ends.append(end)
+                self.closed.append(closed)
+
+        # every day is completely within core standing time
+        self.always |= self.no_drive_days >= set(range(7)) or (
+            self.starts == [datetime.timedelta()] and self.ends == [self.DAY])
+
+    def is_full_day(self, dt):
+        """ Check if the whole day of dt is within core standing time.
+
+        :param dt: time to be checked
+        :type dt: datetime
+        :return: day is a no-drive day or holiday
+        :rtype: bool
+        """
+        return self.always or dt.weekday() in self.no_drive_days or dt.date() in self.holidays
+
+    def _get_interval(self, dt):
+        # get index of daily interval containing dt (None if not within any interval)
+        t = dt - dt.replace(hour=0, minute=0, second=0, microsecond=0)
+        i = bisect.bisect_right(self.starts, t) - 1
+        if i >= 0 and (t < self.ends[i] or (t == self.ends[i] and self.closed[i])):
+            return i
+        return None
+
+    def within(self, dt):
+        """ Check if datetime dt is inside core standing time.
+
+        :param dt: time to be checked
+        :type dt: datetime
+        :return: dt is within core standing time
+        :rtype: bool
+        """
+        return self.is_full_day(dt) or self._get_interval(dt) is not None
+
+    def time_until_end(self, dt, resolution=datetime.timedelta(minutes=1)):
+        """ Get duration from dt until end of current core standing time.
+
+        The duration is a multiple of *resolution*, equivalent to advancing a clock in steps of
+        *resolution* from dt until it is outside of core standing time.
+
+        :param dt: start time
+        :type dt: datetime
+        :param resolution: step size
+        :type resolution: timedelta
+        :raises ValueError: if core standing time never ends
+        :return: duration (zero if dt is not within core standing time)
+        :rtype: timedelta
+        """
+        if self.always:
+            raise ValueError("Core standing time never ends")
+        n_steps = 0
+        cur_time = dt
+        while self.within(cur_time):
+            midnight = cur_time.replace(hour=0, minute=0, second=0, microsecond=0)
+            if self.is_full_day(cur_time):
+                # end of day (excluded)
+                end, closed = midnight + self.DAY, False
+            else:
+                i = self._get_interval(cur_time)
+                end, closed = midnight + self.ends[i], self.closed[i]
+            # first step after end of interval
+            n_steps, remainder = divmod(end - dt, resolution)
+            n_steps += 1 if closed or remainder else 0
+            cur_time = dt + n_steps * resolution
+        return n_steps * resolution
+
+    def time_until_start(self, dt, resolution=datetime.timedelta(minutes=1)):
+        """ Get duration from dt until start of next core standing time.
+
+        The duration is a multiple of *resolution*, equivalent to advancing a clock in steps of
+        *resolution* from dt until it is within core standing time.
+
+        :param dt: start time
+        :type dt: datetime
+        :param resolution: step size
+        :type resolution: timedelta
+        :raises ValueError: if there is no core standing time
+        :return: duration (zero if dt is within core standing time)
+        :rtype: timedelta
+        """
+        if not (self.always or self.starts or self.no_drive_days or (
+                self.holidays and max(self.holidays) >= dt.date())):
+            raise ValueError("Core standing time never starts")
+        n_steps = 0
+        cur_time = dt
+        while not self.within(cur_time):
+            midnight = cur_time.replace(hour=0, minute=0, second=0, microsecond=0)
+            t = cur_time - midnight
+            i = bisect.bisect_right(self.starts, t)
+            if i < len(self.starts):
+                # next interval on same day
+                start = midnight + self.starts[i]
+            else:
+                # next day: either full day or first interval
+                next_day = midnight + self.DAY
+                if self.starts and not self.is_full_day(next_day):
+                    start = next_day + self.starts[0]
+                else:
+                    start = next_day
+            n_steps = -((dt - start) // resolution)
+            cur_time = dt + n_steps * resolution
+        return n_steps * resolution
+
+
 def get_time_windows_from_json(filepath, grid_operator, voltage_level, scenario):
     """ Create a time window timeseries for whole scenario from input file.
 
@@ -239,6 +405,28 @@ def clamp_power(power, vehicle, cs):
     return power
 
 
+def clamp_power_array(power, vehicle, cs):
+    """ Return power that is actually available at charging station for each given power.
+
+    Same as :py:func:`clamp_power`, with array operations.
+
+    :param power: available charging power
+    :type power: list or numpy.ndarray
+    :param vehicle: Vehicle object
+    :type vehicle: vehicle object
+    :param cs: Charging station object
+    :type cs: object
+    :return: power
+    :rtype: numpy.ndarray
+    """
+
+    power = np.asarray(power, dtype=float)
+    total_power = np.minimum(cs.current_power + power, cs.max_power)
+    unusable = ((total_power < cs.min_power)
+                | (total_power < vehicle.vehicle_type.min_charging_power))
+    return np.where(unusable, 0, np.maximum(np.minimum(power, cs.max_power - cs.current_power), 0))
+
+
 def set_options_from_config(args, check=None, verbose=True):
     """ Update given options from config file.
 
@@ -376,3 +564,180 @@ def read_grid_file(grid_path):
 
     assert len(residual_load) == len(curtailment)
     return residual_load, curtailment, grid_start_time
+
+
+def _column_to_array(column):
+    """ Convert timeseries column to NumPy array (see write_columns).
+
+    :param column: values of column
+    :type column: iterable
+    :return: values of column, timestamps as datetime64, missing values as NaN
+    :rtype: numpy.ndarray
+    """
+    column = list(column)
+    if column and isinstance(column[0], datetime.datetime):
+        return np.array(column, dtype="datetime64[us]")
+    array = np.asarray(column)
+    if array.dtype == object:
+        # missing values (e.g. window signal)
+        array = np.array([np.nan if v is None else v for v in column], dtype=float)
+    return array
+
+
+def write_columns(path, columns):
+    """ Write timeseries columns to binary columnar file.
+
+    Format is chosen by file extension (see COLUMNAR_FORMATS):
+
+    * .npz: NumPy archive with one array per column
+    * .parquet, .feather: Apache Parquet / Arrow IPC file (requires pyarrow)
+
+    Missing values (None) of numeric columns are stored as NaN in NumPy archives.
+
+    :param path: path of output file
+    :type path: str or pathlib.Path
+    :param columns: column name -> list of values
+    :type columns: dict
+    :raises ValueError: if file extension is not supported
+    """
+
+    suffix = Path(path).suffix
+    if suffix == ".npz":
+        arrays = {name: _column_to_array(column) for name, column in columns.items()}
+        with open(path, "wb") as f:
+            np.savez(f, **arrays)
+    elif suffix in [".parquet", ".feather"]:
+        import pyarrow as pa
+        table = pa.table({name: list(column) for name, column in columns.items()})
+        if suffix == ".parquet":
+            import pyarrow.parquet
+            pyarrow.parquet.write_table(table, path)
+        else:
+            import pyarrow.feather
+            pyarrow.feather.write_feather(table, path)
+    else:
+        raise ValueError(f"Unknown columnar file format {suffix}, use one of {COLUMNAR_FORMATS}")
+
+
+def write_column_blocks(path, names, blocks):
+    """ Write timeseries columns to binary columnar file block by block.
+
+    Same as write_columns, but the columns are given as blocks of consecutive rows,
+    so only one block has to be in memory (e.g. out-of-core mode).
+    Blocks are stored in temporary files first to find the common type of each column
+    (e.g. missing values in some blocks only).
+
+    :param path: path of output file
+    :type path: str or pathlib.Path
+    :param names: column names
+    :type names: list
+    :param blocks: column name -> list of values for each block
+    :type blocks: iterable of dicts
+    :raises ValueError: if file extension is not supported
+    """
+
+    suffix = Path(path).suffix
+    if suffix not in COLUMNAR_FORMATS:
+        raise ValueError(f"Unknown columnar file format {suffix}, use one of {COLUMNAR_FORMATS}")
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        block_paths = []
+        if suffix == ".npz":
+            dtypes = {}
+            length = 0
+            for block in blocks:
+                arrays = {name: _column_to_array(block[name]) for name in names}
+                if not names or not len(arrays[names[0]]):
+                    # empty block, type unknown
+                    continue
+                for name, array in arrays.items():
+                    dtypes[name] = np.result_type(dtypes.get(name, array.dtype), array.dtype)
+                length += len(arrays[names[0]])
+                block_paths.append(Path(tmp_dir) / f"block_{len(block_paths)}.npz")
+                np.savez(block_paths[-1], **arrays)
+            # same as np.savez, but each column is written block by block
+            with zipfile.ZipFile(path, "w", allowZip64=True) as zf:
+                for name in names:
+                    dtype = dtypes.get(name, np.dtype(float))
+                    with zf.open(name + ".npy", "w", force_zip64=True) as f:
+                        np.lib.format.write_array_header_1_0(f, {
+                            "descr": np.lib.format.dtype_to_descr(dtype),
+                            "fortran_order": False,
+                            "shape": (length,)})
+                        for block_path in block_paths:
+                            with np.load(block_path) as data:
+                                f.write(data[name].astype(dtype).tobytes())
+            return
+
+        import pyarrow as pa
+        import pyarrow.ipc
+        schemas = []
+        for block in blocks:
+            table = pa.table({name: list(block[name]) for name in names})
+            if not table.num_rows:
+                # empty block, type unknown
+                continue
+            schemas.append(table.schema)
+            block_paths.append(Path(tmp_dir) / f"block_{len(block_paths)}.arrow")
+            with pyarrow.ipc.new_file(block_paths[-1], table.schema) as writer:
+                writer.write_table(table)
+        if schemas:
+            # e.g. missing values in first block, integers in some blocks only
+            schema = pa.unify_schemas(schemas, promote_options="permissive")
+        else:
+            schema = pa.schema([(name, pa.float64()) for name in names])
+        if suffix == ".parquet":
+            import pyarrow.parquet
+            writer = pyarrow.parquet.ParquetWriter(path, schema)
+        else:
+            writer = pyarrow.ipc.new_file(path, schema)
+        with writer:
+            for block_path in block_paths:
+                with pyarrow.ipc.open_file(block_path) as reader:
+                    writer.write_table(reader.read_all().cast(schema))
+
+
+def read_columns(path):
+    """ Read timeseries columns from binary columnar file (see write_columns).
+
+    :param path: path of columnar file
+    :type path: str or pathlib.Path
+    :raises ValueError: if file extension is not supported
+    :return: column name -> list of values
+    :rtype: dict
+    """
+
+    suffix = Path(path).suffix
+    if suffix == ".npz":
+        with np.load(path) as data:
+            return {name: data[name].tolist() for name in data.files}
+    if suffix == ".parquet":
+        import pyarrow.parquet
+        return pyarrow.parquet.read_table(path).to_pydict()
+    if suffix == ".feather":
+        import pyarrow.feather
+        return pyarrow.feather.read_table(path).to_pydict()
+    raise ValueError(f"Unknown columnar file format {suffix}, use one of {COLUMNAR_FORMATS}")
+
+
+def read_column_names(path):
+    """ Read names of columns of binary columnar file without reading its values.
+
+    :param path: path of columnar file
+    :type path: str or pathlib.Path
+    :raises ValueError: if file extension is not supported
+    :return: column names
+    :rtype: list
+    """
+
+    suffix = Path(path).suffix
+    if suffix == ".npz":
+        with np.load(path) as data:
+            return list(data.files)
+    if suffix == ".parquet":
+        import pyarrow.parquet
+        return pyarrow.parquet.read_schema(path).names
+    if suffix == ".feather":
+        import pyarrow.ipc
+        with pyarrow.ipc.open_file(path) as reader:
+            return reader.schema.names
+    raise ValueError(f"Unknown columnar file format {suffix}, use one of {COLUMNAR_FORMATS}")
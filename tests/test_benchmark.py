@@ -0,0 +1,83 @@
+import json
+
+import benchmark
+from spice_ev.strategies import greedy
+
+
+class TestBenchmark:
+
+    def test_create_scenario(self, tmp_path):
+        case = {"vehicles": 4, "gcs": 2, "battery": True, "v2g": True, "pv": True}
+        path = benchmark.create_scenario(case, tmp_path)
+        j = json.loads(path.read_text())
+        components = j["components"]
+        assert set(components["grid_connectors"]) == {"GC1", "GC2"}
+        assert len(components["vehicles"]) == 4
+        # charging stations distributed evenly, named as depot stations
+        parents = [cs["parent"] for cs in components["charging_stations"].values()]
+        assert sorted(parents) == ["GC1", "GC1", "GC2", "GC2"]
+        assert all(cs_id.endswith("_deps") for cs_id in components["charging_stations"])
+        for event in j["events"]["vehicle_events"]:
+            cs_id = event["update"].get("connected_charging_station")
+            assert cs_id is None or cs_id in components["charging_stations"]
+        assert set(components["batteries"]) == {"BAT_GC1", "BAT_GC2"}
+        assert set(components["photovoltaics"]) == {"PV_GC1", "PV_GC2"}
+        assert set(j["events"]["local_generation"]) == {"PV_GC1", "PV_GC2"}
+        assert all(vt["v2g"] for vt in components["vehicle_types"].values())
+        benchmark.load_scenario(path)
+
+    def test_benchmark_case(self):
+        case = {"vehicles": 2, "schedule": True}
+        result = benchmark.benchmark_case(case, ["greedy", "schedule"], repeat=2)
+        assert result["name"] == "statistics_v2_gc1_d1_i15+schedule"
+        assert result["size"]["vehicles"] == 2
+        assert result["size"]["n_intervals"] == 96
+        assert result["load"]["status"] == "ok"
+        assert len(result["load"]["runs"]) == 2
+        for strategy in ["greedy", "schedule"]:
+            steps = result["strategies"][strategy]
+            assert list(steps) == ["simulate", "report", "costs"]
+            for info in steps.values():
+                assert info["status"] == "ok"
+                assert info["seconds"] == min(info["runs"])
+        # result is JSON serializable
+        json.dumps(result)
+
+    def test_benchmark_case_csv(self):
+        # several grid connectors: strategies for single grid connector are skipped
+        case = {"mode": "csv", "vehicles": 2, "gcs": 2}
+        result = benchmark.benchmark_case(case, ["distributed", "flex_window"])
+        assert result["size"]["grid_connectors"] == 2
+        assert result["strategies"]["distributed"]["simulate"]["status"] == "ok"
+        assert result["strategies"]["flex_window"] == {
+            "simulate": {"status": "skipped", "reason": "only one grid connector supported"}}
+
+    def test_benchmark_strategy_aborted(self, tmp_path, monkeypatch):
+        # report and costs of aborted simulation are not comparable either
+        def step(self):
+            raise RuntimeError("abort")
+        monkeypatch.setattr(greedy.Greedy, "step", step)
+        path = benchmark.create_scenario({"vehicles": 2}, tmp_path)
+        result = benchmark.benchmark_strategy(path, "greedy", 1, tmp_path)
+        assert list(result) == ["simulate", "report", "costs"]
+        assert all(info["status"] == "aborted" for info in result.values())
+        assert benchmark.flatten_times({"cases": [{"name": "case", "strategies": {
+            "greedy": result}}]}) == {}
+
+    def test_compare_results(self):
+        def get_results(seconds, status="ok"):
+            return {"cases": [{
+                "name": "case",
+                "generate": {"status": "ok", "seconds": 1},
+                "load": {"status": "ok", "seconds": seconds},
+                "strategies": {"greedy": {
+                    "simulate": {"status": status, "seconds": seconds},
+                    "report": {"status": "error", "reason": "error"}}},
+            }]}
+        comparison = benchmark.compare_results(get_results(2), get_results(1))
+        assert comparison == [
+            ("case/generate", 1, 1, 1), ("case/load", 2, 1, 0.5),
+            ("case/greedy/simulate", 2, 1, 0.5)]
+        # aborted simulation is not compared
+        comparison = benchmark.compare_results(get_results(2), get_results(1, "aborted"))
+        assert [c[0] for c in comparison] == ["case/generate", "case/load"]
@@ -1,12 +1,16 @@
+import csv
 import datetime
 import json
+import numpy as np
 import pytest
 from pathlib import Path
+import shutil
 import subprocess
 from argparse import Namespace
 
 from spice_ev import scenario, costs as cc
-from calculate_costs import read_simulation_csv
+from calculate_costs import read_simulation_csv, read_simulation_columns
+import calculate_costs
 from spice_ev.generate import generate_schedule
 
 TEST_REPO_PATH = Path(__file__).parent
@@ -66,6 +70,24 @@ class TestSimulationCosts:
         # charging signal: depends on schedule, should be all None
         assert not any(result["window_signal_list"])
 
+    def test_read_sim_columns(self, tmp_path):
+        input = TEST_REPO_PATH / 'test_data/input_test_strategies/scenario_PV_Bat.json'
+        with input.open() as f:
+            s = scenario.Scenario(json.load(f), input.parent)
+        save_timeseries = tmp_path / "save_timeseries.csv"
+        save_columns = tmp_path / "save_timeseries.npz"
+        s.run('greedy', {"save_timeseries": str(save_timeseries)})
+        s.run('greedy', {"save_timeseries": str(save_columns), "save_soc": tmp_path / "soc.npz"})
+        # same values as from CSV
+        result_csv = read_simulation_csv(str(save_timeseries))
+        result = read_simulation_columns(str(save_columns))
+        assert result.keys() == result_csv.keys()
+        assert result.pop("timestamps_list") == list(result_csv.pop("timestamps_list"))
+        for k, l in result.items():
+            assert l == pytest.approx(result_csv[k])
+        assert any(result["power_grid_supply_list"])
+        assert any(result["power_generation_feed_in_list"])
+
     def test_calculate_costs_basic(self):
         j = get_test_json()
         s = scenario.Scenario(j)
@@ -242,6 +264,114 @@ class TestSimulationCosts:
         assert result["levies_fees_and_taxes_per_year"] == 12487.79
         assert result["feed_in_remuneration_per_year"] == 275.03
 
+    def test_calculate_scenario_costs(self):
+        input_path = TEST_REPO_PATH / "test_data/input_test_strategies"
+        with (input_path / "scenario_2vehicles_building_pv_bat.json").open() as f:
+            j = json.load(f)
+        s = scenario.Scenario(j, input_path)
+        s.run('peak_load_window', {
+            "cost_calculation": True,
+            "time_windows": input_path / "time_windows_example.json",
+        })
+        price_sheet_path = TEST_REPO_PATH / 'test_data/input_test_cost_calculation/price_sheet.json'
+        cc_types = ["fixed_wo_plw", "fixed_w_plw", "flex_window", "balanced_market", "schedule"]
+        with pytest.warns(UserWarning):
+            # no schedule
+            scenario_costs = cc.calculate_scenario_costs(s, cc_types, str(price_sheet_path))
+        assert list(scenario_costs.keys()) == ["GC1"]
+        assert list(scenario_costs["GC1"].keys()) == cc_types
+        # same as single cost calculation
+        assert scenario_costs["GC1"]["fixed_w_plw"]["total_costs_per_year"] == 31052.05
+        timeseries = s.GC1_timeseries
+        power_fix_load_list = cc.get_fixed_load_supply(*[timeseries.get(k) for k in [
+            "fixed load [kW]", "local generation [kW]", "battery power [kW]", "sum CS power [kW]"]])
+        timeseries_lists = [timeseries.get(k) for k in [
+            "time", "grid supply [kW]", "price [EUR/kWh]"]] + [power_fix_load_list] + [
+            timeseries.get(k, [0] * s.n_intervals) for k in [
+                "generation feed-in [kW]", "V2G feed-in [kW]", "battery feed-in [kW]",
+                "window signal [-]"]]
+        pv_power = j["components"]["photovoltaics"]["PV1"]["nominal_power"]
+        for cc_type in cc_types[:-1]:
+            result = cc.calculate_costs(cc_type, "MV", s.interval, *timeseries_lists,
+                                        str(price_sheet_path), power_pv_nominal=pv_power)
+            assert scenario_costs["GC1"][cc_type] == result
+
+        # NumPy arrays as input
+        timeseries_arrays = [timeseries_lists[0]] + [
+            ts if ts is None else np.array(ts, dtype=float) for ts in timeseries_lists[1:-1]
+        ] + [timeseries_lists[-1]]
+        for cc_type in cc_types[:-1]:
+            result = cc.calculate_costs(cc_type, "MV", s.interval, *timeseries_arrays,
+                                        str(price_sheet_path), power_pv_nominal=pv_power)
+            assert scenario_costs["GC1"][cc_type] == result
+
+    def test_compare_price_sheets(self, tmp_path, monkeypatch):
+        scen_path = TEST_REPO_PATH / 'test_data/input_test_strategies/scenario_A.json'
+        with scen_path.open() as f:
+            s = scenario.Scenario(json.load(f), scen_path.parent)
+        save_timeseries = tmp_path / "save_timeseries.csv"
+        s.run('greedy', {"save_timeseries": str(save_timeseries)})
+        timeseries_lists = read_simulation_csv(str(save_timeseries))
+
+        # second price sheet: other grid operator with higher concession fee
+        price_sheet_path = TEST_REPO_PATH / 'test_data/input_test_cost_calculation/price_sheet.json'
+        with price_sheet_path.open() as f:
+            price_sheets = json.load(f)
+        price_sheets["other_operator"] = json.loads(json.dumps(price_sheets[grid_operator]))
+        price_sheets["other_operator"]["concession_fee"]["charge"] += 1
+        other_path = tmp_path / "other.json"
+        with other_path.open("w") as f:
+            json.dump(price_sheets, f)
+
+        # tariffs per voltage level: grid fees of other voltage levels and descriptions removed
+        index = cc.index_price_sheets(price_sheets)
+        assert list(index["other_operator"]) == ["HV", "HV/MV", "MV", "MV/LV", "LV"]
+        tariff = index["other_operator"]["MV"]
+        assert tariff["grid_fee"]["RLM"]["<2500_h/a"]["commodity_charge_ct/kWh"] == {
+            "MV": price_sheets[grid_operator]["grid_fee"]["RLM"]["<2500_h/a"][
+                "commodity_charge_ct/kWh"]["MV"]}
+        assert "info" not in tariff["concession_fee"]
+        assert tariff["concession_fee"] != index[grid_operator]["MV"]["concession_fee"]
+        assert tariff["levies"] == index[grid_operator]["MV"]["levies"]
+
+        price_sheet_paths = [price_sheet_path, other_path]
+        num_calls = []
+        calculate_costs = cc.calculate_costs
+        monkeypatch.setattr(cc, "calculate_costs",
+                            lambda *args, **kwargs: num_calls.append(1) or calculate_costs(
+                                *args, **kwargs))
+        comparison = cc.compare_price_sheets(
+            "fixed_wo_plw", s.interval, timeseries_lists, price_sheet_paths,
+            voltage_levels=["MV", "LV"], fee_types=["RLM"])
+        assert [(row["price sheet"], row["grid operator"], row["voltage level"])
+                for row in comparison] == [
+            ("price_sheet", grid_operator, "MV"), ("price_sheet", grid_operator, "LV"),
+            ("other", grid_operator, "MV"), ("other", grid_operator, "LV"),
+            ("other", "other_operator", "MV"), ("other", "other_operator", "LV")]
+        # tariffs of same grid operator in both price sheets calculated once
+        assert len(num_calls) == 4
+        monkeypatch.undo()
+        # same as single cost calculation
+        for row in comparison:
+            result = cc.calculate_costs(
+                "fixed_wo_plw", row["voltage level"], s.interval, **timeseries_lists,
+                price_sheet_path=price_sheet_paths[row["price sheet"] == "other"],
+                grid_operator=row["grid operator"], fee_type="RLM")
+            assert {k: row[k] for k in result} == result
+        # different voltage levels and concession fee
+        assert comparison[0]["total_costs_per_year"] != comparison[1]["total_costs_per_year"]
+        assert comparison[0]["total_costs_per_year"] == comparison[2]["total_costs_per_year"]
+        assert comparison[2]["total_costs_per_year"] < comparison[4]["total_costs_per_year"]
+
+        # all grid operators and voltage levels of price sheets, in parallel
+        comparison = cc.compare_price_sheets(
+            "fixed_wo_plw", s.interval, timeseries_lists, price_sheet_paths,
+            grid_operators=["other_operator"], processes=2)
+        assert [row["voltage level"] for row in comparison] == ["HV", "HV/MV", "MV", "MV/LV", "LV"]
+        assert comparison[2] == cc.compare_price_sheets(
+            "fixed_wo_plw", s.interval, timeseries_lists, [other_path],
+            voltage_levels=["MV"], grid_operators=["other_operator"])[0]
+
     def test_peak_load_window_no_windows(self):
         input_path = TEST_REPO_PATH / "test_data/input_test_strategies"
         with (input_path / "scenario_PV_Bat.json").open() as f:
@@ -577,3 +707,71 @@ class TestPostSimulationCosts:
             results = json.load(f)
         assert "costs" in results
         assert results["costs"]["electricity costs"]["per year"]["total (gross)"] == 78.18
+
+    def test_calculate_costs_batch(self, tmp_path):
+        price_sheet_path = TEST_REPO_PATH / 'test_data/input_test_cost_calculation/price_sheet.json'
+        input_path = TEST_REPO_PATH / "test_data/input_test_strategies"
+        for name, strategy, soc_suffix in [
+                ("scenario_A", "greedy", ".csv"), ("scenario_C2", "flex_window", ".npz")]:
+            with (input_path / f"{name}.json").open() as f:
+                s = scenario.Scenario(json.load(f), input_path)
+            s.run(strategy, {
+                "save_results": str(tmp_path / f"{name}.json"),
+                "save_timeseries": str(tmp_path / f"{name}.csv"),
+                "save_soc": str(tmp_path / f"{name}_soc{soc_suffix}"),
+            })
+
+        # SoC files are skipped
+        with pytest.warns(UserWarning, match="not a simulation timeseries"):
+            timeseries_files = calculate_costs.find_timeseries_files(str(tmp_path))
+        assert timeseries_files == [tmp_path / "scenario_A.csv", tmp_path / "scenario_C2.csv"]
+        assert calculate_costs.find_timeseries_files(str(tmp_path / "*_A.*")) == [
+            tmp_path / "scenario_A.csv"]
+
+        batch_costs = calculate_costs.calculate_batch_costs(
+            timeseries_files, price_sheet_path, voltage_level="MV")
+        assert list(batch_costs.keys()) == [str(f) for f in timeseries_files]
+        for timeseries_file, result in batch_costs.items():
+            # same as single cost calculation
+            assert result == calculate_costs.calculate_simulation_costs(
+                timeseries_file, Path(timeseries_file).with_suffix(".json"), price_sheet_path,
+                voltage_level="MV")
+        # window signal of flex window strategy is used
+        assert batch_costs[str(timeseries_files[1])]["peak_power_in_windows"] > 0
+        # results files are not changed
+        with (tmp_path / "scenario_A.json").open() as f:
+            assert "costs" not in json.load(f)
+
+        # in parallel
+        assert calculate_costs.calculate_batch_costs(
+            timeseries_files, price_sheet_path, voltage_level="MV", processes=2) == batch_costs
+
+        # consolidated output from shell
+        for output_file in [tmp_path / "costs.json", tmp_path / "costs.csv"]:
+            assert subprocess.call([
+                "python", TEST_REPO_PATH.parent / "calculate_costs.py",
+                "--voltage-level", "MV",
+                "--batch", tmp_path,
+                "--batch-output", output_file,
+                "--cost-parameters-file", price_sheet_path,
+            ]) == 0
+        with (tmp_path / "costs.json").open() as f:
+            assert json.load(f) == batch_costs
+        with (tmp_path / "costs.csv").open() as f:
+            rows = list(csv.DictReader(f))
+        assert [row["timeseries"] for row in rows] == list(batch_costs.keys())
+        assert [float(row["total_costs_per_year"]) for row in rows] == [
+            result["total_costs_per_year"] for result in batch_costs.values()]
+
+        # no results file next to timeseries file: given results file is used with warning
+        shutil.copy(tmp_path / "scenario_A.csv", tmp_path / "other.csv")
+        timeseries_files = [tmp_path / "other.csv"]
+        with pytest.raises(AssertionError, match="No results file"):
+            calculate_costs.calculate_batch_costs(timeseries_files, price_sheet_path)
+        with pytest.warns(UserWarning, match="No results file"):
+            batch_costs = calculate_costs.calculate_batch_costs(
+                timeseries_files, price_sheet_path, tmp_path / "scenario_A.json",
+                voltage_level="MV")
+        assert batch_costs == {str(timeseries_files[0]): calculate_costs.calculate_simulation_costs(
+            tmp_path / "scenario_A.csv", tmp_path / "scenario_A.json", price_sheet_path,
+            voltage_level="MV")}
@@ -296,3 +296,34 @@ class TestBattery:
             p = b.load(td, target_power=target)["avg_power"]
             target_p = min(capacity, target)
             assert pytest.approx(p) == target_p, f"Capacity: {2**i} (2^{i}). {target_p} != {p}"
+
+    def test_series(self):
+        # (dis)charging in consecutive timesteps same as single timesteps
+        lc = loading_curve.LoadingCurve([(0, 50), (0.8, 50), (1, 10)])
+        td = datetime.timedelta(minutes=15)
+        power = [0, 20, 20, 50, 50, 50, 0, 30, 30, 30, 30, 30, 30, 30, 30, 30]
+        for soc in [0, 0.5, 0.95, 1]:
+            b = battery.Battery(100, lc, soc, 0.95, lc)
+            b_single = battery.Battery(100, lc, soc, 0.95, lc)
+            result = b.load_series(td, power)
+            single = [b_single.load(td, max_power=p)["avg_power"] for p in power]
+            assert result["avg_power"] == pytest.approx(single)
+            assert result["steps"] == len(power)
+            assert b.soc == pytest.approx(b_single.soc)
+
+            b.soc = b_single.soc = soc
+            result = b.unload_series(td, power, target_soc=0.2)
+            single = [b_single.unload(td, max_power=p, target_soc=0.2)["avg_power"]
+                      for p in power]
+            assert result["avg_power"] == pytest.approx(single)
+            assert b.soc == pytest.approx(b_single.soc)
+
+        # stop after timestep in which stop SoC is reached
+        b = battery.Battery(100, lc, 0.5, 1, lc)
+        result = b.load_series(td, [8] * 10, stop_soc=0.55)
+        assert result["steps"] == 3
+        assert b.soc == pytest.approx(0.56)
+        assert list(result["avg_power"]) == [8] * 3 + [0] * 7
+        result = b.unload_series(td, [8] * 10, stop_soc=0.55)
+        assert result["steps"] == 1
+        assert b.soc == pytest.approx(0.54)
@@ -2,11 +2,13 @@ from argparse import Namespace
 import json
 from pathlib import Path
 import pytest
+import shutil
 import warnings
 
 from generate import generate
 from spice_ev import scenario
 from spice_ev.generate import generate_schedule
+from spice_ev.generate.scenario_writer import patch_json
 
 TEST_REPO_PATH = Path(__file__).parent
 
@@ -33,6 +35,30 @@ ARG_VALUES1 = {
 }
 
 
+def summarize_flex_band(value):
+    # numeric lists: length, sum and index-weighted sum
+    if isinstance(value, dict):
+        return {k: summarize_flex_band(v) for k, v in value.items()}
+    if isinstance(value, list):
+        if value and all(isinstance(v, (int, float)) for v in value):
+            return [len(value), sum(value), sum(i * v for i, v in enumerate(value))]
+        return [summarize_flex_band(v) for v in value]
+    return value
+
+
+def flatten(value):
+    # values of nested dicts and lists
+    if isinstance(value, dict):
+        for k in sorted(value):
+            yield k
+            yield from flatten(value[k])
+    elif isinstance(value, list):
+        for v in value:
+            yield from flatten(v)
+    else:
+        yield value
+
+
 class TestCaseBase:
 
     def assertIsFile(self, path):
@@ -52,6 +78,65 @@ class TestGenerate(TestCaseBase):
             j = json.load(f)
             scenario.Scenario(j)
 
+    def test_generate_from_statistics_vectorized(self, tmp_path, monkeypatch):
+        from spice_ev.generate import generate_from_statistics
+        # several blocks of vehicles per vehicle type
+        monkeypatch.setattr(generate_from_statistics, "VEHICLES_PER_BLOCK", 2)
+        outputs = []
+        for processes in [1, 2]:
+            output_file = tmp_path / f"generate_{processes}.json"
+            current_arg_values = ARG_VALUES1.copy()
+            current_arg_values.update({
+                "mode": "statistics",
+                "output": output_file,
+                "vehicles": [[3, "golf"], [2, "sprinter"]],
+                "seed": 1,
+                "vectorized": True,
+                "processes": processes,
+            })
+            generate(Namespace(**current_arg_values))
+            outputs.append(output_file.read_text())
+        # same result, no matter how many processes
+        assert outputs[0] == outputs[1]
+        # negative seed is used like its absolute value
+        output_file = tmp_path / "generate_negative_seed.json"
+        current_arg_values.update({"output": output_file, "seed": -1})
+        generate(Namespace(**current_arg_values))
+        assert output_file.read_text() == outputs[0]
+        j = json.loads(outputs[0])
+        assert len(j["components"]["vehicles"]) == 5
+        assert j["events"]["vehicle_events"]
+        scenario.Scenario(j)
+
+    def test_generate_compact(self, tmp_path):
+        current_arg_values = ARG_VALUES1.copy()
+        current_arg_values.update({"mode": "statistics", "seed": 1})
+        for compact in [False, True]:
+            current_arg_values.update({
+                "output": tmp_path / f"generate_{compact}.json", "compact": compact})
+            generate(Namespace(**current_arg_values))
+        j = json.loads((tmp_path / "generate_False.json").read_text())
+        text = (tmp_path / "generate_True.json").read_text()
+        assert text == json.dumps(j, separators=(",", ":"))
+
+    def test_patch_json(self, tmp_path):
+        j = {"scenario": {"interval": 15}, "events": {"vehicle_events": [{"a": 1}]}}
+        updates = {
+            ("events", "schedule_from_csv"): {"column": "schedule [kW]"},
+            ("scenario", "interval"): 5,
+            ("components", "vehicles"): {},
+        }
+        for kwargs in [{"indent": 2}, {"separators": (",", ":")}]:
+            path = tmp_path / "scenario.json"
+            path.write_text(json.dumps(j, **kwargs))
+            patch_json(path, updates)
+            expected = json.loads(json.dumps(j))
+            expected["events"]["schedule_from_csv"] = {"column": "schedule [kW]"}
+            expected["scenario"]["interval"] = 5
+            expected["components"] = {"vehicles": {}}
+            # same file as if written in full
+            assert path.read_text() == json.dumps(expected, **kwargs)
+
     def test_generate_from_statistics_external_files(self, tmp_path):
         output_file = tmp_path / "generate.json"
         current_arg_values = ARG_VALUES1.copy()
@@ -98,6 +183,30 @@ class TestGenerate(TestCaseBase):
             j = json.load(f)
             scenario.Scenario(j)
 
+    def test_assign_vehicle_id(self):
+        from spice_ev.generate.generate_from_csv import assign_vehicle_id
+        with open(TEST_REPO_PATH / "test_data/input_test_generate/vehicle_types.json") as f:
+            vehicle_types = json.load(f)
+        # AB-OPP: minimum standing time of 20 minutes (50 kWh at 150 kW)
+        rotations = [
+            ("2023-01-01 00:00:00", "2023-01-01 01:00:00", "AB-OPP"),
+            ("2023-01-01 00:30:00", "2023-01-01 01:05:00", "AB-OPP"),
+            ("2023-01-01 01:10:00", "2023-01-01 02:00:00", "AB-OPP"),
+            ("2023-01-01 01:30:00", "2023-01-01 02:00:00", "golf"),
+            ("2023-01-01 01:30:00", "2023-01-01 02:00:00", "AB-OPP"),
+            ("2023-01-01 02:00:00", "2023-01-01 03:00:00", "AB-OPP"),
+        ]
+        rotations = [{"departure_time": dep, "arrival_time": arr, "vehicle_type": v_type}
+                     for dep, arr, v_type in rotations]
+        rotations = assign_vehicle_id(rotations, vehicle_types)
+        assert [r["vehicle_id"] for r in rotations] == [
+            # standing time too short: new vehicle
+            "AB-OPP_1", "AB-OPP_2", "AB-OPP_3",
+            # idle vehicles of other types are not used
+            "golf_1",
+            # first in, first out
+            "AB-OPP_1", "AB-OPP_2"]
+
     def test_generate_from_csv_2_delta_soc(self, tmp_path):
         input_csv = "test_data/input_test_generate/generate_from_csv_template2.csv"
         output_file = tmp_path / "generate_from_csv.json"
@@ -183,6 +292,58 @@ class TestGenerate(TestCaseBase):
         generate(Namespace(**current_arg_values))
         self.assertIsFile(output_file)
 
+    def test_generate_from_simbev_stream(self, tmp_path):
+        simbev_dir = TEST_REPO_PATH / "../examples/example_simbev_run"
+        current_arg_values = ARG_VALUES1.copy()
+        current_arg_values.update({
+            "mode": "simbev",
+            "simbev": simbev_dir,
+            "output": str(tmp_path / "generate_from_simbev.json"),
+            "region": None,
+            "vehicle_types": None,
+            "ignore_simbev_soc": False,
+            "seed": 1,
+        })
+        generate(Namespace(**current_arg_values))
+        # read files in parallel and write vehicles right away: same result
+        current_arg_values.update({
+            "output": str(tmp_path / "generate_from_simbev_stream.json"),
+            "processes": 2,
+            "stream": True,
+        })
+        generate(Namespace(**current_arg_values))
+        output = (tmp_path / "generate_from_simbev.json").read_text()
+        assert (tmp_path / "generate_from_simbev_stream.json").read_text() == output
+        assert len(json.loads(output)["components"]["vehicles"]) == 7
+
+    def test_generate_from_simbev_capacity(self, tmp_path):
+        # capacities in file names differ from vehicle type: last file in order is used
+        simbev_dir = tmp_path / "simbev"
+        shutil.copytree(TEST_REPO_PATH / "../examples/example_simbev_run", simbev_dir)
+        events_file = simbev_dir / "region_1/bev_mini_00000_60kWh_events.csv"
+        for name in ["bev_mini_00001_70kWh", "bev_mini_00002_60kWh"]:
+            shutil.copy(events_file, simbev_dir / f"region_1/{name}_events.csv")
+        current_arg_values = ARG_VALUES1.copy()
+        current_arg_values.update({
+            "mode": "simbev",
+            "simbev": simbev_dir,
+            "region": None,
+            "vehicle_types": None,
+            "ignore_simbev_soc": False,
+            "seed": 1,
+            "verbose": 1,
+        })
+        outputs = []
+        for processes in [1, 2]:
+            output_file = tmp_path / f"generate_from_simbev_{processes}.json"
+            current_arg_values.update({"output": str(output_file), "processes": processes})
+            with pytest.warns(UserWarning, match="Capacities of vehicle type 'bev_mini'"):
+                generate(Namespace(**current_arg_values))
+            outputs.append(output_file.read_text())
+        assert outputs[1] == outputs[0]
+        j = json.loads(outputs[0])
+        assert j["components"]["vehicle_types"]["bev_mini"]["capacity"] == 60
+
     def test_generate_update_namespace(self, tmp_path):
         # tests various more obscure options not covered by other tests
         with pytest.raises(SystemExit):
@@ -233,6 +394,37 @@ class TestGenerateSchedule(TestCaseBase):
             assert (interval["time"][0], interval["time"][-1]) == timesteps[i]
             assert interval["num_vehicles_present"] == vehicles[i]
 
+    def test_generate_flex_bands(self):
+        # flex bands of separate replays of events for each GC (summarized)
+        expected_path = TEST_REPO_PATH / "test_data/input_test_generate/flex_bands_expected.json"
+        with expected_path.open() as f:
+            expected = json.load(f)
+        input_path = TEST_REPO_PATH / "test_data/input_test_strategies"
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore', UserWarning)
+            for name in ["scenario_PV_Bat", "scenario_C1"]:
+                with (input_path / f"{name}.json").open() as f:
+                    s = scenario.Scenario(json.load(f), input_path)
+                flex_bands = generate_schedule.generate_flex_bands(s)
+                assert list(flatten(summarize_flex_band(flex_bands))) == pytest.approx(
+                    list(flatten(expected[name])))
+
+            # grid connectors share vehicles
+            with (input_path / "bus_scenario_D.json").open() as f:
+                s = scenario.Scenario(json.load(f), input_path)
+            flex_bands = generate_schedule.generate_flex_bands(s)
+            gc_ids = sorted(s.components.grid_connectors.keys())
+            assert list(flex_bands.keys()) == gc_ids
+            assert list(flatten(summarize_flex_band(flex_bands))) == pytest.approx(
+                list(flatten(expected["bus_scenario_D"])))
+            assert flex_bands["S Buch"] == generate_schedule.generate_flex_band(s, "S Buch")
+            # GCs in worker processes
+            assert generate_schedule.generate_flex_bands(s, processes=2) == flex_bands
+            # flex report reuses events of simulation
+            s.run("greedy", {"PROCESSES": 2})
+            assert s.event_steps is not None
+            assert s.flex_bands == flex_bands
+
     def test_generate_collective(self, tmp_path):
         # copy scenario to tmp
         input_json = "generate_schedule_2vehicles.json"
@@ -322,6 +514,22 @@ class TestGenerateSchedule(TestCaseBase):
         assert sum(schedules[0][130:153]) == 0
         assert pytest.approx(sum(schedules[0][153:191]), .1) == 1000
 
+    def test_get_balanced_power(self):
+        loads = [10, 0, 5, 20]
+        lower = [-10, 0, 0, -5]
+        upper = [10, 4, 10, 10]
+        # fill lowest loads up to common level 8
+        power = generate_schedule.get_balanced_power(loads, [0] * 4, upper, 7)
+        assert list(power) == pytest.approx([0, 4, 3, 0])
+        # shift power from high to low loads (same level)
+        power = generate_schedule.get_balanced_power(loads, lower, upper, 0)
+        assert list(power) == pytest.approx([-2, 4, 3, -5])
+        # power needed can not be reached: clip to bounds
+        power = generate_schedule.get_balanced_power(loads, lower, upper, 100)
+        assert list(power) == upper
+        power = generate_schedule.get_balanced_power(loads, lower, upper, -100)
+        assert list(power) == lower
+
     def test_generate_complex_schedule(self, tmp_path):
         # slightly more complex scenario with fixed load and local generation
         # copy scenario and needed files to tmp
@@ -1,7 +1,11 @@
+import datetime
 import json
 from pathlib import Path
+import numpy as np
+import pytest
 
 from spice_ev import scenario, report
+from spice_ev.result_store import ResultStore
 
 
 def get_scenario():
@@ -72,11 +76,70 @@ class TestReport:
         s.flex_bands = {"GC1": None}
         report.aggregate_local_results(s, 'GC1')
 
+    def test_run_statistics(self):
+        # statistics accumulated during simulation match recorded timeseries
+        for options in [{}, {"fast_forward": True}, {"adaptive_interval": 15}]:
+            input = Path(__file__).parent / 'test_data/input_test_strategies/scenario_PV_Bat.json'
+            with input.open('r') as f:
+                s = scenario.Scenario(json.load(f), input.parent)
+            s.run('balanced', options)
+            stats = s.run_statistics
+            assert stats.num_steps == s.n_intervals
+            assert stats.sum_load["GC1"] == pytest.approx(sum(s.totalLoad["GC1"]))
+            assert stats.max_load["GC1"] == max(s.totalLoad["GC1"])
+            assert sum(stats.sum_load_per_window["GC1"]) == pytest.approx(stats.sum_load["GC1"])
+            assert stats.sum_local_generation["GC1"] == sum(s.localGenerationPower["GC1"])
+            assert stats.max_battery_level["BAT1"] == max(s.batteryLevels["BAT1"])
+            assert stats.standing_per_window == [
+                sum(soc is not None for idx, socs in enumerate(s.socs) for soc in socs
+                    if report.get_window_index(s.results[idx]["current_time"]) == widx)
+                for widx in range(4)]
+
     def test_aggregate_timeseries(self):
-        report.aggregate_timeseries(get_scenario(), 'GC1')
+        s = get_scenario()
+        agg_ts = report.aggregate_timeseries(s, 'GC1')
+        header = agg_ts["header"]
+        assert len(agg_ts["timeseries"]) == s.n_intervals
+        assert all(len(row) == len(header) for row in agg_ts["timeseries"])
+        # power per CS adds up to sum of CS power
+        cs_columns = [i for i, name in enumerate(header) if name.startswith("CS_")]
+        assert cs_columns
+        for row in agg_ts["timeseries"]:
+            cs_sum = row[header.index("sum CS power [kW]")]
+            assert sum(row[i] for i in cs_columns) == pytest.approx(cs_sum, abs=1e-2)
+        # columns stored in scenario
+        assert s.GC1_timeseries["grid supply [kW]"] == [
+            row[header.index("grid supply [kW]")] for row in agg_ts["timeseries"]]
+
+    def test_round_values(self):
+        # halfway after scaling, but binary value above or below
+        values = [5.7925, 2.675, 1.0005, -5.7925, -0.0001, 0.0, 7]
+        assert report.round_values(values, 3).tolist() == [round(v, 3) + 0 for v in values]
+        assert str(report.round_values(-0.0001, 3)) == "0.0"
 
     def test_generate_soc_timeseries(self):
-        report.generate_soc_timeseries(get_scenario())
+        s = get_scenario()
+        report.generate_soc_timeseries(s)
+        vids = sorted(s.components.vehicles.keys())
+        assert s.trips
+        for vidx, start_idx, start_soc, end_idx, end_soc in s.trips:
+            socs = s.vehicle_socs[vids[vidx]]
+            # linear interpolation during trip
+            m = (end_soc - start_soc) / (end_idx - start_idx)
+            for idx in range(start_idx, end_idx):
+                assert socs[idx] == pytest.approx(start_soc + m * (idx - start_idx))
+            assert socs[end_idx] == pytest.approx(end_soc)
+        # trips are interpolated when needed, same values for each block size
+        disconnect = next(report.iter_disconnected_socs(s))
+        blocks = list(report.iter_disconnected_socs(s, 7))
+        assert len(blocks) == -(-len(s.disconnect) // 7)
+        assert np.array_equal(np.concatenate(blocks), disconnect, equal_nan=True)
+        for socs, dis, soc_row in zip(s.socs, disconnect.tolist(), zip(*s.vehicle_socs.values())):
+            assert list(soc_row) == pytest.approx([a or (None if b != b else b)
+                                                   for a, b in zip(socs, dis)])
+        # rows of SoC file: same values
+        for row, soc_row in zip(report.iter_soc_rows(s), zip(*s.vehicle_socs.values())):
+            assert row[2:] == list(soc_row)
 
     def test_simple_plot(self):
         try:
@@ -148,6 +211,54 @@ class TestReport:
         with plt.ion():
             report.plot(s)
 
+    def test_downsample_envelope(self):
+        values = [(i % 7) - 3 for i in range(1000)]
+        values[500:520] = [None] * 20
+        values[123] = 100
+        indices, downsampled = report.downsample_envelope(values, 50)
+        assert len(indices) < len(values) / 5
+        assert indices == sorted(set(indices))
+        # extreme values and gaps kept
+        assert max(v for v in downsampled if v == v) == 100
+        assert min(v for v in downsampled if v == v) == -3
+        assert any(v != v for v in downsampled)
+        assert all(values[i] == v for i, v in zip(indices, downsampled) if v == v)
+        # short timeseries unchanged
+        indices, downsampled = report.downsample_envelope([1, None, 3], 50)
+        assert indices == [0, 1, 2]
+        assert downsampled[::2] == [1, 3]
+
+    def test_plot_file(self, tmp_path):
+        try:
+            import matplotlib  # noqa: F401
+        except ModuleNotFoundError:
+            # no matplot installed
+            return
+        backend = matplotlib.get_backend()
+        s = get_scenario()
+        report.generate_reports(s, {"plot_file": tmp_path / "plot.png"})
+        assert (tmp_path / "plot.png").stat().st_size > 0
+        # backend of process not changed by headless plot
+        assert matplotlib.get_backend() == backend
+
+    def test_plot_zoom(self):
+        try:
+            import matplotlib.pyplot as plt
+        except ModuleNotFoundError:
+            # no matplot installed
+            return
+        s = get_scenario()
+        report.aggregate_global_results(s)
+        with plt.ion():
+            report.plot(s)
+        ax = plt.gcf().axes[0]
+        line = ax.get_lines()[0]
+        times = [r["current_time"] for r in s.results]
+        # zoom in: envelope of visible timesteps recomputed in full resolution
+        ax.set_xlim(times[10], times[20])
+        assert list(line.get_xdata()) == times[9:22]
+        plt.close("all")
+
     def test_generate_reports(self, tmp_path):
         report.generate_reports(get_scenario(), {
             'save_timeseries': tmp_path / 'timeseries.csv',
@@ -163,3 +274,61 @@ class TestReport:
         s.run('greedy', {})
         report.generate_reports(s, {"skip_flex_report": True, "testing": True})
         assert s.flex_bands is None
+
+    def test_flex_report_fallback(self, monkeypatch):
+        from spice_ev.generate import generate_schedule
+        input = Path(__file__).parent / 'test_data/input_test_strategies/bus_scenario_D.json'
+        with input.open('r') as f:
+            j = json.load(f)
+        j["scenario"]["n_intervals"] = 100
+        s = scenario.Scenario(j, input.parent)
+        s.run('greedy', {"ALLOW_NEGATIVE_SOC": True})
+        gc_ids = sorted(s.components.grid_connectors.keys())
+        generate_flex_bands = generate_schedule.generate_flex_bands
+
+        def fail_first_gc(scenario, gc_ids=None, *args, **kwargs):
+            if gc_ids is None or "Alt-Kladow" in gc_ids:
+                raise Exception("flex band failed")
+            return generate_flex_bands(scenario, gc_ids, *args, **kwargs)
+
+        monkeypatch.setattr(generate_schedule, "generate_flex_bands", fail_first_gc)
+        report.generate_reports(s, {})
+        # only flex band of failing GC is missing
+        assert s.flex_bands["Alt-Kladow"] is None
+        for gcID in gc_ids[1:]:
+            assert s.flex_bands[gcID] == generate_flex_bands(s, [gcID])[gcID]
+
+    def test_result_store(self, tmp_path):
+        db_path = tmp_path / "runs.sqlite"
+        results = {}
+        for strategy in ["greedy", "balanced"]:
+            s = get_scenario()
+            s.run(strategy, {
+                "save_db": db_path,
+                "save_results": tmp_path / f"{strategy}.json",
+                "db_resolution": 60,
+            })
+            with (tmp_path / f"{strategy}.json").open() as f:
+                results[strategy] = json.load(f)
+
+        gcID = sorted(s.components.grid_connectors.keys())[0]
+        max_power = s.components.grid_connectors[gcID].max_power
+        with ResultStore(db_path) as store:
+            runs = store.get_runs()
+            assert [r["strategy"] for r in runs] == ["greedy", "balanced"]
+            assert store.get_runs(strategy="balanced")[0]["run_id"] == runs[1]["run_id"]
+            # same values as results file
+            peaks = store.query("power peaks/total", max_power=max_power)
+            assert [v for _, _, v in peaks] == pytest.approx(
+                [results[strategy]["power peaks"]["total"] for strategy in results])
+            assert store.query("power peaks/total", max_power=max_power + 1) == []
+            assert store.query("sum of energy/value", strategy="greedy")[0][2] == pytest.approx(
+                results["greedy"]["sum of energy"]["value"])
+            assert store.get_results(runs[0]["run_id"], gcID) == results["greedy"]
+            # timeseries averaged to one hour
+            steps_per_hour = round(60 / runs[0]["interval"])
+            times, values = store.get_timeseries(runs[1]["run_id"], gcID, "grid supply [kW]")
+            supply = getattr(s, f"{gcID}_timeseries")["grid supply [kW]"]
+            assert len(values) == -(-len(supply) // steps_per_hour)
+            assert times[1] - times[0] == datetime.timedelta(hours=1)
+            assert values[0] == pytest.approx(sum(supply[:steps_per_hour]) / steps_per_hour)
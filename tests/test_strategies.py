@@ -2,8 +2,9 @@ from argparse import Namespace
 import json
 from pathlib import Path
 import pytest
+import sys
 
-from spice_ev import scenario, strategy
+from spice_ev import history, report, scenario, strategy, util
 from spice_ev.generate import generate_schedule
 
 TEST_REPO_PATH = Path(__file__).parent
@@ -31,6 +32,22 @@ def get_test_json():
     }
 
 
+def assert_approx_equal(actual, expected):
+    # compare nested results, numbers may differ by rounding errors
+    if isinstance(expected, dict):
+        assert actual.keys() == expected.keys()
+        for k, v in expected.items():
+            assert_approx_equal(actual[k], v)
+    elif isinstance(expected, list):
+        assert len(actual) == len(expected)
+        for a, e in zip(actual, expected):
+            assert_approx_equal(a, e)
+    elif isinstance(expected, float):
+        assert actual == pytest.approx(expected)
+    else:
+        assert actual == expected
+
+
 def load_json(filename):
     with open(filename, 'r') as f:
         return json.load(f)
@@ -185,6 +202,159 @@ class TestScenarios(TestCaseBase):
         strat.step()
         assert strat.world_state.grid_connectors["GC1"].cur_max_power == 2000
 
+    def test_fast_forward(self, monkeypatch):
+        # vehicle leaves for most of the day: skip quiescent timesteps, same results
+        scenario_json = get_test_json()
+        scenario_json["components"] = {
+            "grid_connectors": {"GC1": {"max_power": 100, "cost": {"type": "fixed", "value": 1}}},
+            "charging_stations": {"cs": {"max_power": 11, "parent": "GC1"}},
+            "vehicle_types": {
+                "t": {"name": "t", "capacity": 50, "charging_curve": [[0, 11], [1, 11]]}},
+            "vehicles": {"t1": {
+                "vehicle_type": "t", "soc": 0.6, "desired_soc": 0.5,
+                "connected_charging_station": "cs",
+                "estimated_time_of_departure": "2020-01-01T02:00:00+02:00"}},
+        }
+        scenario_json["events"]["vehicle_events"] = [{
+            "signal_time": "2020-01-01T00:00:00+02:00",
+            "start_time": "2020-01-01T02:00:00+02:00",
+            "vehicle_id": "t1",
+            "event_type": "departure",
+            "update": {"estimated_time_of_arrival": "2020-01-01T18:00:00+02:00"}
+          }, {
+            "signal_time": "2020-01-01T00:00:00+02:00",
+            "start_time": "2020-01-01T18:00:00+02:00",
+            "vehicle_id": "t1",
+            "event_type": "arrival",
+            "update": {
+                "soc_delta": -0.4, "desired_soc": 0.8, "connected_charging_station": "cs",
+                "estimated_time_of_departure": "2020-01-01T23:00:00+02:00"}
+        }]
+        scenario_json["events"]["grid_operator_signals"] = [{
+            "signal_time": "2020-01-01T00:00:00+02:00",
+            "start_time": "2020-01-01T12:00:00+02:00",
+            "grid_connector_id": "GC1",
+            "cost": {"type": "fixed", "value": 2},
+        }]
+        scenario_json["components"]["grid_connectors"]["GC1"].update(
+            {"grid_operator": "default_grid_operator", "voltage_level": "MV"})
+        result_names = ["socs", "disconnect", "connected", "results", "totalLoad", "prices",
+                        "fixedLoads", "connChargeByTS", "gcWindowSchedule", "step_i"]
+        options = {"time_windows":
+                   TEST_REPO_PATH / "test_data/input_test_strategies/time_windows_example.json"}
+        for strat in ["greedy", "balanced", "peak_load_window"]:
+            s = scenario.Scenario(scenario_json)
+            s.components.vehicles["t1"].battery.loss_rate = {"relative": 0.1}
+            s.run(strat, dict(options))
+            results = {name: getattr(s, name) for name in result_names}
+            soc = s.strat.world_state.vehicles["t1"].battery.soc
+
+            num_steps = []
+            strat_class = strategy.class_from_str(strat)
+            step = strat_class.step
+            monkeypatch.setattr(
+                strat_class, "step", lambda self: num_steps.append(1) or step(self))
+            s = scenario.Scenario(scenario_json)
+            s.components.vehicles["t1"].battery.loss_rate = {"relative": 0.1}
+            s.run(strat, dict(options, fast_forward=True))
+            monkeypatch.undo()
+            # skipped: 2:15 - 11:45 and 12:15 - 17:45 (price change at 12:00)
+            assert len(num_steps) == s.n_intervals - 39 - 23
+            # losses during skipped timesteps are applied at once
+            assert_approx_equal({name: getattr(s, name) for name in result_names}, results)
+            assert s.strat.world_state.vehicles["t1"].battery.soc == pytest.approx(soc)
+
+    def test_fast_forward_battery(self, monkeypatch):
+        # stationary battery without load or surplus to support: only losses, skip timesteps
+        scenario_json = get_test_json()
+        scenario_json["components"] = {
+            "grid_connectors": {"GC1": {"max_power": 100, "cost": {"type": "fixed", "value": 1}}},
+            "batteries": {"BAT1": {
+                "parent": "GC1", "capacity": 50, "charging_curve": [[0, 11], [1, 11]],
+                "soc": 0.8, "loss_rate": {"relative": 0.5, "fixed_absolute": 0.01}}},
+        }
+        result_names = ["batteryLevels", "totalLoad", "prices", "fixedLoads", "results", "step_i"]
+        options = {"time_windows":
+                   TEST_REPO_PATH / "test_data/input_test_strategies/time_windows_example.json"}
+        for strat in ["greedy", "balanced", "peak_load_window"]:
+            s = scenario.Scenario(scenario_json)
+            s.run(strat, dict(options))
+            results = {name: getattr(s, name) for name in result_names}
+            soc = s.strat.world_state.batteries["BAT1"].soc
+            stats = vars(s.run_statistics)
+
+            num_steps = []
+            strat_class = strategy.class_from_str(strat)
+            step = strat_class.step
+            monkeypatch.setattr(
+                strat_class, "step", lambda self: num_steps.append(1) or step(self))
+            s = scenario.Scenario(scenario_json)
+            s.run(strat, dict(options, fast_forward=True))
+            monkeypatch.undo()
+            # battery only skipped by strategies without look-ahead
+            assert len(num_steps) == (1 if strat in ["greedy", "balanced"] else s.n_intervals)
+            assert_approx_equal({name: getattr(s, name) for name in result_names}, results)
+            assert s.strat.world_state.batteries["BAT1"].soc == pytest.approx(soc)
+            assert_approx_equal(vars(s.run_statistics), stats)
+
+    def test_adaptive_interval(self):
+        input = TEST_REPO_PATH / 'test_data/input_test_strategies/scenario_C3.json'
+        for strat in ["greedy", "balanced"]:
+            s = scenario.Scenario(load_json(input), input.parent)
+            s.run(strat, {})
+            energy = sum(s.totalLoad["GC1"]) / s.stepsPerHour
+            s = scenario.Scenario(load_json(input), input.parent)
+            s.run(strat, {"adaptive_interval": 15})
+            assert s.step_i == s.n_intervals
+            assert s.strat.desired_counter == 0
+            # results on scenario interval
+            assert len(s.socs) == len(s.totalLoad["GC1"]) == s.n_intervals
+            assert s.results[-1]["current_time"] == s.stop_time - s.interval
+            assert sum(s.totalLoad["GC1"]) / s.stepsPerHour == pytest.approx(energy, rel=0.05)
+        # strategy schedule does not support adaptive interval
+        s = scenario.Scenario(get_test_json())
+        with pytest.warns(UserWarning, match="adaptive interval"):
+            s.run("schedule", {"LOAD_STRAT": "individual", "adaptive_interval": 60})
+
+    def test_out_of_core(self, tmp_path, monkeypatch):
+        # history in chunk files: same results, only few chunks in memory
+        monkeypatch.setattr(history, "CHUNK_SIZE", 100)
+        input = TEST_REPO_PATH / 'test_data/input_test_strategies/bus_scenario_D.json'
+        outputs = []
+        columnar_outputs = []
+        for history_dir in [None, tmp_path / "history"]:
+            s = scenario.Scenario(load_json(input), input.parent)
+            out = tmp_path / ("ooc" if history_dir else "memory")
+            out.mkdir()
+            s.run("balanced", {
+                "out_of_core": history_dir, "ALLOW_NEGATIVE_SOC": True,
+                "save_timeseries": out / "timeseries.csv", "save_soc": out / "soc.csv",
+                "save_results": out / "results.json"})
+            outputs.append({path.name: path.read_text() for path in out.iterdir()})
+            # columnar outputs are written chunk by chunk, vehicle SoC is not attached
+            options = {"skip_flex_report": True, "attach_vehicle_soc": True,
+                       "save_timeseries": out / "timeseries.npz", "save_soc": out / "soc.npz"}
+            if history_dir:
+                with pytest.warns(UserWarning, match="not attached"):
+                    report.generate_reports(s, options)
+                assert not hasattr(s, "vehicle_socs")
+            else:
+                report.generate_reports(s, options)
+            # compare with NaN
+            columnar_outputs.append({
+                path.name: str(util.read_columns(path)) for path in out.glob("*.npz")})
+        assert outputs[0] == outputs[1]
+        assert len(columnar_outputs[0]) == len([name for name in outputs[0] if ".csv" in name])
+        assert columnar_outputs[0] == columnar_outputs[1]
+        assert s.step_i == s.n_intervals
+        assert len(s.socs) == s.n_intervals
+        assert len(s.socs.cache) <= 2
+        assert len(list((tmp_path / "history").glob("socs_*.pickle"))) == s.n_intervals // 100 + 1
+        # timeseries of GC without single CS columns
+        timeseries = getattr(s, "S+U Wuhletal_timeseries")
+        assert len(timeseries["grid supply [kW]"]) == s.n_intervals
+        assert not any(name.endswith("_opps [kW]") for name in timeseries)
+
     def test_vehicle_soc(self):
         s = scenario.Scenario({
             "scenario": {
@@ -353,6 +523,60 @@ class TestScenarios(TestCaseBase):
         assert s.testing["max_total_load"] <= max_power
         assert s.testing["max_total_load"] > 0
 
+    def test_distributed_parallel(self):
+        # stepping GCs in worker processes gives same results as sequential run
+        input = TEST_REPO_PATH / 'test_data/input_test_strategies/bus_scenario_D.json'
+        scenario_json = load_json(input)
+        scenario_json["scenario"]["n_intervals"] = 300
+        s = scenario.Scenario(scenario_json, input.parent)
+        s.run('distributed', {"ALLOW_NEGATIVE_SOC": True})
+        total_load = s.totalLoad
+        socs = s.socs
+        s = scenario.Scenario(scenario_json, input.parent)
+        s.run('distributed', {"ALLOW_NEGATIVE_SOC": True, "PROCESSES": 2})
+        # each GC is always simulated by the same worker
+        assert len(s.strat.gc_workers) == 2
+        assert set(s.strat.gc_worker_ids.values()) == {0, 1}
+        assert s.totalLoad == total_load
+        assert s.socs == socs
+
+    def test_gc_parallel(self):
+        # GCs simulated by worker processes give same results as sequential run
+        input = TEST_REPO_PATH / 'test_data/input_test_strategies/bus_scenario_D.json'
+        scenario_json = load_json(input)
+        scenario_json["scenario"]["n_intervals"] = 100
+        options = {
+            "ALLOW_NEGATIVE_SOC": True,
+            "HORIZON": 1,
+            "time_windows":
+                TEST_REPO_PATH / "test_data/input_test_strategies/time_windows_example.json",
+        }
+
+        def get_scenario(loss_rate):
+            s = scenario.Scenario(scenario_json, input.parent)
+            if loss_rate:
+                # battery losses applied by main process
+                for vehicle in s.components.vehicles.values():
+                    vehicle.battery.loss_rate = loss_rate
+                for battery in s.components.batteries.values():
+                    battery.loss_rate = loss_rate
+            return s
+
+        for strat, loss_rate in [
+                ("balanced_market", None), ("peak_load_window", None),
+                ("balanced_market", {"relative": 1}), ("peak_load_window", {"relative": 1})]:
+            s = get_scenario(loss_rate)
+            s.run(strat, options)
+            total_load = s.totalLoad
+            socs = s.socs
+            s = get_scenario(loss_rate)
+            s.run(strat, dict(options, PROCESSES=2))
+            assert s.totalLoad == total_load
+            assert s.socs == socs
+            # GCs assigned to workers, no events left to send
+            assert set(s.strat.gc_worker_ids.values()) == {0, 1}
+            assert s.strat.gc_worker_events == []
+
     def test_pv_bat(self):
         input = TEST_REPO_PATH / 'test_data/input_test_strategies/scenario_PV_Bat.json'
         s = scenario.Scenario(load_json(input), input.parent)
@@ -361,6 +585,113 @@ class TestScenarios(TestCaseBase):
         assert s.testing["sum_local_generation_per_h"]["GC1"] == 246.0
         assert s.strat.world_state.batteries["BAT1"].soc > 0
 
+    def test_optimal(self):
+        pytest.importorskip("scipy")
+        for name in ["scenario_A", "scenario_B", "scenario_PV_Bat"]:
+            input = TEST_REPO_PATH / f'test_data/input_test_strategies/{name}.json'
+            s = scenario.Scenario(load_json(input), input.parent)
+            s.run('optimal', {"testing": True})
+            assert s.step_i == s.n_intervals
+            assert s.strat.desired_counter == 0
+            for gcID, gc in s.components.grid_connectors.items():
+                assert s.testing["max_total_load"] <= gc.max_power
+        # local generation is stored in battery instead of feed-in
+        assert s.strat.world_state.batteries["BAT1"].soc > 0
+
+    def test_optimal_min_power(self):
+        pytest.importorskip("scipy")
+        # power of GC not sufficient to charge both vehicles with minimum power
+        scenario_json = get_test_json()
+        scenario_json["components"] = {
+            "grid_connectors": {"GC1": {"max_power": 10, "cost": {"type": "fixed", "value": 1}}},
+            "charging_stations": {
+                cs_id: {"max_power": 7, "min_power": 6, "parent": "GC1"}
+                for cs_id in ["cs1", "cs2"]},
+            "vehicle_types": {
+                "t": {"name": "t", "capacity": 100, "charging_curve": [[0, 11], [1, 11]]}},
+            "vehicles": {
+                v_id: {"vehicle_type": "t", "soc": 0.9, "desired_soc": 1,
+                       "connected_charging_station": cs_id,
+                       "estimated_time_of_departure": "2020-01-01T01:00:00+02:00"}
+                for v_id, cs_id in [("t1", "cs1"), ("t2", "cs2")]},
+        }
+        # minimum power applied to linear program solution or part of mixed integer program
+        for milp in [False, True]:
+            s = scenario.Scenario(scenario_json)
+            s.n_intervals = 4
+            s.run('optimal', {"HORIZON": 1, "MIN_POWER_MILP": milp})
+            assert s.step_i == s.n_intervals
+            assert max(s.totalLoad["GC1"]) <= 10
+            for commands in s.connChargeByTS["GC1"]:
+                assert all(power == 0 or power >= 6 - 1e-6 for power in commands.values())
+            assert sum(s.totalLoad["GC1"]) > 0
+
+    def test_optimal_fallback(self):
+        pytest.importorskip("scipy")
+        # no solution within time limit: charge greedily, limited by GC
+        scenario_json = get_test_json()
+        scenario_json["components"] = {
+            "grid_connectors": {"GC1": {"max_power": 10, "cost": {"type": "fixed", "value": 1}}},
+            "charging_stations": {
+                cs_id: {"max_power": 11, "parent": "GC1"} for cs_id in ["cs1", "cs2"]},
+            "vehicle_types": {
+                "t": {"name": "t", "capacity": 100, "charging_curve": [[0, 11], [1, 11]]}},
+            "vehicles": {
+                v_id: {"vehicle_type": "t", "soc": 0.5, "desired_soc": 1,
+                       "connected_charging_station": cs_id,
+                       "estimated_time_of_departure": "2020-01-01T05:00:00+02:00"}
+                for v_id, cs_id in [("t1", "cs1"), ("t2", "cs2")]},
+        }
+        s = scenario.Scenario(scenario_json)
+        s.n_intervals = 4
+        s.run('optimal', {"TIME_LIMIT": 0})
+        assert s.step_i == s.n_intervals
+        assert s.totalLoad["GC1"] == pytest.approx([10] * 4)
+
+    def test_optimal_integer_load(self, monkeypatch):
+        pytest.importorskip("scipy")
+        # horizon with integer fixed load, power, price and start (e.g. no fixed loads at all)
+        scenario_json = get_test_json()
+        scenario_json["components"] = {
+            "grid_connectors": {"GC1": {"max_power": 10, "cost": {"type": "fixed", "value": 1}}},
+            "charging_stations": {"cs1": {"max_power": 11, "parent": "GC1"}},
+            "vehicle_types": {
+                "t": {"name": "t", "capacity": 100, "charging_curve": [[0, 11], [1, 11]]}},
+            "vehicles": {
+                "t1": {"vehicle_type": "t", "soc": 0.5, "desired_soc": 1,
+                       "connected_charging_station": "cs1",
+                       "estimated_time_of_departure": "2020-01-01T05:00:00+02:00"}},
+        }
+        s = scenario.Scenario(scenario_json)
+        strat = strategy.class_from_str("optimal")(
+            s.components, s.start_time, **{"interval": s.interval, "HORIZON": 1})
+        timesteps = [{"fixed_load": 0, "max_power": 10, "price": 1, "target": 5}] * 4
+        devices = strat.get_devices("GC1")
+        for highspy in [True, False]:
+            if not highspy:
+                monkeypatch.setitem(sys.modules, "highspy", None)
+            plan = strat.solve(timesteps, devices, {"t1": [10, 10, 10]})
+            assert plan is not None
+            assert sum(plan["t1"]) > 0
+
+    def test_optimal_start_solution(self, monkeypatch):
+        pytest.importorskip("scipy")
+        pytest.importorskip("highspy")
+        # solver started from previous solution: as good as without starting point
+        # (timing of feed-in may differ between equally good solutions)
+        input = TEST_REPO_PATH / 'test_data/input_test_strategies/scenario_PV_Bat.json'
+        s = scenario.Scenario(load_json(input), input.parent)
+        s.run('optimal', {})
+        monkeypatch.setitem(sys.modules, "highspy", None)
+        s_linprog = scenario.Scenario(load_json(input), input.parent)
+        s_linprog.run('optimal', {})
+        for sim in [s, s_linprog]:
+            assert sim.strat.desired_counter == 0
+        assert sum(s.totalLoad["GC1"]) == pytest.approx(sum(s_linprog.totalLoad["GC1"]))
+        assert max(s.totalLoad["GC1"]) == pytest.approx(max(s_linprog.totalLoad["GC1"]))
+        assert (s.strat.world_state.batteries["BAT1"].soc
+                == pytest.approx(s_linprog.strat.world_state.batteries["BAT1"].soc))
+
     # TEST STRATEGY OUTPUTS
     def test_general_outputs(self):
         input = TEST_REPO_PATH / 'test_data/input_test_strategies/scenario_C1.json'
@@ -436,6 +767,39 @@ class TestScenarios(TestCaseBase):
         for idx in indices_unload_battery:
             assert s.testing["timeseries"]["schedule"]["GC1"][idx] is False
 
+    def test_flex_window_horizon(self):
+        from spice_ev.strategies.flex_window import Horizon
+        input = TEST_REPO_PATH / 'test_data/input_test_strategies/scenario_C2.json'
+        s = scenario.Scenario(load_json(input), input.parent)
+        gc = s.components.grid_connectors["GC1"]
+        gc.window = True
+
+        horizon = Horizon(8, s.interval)
+        horizon.update(gc, s.start_time, [])
+        assert len(horizon.avg_fixed_load) == 8
+        assert list(horizon.window) == [True] * 8
+        assert list(horizon.window_idx[True]) == list(range(8))
+        assert horizon.leading(horizon.window_idx[True]) == 8
+        assert horizon.leading([0, 1, 3]) == 2
+        assert horizon.leading([1, 2]) == 0
+
+        # moving horizon keeps predicted fixed load
+        next_time = s.start_time + 2 * s.interval
+        horizon.update(gc, next_time, [])
+        fresh = Horizon(8, s.interval)
+        fresh.update(gc, next_time, [])
+        assert list(horizon.avg_fixed_load) == list(fresh.avg_fixed_load)
+        assert list(horizon.fixed_load) == list(fresh.fixed_load)
+
+        # timesteps until given time
+        assert horizon.num_timesteps_until(next_time) == 0
+        assert horizon.num_timesteps_until(next_time, inclusive=True) == 1
+        assert horizon.num_timesteps_until(next_time + s.interval / 2) == 1
+        assert horizon.num_timesteps_until(next_time + 2 * s.interval) == 2
+        assert horizon.num_timesteps_until(next_time + 2 * s.interval, inclusive=True) == 3
+        assert horizon.num_timesteps_until(next_time - s.interval, inclusive=True) == 0
+        assert horizon.num_timesteps_until(next_time + 20 * s.interval) == 8
+
     def test_distributed_C3_prioritization(self):
         # scenario with really low GC power, but supporting stationary battery
         input = TEST_REPO_PATH / 'test_data/input_test_strategies/scenario_C3.json'
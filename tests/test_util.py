@@ -106,6 +106,46 @@ class TestUtil:
             b = util.dt_within_core_standing_time(dt.replace(hour=h, minute=0), core)
             assert b == e, "{}:{} is {}".format(h, 0, b)
 
+    def test_core_standing_time_calendar(self):
+        # 2020/1/1 is Wednesday (2)
+        dt = datetime.datetime(day=1, month=1, year=2020)
+        core = {
+            "times": [{"start": (22, 30), "end": (5, 30)}, {"start": (10, 0), "end": (13, 0)}],
+            "no_drive_days": [5],
+            "holidays": ["2020-01-02"],
+        }
+        calendar = util.CoreStandingTime(core)
+        # same result as dt_within_core_standing_time
+        for m in range(0, 5 * 24 * 60, 7):
+            cur_dt = dt + datetime.timedelta(minutes=m)
+            assert calendar.within(cur_dt) == util.dt_within_core_standing_time(cur_dt, core)
+
+        # end of time window is included, but not when crossing midnight
+        assert calendar.time_until_end(dt.replace(hour=12)) == datetime.timedelta(minutes=61)
+        assert calendar.time_until_end(dt.replace(hour=5)) == datetime.timedelta(minutes=30)
+        # outside of core standing time
+        assert calendar.time_until_end(dt.replace(hour=8)) == datetime.timedelta()
+        assert calendar.time_until_start(dt.replace(hour=8)) == datetime.timedelta(hours=2)
+        assert calendar.time_until_start(dt.replace(hour=12)) == datetime.timedelta()
+        # holiday (Thursday) and following night until Friday morning
+        assert calendar.time_until_end(dt.replace(hour=23)) == datetime.timedelta(hours=30.5)
+        # coarser resolution: first full step outside of core standing time
+        assert calendar.time_until_end(
+            dt.replace(hour=12), resolution=datetime.timedelta(minutes=15)
+        ) == datetime.timedelta(minutes=75)
+
+        # always within core standing time: never ends
+        for core in [None, {"no_drive_days": list(range(7))},
+                     {"times": [{"start": (0, 0), "end": (12, 0)},
+                                {"start": (12, 0), "end": (0, 0)}]}]:
+            calendar = util.CoreStandingTime(core)
+            assert calendar.within(dt)
+            with pytest.raises(ValueError):
+                calendar.time_until_end(dt)
+        # never within core standing time: never starts
+        with pytest.raises(ValueError):
+            util.CoreStandingTime({}).time_until_start(dt)
+
     def test_get_time_windows_from_json(self, tmp_path):
         filepath = tmp_path / "time_windows.json"
         grid_operator = "operator"
@@ -310,3 +350,53 @@ class TestUtil:
         assert util.sanitize('".*<f/|o\\o:>?!"') == ".foo!"
         # declare special chars to remove
         assert util.sanitize("<foo? bar!>", 'or ') == "<f?ba!>"
+
+    def test_columns_npz(self, tmp_path):
+        start = datetime.datetime(2023, 1, 1, 12)
+        columns = {
+            "time": [start + datetime.timedelta(minutes=15 * i) for i in range(3)],
+            "power": [1.5, 0, -2.25],
+            "window": [True, None, False],
+        }
+        util.write_columns(tmp_path / "ts.npz", columns)
+        read = util.read_columns(tmp_path / "ts.npz")
+        assert read["time"] == columns["time"]
+        assert read["power"] == columns["power"]
+        # missing values stored as NaN
+        assert read["window"][::2] == [1, 0]
+        assert read["window"][1] != read["window"][1]
+        assert util.read_column_names(tmp_path / "ts.npz") == list(columns)
+        # block by block: same content, missing values in second block only
+        util.write_column_blocks(tmp_path / "blocks.npz", list(columns), [
+            {name: column[:1] for name, column in columns.items()},
+            {name: column[1:] for name, column in columns.items()}])
+        assert str(util.read_columns(tmp_path / "blocks.npz")) == str(read)
+        util.write_column_blocks(tmp_path / "blocks.npz", list(columns), [])
+        assert util.read_columns(tmp_path / "blocks.npz") == {name: [] for name in columns}
+        with pytest.raises(ValueError):
+            util.write_columns(tmp_path / "ts.xlsx", columns)
+        with pytest.raises(ValueError):
+            util.write_column_blocks(tmp_path / "ts.xlsx", list(columns), [columns])
+        with pytest.raises(ValueError):
+            util.read_columns(tmp_path / "ts.xlsx")
+        with pytest.raises(ValueError):
+            util.read_column_names(tmp_path / "ts.xlsx")
+
+    @pytest.mark.parametrize("suffix", [".parquet", ".feather"])
+    def test_columns_arrow(self, tmp_path, suffix):
+        pytest.importorskip("pyarrow")
+        start = datetime.datetime(2023, 1, 1, 12)
+        columns = {
+            "time": [start + datetime.timedelta(minutes=15 * i) for i in range(3)],
+            "power": [1.5, 0.0, -2.25],
+            "window": [True, None, False],
+        }
+        util.write_columns(tmp_path / f"ts{suffix}", columns)
+        assert util.read_columns(tmp_path / f"ts{suffix}") == columns
+        assert util.read_column_names(tmp_path / f"ts{suffix}") == list(columns)
+        # block by block: missing values and integers in first block only
+        util.write_column_blocks(tmp_path / f"blocks{suffix}", list(columns), [
+            {"time": columns["time"][:1], "power": [0], "window": [None]},
+            {name: column[1:] for name, column in columns.items()}])
+        assert util.read_columns(tmp_path / f"blocks{suffix}") == {
+            **columns, "power": [0.0, 0.0, -2.25], "window": [None, None, False]}